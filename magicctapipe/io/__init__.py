@@ -1,11 +1,22 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+from .cache import (
+    evict_cache_entries,
+    get_mc_dl2_cache_key,
+    load_cached_mc_dl2,
+    save_cached_mc_dl2,
+)
 from .containers import (
     BaseEventInfoContainer,
     RealEventInfoContainer,
     SimEventInfoContainer,
 )
+from .dtypes import (
+    EVENT_DTYPES,
+    apply_dtype_profile,
+    get_event_dtypes,
+)
 from .gadf import (
     create_event_hdu,
     create_gh_cuts_hdu,
@@ -19,18 +30,61 @@ from .io import (
     get_stereo_events,
     load_dl2_data_file,
     load_irf_files,
+    load_irf_manifest,
+    find_irf_files,
     load_lst_dl1_data_file,
     load_magic_dl1_data_files,
     load_mc_dl2_data_file,
     load_train_data_files,
     load_train_data_files_tel,
+    count_train_data_files_tel,
+    sample_train_data_files_tel,
+    save_irf_manifest,
     save_pandas_data_in_table,
+    save_event_data,
+    index_event_table,
+    is_lexsorted,
+    is_sorted_event_file,
+    read_events,
+)
+from .provenance import (
+    get_input_identity,
+    get_provenance,
+    is_up_to_date,
+    read_provenance,
+    set_provenance_keywords,
+    write_provenance,
+)
+from .sources import (
+    load_source_catalog,
+    resolve_source_coordinate,
+)
+from .split import (
+    create_split_manifests,
+    find_input_files,
+    get_split_values,
+    load_file_manifest,
+    save_file_manifest,
+    select_split_events,
+)
+from .storage import (
+    get_parquet_path,
+    merge_parquet_data,
+    read_event_data,
+    save_parquet_data,
 )
 
 __all__ = [
+    "evict_cache_entries",
+    "get_mc_dl2_cache_key",
+    "load_cached_mc_dl2",
+    "save_cached_mc_dl2",
     "BaseEventInfoContainer",
     "RealEventInfoContainer",
     "SimEventInfoContainer",
+    "EVENT_DTYPES",
+    "apply_dtype_profile",
+    "get_event_dtypes",
     "create_event_hdu",
     "create_gh_cuts_hdu",
     "create_gti_hdu",
@@ -41,10 +95,38 @@ __all__ = [
     "get_stereo_events",
     "load_dl2_data_file",
     "load_irf_files",
+    "load_irf_manifest",
+    "find_irf_files",
     "load_lst_dl1_data_file",
     "load_magic_dl1_data_files",
     "load_mc_dl2_data_file",
     "load_train_data_files",
     "load_train_data_files_tel",
+    "count_train_data_files_tel",
+    "sample_train_data_files_tel",
+    "save_irf_manifest",
     "save_pandas_data_in_table",
+    "save_event_data",
+    "index_event_table",
+    "is_lexsorted",
+    "is_sorted_event_file",
+    "read_events",
+    "get_input_identity",
+    "get_provenance",
+    "is_up_to_date",
+    "read_provenance",
+    "set_provenance_keywords",
+    "write_provenance",
+    "load_source_catalog",
+    "resolve_source_coordinate",
+    "create_split_manifests",
+    "find_input_files",
+    "get_split_values",
+    "load_file_manifest",
+    "save_file_manifest",
+    "select_split_events",
+    "get_parquet_path",
+    "read_event_data",
+    "save_parquet_data",
+    "merge_parquet_data",
 ]
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Cache of the MC DL2 event tables loaded for creating the IRFs.
+
+Loading a MC DL2 data file with `load_mc_dl2_data_file` always gives the
+same event table, pointing direction and simulation information for the
+same input file and settings, so they are saved in a cache directory
+and loaded from there by the next calls. The entries are addressed by a
+hash of the input file (its path, size and modification time, or its
+content), the telescope IDs, the quality cuts, the event type, the DL2
+weight type, the dtype profile and the package version.
+
+Every entry consists of a Parquet file of the event table and a JSON
+file of the units of the columns, the pointing direction and the
+simulation information, which is written last and marks the entry as
+complete. The entries are evicted in the least-recently-used order when
+the total size of the cache exceeds a given limit.
+
+The cache requires the optional dependency `pyarrow`, without which the
+events are loaded as usual.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+from astropy import units as u
+from astropy.table import QTable
+from magicctapipe.io.storage import get_parquet_path
+from magicctapipe.version import __version__
+from pyirf.simulations import SimulatedEventsInfo
+
+__all__ = [
+    "get_mc_dl2_cache_key",
+    "load_cached_mc_dl2",
+    "save_cached_mc_dl2",
+    "evict_cache_entries",
+]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# The version of the format of the cache entries, which is a part of the
+# keys so that the entries of an old format are not used
+CACHE_FORMAT_VERSION = 1
+
+# The size of the chunks read at once when hashing the file content
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _get_file_identity(input_file, hash_content=False):
+    """
+    Gets the identity of a data file and of its Parquet dataset if it
+    exists, either by the content or by the path, size and modification
+    time of the files.
+    """
+
+    input_files = [Path(input_file)]
+    parquet_path = Path(get_parquet_path(input_file))
+
+    if parquet_path.exists():
+        input_files += sorted(path for path in parquet_path.rglob("*") if path.is_file())
+
+    identity = []
+
+    for path in input_files:
+        if hash_content:
+            file_hash = hashlib.sha256()
+
+            with open(path, "rb") as f_in:
+                for chunk in iter(lambda: f_in.read(HASH_CHUNK_SIZE), b""):
+                    file_hash.update(chunk)
+
+            identity.append(file_hash.hexdigest())
+
+        else:
+            stat = path.stat()
+            identity.append([str(path.resolve()), stat.st_size, stat.st_mtime_ns])
+
+    return identity
+
+
+def get_mc_dl2_cache_key(
+    input_file,
+    config,
+    quality_cuts,
+    event_type,
+    weight_type_dl2,
+    compact=False,
+    hash_content=False,
+):
+    """
+    Gets the key of the cache entry of a MC DL2 data file loaded with
+    given settings.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an input MC DL2 data file
+    config: dict
+        Configuration with the telescope IDs
+    quality_cuts: str
+        Quality cuts applied to the input events
+    event_type: str
+        Type of the events which will be used
+    weight_type_dl2: str
+        Type of the weight for averaging telescope-wise DL2 parameters
+    compact: bool
+        If `True`, the compact dtype profile is used
+    hash_content: bool
+        If `True`, the input file is identified by the hash of its
+        content, otherwise by its path, size and modification time
+
+    Returns
+    -------
+    cache_key: str
+        Key of the cache entry
+    """
+
+    key_items = {
+        "format_version": CACHE_FORMAT_VERSION,
+        "package_version": __version__,
+        "input_file": _get_file_identity(input_file, hash_content),
+        "mc_tel_ids": config["mc_tel_ids"],
+        "quality_cuts": quality_cuts,
+        "event_type": event_type,
+        "weight_type_dl2": weight_type_dl2,
+        "compact": compact,
+    }
+
+    key_json = json.dumps(key_items, sort_keys=True, default=str)
+    cache_key = hashlib.sha256(key_json.encode()).hexdigest()
+
+    return cache_key
+
+
+def load_cached_mc_dl2(cache_dir, cache_key):
+    """
+    Loads a MC DL2 event table from the cache.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Path to the cache directory
+    cache_key: str
+        Key of the cache entry
+
+    Returns
+    -------
+    cache_entry: tuple
+        Table of the MC DL2 events, pointing direction (zd, az) in the
+        unit of degree and simulation information, or `None` if the
+        entry is not found
+    """
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.warning("WARNING: The cache is not used, since pyarrow is not installed.")
+        return None
+
+    metadata_file = Path(cache_dir) / f"{cache_key}.json"
+    table_file = Path(cache_dir) / f"{cache_key}.parquet"
+
+    if not (metadata_file.exists() and table_file.exists()):
+        return None
+
+    with open(metadata_file, "r") as f_in:
+        metadata = json.load(f_in)
+
+    df_events = pq.read_table(table_file).to_pandas()
+
+    event_table = QTable.from_pandas(df_events)
+
+    for column, unit in metadata["units"].items():
+        event_table[column] = u.Quantity(event_table[column], unit, copy=False)
+
+    pointing = np.array(metadata["pointing"])
+
+    config_sim = metadata["sim_info"]
+
+    sim_info = SimulatedEventsInfo(
+        n_showers=config_sim["n_showers"],
+        energy_min=u.Quantity(config_sim["energy_min"], unit="TeV"),
+        energy_max=u.Quantity(config_sim["energy_max"], unit="TeV"),
+        max_impact=u.Quantity(config_sim["max_impact"], unit="m"),
+        spectral_index=config_sim["spectral_index"],
+        viewcone=u.Quantity(config_sim["viewcone"], unit="deg"),
+    )
+
+    # Mark the entry as recently used
+    os.utime(metadata_file)
+
+    return event_table, pointing, sim_info
+
+
+def save_cached_mc_dl2(
+    cache_dir, cache_key, event_table, pointing, sim_info, max_size=None
+):
+    """
+    Saves a MC DL2 event table in the cache, evicting the least recently
+    used entries if the cache exceeds the maximum size.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Path to the cache directory
+    cache_key: str
+        Key of the cache entry
+    event_table: astropy.table.table.QTable
+        Table of the MC DL2 events
+    pointing: numpy.ndarray
+        Telescope pointing direction (zd, az) in the unit of degree
+    sim_info: pyirf.simulations.SimulatedEventsInfo
+        Container of the simulation information
+    max_size: int
+        Maximum size of the cache in bytes (If None, no entries are
+        evicted)
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.warning("WARNING: The cache is not used, since pyarrow is not installed.")
+        return
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(exist_ok=True, parents=True)
+
+    units = {}
+    columns = {}
+
+    for column in event_table.colnames:
+        values = event_table[column]
+
+        if isinstance(values, u.Quantity):
+            units[column] = values.unit.to_string()
+            values = values.value
+
+        columns[column] = np.asarray(values)
+
+    metadata = {
+        "units": units,
+        "pointing": np.asarray(pointing).tolist(),
+        "sim_info": {
+            "n_showers": int(sim_info.n_showers),
+            "energy_min": sim_info.energy_min.to_value("TeV"),
+            "energy_max": sim_info.energy_max.to_value("TeV"),
+            "max_impact": sim_info.max_impact.to_value("m"),
+            "spectral_index": float(sim_info.spectral_index),
+            "viewcone": sim_info.viewcone.to_value("deg"),
+        },
+    }
+
+    # Write the files under temporary names and rename them, so that
+    # incomplete entries are never read. The metadata file is renamed
+    # last since it marks the entry as complete.
+    table_file = cache_dir / f"{cache_key}.parquet"
+    metadata_file = cache_dir / f"{cache_key}.json"
+
+    table_file_tmp = cache_dir / f"{cache_key}.parquet.{os.getpid()}.tmp"
+    metadata_file_tmp = cache_dir / f"{cache_key}.json.{os.getpid()}.tmp"
+
+    pq.write_table(pa.table(columns), table_file_tmp)
+
+    with open(metadata_file_tmp, "w") as f_out:
+        json.dump(metadata, f_out)
+
+    os.replace(table_file_tmp, table_file)
+    os.replace(metadata_file_tmp, metadata_file)
+
+    if max_size is not None:
+        evict_cache_entries(cache_dir, max_size, keep_keys=[cache_key])
+
+
+def evict_cache_entries(cache_dir, max_size, keep_keys=None):
+    """
+    Evicts the least recently used entries of the cache until its total
+    size does not exceed the maximum size.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Path to the cache directory
+    max_size: int
+        Maximum size of the cache in bytes
+    keep_keys: list
+        Keys of the entries which are never evicted
+    """
+
+    keep_keys = [] if keep_keys is None else keep_keys
+
+    entries = []
+
+    for metadata_file in Path(cache_dir).glob("*.json"):
+        table_file = metadata_file.with_suffix(".parquet")
+
+        try:
+            last_used = metadata_file.stat().st_mtime
+            size = metadata_file.stat().st_size + table_file.stat().st_size
+        except FileNotFoundError:
+            # The entry is incomplete or being evicted by another process
+            continue
+
+        entries.append((last_used, size, metadata_file.stem))
+
+    total_size = sum(size for _, size, _ in entries)
+
+    for _, size, cache_key in sorted(entries):
+        if total_size <= max_size:
+            break
+
+        if cache_key in keep_keys:
+            continue
+
+        logger.info(f"Evicting the cache entry {cache_key}")
+
+        for suffix in [".json", ".parquet"]:
+            try:
+                Path(cache_dir, f"{cache_key}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+
+        total_size -= size
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Declared data types of the known columns of the event tables.
+
+Every known column has a standard type, which is the type saved in the
+data files so far, and a compact type used when the loaders and writers
+are called with `compact=True`. The compact profile roughly halves the
+memory usage per event row, with the following precision contract:
+
+- The identifiers, i.e., the observation and event IDs, are kept as
+  64-bit integers, and the telescope IDs, combination types and other
+  small counters are stored in 8- or 16-bit integers, whose ranges
+  cover all the possible values. They are always exact.
+- The timestamps, trigger times and time differences are kept as 64-bit
+  floats, so the event times and the ON time are exact.
+- The true directions `true_alt` and `true_az` are kept as 64-bit
+  floats, since they are a part of the key identifying the simulated
+  shower events.
+- All the other parameters (Hillas and leakage parameters, pointing and
+  reconstructed directions, stereo parameters and the RF outputs) are
+  stored as 32-bit floats, whose relative precision is about 6e-8,
+  e.g., 2e-5 deg (0.08 arcsec) at 360 deg, which is far below the
+  resolutions of the parameters.
+
+The profiles only change the widths of the column types and never their
+kinds, e.g., a float column of IDs containing NaN is not cast to an
+integer type. The columns not declared here are kept as they are, and
+without `compact=True` the events are not cast at all.
+"""
+
+import numpy as np
+
+__all__ = ["EVENT_DTYPES", "get_event_dtypes", "apply_dtype_profile"]
+
+# The types of the identifiers and counters, as (standard, compact)
+_ID_DTYPES = {
+    "obs_id": ("int64", "int64"),
+    "event_id": ("int64", "int64"),
+    "obs_id_lst": ("int64", "int64"),
+    "event_id_lst": ("int64", "int64"),
+    "obs_id_magic": ("int64", "int64"),
+    "event_id_magic": ("int64", "int64"),
+    "tel_id": ("int64", "int8"),
+    "combo_type": ("int64", "int8"),
+    "multiplicity": ("int64", "int8"),
+    "event_type": ("int64", "int16"),
+    "true_event_class": ("int64", "int8"),
+    "n_islands": ("int64", "int16"),
+    "n_pixels": ("int64", "int16"),
+    "magic_stereo": ("bool", "bool"),
+}
+
+# The types of the times and the key of the simulated shower events
+_EXACT_FLOAT_COLUMNS = [
+    "timestamp",
+    "time_sec",
+    "time_nanosec",
+    "time_diff",
+    "dragon_time",
+    "tib_time",
+    "ucts_time",
+    "true_alt",
+    "true_az",
+]
+
+# The parameters stored as 32-bit floats in the compact profile
+_COMPACT_FLOAT_COLUMNS = [
+    # Image parameters
+    "intensity",
+    "x",
+    "y",
+    "r",
+    "phi",
+    "length",
+    "length_uncertainty",
+    "width",
+    "width_uncertainty",
+    "psi",
+    "skewness",
+    "kurtosis",
+    "slope",
+    "intercept",
+    "pixels_width_1",
+    "pixels_width_2",
+    "intensity_width_1",
+    "intensity_width_2",
+    # Pointing directions
+    "pointing_alt",
+    "pointing_az",
+    # Stereo parameters
+    "alt",
+    "alt_uncert",
+    "az",
+    "az_uncert",
+    "core_x",
+    "core_y",
+    "impact",
+    "h_max",
+    # Simulated shower parameters
+    "true_energy",
+    "true_disp",
+    "true_core_x",
+    "true_core_y",
+    "true_impact",
+    "off_axis",
+    # Outputs of the RFs
+    "reco_energy",
+    "reco_energy_var",
+    "reco_disp",
+    "reco_disp_var",
+    "gammaness",
+    "gammaness_var",
+    "reco_alt",
+    "reco_az",
+]
+
+EVENT_DTYPES = {
+    **_ID_DTYPES,
+    **{column: ("float64", "float64") for column in _EXACT_FLOAT_COLUMNS},
+    **{column: ("float64", "float32") for column in _COMPACT_FLOAT_COLUMNS},
+}
+
+
+def get_event_dtypes(compact=False):
+    """
+    Gets the declared data types of the known columns.
+
+    Parameters
+    ----------
+    compact: bool
+        If `True`, the types of the compact profile are returned,
+        otherwise those of the standard profile
+
+    Returns
+    -------
+    dtypes: dict
+        Data types of the known columns
+    """
+
+    profile = 1 if compact else 0
+    dtypes = {column: np.dtype(types[profile]) for column, types in EVENT_DTYPES.items()}
+
+    return dtypes
+
+
+def apply_dtype_profile(event_data, compact=False):
+    """
+    Casts the known columns of events to the types of the compact dtype
+    profile.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame
+        Data frame of the events
+    compact: bool
+        If `True`, the columns are cast to the types of the compact
+        profile, otherwise the events are returned unchanged
+
+    Returns
+    -------
+    event_data: pandas.core.frame.DataFrame
+        Data frame of the events with the declared column types
+    """
+
+    # Keep the types of the data files unless the compact profile is
+    # requested, so the outputs do not change for the other users
+    if not compact:
+        return event_data
+
+    dtypes = get_event_dtypes(compact=True)
+    new_dtypes = {}
+
+    for column, dtype in event_data.dtypes.items():
+        new_dtype = dtypes.get(column)
+
+        if (new_dtype is None) or (new_dtype == dtype):
+            continue
+
+        # Only the widths of the types are changed, e.g., float IDs
+        # which may contain NaN are not cast to integers
+        if new_dtype.kind != getattr(dtype, "kind", None):
+            continue
+
+        new_dtypes[column] = new_dtype
+
+    if len(new_dtypes) > 0:
+        event_data = event_data.astype(new_dtypes, copy=False)
+
+    return event_data
@@ -10,7 +10,13 @@ from astropy.io import fits
 from astropy.table import QTable
 from astropy.time import Time
 from magicctapipe import __version__
-from magicctapipe.utils.functions import HEIGHT_ORM, LAT_ORM, LON_ORM
+from magicctapipe.io.sources import resolve_source_coordinate
+from magicctapipe.utils.functions import (
+    HEIGHT_ORM,
+    LAT_ORM,
+    LON_ORM,
+    transform_radec_to_galactic,
+)
 from pyirf.binning import split_bin_lo_hi
 
 __all__ = [
@@ -139,7 +145,16 @@ def create_gh_cuts_hdu(
 
 
 def create_event_hdu(
-    event_table, config, on_time, deadc, source_name, source_ra=None, source_dec=None
+    event_table,
+    config,
+    on_time,
+    deadc,
+    source_name,
+    source_ra=None,
+    source_dec=None,
+    source_catalog=None,
+    source_cache_file=None,
+    resolve_source_online=False,
 ):
     """
     Creates a fits binary table HDU for shower events.
@@ -164,6 +179,15 @@ def create_event_hdu(
         Declination of the observed source, whose format should be
         acceptable by `astropy.coordinates.sky_coordinate.SkyCoord`
         (Used only when the source name cannot be resolved)
+    source_catalog: str
+        Path to a YAML catalog of the source coordinates, which is used
+        in addition to that of the package to resolve the source name
+    source_cache_file: str
+        Path to a YAML file where the source coordinates resolved online
+        are cached
+    resolve_source_online: bool
+        If `True`, the source name is resolved online if it is not found
+        in the catalogs
 
     Returns
     -------
@@ -200,17 +224,16 @@ def create_event_hdu(
     instruments = "_".join(tel_list_unique)
 
     # Transfer the RA/Dec directions to the galactic coordinate
-    event_coords = SkyCoord(
-        ra=event_table["reco_ra"], dec=event_table["reco_dec"], frame="icrs"
+    glon, glat = transform_radec_to_galactic(
+        ra=event_table["reco_ra"], dec=event_table["reco_dec"]
     )
 
-    event_coords = event_coords.galactic
-
-    try:
-        # Try to get the source coordinate from the input name
-        source_coord = SkyCoord.from_name(source_name, frame="icrs")
+    # Try to get the source coordinate from the input name
+    source_coord = resolve_source_coordinate(
+        source_name, source_catalog, source_cache_file, resolve_source_online
+    )
 
-    except Exception:
+    if source_coord is None:
         logger.warning(
             f"WARNING: The source name '{source_name}' could not be resolved. "
             f"Setting the input RA/Dec coordinate ({source_ra}, {source_dec})..."
@@ -231,8 +254,8 @@ def create_event_hdu(
             "ENERGY": event_table["reco_energy"],
             "GAMMANESS": event_table["gammaness"],
             "MULTIP": event_table["multiplicity"],
-            "GLON": event_coords.l.to("deg"),
-            "GLAT": event_coords.b.to("deg"),
+            "GLON": glon,
+            "GLAT": glat,
             "ALT": event_table["reco_alt"].to("deg"),
             "AZ": event_table["reco_az"].to("deg"),
         }
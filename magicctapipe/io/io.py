@@ -2,9 +2,12 @@
 # coding: utf-8
 
 import glob
+import json
 import logging
 import pprint
 import re
+import shutil
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
@@ -17,7 +20,18 @@ from ctapipe.containers import EventType
 from ctapipe.coordinates import CameraFrame
 from ctapipe.instrument import SubarrayDescription
 from lstchain.reco.utils import add_delta_t_key
-from magicctapipe.utils import calculate_mean_direction, transform_altaz_to_radec
+from magicctapipe.io.cache import get_mc_dl2_cache_key, load_cached_mc_dl2, save_cached_mc_dl2
+from magicctapipe.io.dtypes import apply_dtype_profile
+from magicctapipe.io.split import find_input_files, select_split_events
+from magicctapipe.io.storage import get_parquet_path, read_event_data, save_parquet_data
+from magicctapipe.utils import (
+    factorize_events,
+    get_event_sort_keys,
+    group_mean,
+    group_mean_direction,
+    transform_altaz_to_radec,
+)
+from magicctapipe.utils.functions import ACCURACY_RADEC, TIME_RESOLUTION_RADEC
 from pyirf.binning import join_bin_lo_hi
 from pyirf.simulations import SimulatedEventsInfo
 from pyirf.utils import calculate_source_fov_offset, calculate_theta
@@ -32,10 +46,20 @@ __all__ = [
     "load_magic_dl1_data_files",
     "load_train_data_files",
     "load_train_data_files_tel",
+    "count_train_data_files_tel",
+    "sample_train_data_files_tel",
     "load_mc_dl2_data_file",
     "load_dl2_data_file",
     "load_irf_files",
+    "save_irf_manifest",
+    "load_irf_manifest",
+    "find_irf_files",
     "save_pandas_data_in_table",
+    "save_event_data",
+    "index_event_table",
+    "is_lexsorted",
+    "is_sorted_event_file",
+    "read_events",
 ]
 
 logger = logging.getLogger(__name__)
@@ -58,6 +82,19 @@ TIME_DIFF_UPLIM = 0.1 * u.s
 DEAD_TIME_LST = 7.6 * u.us
 DEAD_TIME_MAGIC = 26 * u.us
 
+# The number of rows appended at once when saving a data frame in a table
+CHUNK_SIZE_TABLE = 100000
+
+# The name of the manifest file listing the IRF data files of a directory
+IRF_MANIFEST_FILE_NAME = "irf_manifest.json"
+
+# The storage backends of the event tables
+STORAGE_BACKENDS = ["hdf5", "parquet"]
+
+# The columns identifying the telescope events, by which the event
+# tables can be sorted and indexed
+EVENT_KEY = ["obs_id", "event_id", "tel_id"]
+
 def telescope_combinations(config):
     """
     Generates all possible telescope combinations without repetition. E.g.: "LST1_M1", "LST2_LST4_M2", "LST1_LST2_LST3_M1" and so on.
@@ -123,7 +160,12 @@ def format_object(input_object):
         The formatted object
     """
 
-    pp = pprint.PrettyPrinter(indent=4, width=1, sort_dicts=False)
+    # The argument keeping the order of the dictionaries is available
+    # since Python 3.8
+    try:
+        pp = pprint.PrettyPrinter(indent=4, width=1, sort_dicts=False)
+    except TypeError:
+        pp = pprint.PrettyPrinter(indent=4, width=1)
 
     string = pp.pformat(input_object)
 
@@ -170,8 +212,11 @@ def get_stereo(
         event_data_stereo.query(quality_cuts, inplace=True)
 
     max_multiplicity=len(TEL_NAMES.keys())
-    # Extract stereo events                                                                                                                                           
-    event_data_stereo["multiplicity"] = event_data_stereo.groupby(group_index).size()
+    # Extract stereo events
+    event_codes, event_index = factorize_events(event_data_stereo, group_index)
+    event_multiplicity = np.bincount(event_codes, minlength=len(event_index))
+
+    event_data_stereo["multiplicity"] = event_multiplicity[event_codes]
     event_data_stereo.query(f"multiplicity >1 & multiplicity <= {max_multiplicity}", inplace=True)
     
     return event_data_stereo
@@ -210,41 +255,84 @@ def get_stereo_events(
     # Apply the quality cuts
     if quality_cuts is not None:
         event_data_stereo.query(quality_cuts, inplace=True)
-    
-    max_multiplicity=len(TEL_NAMES.keys())
+
+    if "tel_id" in event_data_stereo.columns:
+        tel_ids = event_data_stereo["tel_id"].to_numpy()
+    else:
+        tel_ids = event_data_stereo.index.get_level_values("tel_id").to_numpy()
+
+    tel_ids = tel_ids.astype(np.int64)
+
+    unknown_tel_ids = np.setdiff1d(tel_ids, list(TEL_NAMES.keys()))
+
+    if len(unknown_tel_ids) > 0:
+        raise ValueError(
+            f"The telescope IDs {unknown_tel_ids.tolist()} are not in the configuration."
+        )
+
+    # Map the configured telescope IDs to consecutive bit positions, so
+    # that the size of the bitmasks depends only on the number of the
+    # telescopes and not on the values of their IDs
+    config_tel_ids = np.sort(list(TEL_NAMES.keys()))
+    tel_bits = np.searchsorted(config_tel_ids, tel_ids)
+
+    # Compute the bitmask of the telescopes that triggered every shower
+    # event, i.e., the bitwise OR of `1 << tel_bit`, in a single pass
+    # over the rows sorted by the event codes
+    event_codes, _ = factorize_events(event_data_stereo, group_index)
+
+    order = np.argsort(event_codes, kind="stable")
+    sorted_codes = event_codes[order]
+
+    group_starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1) != 0)
+
+    if len(group_starts) > 0:
+        tel_masks = np.bitwise_or.reduceat(np.left_shift(1, tel_bits[order]), group_starts)
+    else:
+        tel_masks = np.zeros(0, dtype=np.int64)
+
+    # Map the bitmasks to the multiplicity (popcount) and the combination
+    # types with lookup tables precomputed over all the possible bitmasks
+    table_size = 1 << len(config_tel_ids)
+
+    multiplicity_table = np.zeros(table_size, dtype=np.int64)
+    combo_type_table = np.full(table_size, -1, dtype=np.int64)
+
+    for tel_bit in range(len(config_tel_ids)):
+        has_tel_id = (np.arange(table_size) >> tel_bit) & 1
+        multiplicity_table += has_tel_id
+
+    for combo_type, tel_combo_ids in enumerate(TEL_COMBINATIONS.values()):
+        tel_combo_bits = np.searchsorted(config_tel_ids, tel_combo_ids)
+        combo_mask = np.bitwise_or.reduce(np.left_shift(1, tel_combo_bits))
+        combo_type_table[combo_mask] = combo_type
+
     # Extract stereo events
-    event_data_stereo["multiplicity"] = event_data_stereo.groupby(group_index).size()
-    event_data_stereo.query(f"multiplicity >1 & multiplicity <= {max_multiplicity}", inplace=True)
+    event_multiplicity = multiplicity_table[tel_masks]
+    event_combo_types = combo_type_table[tel_masks]
 
-    # Check the total number of events
-    n_events_total = len(event_data_stereo.groupby(group_index).size())
-    logger.info(f"\nIn total {n_events_total} stereo events are found:")
+    max_multiplicity = len(TEL_NAMES.keys())
 
-    n_events_per_combo = {}
+    is_stereo_event = (event_multiplicity > 1) & (event_multiplicity <= max_multiplicity)
+    is_stereo = is_stereo_event[event_codes]
 
-    # Loop over every telescope combination type
-    for combo_type, (tel_combo, tel_ids) in enumerate(TEL_COMBINATIONS.items()):
-        multiplicity = len(tel_ids)
+    event_data_stereo["multiplicity"] = event_multiplicity[event_codes]
+    event_data_stereo["combo_type"] = event_combo_types[event_codes]
 
-        df_events = event_data_stereo.query(
-            f"(tel_id == {tel_ids}) & (multiplicity == {multiplicity})"
-        ).copy()
+    event_data_stereo = event_data_stereo[is_stereo]
 
-        # Here we recalculate the multiplicity and apply the cut again,
-        # since with the above cut the events belonging to other
-        # combination types are also extracted. For example, in case of
-        # tel_id = [1, 2], the tel 1 events of the combination [1, 3]
-        # and the tel 2 events of the combination [2, 3] remain in the
-        # data frame, whose multiplicity will be recalculated as 1 and
-        # so will be removed with the following cuts.
+    # Check the total number of events
+    n_events_total = np.count_nonzero(is_stereo_event)
+    logger.info(f"\nIn total {n_events_total} stereo events are found:")
 
-        df_events["multiplicity"] = df_events.groupby(group_index).size()
-        df_events.query(f"multiplicity == {multiplicity}", inplace=True)
+    n_events_combo = np.bincount(
+        event_combo_types[is_stereo_event], minlength=len(TEL_COMBINATIONS)
+    )
 
-        # Assign the combination type
-        event_data_stereo.loc[df_events.index, "combo_type"] = combo_type
+    n_events_per_combo = {}
 
-        n_events = len(df_events.groupby(group_index).size())
+    for combo_type, tel_combo in enumerate(TEL_COMBINATIONS.keys()):
+        n_events = n_events_combo[combo_type]
         percentage = 100 * n_events / n_events_total
 
         key = f"{tel_combo} (type {combo_type})"
@@ -252,15 +340,19 @@ def get_stereo_events(
 
         n_events_per_combo[key] = value
 
-    event_data_stereo = event_data_stereo.astype({"combo_type": int})
-
     # Show the number of events per combination type
     logger.info(format_object(n_events_per_combo))
 
     return event_data_stereo
 
 
-def get_dl2_mean(event_data, weight_type="simple", group_index=["obs_id", "event_id"]):
+def get_dl2_mean(
+    event_data,
+    weight_type="simple",
+    group_index=["obs_id", "event_id"],
+    time_resolution_radec=TIME_RESOLUTION_RADEC,
+    accuracy_radec=ACCURACY_RADEC,
+):
     """
     Gets mean DL2 parameters per shower event.
 
@@ -275,6 +367,13 @@ def get_dl2_mean(event_data, weight_type="simple", group_index=["obs_id", "event
         "intensity" uses the linear-scale intensity parameter
     group_index: list
         Index to group telescope events
+    time_resolution_radec: astropy.units.quantity.Quantity
+        Resolution of the time grid on which the Alt/Az to RA/Dec
+        transformation is computed for real data (If None, it is
+        computed for every event)
+    accuracy_radec: astropy.units.quantity.Quantity
+        Accuracy required for the Alt/Az to RA/Dec transformation
+        computed on the time grid (If None, it is not verified)
 
     Returns
     -------
@@ -289,18 +388,33 @@ def get_dl2_mean(event_data, weight_type="simple", group_index=["obs_id", "event
 
     is_simulation = "true_energy" in event_data.columns
 
+    # Factorize the shower events only once, and calculate all the mean
+    # parameters with the group-reduction kernels
+    event_codes, event_index = factorize_events(event_data, group_index)
+    n_events = len(event_index)
+
     # Create a mean data frame
     if is_simulation:
         params = ["combo_type", "multiplicity", "true_energy", "true_alt", "true_az"]
     else:
         params = ["combo_type", "multiplicity", "timestamp"]
 
-    event_data_mean = event_data[params].groupby(group_index).mean()
+    event_data_mean = pd.DataFrame(
+        data={
+            param: group_mean(event_data[param].to_numpy(), event_codes, n_events)
+            for param in params
+        },
+        index=event_index,
+    )
+
     event_data_mean = event_data_mean.astype({"combo_type": int, "multiplicity": int})
 
     # Calculate the mean pointing direction
-    pnt_az_mean, pnt_alt_mean = calculate_mean_direction(
-        lon=event_data["pointing_az"], lat=event_data["pointing_alt"], unit="rad"
+    pnt_az_mean, pnt_alt_mean = group_mean_direction(
+        lon=event_data["pointing_az"].to_numpy(),
+        lat=event_data["pointing_alt"].to_numpy(),
+        event_codes=event_codes,
+        n_events=n_events,
     )
 
     event_data_mean["pointing_alt"] = pnt_alt_mean
@@ -308,75 +422,76 @@ def get_dl2_mean(event_data, weight_type="simple", group_index=["obs_id", "event
 
     # Define the weights for the DL2 parameters
     if weight_type == "simple":
-        energy_weights = 1
+        energy_weights = None
         direction_weights = None
-        gammaness_weights = 1
+        gammaness_weights = None
 
     elif weight_type == "variance":
-        energy_weights = 1 / event_data["reco_energy_var"]
-        direction_weights = 1 / event_data["reco_disp_var"]
-        gammaness_weights = 1 / event_data["gammaness_var"]
+        energy_weights = 1 / event_data["reco_energy_var"].to_numpy()
+        direction_weights = 1 / event_data["reco_disp_var"].to_numpy()
+        gammaness_weights = 1 / event_data["gammaness_var"].to_numpy()
 
     elif weight_type == "intensity":
-        energy_weights = event_data["intensity"]
-        direction_weights = event_data["intensity"]
-        gammaness_weights = event_data["intensity"]
+        energy_weights = event_data["intensity"].to_numpy()
+        direction_weights = energy_weights
+        gammaness_weights = energy_weights
 
     else:
         raise ValueError(f"Unknown weight type '{weight_type}'.")
 
     # Calculate mean DL2 parameters
-    df_events = pd.DataFrame(
-        data={
-            "energy_weight": energy_weights,
-            "gammaness_weight": gammaness_weights,
-            "weighted_log_energy": np.log10(event_data["reco_energy"]) * energy_weights,
-            "weighted_gammaness": event_data["gammaness"] * gammaness_weights,
-        }
+    log_energy_mean = group_mean(
+        np.log10(event_data["reco_energy"].to_numpy()), event_codes, n_events, energy_weights
     )
 
-    group_sum = df_events.groupby(group_index).sum()
-
-    log_energy_mean = group_sum["weighted_log_energy"] / group_sum["energy_weight"]
-    gammaness_mean = group_sum["weighted_gammaness"] / group_sum["gammaness_weight"]
+    gammaness_mean = group_mean(
+        event_data["gammaness"].to_numpy(), event_codes, n_events, gammaness_weights
+    )
 
-    reco_az_mean, reco_alt_mean = calculate_mean_direction(
-        lon=event_data["reco_az"],
-        lat=event_data["reco_alt"],
-        unit="deg",
+    reco_az_mean, reco_alt_mean = group_mean_direction(
+        lon=np.deg2rad(event_data["reco_az"].to_numpy()),
+        lat=np.deg2rad(event_data["reco_alt"].to_numpy()),
+        event_codes=event_codes,
+        n_events=n_events,
         weights=direction_weights,
     )
 
+    reco_alt_mean = np.rad2deg(reco_alt_mean)
+    reco_az_mean = np.rad2deg(reco_az_mean)
+
     event_data_mean["reco_energy"] = 10**log_energy_mean
     event_data_mean["reco_alt"] = reco_alt_mean
     event_data_mean["reco_az"] = reco_az_mean
     event_data_mean["gammaness"] = gammaness_mean
 
-    # Transform the Alt/Az directions to the RA/Dec coordinate
+    # Transform the Alt/Az directions to the RA/Dec coordinate. Here the
+    # pointing and reconstructed directions are transformed at once, so
+    # that the transformation on the time grid is computed only once.
     if not is_simulation:
-        timestamps_mean = Time(event_data_mean["timestamp"], format="unix", scale="utc")
-
-        pnt_ra_mean, pnt_dec_mean = transform_altaz_to_radec(
-            alt=u.Quantity(pnt_alt_mean, unit="rad"),
-            az=u.Quantity(pnt_az_mean, unit="rad"),
-            obs_time=timestamps_mean,
+        timestamps_mean = Time(
+            np.tile(event_data_mean["timestamp"].to_numpy(), 2), format="unix", scale="utc"
         )
 
-        reco_ra_mean, reco_dec_mean = transform_altaz_to_radec(
-            alt=u.Quantity(reco_alt_mean, unit="deg"),
-            az=u.Quantity(reco_az_mean, unit="deg"),
+        ra_mean, dec_mean = transform_altaz_to_radec(
+            alt=u.Quantity(np.concatenate([pnt_alt_mean, np.deg2rad(reco_alt_mean)]), "rad"),
+            az=u.Quantity(np.concatenate([pnt_az_mean, np.deg2rad(reco_az_mean)]), "rad"),
             obs_time=timestamps_mean,
+            time_resolution=time_resolution_radec,
+            accuracy=accuracy_radec,
         )
 
-        event_data_mean["pointing_ra"] = pnt_ra_mean.to_value("deg")
-        event_data_mean["pointing_dec"] = pnt_dec_mean.to_value("deg")
-        event_data_mean["reco_ra"] = reco_ra_mean.to_value("deg")
-        event_data_mean["reco_dec"] = reco_dec_mean.to_value("deg")
+        ra_mean = ra_mean.to_value("deg")
+        dec_mean = dec_mean.to_value("deg")
+
+        event_data_mean["pointing_ra"] = ra_mean[:n_events]
+        event_data_mean["pointing_dec"] = dec_mean[:n_events]
+        event_data_mean["reco_ra"] = ra_mean[n_events:]
+        event_data_mean["reco_dec"] = dec_mean[n_events:]
 
     return event_data_mean
 
 
-def load_lst_dl1_data_file(input_file):
+def load_lst_dl1_data_file(input_file, compact=False):
     """
     Loads a LST-1 DL1 data file and arranges the contents for the event
     coincidence with MAGIC.
@@ -385,6 +500,9 @@ def load_lst_dl1_data_file(input_file):
     ----------
     input_file: str
         Path to an input LST-1 data file
+    compact: bool
+        If `True`, the columns are cast to the compact dtype profile
+        defined in `magicctapipe.io.dtypes`
 
     Returns
     -------
@@ -448,6 +566,8 @@ def load_lst_dl1_data_file(input_file):
     event_data["phi"] = np.rad2deg(event_data["phi"])
     event_data["psi"] = np.rad2deg(event_data["psi"])
 
+    event_data = apply_dtype_profile(event_data, compact)
+
     # Read the subarray description
     subarray = SubarrayDescription.from_hdf(input_file)
 
@@ -461,7 +581,7 @@ def load_lst_dl1_data_file(input_file):
     return event_data, subarray
 
 
-def load_magic_dl1_data_files(input_dir, config):
+def load_magic_dl1_data_files(input_dir, config, compact=False):
     """
     Loads MAGIC DL1 data files for the event coincidence with LST-1.
 
@@ -471,6 +591,9 @@ def load_magic_dl1_data_files(input_dir, config):
         Path to a directory where input MAGIC DL1 data files are stored
     config: dict 
         yaml file with information about the telescope IDs. Typically called "config_general.yaml"
+    compact: bool
+        If `True`, the columns are cast to the compact dtype profile
+        defined in `magicctapipe.io.dtypes`
 
     Returns
     -------
@@ -507,6 +630,8 @@ def load_magic_dl1_data_files(input_dir, config):
         logger.info(input_file)
 
         df_events = pd.read_hdf(input_file, key="events/parameters")
+        df_events = apply_dtype_profile(df_events, compact)
+
         data_list.append(df_events)
 
     event_data = pd.concat(data_list)
@@ -538,7 +663,12 @@ def load_magic_dl1_data_files(input_dir, config):
 
 
 def load_train_data_files(
-    input_dir, config, offaxis_min=None, offaxis_max=None, true_event_class=None
+    input_dir,
+    config,
+    offaxis_min=None,
+    offaxis_max=None,
+    true_event_class=None,
+    compact=False,
 ):
     """
     Loads DL1-stereo data files and separates the shower events per
@@ -547,7 +677,8 @@ def load_train_data_files(
     Parameters
     ----------
     input_dir: str
-        Path to a directory where input DL1-stereo files are stored
+        Path to a directory where input DL1-stereo files are stored, or
+        to a manifest listing them saved by `create_split_manifests`
     config: dict
         yaml file with information about the telescope IDs. Typically called "config_general.yaml"
     offaxis_min: str
@@ -558,7 +689,9 @@ def load_train_data_files(
         acceptable by `astropy.units.quantity.Quantity`
     true_event_class: int
         True event class of the input events
-    
+    compact: bool
+        If `True`, the columns are cast to the compact dtype profile
+        defined in `magicctapipe.io.dtypes`
 
     Returns
     -------
@@ -575,11 +708,8 @@ def load_train_data_files(
     
     _, TEL_COMBINATIONS = telescope_combinations(config)
 
-    # Find the input files
-    file_mask = f"{input_dir}/dl1_stereo_*.h5"
-
-    input_files = glob.glob(file_mask)
-    input_files.sort()
+    # Find the input files, in the directory or in the manifest
+    input_files, split = find_input_files(input_dir, "dl1_stereo_*.h5")
 
     if len(input_files) == 0:
         raise FileNotFoundError(
@@ -591,28 +721,28 @@ def load_train_data_files(
 
     data_list = []
 
+    # The off-axis cuts are applied when reading the files, which allows
+    # the Parquet backend to skip the row groups out of the range
+    offaxis_filters = _get_offaxis_filters(offaxis_min, offaxis_max)
+
     for input_file in input_files:
         logger.info(input_file)
 
-        df_events = pd.read_hdf(input_file, key="events/parameters")
+        df_events = read_event_data(input_file, filters=offaxis_filters)
+        df_events = df_events[select_split_events(df_events, split)]
+        df_events = apply_dtype_profile(df_events, compact)
+
         data_list.append(df_events)
 
     event_data = pd.concat(data_list)
     event_data.set_index(GROUP_INDEX_TRAIN, inplace=True)
     event_data.sort_index(inplace=True)
 
-    if offaxis_min is not None:
-        offaxis_min = u.Quantity(offaxis_min).to_value("deg")
-        event_data.query(f"off_axis >= {offaxis_min}", inplace=True)
-
-    if offaxis_max is not None:
-        offaxis_max = u.Quantity(offaxis_max).to_value("deg")
-        event_data.query(f"off_axis <= {offaxis_max}", inplace=True)
-
     if true_event_class is not None:
         event_data["true_event_class"] = true_event_class
 
     event_data = get_stereo_events(event_data, config, group_index=GROUP_INDEX_TRAIN)
+    event_data = apply_dtype_profile(event_data, compact)
 
     data_train = {}
 
@@ -626,7 +756,14 @@ def load_train_data_files(
     return data_train
 
 
-def load_train_data_files_tel(input_dir, config, offaxis_min=None, offaxis_max=None, true_event_class=None):
+def load_train_data_files_tel(
+    input_dir,
+    config,
+    offaxis_min=None,
+    offaxis_max=None,
+    true_event_class=None,
+    compact=False,
+):
     """
     Loads DL1-stereo data files and separates the shower events per
     telescope combination type for training RFs.
@@ -634,7 +771,8 @@ def load_train_data_files_tel(input_dir, config, offaxis_min=None, offaxis_max=N
     Parameters
     ----------
     input_dir: str
-        Path to a directory where input DL1-stereo files are stored
+        Path to a directory where input DL1-stereo files are stored, or
+        to a manifest listing them saved by `create_split_manifests`
     config: dict 
         yaml file with information about the telescope IDs. Typically called "config_general.yaml"
     offaxis_min: str
@@ -645,7 +783,9 @@ def load_train_data_files_tel(input_dir, config, offaxis_min=None, offaxis_max=N
         acceptable by `astropy.units.quantity.Quantity`
     true_event_class: int
         True event class of the input events
-    
+    compact: bool
+        If `True`, the columns are cast to the compact dtype profile
+        defined in `magicctapipe.io.dtypes`
 
     Returns
     -------
@@ -662,11 +802,8 @@ def load_train_data_files_tel(input_dir, config, offaxis_min=None, offaxis_max=N
     
     TEL_NAMES, _ = telescope_combinations(config)
     
-    # Find the input files
-    file_mask = f"{input_dir}/dl1_stereo_*.h5"
-
-    input_files = glob.glob(file_mask)
-    input_files.sort()
+    # Find the input files, in the directory or in the manifest
+    input_files, split = find_input_files(input_dir, "dl1_stereo_*.h5")
 
     if len(input_files) == 0:
         raise FileNotFoundError(
@@ -678,28 +815,28 @@ def load_train_data_files_tel(input_dir, config, offaxis_min=None, offaxis_max=N
 
     data_list = []
 
+    # The off-axis cuts are applied when reading the files, which allows
+    # the Parquet backend to skip the row groups out of the range
+    offaxis_filters = _get_offaxis_filters(offaxis_min, offaxis_max)
+
     for input_file in input_files:
         logger.info(input_file)
 
-        df_events = pd.read_hdf(input_file, key="events/parameters")
+        df_events = read_event_data(input_file, filters=offaxis_filters)
+        df_events = df_events[select_split_events(df_events, split)]
+        df_events = apply_dtype_profile(df_events, compact)
+
         data_list.append(df_events)
 
     event_data = pd.concat(data_list)
     event_data.set_index(GROUP_INDEX_TRAIN, inplace=True)
     event_data.sort_index(inplace=True)
 
-    if offaxis_min is not None:
-        offaxis_min = u.Quantity(offaxis_min).to_value("deg")
-        event_data.query(f"off_axis >= {offaxis_min}", inplace=True)
-
-    if offaxis_max is not None:
-        offaxis_max = u.Quantity(offaxis_max).to_value("deg")
-        event_data.query(f"off_axis <= {offaxis_max}", inplace=True)
-
     if true_event_class is not None:
         event_data["true_event_class"] = true_event_class
 
     event_data = get_stereo_events(event_data, config, group_index=GROUP_INDEX_TRAIN)
+    event_data = apply_dtype_profile(event_data, compact)
 
     data_train = {}
 
@@ -713,7 +850,214 @@ def load_train_data_files_tel(input_dir, config, offaxis_min=None, offaxis_max=N
     return data_train
 
 
-def load_mc_dl2_data_file(config, input_file, quality_cuts, event_type, weight_type_dl2):
+def count_train_data_files_tel(input_dir, config, offaxis_min=None, offaxis_max=None):
+    """
+    Counts the stereo shower events per telescope in DL1-stereo data
+    files. Only the columns needed to identify the events are read, so
+    it is much cheaper than loading the files.
+
+    Parameters
+    ----------
+    input_dir: str
+        Path to a directory where input DL1-stereo files are stored, or
+        to a manifest listing them saved by `create_split_manifests`
+    config: dict
+        yaml file with information about the telescope IDs. Typically called "config_general.yaml"
+    offaxis_min: str
+        Minimum shower off-axis angle allowed, whose format should be
+        acceptable by `astropy.units.quantity.Quantity`
+    offaxis_max: str
+        Maximum shower off-axis angle allowed, whose format should be
+        acceptable by `astropy.units.quantity.Quantity`
+
+    Returns
+    -------
+    n_events: dict
+        Number of the stereo shower events per telescope ID
+
+    Raises
+    ------
+    FileNotFoundError
+        If any DL1-stereo data files are not found in the input
+        directory
+    """
+
+    TEL_NAMES, _ = telescope_combinations(config)
+
+    # Find the input files, in the directory or in the manifest
+    input_files, split = find_input_files(input_dir, "dl1_stereo_*.h5")
+
+    if len(input_files) == 0:
+        raise FileNotFoundError(
+            "Could not find any DL1-stereo data files in the input directory."
+        )
+
+    columns = GROUP_INDEX_TRAIN + ["tel_id"]
+    offaxis_filters = _get_offaxis_filters(offaxis_min, offaxis_max)
+
+    max_multiplicity = len(TEL_NAMES.keys())
+    n_events = dict.fromkeys(TEL_NAMES.keys(), 0)
+
+    for input_file in input_files:
+        df_events = read_event_data(input_file, columns=columns, filters=offaxis_filters)
+        df_events = df_events[select_split_events(df_events, split)]
+
+        multiplicity = df_events.groupby(GROUP_INDEX_TRAIN)["tel_id"].transform("size")
+        is_stereo = (multiplicity > 1) & (multiplicity <= max_multiplicity)
+
+        # Every stereo event has exactly one row per telescope
+        tel_counts = df_events.loc[is_stereo, "tel_id"].value_counts()
+
+        for tel_id in n_events.keys():
+            n_events[tel_id] += int(tel_counts.get(tel_id, 0))
+
+    return n_events
+
+
+def sample_train_data_files_tel(
+    input_dir,
+    config,
+    n_events,
+    offaxis_min=None,
+    offaxis_max=None,
+    true_event_class=None,
+    random_state=None,
+    compact=False,
+):
+    """
+    Loads DL1-stereo data files and extracts a given number of shower
+    events per telescope at random for training RFs.
+
+    The input files are streamed one by one, and a reservoir of shower
+    events is kept for every telescope. Each event gets a random
+    priority shared by all its telescope rows, and only the events with
+    the lowest priorities are kept, so that the memory usage is bounded
+    by the requested number of events plus a single input file.
+
+    Parameters
+    ----------
+    input_dir: str
+        Path to a directory where input DL1-stereo files are stored, or
+        to a manifest listing them saved by `create_split_manifests`
+    config: dict
+        yaml file with information about the telescope IDs. Typically called "config_general.yaml"
+    n_events: dict
+        Number of the shower events to be extracted per telescope ID
+    offaxis_min: str
+        Minimum shower off-axis angle allowed, whose format should be
+        acceptable by `astropy.units.quantity.Quantity`
+    offaxis_max: str
+        Maximum shower off-axis angle allowed, whose format should be
+        acceptable by `astropy.units.quantity.Quantity`
+    true_event_class: int
+        True event class of the input events
+    random_state: int
+        Seed of the random number generator
+    compact: bool
+        If `True`, the columns are cast to the compact dtype profile
+        defined in `magicctapipe.io.dtypes`
+
+    Returns
+    -------
+    data_train: dict
+        Data frames of the shower events separated telescope-wise
+
+    Raises
+    ------
+    FileNotFoundError
+        If any DL1-stereo data files are not found in the input
+        directory
+    """
+
+    TEL_NAMES, _ = telescope_combinations(config)
+
+    # Find the input files, in the directory or in the manifest
+    input_files, split = find_input_files(input_dir, "dl1_stereo_*.h5")
+
+    if len(input_files) == 0:
+        raise FileNotFoundError(
+            "Could not find any DL1-stereo data files in the input directory."
+        )
+
+    rng = np.random.default_rng(random_state)
+    max_multiplicity = len(TEL_NAMES.keys())
+
+    reservoirs = {}
+    offaxis_filters = _get_offaxis_filters(offaxis_min, offaxis_max)
+
+    # Load the input files
+    logger.info("\nThe following DL1-stereo data files are found:")
+
+    for input_file in input_files:
+        logger.info(input_file)
+
+        df_events = read_event_data(input_file, filters=offaxis_filters)
+        df_events = df_events[select_split_events(df_events, split)]
+        df_events = apply_dtype_profile(df_events, compact)
+        df_events.set_index(GROUP_INDEX_TRAIN, inplace=True)
+
+        df_events["multiplicity"] = df_events.groupby(GROUP_INDEX_TRAIN).size()
+        df_events.query(
+            f"multiplicity > 1 & multiplicity <= {max_multiplicity}", inplace=True
+        )
+
+        # Assign a random priority per shower event
+        event_codes, event_keys = pd.factorize(df_events.index)
+        df_events["priority"] = rng.random(len(event_keys))[event_codes]
+
+        for tel_id, n_events_tel in n_events.items():
+            if n_events_tel <= 0:
+                continue
+
+            # Keep all the telescope rows of the events seen by the telescope
+            tel_event_codes = event_codes[df_events["tel_id"].to_numpy() == tel_id]
+            is_tel_event = np.isin(event_codes, tel_event_codes)
+
+            df_reservoir = pd.concat([reservoirs.get(tel_id), df_events[is_tel_event]])
+
+            priorities = np.unique(df_reservoir["priority"])
+
+            if len(priorities) > n_events_tel:
+                threshold = priorities[n_events_tel - 1]
+                df_reservoir = df_reservoir[df_reservoir["priority"] <= threshold]
+
+            reservoirs[tel_id] = df_reservoir
+
+    data_train = {}
+
+    for tel_id, df_reservoir in reservoirs.items():
+        df_reservoir = df_reservoir.sort_index()
+
+        if true_event_class is not None:
+            df_reservoir["true_event_class"] = true_event_class
+
+        n_events_tel = len(np.unique(df_reservoir["priority"]))
+        logger.info(f"\n{TEL_NAMES[tel_id]}: {n_events_tel} events are extracted")
+
+        df_reservoir = df_reservoir.drop(columns=["priority", "multiplicity"])
+        df_reservoir = get_stereo_events(
+            df_reservoir, config, group_index=GROUP_INDEX_TRAIN
+        )
+        df_reservoir = apply_dtype_profile(df_reservoir, compact)
+
+        df_events = df_reservoir.query(f"tel_id == {tel_id}")
+
+        if not df_events.empty:
+            data_train[tel_id] = df_events
+
+    return data_train
+
+
+def load_mc_dl2_data_file(
+    config,
+    input_file,
+    quality_cuts,
+    event_type,
+    weight_type_dl2,
+    compact=False,
+    cache_dir=None,
+    cache_max_size=None,
+):
     """
     Loads a MC DL2 data file for creating the IRFs.
 
@@ -734,6 +1078,15 @@ def load_mc_dl2_data_file(config, input_file, quality_cuts, event_type, weight_t
     weight_type_dl2: str
         Type of the weight for averaging telescope-wise DL2 parameters -
         "simple", "variance" or "intensity" are allowed
+    compact: bool
+        If `True`, the columns are cast to the compact dtype profile
+        defined in `magicctapipe.io.dtypes`
+    cache_dir: str
+        Path to a directory where the loaded events are cached (If None,
+        the cache is not used)
+    cache_max_size: int
+        Maximum size of the cache in bytes (If None, no cache entries
+        are evicted)
 
     Returns
     -------
@@ -750,6 +1103,16 @@ def load_mc_dl2_data_file(config, input_file, quality_cuts, event_type, weight_t
         If the input event type is not known
     """
 
+    if cache_dir is not None:
+        cache_key = get_mc_dl2_cache_key(
+            input_file, config, quality_cuts, event_type, weight_type_dl2, compact
+        )
+        cache_entry = load_cached_mc_dl2(cache_dir, cache_key)
+
+        if cache_entry is not None:
+            logger.info(f"Loaded the events from the cache entry {cache_key}")
+            return cache_entry
+
     TEL_NAMES, TEL_COMBINATIONS = telescope_combinations(config)
     combo_types = np.asarray(range(len(TEL_COMBINATIONS)))
     three_or_more = []
@@ -758,10 +1121,18 @@ def load_mc_dl2_data_file(config, input_file, quality_cuts, event_type, weight_t
             three_or_more.append(n)
     
         
-    # Load the input file
-    df_events = pd.read_hdf(input_file, key="events/parameters")
+    # Load the input file. The events of the other combination types are
+    # already skipped when reading the file.
+    df_events = read_event_data(
+        input_file, filters=_get_event_type_filters(event_type, config)
+    )
+    df_events = apply_dtype_profile(df_events, compact)
+
+    if not is_sorted_event_file(input_file):
+        order = np.argsort(get_event_sort_keys(df_events), kind="stable")
+        df_events = df_events.iloc[order]
+
     df_events.set_index(["obs_id", "event_id", "tel_id"], inplace=True)
-    df_events.sort_index(inplace=True)
 
     df_events = get_stereo(df_events, config, quality_cuts)
 
@@ -846,10 +1217,24 @@ def load_mc_dl2_data_file(config, input_file, quality_cuts, event_type, weight_t
         viewcone=viewcone,
     )
 
+    if cache_dir is not None:
+        save_cached_mc_dl2(
+            cache_dir, cache_key, event_table, pointing, sim_info, cache_max_size
+        )
+
     return event_table, pointing, sim_info
 
 
-def load_dl2_data_file(config, input_file, quality_cuts, event_type, weight_type_dl2):
+def load_dl2_data_file(
+    config,
+    input_file,
+    quality_cuts,
+    event_type,
+    weight_type_dl2,
+    time_resolution_radec=TIME_RESOLUTION_RADEC,
+    accuracy_radec=ACCURACY_RADEC,
+    compact=False,
+):
     """
     Loads a DL2 data file for processing to DL3.
 
@@ -870,6 +1255,16 @@ def load_dl2_data_file(config, input_file, quality_cuts, event_type, weight_type
     weight_type_dl2: str
         Type of the weight for averaging telescope-wise DL2 parameters -
         "simple", "variance" or "intensity" are allowed
+    time_resolution_radec: astropy.units.quantity.Quantity
+        Resolution of the time grid on which the Alt/Az to RA/Dec
+        transformation is computed (If None, it is computed for every
+        event)
+    accuracy_radec: astropy.units.quantity.Quantity
+        Accuracy required for the Alt/Az to RA/Dec transformation
+        computed on the time grid (If None, it is not verified)
+    compact: bool
+        If `True`, the columns are cast to the compact dtype profile
+        defined in `magicctapipe.io.dtypes`
 
     Returns
     -------
@@ -894,10 +1289,18 @@ def load_dl2_data_file(config, input_file, quality_cuts, event_type, weight_type
             three_or_more.append(n)
             
             
-    # Load the input file
-    event_data = pd.read_hdf(input_file, key="events/parameters")
+    # Load the input file. The events of the other combination types are
+    # already skipped when reading the file.
+    event_data = read_event_data(
+        input_file, filters=_get_event_type_filters(event_type, config)
+    )
+    event_data = apply_dtype_profile(event_data, compact)
+
+    if not is_sorted_event_file(input_file):
+        order = np.argsort(get_event_sort_keys(event_data), kind="stable")
+        event_data = event_data.iloc[order]
+
     event_data.set_index(["obs_id", "event_id", "tel_id"], inplace=True)
-    event_data.sort_index(inplace=True)
 
     event_data = get_stereo(event_data, config, quality_cuts)
 
@@ -929,7 +1332,12 @@ def load_dl2_data_file(config, input_file, quality_cuts, event_type, weight_type
     logger.info(f"--> {n_events} stereo events")
 
     # Get the mean DL2 parameters
-    df_dl2_mean = get_dl2_mean(event_data, weight_type_dl2)
+    df_dl2_mean = get_dl2_mean(
+        event_data,
+        weight_type_dl2,
+        time_resolution_radec=time_resolution_radec,
+        accuracy_radec=accuracy_radec,
+    )
     df_dl2_mean.reset_index(inplace=True)
 
     # Convert the pandas data frame to astropy QTable
@@ -993,11 +1401,124 @@ def load_dl2_data_file(config, input_file, quality_cuts, event_type, weight_type
     return event_table, on_time, deadc
 
 
+def save_irf_manifest(irf_entries, output_dir):
+    """
+    Saves a manifest listing the IRF data files created in a directory.
+
+    Parameters
+    ----------
+    irf_entries: list
+        Entries of the IRF data files, given as dictionaries with the
+        path to the file `file`, the pointing direction (zd, az) in the
+        unit of degree `pointing` and any other information
+    output_dir: str
+        Path to a directory where the IRF data files are stored
+
+    Returns
+    -------
+    manifest_file: str
+        Path to the output manifest file
+    """
+
+    manifest_file = f"{output_dir}/{IRF_MANIFEST_FILE_NAME}"
+
+    # The file paths are saved relative to the directory, so that the
+    # directory can be moved together with the manifest
+    irf_entries = [
+        {**entry, "file": Path(entry["file"]).name}
+        for entry in sorted(irf_entries, key=lambda entry: list(entry["pointing"]))
+    ]
+
+    with open(manifest_file, "w") as f_out:
+        json.dump({"irf_files": irf_entries}, f_out, indent=4)
+
+    return manifest_file
+
+
+def load_irf_manifest(input_dir_irf):
+    """
+    Loads the manifest of the IRF data files stored in a directory.
+
+    Parameters
+    ----------
+    input_dir_irf: str
+        Path to a directory where input IRF data files are stored
+
+    Returns
+    -------
+    input_files_irf: list
+        Paths to the IRF data files listed in the manifest, or `None`
+        if the directory has no manifest
+
+    Raises
+    ------
+    FileNotFoundError
+        If any IRF data files listed in the manifest are not found
+    """
+
+    manifest_file = Path(input_dir_irf) / IRF_MANIFEST_FILE_NAME
+
+    if not manifest_file.exists():
+        return None
+
+    with open(manifest_file, "r") as f_in:
+        irf_entries = json.load(f_in)["irf_files"]
+
+    input_files_irf = [f"{input_dir_irf}/{entry['file']}" for entry in irf_entries]
+
+    missing_files = [file for file in input_files_irf if not Path(file).exists()]
+
+    if len(missing_files) > 0:
+        raise FileNotFoundError(
+            f"Could not find the IRF data files listed in {manifest_file}:\n"
+            + "\n".join(missing_files)
+        )
+
+    return input_files_irf
+
+
+def find_irf_files(input_dir_irf):
+    """
+    Finds the IRF data files stored in a directory, which are those
+    listed in the manifest saved by `save_irf_manifest` if it exists,
+    otherwise all the files named `irf_*.fits.gz` in the directory.
+
+    Parameters
+    ----------
+    input_dir_irf: str
+        Path to a directory where input IRF data files are stored
+
+    Returns
+    -------
+    input_files_irf: list
+        Paths to the IRF data files
+
+    Raises
+    ------
+    FileNotFoundError
+        If any IRF data files listed in the manifest are not found
+    """
+
+    input_files_irf = load_irf_manifest(input_dir_irf)
+
+    if input_files_irf is None:
+        irf_file_mask = f"{input_dir_irf}/irf_*.fits.gz"
+
+        input_files_irf = glob.glob(irf_file_mask)
+        input_files_irf.sort()
+
+    return input_files_irf
+
+
 def load_irf_files(input_dir_irf):
     """
     Loads input IRF data files for the IRF interpolation and checks the
     consistency of their configurations.
 
+    If the input directory has a manifest saved by `save_irf_manifest`,
+    the IRF data files listed in it are loaded, otherwise all the files
+    named `irf_*.fits.gz` in the directory.
+
     Parameters
     ----------
     input_dir_irf: str
@@ -1051,11 +1572,8 @@ def load_irf_files(input_dir_irf):
         "bkg_fov_offset_bins": [],
     }
 
-    # Find the input files
-    irf_file_mask = f"{input_dir_irf}/irf_*.fits.gz"
-
-    input_files_irf = glob.glob(irf_file_mask)
-    input_files_irf.sort()
+    # Find the input files, using the manifest if it exists
+    input_files_irf = find_irf_files(input_dir_irf)
 
     n_input_files = len(input_files_irf)
 
@@ -1196,11 +1714,23 @@ def load_irf_files(input_dir_irf):
 
 
 def save_pandas_data_in_table(
-    input_data, output_file, group_name, table_name, mode="w"
+    input_data,
+    output_file,
+    group_name,
+    table_name,
+    mode="w",
+    chunk_size=CHUNK_SIZE_TABLE,
+    filters=None,
+    chunkshape=None,
+    sort_events=False,
 ):
     """
     Saves a pandas data frame in a table.
 
+    The structured array of the table is filled column by column and
+    appended in chunks of rows, so that the rows are never converted to
+    Python objects and the memory usage is limited by the chunk size.
+
     Parameters
     ----------
     input_data: pandas.core.frame.DataFrame
@@ -1215,12 +1745,314 @@ def save_pandas_data_in_table(
         Mode of saving the data if a file already exists at the path -
         "w" for overwriting the file with the new table, and
         "a" for appending the table to the file
+    chunk_size: int
+        Number of rows appended to the table at once
+    filters: tables.filters.Filters
+        Compression filters of the table, e.g.,
+        `tables.Filters(complevel=5, complib="blosc:zstd", shuffle=True)`
+        (If None, the table is not compressed)
+    chunkshape: tuple
+        Shape of the HDF5 chunks of the table
+        (If None, it is computed automatically by PyTables)
+    sort_events: bool
+        If `True`, the rows are saved sorted by the event key, i.e.,
+        `obs_id`, `event_id` and `tel_id`, and the table gets the
+        column indexes and sort flag created by `index_event_table`
     """
 
-    values = [tuple(array) for array in input_data.to_numpy()]
     dtypes = np.dtype(list(zip(input_data.dtypes.index, input_data.dtypes.values)))
 
-    data_array = np.array(values, dtype=dtypes)
+    columns = [input_data[column].to_numpy() for column in input_data.columns]
+    n_rows = len(input_data)
+
+    sort_keys = [key for key in EVENT_KEY if key in input_data.columns]
+    order = None
+
+    if sort_events and (len(sort_keys) > 0):
+        # Here `numpy.lexsort` takes the primary key at the last
+        order = np.lexsort([input_data[key].to_numpy() for key in sort_keys[::-1]])
 
     with tables.open_file(output_file, mode=mode) as f_out:
-        f_out.create_table(group_name, table_name, createparents=True, obj=data_array)
+        table = f_out.create_table(
+            group_name,
+            table_name,
+            description=dtypes,
+            createparents=True,
+            filters=filters,
+            expectedrows=max(n_rows, 1),
+            chunkshape=chunkshape,
+        )
+
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+
+            data_chunk = np.empty(stop - start, dtype=dtypes)
+            rows = slice(start, stop) if order is None else order[start:stop]
+
+            for name, values in zip(dtypes.names, columns):
+                data_chunk[name] = values[rows]
+
+            table.append(data_chunk)
+
+        table.flush()
+
+        if sort_events:
+            index_event_table(table)
+
+
+def index_event_table(table):
+    """
+    Creates the completely sorted indexes (CSI) of the observation and
+    event IDs of an event table, and if the rows are sorted by the event
+    key sets the attribute `sorted_by` to the sorted columns.
+
+    Parameters
+    ----------
+    table: tables.table.Table
+        Event table opened in a writable mode
+
+    Returns
+    -------
+    is_sorted: bool
+        Whether the rows are sorted by the event key
+    """
+
+    sort_keys = [key for key in EVENT_KEY if key in table.colnames]
+
+    for key in sort_keys[:2]:
+        if not table.cols._f_col(key).is_indexed:
+            table.cols._f_col(key).create_csindex()
+
+    key_columns = [table.col(key) for key in sort_keys]
+    is_sorted = (len(key_columns) > 0) and is_lexsorted(key_columns)
+
+    if is_sorted:
+        table.attrs["sorted_by"] = ",".join(sort_keys)
+
+    elif "sorted_by" in table.attrs:
+        del table.attrs["sorted_by"]
+
+    return is_sorted
+
+
+def is_lexsorted(columns):
+    """
+    Checks whether rows are sorted lexicographically by given columns.
+
+    Parameters
+    ----------
+    columns: list
+        Arrays of the columns, starting from the primary key
+
+    Returns
+    -------
+    is_sorted: bool
+        Whether the rows are sorted by the columns
+    """
+
+    if len(columns[0]) < 2:
+        return True
+
+    # Rows whose preceding columns are all equal to the previous row
+    # have to be in ascending order in the next column
+    is_tied = np.ones(len(columns[0]) - 1, dtype=bool)
+
+    for values in columns:
+        values = np.asarray(values)
+
+        if np.any(is_tied & (values[1:] < values[:-1])):
+            return False
+
+        is_tied &= values[1:] == values[:-1]
+
+    return True
+
+
+def is_sorted_event_file(input_file):
+    """
+    Checks whether the events of a data file are read sorted by the
+    event key, so that the loaders can skip sorting them again.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an input HDF file
+
+    Returns
+    -------
+    is_sorted: bool
+        Whether the events are sorted by `obs_id`, `event_id` and
+        `tel_id`
+    """
+
+    # The events of the Parquet datasets are read per partition
+    if Path(get_parquet_path(input_file)).exists():
+        return False
+
+    with tables.open_file(input_file, mode="r") as f_in:
+        attrs = f_in.root.events.parameters.attrs
+        is_sorted = ("sorted_by" in attrs) and (attrs["sorted_by"] == ",".join(EVENT_KEY))
+
+    return is_sorted
+
+
+def read_events(input_file, obs_id, event_ids):
+    """
+    Reads given shower events from a data file by using the column
+    indexes of the event table, without reading the whole table.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an input HDF file
+    obs_id: int
+        Observation ID of the events
+    event_ids: int or list
+        Event IDs of the events
+
+    Returns
+    -------
+    event_data: pandas.core.frame.DataFrame
+        Data frame of the telescope events of the shower events
+    """
+
+    event_ids = np.atleast_1d(event_ids)
+
+    if Path(get_parquet_path(input_file)).exists():
+        filters = [("obs_id", "==", obs_id), ("event_id", "in", event_ids.tolist())]
+        return read_event_data(input_file, filters=filters)
+
+    with tables.open_file(input_file, mode="r") as f_in:
+        table = f_in.root.events.parameters
+
+        # The range of the event IDs is not defined if no events are
+        # requested, so an empty frame with the columns is returned
+        if len(event_ids) == 0:
+            return pd.DataFrame(table.read(0, 0))
+
+        # The condition on the range of the event IDs is resolved with
+        # the indexes, and then the exact event IDs are selected
+        condition = (
+            f"(obs_id == {int(obs_id)}) & (event_id >= {int(event_ids.min())}) "
+            f"& (event_id <= {int(event_ids.max())})"
+        )
+
+        data_array = table.read_where(condition)
+
+    data_array = data_array[np.isin(data_array["event_id"], event_ids)]
+    event_data = pd.DataFrame(data_array)
+
+    return event_data
+
+
+def save_event_data(
+    event_data, output_file, backend="hdf5", sort_events=False, compact=False
+):
+    """
+    Saves the events in a data file with a given storage backend.
+
+    With the "hdf5" backend the events are saved in the table
+    `events/parameters` of the output file, which is overwritten. With
+    the "parquet" backend they are saved in a Parquet dataset next to
+    the output file, partitioned by the observation IDs and telescope
+    combination types, and the output file is removed so that the other
+    data, e.g., the subarray description, can be saved in it afterwards.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame
+        Data frame of the events
+    output_file: str
+        Path to an output HDF file
+    backend: str
+        Storage backend of the events - "hdf5" or "parquet"
+    sort_events: bool
+        If `True`, the events are saved sorted by the event key with
+        the column indexes (applicable only to the "hdf5" backend)
+    compact: bool
+        If `True`, the columns are saved with the compact dtype profile
+        defined in `magicctapipe.io.dtypes`, otherwise with the
+        standard one
+
+    Raises
+    ------
+    ValueError
+        If the input storage backend is not known
+    """
+
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}'.")
+
+    event_data = apply_dtype_profile(event_data, compact)
+
+    parquet_path = Path(get_parquet_path(output_file))
+
+    if backend == "hdf5":
+        # Remove the events saved previously with the Parquet backend,
+        # which would otherwise be read instead of the new ones
+        if parquet_path.exists():
+            shutil.rmtree(parquet_path)
+
+        save_pandas_data_in_table(
+            event_data,
+            output_file,
+            group_name="/events",
+            table_name="parameters",
+            sort_events=sort_events,
+        )
+
+    else:
+        # Remove the events saved previously with the HDF backend
+        try:
+            Path(output_file).unlink()
+        except FileNotFoundError:
+            pass
+
+        save_parquet_data(event_data, parquet_path)
+
+
+def _get_offaxis_filters(offaxis_min, offaxis_max):
+    """
+    Gets the filters of the off-axis angles applied when reading events.
+    """
+
+    filters = []
+
+    if offaxis_min is not None:
+        filters.append(("off_axis", ">=", u.Quantity(offaxis_min).to_value("deg")))
+
+    if offaxis_max is not None:
+        filters.append(("off_axis", "<=", u.Quantity(offaxis_max).to_value("deg")))
+
+    return filters if len(filters) > 0 else None
+
+
+def _get_event_type_filters(event_type, config):
+    """
+    Gets the filters of the combination types applied when reading
+    events of a given event type.
+    """
+
+    _, TEL_COMBINATIONS = telescope_combinations(config)
+
+    combo_type_magic = len(TEL_COMBINATIONS) - 1
+
+    three_or_more = [
+        combo_type
+        for combo_type, tel_ids in enumerate(TEL_COMBINATIONS.values())
+        if len(tel_ids) >= 3
+    ]
+
+    if event_type in ["software", "software_6_tel"]:
+        filters = [("combo_type", "<", combo_type_magic)]
+
+    elif event_type == "software_3tels_or_more":
+        filters = [("combo_type", "in", three_or_more)]
+
+    elif event_type == "magic_only":
+        filters = [("combo_type", "==", combo_type_magic)]
+
+    else:
+        filters = None
+
+    return filters
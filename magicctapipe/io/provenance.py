@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Provenance of the data files, with which the files already up to date
+are not processed again.
+
+Every output data file records the hash of its inputs, the hash of the
+configuration sections used to create it and the version of the
+package, as a root attribute of the HDF files or as keywords of the
+primary header of the FITS files. An input which has its own provenance
+is identified by its recorded hash, otherwise by its size and
+modification time, so a change of the configuration of a stage changes
+the hashes of all the downstream files and only those are reprocessed.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import tables
+from astropy.io import fits
+from magicctapipe.version import __version__
+
+__all__ = [
+    "get_input_identity",
+    "get_provenance",
+    "read_provenance",
+    "set_provenance_keywords",
+    "write_provenance",
+    "is_up_to_date",
+]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# The name of the root attribute of the HDF files
+PROVENANCE_ATTRIBUTE = "magicctapipe_provenance"
+
+# The keywords of the primary header of the FITS files
+PROVENANCE_KEYWORDS = {
+    "hash": "PROVHASH",
+    "input_hash": "INPHASH",
+    "config_hash": "CFGHASH",
+    "version": "MCPVERS",
+}
+
+
+def _get_hash(items):
+    """
+    Gets the SHA-256 hash of JSON-serializable items.
+    """
+
+    items_json = json.dumps(items, sort_keys=True, default=str)
+
+    return hashlib.sha256(items_json.encode()).hexdigest()
+
+
+def _get_path_identity(input_path):
+    """
+    Gets the identity of a file, or of the files in a directory, by the
+    recorded provenance hashes or by the sizes and modification times.
+    """
+
+    input_path = Path(input_path)
+
+    if input_path.is_dir():
+        input_files = sorted(path for path in input_path.rglob("*") if path.is_file())
+    else:
+        input_files = [input_path]
+
+    identity = []
+
+    for input_file in input_files:
+        provenance = read_provenance(input_file)
+
+        if provenance is not None:
+            file_identity = provenance["hash"]
+        else:
+            stat = input_file.stat()
+            file_identity = [stat.st_size, stat.st_mtime_ns]
+
+        identity.append([str(input_file.relative_to(input_path.parent)), file_identity])
+
+    return identity
+
+
+def get_input_identity(input_paths):
+    """
+    Gets the identity of input files, which can be computed once and
+    given to `get_provenance` for many output files sharing the inputs.
+
+    Parameters
+    ----------
+    input_paths: list
+        Paths to the input files or directories
+
+    Returns
+    -------
+    input_identity: list
+        Recorded provenance hashes, or sizes and modification times, of
+        the input files
+    """
+
+    input_identity = [_get_path_identity(path) for path in input_paths]
+
+    return input_identity
+
+
+def get_provenance(input_paths, config, input_identity=None):
+    """
+    Gets the provenance of an output data file.
+
+    Parameters
+    ----------
+    input_paths: list
+        Paths to the input files or directories of the file
+    config: dict
+        Configuration sections used to create the file
+    input_identity: list
+        Identity of further inputs of the file returned by
+        `get_input_identity`, which follow the input paths
+
+    Returns
+    -------
+    provenance: dict
+        Hash of the provenance, hash of the inputs, hash of the
+        configuration and version of the package
+    """
+
+    input_identity = get_input_identity(input_paths) + list(input_identity or [])
+    input_hash = _get_hash(input_identity)
+    config_hash = _get_hash(config)
+
+    provenance = {
+        "hash": _get_hash([input_hash, config_hash, __version__]),
+        "input_hash": input_hash,
+        "config_hash": config_hash,
+        "version": __version__,
+    }
+
+    return provenance
+
+
+def read_provenance(input_file):
+    """
+    Reads the provenance recorded in a HDF or FITS data file.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to a data file
+
+    Returns
+    -------
+    provenance: dict
+        Provenance recorded in the file, or `None` if the file does not
+        exist or has no provenance
+    """
+
+    input_file = Path(input_file)
+
+    if not input_file.is_file():
+        return None
+
+    try:
+        if input_file.suffix in [".h5", ".hdf5"]:
+            with tables.open_file(input_file, mode="r") as f_in:
+                provenance = getattr(f_in.root._v_attrs, PROVENANCE_ATTRIBUTE, None)
+
+            return None if provenance is None else json.loads(provenance)
+
+        if ".fits" in input_file.suffixes:
+            header = fits.getheader(input_file, ext=0)
+
+            if PROVENANCE_KEYWORDS["hash"] not in header:
+                return None
+
+            return {key: header[keyword] for key, keyword in PROVENANCE_KEYWORDS.items()}
+
+    except (OSError, tables.HDF5ExtError):
+        logger.warning(f"WARNING: Could not read the provenance of {input_file}.")
+
+    return None
+
+
+def set_provenance_keywords(header, provenance):
+    """
+    Sets the provenance keywords in the primary header of a FITS file,
+    e.g., before the file is written.
+
+    Parameters
+    ----------
+    header: astropy.io.fits.header.Header
+        Primary header of a FITS file
+    provenance: dict
+        Provenance returned by `get_provenance`
+    """
+
+    for key, keyword in PROVENANCE_KEYWORDS.items():
+        header[keyword] = provenance[key]
+
+
+def write_provenance(output_file, provenance):
+    """
+    Records the provenance in a HDF or FITS data file.
+
+    Parameters
+    ----------
+    output_file: str
+        Path to a data file
+    provenance: dict
+        Provenance returned by `get_provenance`
+
+    Raises
+    ------
+    ValueError
+        If the file is neither a HDF nor a FITS file
+    """
+
+    output_file = Path(output_file)
+
+    if output_file.suffix in [".h5", ".hdf5"]:
+        with tables.open_file(output_file, mode="a") as f_out:
+            f_out.root._v_attrs[PROVENANCE_ATTRIBUTE] = json.dumps(provenance)
+
+    elif ".fits" in output_file.suffixes:
+        with fits.open(output_file, mode="update") as hdus:
+            set_provenance_keywords(hdus[0].header, provenance)
+
+    else:
+        raise ValueError(f"Unknown format of the data file '{output_file}'.")
+
+
+def is_up_to_date(output_file, provenance):
+    """
+    Checks whether a data file was created from the same inputs and
+    configuration with the same version of the package.
+
+    Parameters
+    ----------
+    output_file: str
+        Path to a data file
+    provenance: dict
+        Provenance returned by `get_provenance`
+
+    Returns
+    -------
+    up_to_date: bool
+        `True` if the file exists and has the same provenance hash
+    """
+
+    recorded_provenance = read_provenance(output_file)
+
+    if recorded_provenance is None:
+        return False
+
+    return recorded_provenance["hash"] == provenance["hash"]
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Offline resolver of the source coordinates used in the DL3 data files.
+
+The source names are looked up in the catalog shipped with the package,
+in an optional user catalog and in a persistent cache of the names
+resolved before, all of which are YAML files of the following format:
+
+Crab:
+    ra: 83.63308  # deg, ICRS
+    dec: 22.01450  # deg, ICRS
+    aliases: ["Crab Nebula"]  # optional
+
+Only if the name is not found and the online resolution is enabled, it
+is resolved with `astropy.coordinates.SkyCoord.from_name`, and the
+result is added to the cache. The catalogs are loaded only once per
+process, so resolving a source does not need any network access or file
+reading for every DL3 data file.
+"""
+
+import logging
+import os
+import re
+from pathlib import Path
+
+import yaml
+from astropy.coordinates import SkyCoord
+
+__all__ = ["load_source_catalog", "resolve_source_coordinate"]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# The catalog of the sources shipped with the package
+DEFAULT_SOURCE_CATALOG = Path(__file__).parent.parent / "data" / "source_catalog.yaml"
+
+# The catalogs already loaded, with the keys of the paths and the
+# modification times of the files
+_LOADED_CATALOGS = {}
+
+
+def _normalize_source_name(source_name):
+    """
+    Normalizes a source name to be compared case-insensitively and
+    ignoring spaces, "_" and "-".
+    """
+
+    return re.sub(r"[\s_\-]", "", str(source_name)).lower()
+
+
+def load_source_catalog(catalog_file=None):
+    """
+    Loads a catalog of the source coordinates.
+
+    Parameters
+    ----------
+    catalog_file: str
+        Path to a YAML catalog file (If None, the catalog shipped with
+        the package is loaded)
+
+    Returns
+    -------
+    catalog: dict
+        RA/Dec coordinates in the unit of degree with the keys of the
+        normalized source names and aliases, which is empty if the
+        catalog file does not exist
+    """
+
+    catalog_file = Path(DEFAULT_SOURCE_CATALOG if catalog_file is None else catalog_file)
+
+    if not catalog_file.exists():
+        return {}
+
+    catalog_key = (str(catalog_file.resolve()), catalog_file.stat().st_mtime_ns)
+
+    if catalog_key in _LOADED_CATALOGS:
+        return _LOADED_CATALOGS[catalog_key]
+
+    with open(catalog_file, "r") as f_in:
+        sources = yaml.safe_load(f_in) or {}
+
+    catalog = {}
+
+    for source_name, source in sources.items():
+        coordinate = (float(source["ra"]), float(source["dec"]))
+
+        for name in [source_name] + source.get("aliases", []):
+            catalog[_normalize_source_name(name)] = coordinate
+
+    _LOADED_CATALOGS[catalog_key] = catalog
+
+    return catalog
+
+
+def _add_to_source_cache(cache_file, source_name, source_coord):
+    """
+    Adds a source coordinate resolved online to a cache file.
+    """
+
+    cache_file = Path(cache_file)
+    cache_file.parent.mkdir(exist_ok=True, parents=True)
+
+    sources = {}
+
+    if cache_file.exists():
+        with open(cache_file, "r") as f_in:
+            sources = yaml.safe_load(f_in) or {}
+
+    sources[source_name] = {
+        "ra": float(source_coord.ra.to_value("deg")),
+        "dec": float(source_coord.dec.to_value("deg")),
+    }
+
+    # Write the file under a temporary name and rename it, so that the
+    # cache is never read while it is being written
+    cache_file_tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+
+    with open(cache_file_tmp, "w") as f_out:
+        yaml.safe_dump(sources, f_out, sort_keys=True)
+
+    os.replace(cache_file_tmp, cache_file)
+
+
+def resolve_source_coordinate(
+    source_name, catalog_file=None, cache_file=None, resolve_online=False
+):
+    """
+    Resolves the coordinate of a source from its name.
+
+    The name is looked up in the catalog shipped with the package, in
+    the input catalog and in the cache, in this order. If it is not
+    found and the online resolution is enabled, it is resolved with
+    `SkyCoord.from_name`, and the result is added to the cache.
+
+    Parameters
+    ----------
+    source_name: str
+        Name of the source
+    catalog_file: str
+        Path to a YAML catalog file used in addition to that of the
+        package
+    cache_file: str
+        Path to a YAML file where the coordinates resolved online are
+        cached
+    resolve_online: bool
+        If `True`, the names not found in the catalogs are resolved
+        online
+
+    Returns
+    -------
+    source_coord: astropy.coordinates.sky_coordinate.SkyCoord
+        Coordinate of the source, or `None` if the name is not resolved
+    """
+
+    normalized_name = _normalize_source_name(source_name)
+
+    catalog_paths = [DEFAULT_SOURCE_CATALOG]
+    catalog_paths += [path for path in [catalog_file, cache_file] if path is not None]
+
+    for catalog_path in catalog_paths:
+        catalog = load_source_catalog(catalog_path)
+
+        if normalized_name in catalog:
+            ra, dec = catalog[normalized_name]
+            return SkyCoord(ra=ra, dec=dec, unit="deg", frame="icrs")
+
+    if not resolve_online:
+        return None
+
+    try:
+        source_coord = SkyCoord.from_name(source_name, frame="icrs")
+
+    except Exception:
+        logger.warning(f"WARNING: The source name '{source_name}' could not be resolved online.")
+        return None
+
+    if cache_file is not None:
+        _add_to_source_cache(cache_file, source_name, source_coord)
+
+    return source_coord
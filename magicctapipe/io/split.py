@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Deterministic train/test splits of data files, saved as manifests.
+
+Instead of moving the data files into separate directories, the split
+is saved in manifest files listing the input files of each subset,
+which the loaders accept in place of the input directories. Nothing is
+moved or deleted, and the same seed and fraction always give the same
+split. The data can be split in two ways:
+
+- "file": the files are ranked by a hash of their names with the seed,
+  and the first ones up to the train fraction are used for training.
+- "event": every manifest lists all the files, and the events are
+  selected by a hash of (obs_id, event_id) with the seed when they are
+  loaded, so that all the telescope events of a shower are kept in the
+  same subset.
+
+The manifests are JSON files of the following format, where the paths
+are relative to the manifest so that they can be moved together:
+
+{
+    "files": ["../node1/dl1_gamma_run1.h5", ...],
+    "split": {"subset": "train", "split_by": "file", "train_fraction": 0.8, "seed": 0}
+}
+"""
+
+import glob
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+__all__ = [
+    "get_split_values",
+    "save_file_manifest",
+    "load_file_manifest",
+    "create_split_manifests",
+    "find_input_files",
+    "select_split_events",
+]
+
+# The subsets of the splits
+SPLIT_SUBSETS = ["train", "test"]
+
+# The ways to split the data
+SPLIT_TYPES = ["file", "event"]
+
+
+def get_split_values(keys, seed=0):
+    """
+    Gets uniformly distributed values in [0, 1) from integer keys, with
+    which the keys are assigned to the subsets of a split.
+
+    The values are computed with the SplitMix64 mixing function, so
+    they are deterministic and independent of the order of the keys.
+
+    Parameters
+    ----------
+    keys: numpy.ndarray
+        Keys, as unsigned 64-bit integers
+    seed: int
+        Seed of the split
+
+    Returns
+    -------
+    values: numpy.ndarray
+        Values in [0, 1) of the keys
+    """
+
+    keys = np.atleast_1d(np.asarray(keys, dtype=np.uint64))
+
+    # The arithmetic is done modulo 2^64 on purpose
+    with np.errstate(over="ignore"):
+        z = _mix_keys(keys + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15))
+
+    # Use the 53 most significant bits, i.e., the mantissa of a double
+    values = (z >> np.uint64(11)).astype(np.float64) / 2**53
+
+    return values
+
+
+def _mix_keys(keys):
+    """
+    Mixes the bits of unsigned 64-bit integer keys with the finalizer of
+    SplitMix64.
+    """
+
+    with np.errstate(over="ignore"):
+        z = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+
+    return z
+
+
+def _get_file_key(input_file):
+    """
+    Gets the key of a file from its name, which does not depend on the
+    directory where the file is stored.
+    """
+
+    file_hash = hashlib.sha256(Path(input_file).name.encode()).digest()
+
+    return int.from_bytes(file_hash[:8], "little")
+
+
+def save_file_manifest(manifest_file, input_files, split=None):
+    """
+    Saves a manifest listing data files.
+
+    Parameters
+    ----------
+    manifest_file: str
+        Path to an output manifest file
+    input_files: list
+        Paths to the data files
+    split: dict
+        Subset, split type, train fraction and seed of the split which
+        the files belong to (If None, the files are not split)
+
+    Returns
+    -------
+    manifest_file: str
+        Path to the output manifest file
+    """
+
+    manifest_dir = Path(manifest_file).parent
+    manifest_dir.mkdir(exist_ok=True, parents=True)
+
+    # The file paths are saved relative to the manifest, so that they
+    # can be moved together
+    manifest = {
+        "files": [os.path.relpath(input_file, manifest_dir) for input_file in input_files],
+        "split": split,
+    }
+
+    with open(manifest_file, "w") as f_out:
+        json.dump(manifest, f_out, indent=4)
+
+    return str(manifest_file)
+
+
+def load_file_manifest(manifest_file):
+    """
+    Loads a manifest listing data files.
+
+    Parameters
+    ----------
+    manifest_file: str
+        Path to an input manifest file
+
+    Returns
+    -------
+    input_files: list
+        Paths to the data files listed in the manifest
+    split: dict
+        Split which the files belong to, or `None` if they are not split
+
+    Raises
+    ------
+    FileNotFoundError
+        If any data files listed in the manifest are not found
+    ValueError
+        If the split of the manifest is not valid
+    """
+
+    with open(manifest_file, "r") as f_in:
+        manifest = json.load(f_in)
+
+    manifest_dir = Path(manifest_file).parent
+
+    input_files = [
+        os.path.normpath(manifest_dir / input_file) for input_file in manifest["files"]
+    ]
+
+    missing_files = [file for file in input_files if not Path(file).exists()]
+
+    if len(missing_files) > 0:
+        raise FileNotFoundError(
+            f"Could not find the data files listed in {manifest_file}:\n"
+            + "\n".join(missing_files)
+        )
+
+    split = manifest.get("split")
+
+    if split is not None:
+        if split["subset"] not in SPLIT_SUBSETS:
+            raise ValueError(f"Unknown subset '{split['subset']}' in {manifest_file}.")
+
+        if split["split_by"] not in SPLIT_TYPES:
+            raise ValueError(f"Unknown split type '{split['split_by']}' in {manifest_file}.")
+
+    return input_files, split
+
+
+def create_split_manifests(
+    input_files, manifest_files, train_fraction, seed=0, split_by="file"
+):
+    """
+    Splits data files into the train and test subsets and saves their
+    manifests.
+
+    Parameters
+    ----------
+    input_files: list
+        Paths to the data files
+    manifest_files: dict
+        Paths to the output manifest files with the keys of the subsets
+        "train" and "test"
+    train_fraction: float
+        Fraction of the files, or of the events, used for training
+    seed: int
+        Seed of the split
+    split_by: str
+        Way to split the data - "file" or "event"
+
+    Returns
+    -------
+    split_files: dict
+        Paths to the data files of the subsets, which are all the files
+        for both subsets when the events are split
+
+    Raises
+    ------
+    ValueError
+        If the split type or the train fraction is not valid
+    """
+
+    if split_by not in SPLIT_TYPES:
+        raise ValueError(f"Unknown split type '{split_by}'.")
+
+    if not 0 <= train_fraction <= 1:
+        raise ValueError(f"The train fraction must be in [0, 1], not {train_fraction}.")
+
+    input_files = sorted(input_files)
+
+    if split_by == "file":
+        file_keys = [_get_file_key(input_file) for input_file in input_files]
+        order = np.argsort(get_split_values(file_keys, seed), kind="stable")
+
+        n_files_train = int(len(input_files) * train_fraction)
+
+        split_files = {
+            "train": sorted(input_files[i_file] for i_file in order[:n_files_train]),
+            "test": sorted(input_files[i_file] for i_file in order[n_files_train:]),
+        }
+
+    else:
+        split_files = {"train": input_files, "test": input_files}
+
+    for subset, manifest_file in manifest_files.items():
+        split = {
+            "subset": subset,
+            "split_by": split_by,
+            "train_fraction": train_fraction,
+            "seed": seed,
+        }
+
+        save_file_manifest(manifest_file, split_files[subset], split)
+
+    return split_files
+
+
+def find_input_files(input_path, file_mask="*.h5"):
+    """
+    Finds the input data files in a directory or in a manifest.
+
+    Parameters
+    ----------
+    input_path: str
+        Path to a directory where the data files are stored, or to a
+        manifest listing them
+    file_mask: str
+        Mask of the names of the data files in the directory
+
+    Returns
+    -------
+    input_files: list
+        Paths to the data files
+    split: dict
+        Split which the files belong to, or `None` if the input is a
+        directory or the files are not split
+    """
+
+    if Path(input_path).is_file():
+        return load_file_manifest(input_path)
+
+    input_files = glob.glob(f"{input_path}/{file_mask}")
+    input_files.sort()
+
+    return input_files, None
+
+
+def select_split_events(event_data, split):
+    """
+    Selects the events of a subset of a split.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame or numpy.ndarray
+        Data frame or structured array of the events, with the
+        observation and event IDs in the columns or in the index
+    split: dict
+        Split returned by `load_file_manifest` or `find_input_files`
+
+    Returns
+    -------
+    mask: numpy.ndarray
+        Mask of the events in the subset, which is all `True` if the
+        events are not split
+    """
+
+    if split is None or split["split_by"] != "event":
+        return np.ones(len(event_data), dtype=bool)
+
+    if len(event_data) == 0:
+        return np.zeros(0, dtype=bool)
+
+    if isinstance(event_data, pd.DataFrame) and "obs_id" not in event_data.columns:
+        obs_ids = event_data.index.get_level_values("obs_id").to_numpy()
+        event_ids = event_data.index.get_level_values("event_id").to_numpy()
+    else:
+        obs_ids = np.asarray(event_data["obs_id"])
+        event_ids = np.asarray(event_data["event_id"])
+
+    # Combine the hashed observation IDs with the event IDs, so that the
+    # IDs of any range are supported, unlike with the packed event keys
+    obs_ids = obs_ids.astype(np.int64).astype(np.uint64)
+    event_ids = event_ids.astype(np.int64).astype(np.uint64)
+
+    with np.errstate(over="ignore"):
+        event_keys = _mix_keys(obs_ids) + event_ids
+
+    is_train = get_split_values(event_keys, split["seed"]) < split["train_fraction"]
+
+    return is_train if split["subset"] == "train" else ~is_train
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Storage backends of the event tables of the DL1-coincidence, DL1-stereo
+and DL2 data files.
+
+By default the events are saved in the `events/parameters` table of the
+output HDF file. With the Parquet backend they are instead saved as a
+Parquet dataset next to the HDF file, partitioned by the observation IDs
+and telescope combination types, and the HDF file keeps only the other
+data such as the subarray description and simulation configuration.
+The readers detect the backend from the files on disk, so the loaders
+and the merging of the files work with both of them.
+
+The Parquet backend requires the optional dependency `pyarrow`.
+"""
+
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import tables
+
+__all__ = [
+    "get_parquet_path",
+    "save_parquet_data",
+    "read_event_data",
+    "merge_parquet_data",
+]
+
+# The columns used to partition the Parquet datasets
+PARTITION_COLUMNS = ["obs_id", "combo_type"]
+
+# The maximum number of rows in a row group of the Parquet datasets,
+# within which the column statistics are used to skip the row groups
+ROW_GROUP_SIZE = 100000
+
+# The name of the file storing the schema of the Parquet datasets
+SCHEMA_FILE_NAME = "_common_metadata"
+
+
+def get_parquet_path(input_file):
+    """
+    Gets the path to the Parquet dataset of an event data file.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an event data file
+
+    Returns
+    -------
+    parquet_path: str
+        Path to the Parquet dataset of the events
+    """
+
+    parquet_path = str(Path(input_file).with_suffix(".parquet"))
+
+    return parquet_path
+
+
+def save_parquet_data(event_data, output_path, partition_columns=None):
+    """
+    Saves the events in a partitioned Parquet dataset.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame
+        Data frame of the events
+    output_path: str
+        Path to an output Parquet dataset, which is overwritten
+    partition_columns: list
+        Columns used to partition the dataset
+        (If None, the observation IDs and combination types are used)
+    """
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    output_path = Path(output_path)
+
+    if output_path.exists():
+        shutil.rmtree(output_path)
+
+    if partition_columns is None:
+        partition_columns = PARTITION_COLUMNS
+
+    partition_columns = [col for col in partition_columns if col in event_data.columns]
+
+    table = pa.Table.from_pandas(event_data, preserve_index=False)
+    table = table.replace_schema_metadata(None)
+
+    partition_schema = pa.schema([table.schema.field(col) for col in partition_columns])
+
+    ds.write_dataset(
+        table,
+        output_path,
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+        max_rows_per_group=ROW_GROUP_SIZE,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    # Save the full schema with the partition columns, so that they are
+    # read back with the same types and order as the other columns
+    schema = table.schema.with_metadata(
+        {"partition_columns": json.dumps(partition_columns)}
+    )
+
+    pq.write_metadata(schema, output_path / SCHEMA_FILE_NAME)
+
+
+def read_event_data(input_file, columns=None, filters=None):
+    """
+    Reads the events from a data file saved with any storage backend.
+
+    Only the given columns are read, and with the Parquet backend the
+    files and row groups that cannot satisfy the filters are skipped by
+    using the partitions and column statistics.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an input HDF file
+    columns: list
+        Columns to be read (If None, all the columns are read)
+    filters: list
+        Conditions on the columns applied to the events, given as the
+        tuples (column, operator, value) which are all required. The
+        operators "==", "!=", "<", "<=", ">", ">=" and "in" are allowed
+
+    Returns
+    -------
+    event_data: pandas.core.frame.DataFrame
+        Data frame of the events
+    """
+
+    parquet_path = Path(get_parquet_path(input_file))
+
+    if not parquet_path.exists():
+        if columns is None:
+            event_data = pd.read_hdf(input_file, key="events/parameters")
+
+        else:
+            # Read only the given columns and those used for the filters
+            filter_columns = [] if filters is None else [col for col, _, _ in filters]
+            read_columns = list(dict.fromkeys(columns + filter_columns))
+
+            with tables.open_file(input_file, mode="r") as f_in:
+                table = f_in.root.events.parameters
+                event_data = pd.DataFrame({col: table.col(col) for col in read_columns})
+
+        if filters is not None:
+            event_data = event_data[_filters_to_mask(event_data, filters)]
+            event_data.reset_index(drop=True, inplace=True)
+
+        if columns is not None:
+            event_data = event_data[columns]
+
+        return event_data
+
+    dataset, _ = _open_parquet_dataset(parquet_path)
+
+    if columns is None:
+        columns = dataset.schema.names
+
+    expression = None if filters is None else _filters_to_expression(filters)
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    event_data = table.to_pandas()
+
+    return event_data
+
+
+def merge_parquet_data(input_files, output_path, selection=None):
+    """
+    Merges the Parquet datasets of event data files into a new dataset.
+
+    The events are copied in batches of rows, so that the memory usage
+    does not depend on the dataset sizes, and the new dataset has the
+    same schema and partitions as the input ones.
+
+    Parameters
+    ----------
+    input_files: list
+        Paths to input HDF files whose events are saved with the Parquet
+        backend
+    output_path: str
+        Path to an output Parquet dataset, which is overwritten
+    selection: callable
+        Function taking a data frame of a batch of events and returning
+        the mask of the events to be copied (If None, all the events are
+        copied)
+
+    Returns
+    -------
+    n_rows: list
+        Number of the events copied from every input file
+
+    Raises
+    ------
+    RuntimeError
+        If the schema of any dataset differs from the first one
+    """
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    output_path = Path(output_path)
+
+    if output_path.exists():
+        shutil.rmtree(output_path)
+
+    datasets = []
+
+    for input_file in input_files:
+        dataset, partition_columns = _open_parquet_dataset(
+            Path(get_parquet_path(input_file))
+        )
+
+        if len(datasets) > 0 and not dataset.schema.equals(datasets[0].schema):
+            raise RuntimeError(
+                f"The schema of the events in '{input_file}' differs from that in "
+                f"'{input_files[0]}'."
+            )
+
+        datasets.append(dataset)
+
+    schema = datasets[0].schema
+    partition_schema = pa.schema([schema.field(col) for col in partition_columns])
+
+    n_rows = [0] * len(input_files)
+
+    def iterate_batches():
+        for i_file, dataset in enumerate(datasets):
+            for batch in dataset.to_batches():
+                if selection is not None:
+                    mask = selection(batch.to_pandas())
+                    batch = batch.filter(pa.array(mask))
+
+                n_rows[i_file] += batch.num_rows
+                yield batch
+
+    ds.write_dataset(
+        iterate_batches(),
+        output_path,
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+        max_rows_per_group=ROW_GROUP_SIZE,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    schema = schema.with_metadata({"partition_columns": json.dumps(partition_columns)})
+    pq.write_metadata(schema, output_path / SCHEMA_FILE_NAME)
+
+    return n_rows
+
+
+def _open_parquet_dataset(parquet_path):
+    """
+    Opens a Parquet dataset with the schema saved with it, and returns
+    the dataset and its partition columns.
+    """
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(parquet_path / SCHEMA_FILE_NAME)
+
+    partition_columns = json.loads(schema.metadata[b"partition_columns"])
+    partition_schema = pa.schema([schema.field(col) for col in partition_columns])
+
+    dataset = ds.dataset(
+        parquet_path,
+        schema=schema.remove_metadata(),
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+    )
+
+    return dataset, partition_columns
+
+
+def _filters_to_expression(filters):
+    """
+    Converts the conditions on the columns to a pyarrow expression.
+    """
+
+    import pyarrow.dataset as ds
+
+    expression = None
+
+    for column, operator, value in filters:
+        field = ds.field(column)
+
+        if operator == "==":
+            condition = field == value
+        elif operator == "!=":
+            condition = field != value
+        elif operator == "<":
+            condition = field < value
+        elif operator == "<=":
+            condition = field <= value
+        elif operator == ">":
+            condition = field > value
+        elif operator == ">=":
+            condition = field >= value
+        elif operator == "in":
+            condition = field.isin(list(value))
+        else:
+            raise ValueError(f"Unknown filter operator '{operator}'.")
+
+        expression = condition if expression is None else expression & condition
+
+    return expression
+
+
+def _filters_to_mask(event_data, filters):
+    """
+    Converts the conditions on the columns to a mask of the events.
+    """
+
+    mask = np.ones(len(event_data), dtype=bool)
+
+    for column, operator, value in filters:
+        values = event_data[column].to_numpy()
+
+        if operator == "==":
+            mask &= values == value
+        elif operator == "!=":
+            mask &= values != value
+        elif operator == "<":
+            mask &= values < value
+        elif operator == "<=":
+            mask &= values <= value
+        elif operator == ">":
+            mask &= values > value
+        elif operator == ">=":
+            mask &= values >= value
+        elif operator == "in":
+            mask &= np.isin(values, list(value))
+        else:
+            raise ValueError(f"Unknown filter operator '{operator}'.")
+
+    return mask
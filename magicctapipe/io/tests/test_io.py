@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from magicctapipe.io import (
+    count_train_data_files_tel,
+    sample_train_data_files_tel,
+    save_event_data,
+)
+
+CONFIG = {
+    "mc_tel_ids": {
+        "LST-1": 1,
+        "LST-2": 0,
+        "LST-3": 0,
+        "LST-4": 0,
+        "MAGIC-I": 2,
+        "MAGIC-II": 3,
+    }
+}
+
+
+@pytest.fixture(scope="module")
+def dl1_stereo_dir(tmp_path_factory):
+    """
+    DL1-stereo data files of simulated shower events triggering random
+    combinations of the telescopes.
+    """
+
+    input_dir = tmp_path_factory.mktemp("dl1_stereo")
+    rng = np.random.default_rng(0)
+
+    for obs_id in [1, 2]:
+        rows = []
+
+        for event_id in range(300):
+            tel_ids = [tel_id for tel_id in [1, 2, 3] if rng.random() < 0.7]
+            true_alt, true_az = rng.uniform(40, 80), rng.uniform(0, 360)
+
+            for tel_id in tel_ids:
+                rows.append(
+                    [obs_id, event_id, tel_id, true_alt, true_az, rng.random()]
+                )
+
+        event_data = pd.DataFrame(
+            rows,
+            columns=[
+                "obs_id",
+                "event_id",
+                "tel_id",
+                "true_alt",
+                "true_az",
+                "intensity",
+            ],
+        )
+
+        save_event_data(event_data, f"{input_dir}/dl1_stereo_Run{obs_id}.h5")
+
+    return str(input_dir)
+
+
+def test_sample_train_data_files_tel(dl1_stereo_dir):
+    """
+    Check that the numbers of the shower events sampled per telescope
+    are capped as requested, and that the same seed gives the same
+    sample.
+    """
+
+    n_events_total = count_train_data_files_tel(dl1_stereo_dir, CONFIG)
+    n_events = {1: 50, 2: 200, 3: n_events_total[3] + 100}
+
+    data_train = sample_train_data_files_tel(
+        dl1_stereo_dir, CONFIG, n_events, random_state=1
+    )
+
+    # Every shower event has a single row per telescope
+    assert len(data_train[1]) == 50
+    assert len(data_train[2]) == 200
+    assert len(data_train[3]) == n_events_total[3]
+
+    for tel_id, df_events in data_train.items():
+        assert np.all(df_events["tel_id"] == tel_id)
+        assert df_events.index.is_unique
+
+    data_train_same = sample_train_data_files_tel(
+        dl1_stereo_dir, CONFIG, n_events, random_state=1
+    )
+
+    data_train_other = sample_train_data_files_tel(
+        dl1_stereo_dir, CONFIG, n_events, random_state=2
+    )
+
+    for tel_id in [1, 2]:
+        pd.testing.assert_frame_equal(data_train[tel_id], data_train_same[tel_id])
+        assert not data_train[tel_id].index.equals(data_train_other[tel_id].index)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from magicctapipe.io import select_split_events
+
+
+@pytest.fixture
+def event_data():
+    """
+    Telescope events of many shower events, with observation IDs beyond
+    the range of the packed event keys.
+    """
+
+    rng = np.random.default_rng(0)
+
+    n_events = 20000
+
+    obs_ids = rng.choice([1, 2**24, 2**40], n_events)
+    event_ids = rng.integers(0, 2**34, n_events)
+
+    event_data = pd.DataFrame(
+        data={
+            "obs_id": np.repeat(obs_ids, 2),
+            "event_id": np.repeat(event_ids, 2),
+            "tel_id": np.tile([1, 2], n_events),
+        }
+    )
+
+    return event_data
+
+
+@pytest.mark.parametrize("subset", ["train", "test"])
+def test_select_split_events(event_data, subset):
+    """
+    Check that the shower events are split with the train fraction,
+    keeping the telescope events of a shower in the same subset, and
+    that the split does not depend on the type of the IDs.
+    """
+
+    split = {"subset": subset, "split_by": "event", "train_fraction": 0.7, "seed": 1}
+
+    mask = select_split_events(event_data, split)
+
+    fraction = 0.7 if subset == "train" else 0.3
+    assert mask.mean() == pytest.approx(fraction, abs=0.02)
+
+    np.testing.assert_array_equal(mask[0::2], mask[1::2])
+
+    event_data_float = event_data.astype({"obs_id": float, "event_id": float})
+    event_data_index = event_data.set_index(["obs_id", "event_id", "tel_id"])
+
+    np.testing.assert_array_equal(select_split_events(event_data_float, split), mask)
+    np.testing.assert_array_equal(select_split_events(event_data_index, split), mask)
+
+    split_other = dict(split, subset="test" if subset == "train" else "train")
+    np.testing.assert_array_equal(select_split_events(event_data, split_other), ~mask)
@@ -1,3 +1,15 @@
+from .cube import (
+    create_irf_cube,
+    save_irf_cube,
+    load_irf_cube,
+    calculate_percentile_cut_from_cube,
+    evaluate_cut_from_cube,
+    effective_area_from_cube,
+    energy_dispersion_from_cube,
+    psf_table_from_cube,
+    background_2d_from_cube,
+)
+from .interpolation import IRFInterpolator
 from .utils import (
     read_simu_info_mcp_sum_num_showers,
     convert_simu_info_mcp_to_pyirf,
@@ -14,6 +26,16 @@ from .utils import (
 )
 
 __all__ = [
+    "create_irf_cube",
+    "save_irf_cube",
+    "load_irf_cube",
+    "calculate_percentile_cut_from_cube",
+    "evaluate_cut_from_cube",
+    "effective_area_from_cube",
+    "energy_dispersion_from_cube",
+    "psf_table_from_cube",
+    "background_2d_from_cube",
+    "IRFInterpolator",
     "read_simu_info_mcp_sum_num_showers",
     "convert_simu_info_mcp_to_pyirf",
     "read_dl2_mcp_to_pyirf_MAGIC_LST_list",
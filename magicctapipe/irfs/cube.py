@@ -0,0 +1,909 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Histogram cubes of MC DL2 events, from which the IRFs are derived for
+any gammaness and theta cuts without the event-level data.
+
+A cube is built once per MC sample and holds the numbers and summed
+weights of the events in the bins of the following parameters:
+
+- gamma events: true energy, reconstructed energy, energy migration,
+  true FoV offset, theta and gammaness
+- background events: reconstructed energy, reconstructed FoV offset and
+  gammaness
+
+Since the cubes are sparse, only the occupied bins are stored, as the
+rows of the `cells` tables with the bin indices and the contents. The
+bin index 0 stands for the underflow and `n_bins + 1` for the overflow
+of every parameter, so all the events are kept in the cubes. For the
+gammaness and theta, the cells also record whether the values lie
+exactly on an edge of their bins, so that the cuts at the bin edges are
+evaluated exactly for all the operators, also for the events with
+discrete values.
+
+The gammaness bin edges are given per reconstructed energy bin, and they
+include the quantiles of the gammaness of the gamma events in the bin.
+The dynamic gammaness cuts are then computed from the quantiles exactly
+as `pyirf.cuts.calculate_percentile_cut` does, and the cuts with the
+efficiencies matching the quantiles are at the bin edges. The theta cuts
+are interpolated within the bins of the theta histograms, and then
+rounded to the nearest theta bin edges, so they differ from those
+computed with the events by up to the width of a theta bin.
+
+The cuts are applied at the nearest bin edges. Global cuts given at the
+bin edges, e.g. the gammaness cuts at the linear edges, and the cut
+tables computed from the cubes select exactly the same events as with
+the event-level data, and then the IRFs derived from the cubes are the
+same as those derived from the events.
+"""
+
+import json
+import logging
+import operator
+
+import numpy as np
+import pandas as pd
+import tables
+from astropy import units as u
+from astropy.table import QTable
+from pyirf.binning import bin_center
+from pyirf.irf.background import BACKGROUND_UNIT
+from pyirf.simulations import SimulatedEventsInfo
+from pyirf.utils import cone_solid_angle
+
+__all__ = [
+    "create_irf_cube",
+    "save_irf_cube",
+    "load_irf_cube",
+    "calculate_percentile_cut_from_cube",
+    "evaluate_cut_from_cube",
+    "effective_area_from_cube",
+    "energy_dispersion_from_cube",
+    "psf_table_from_cube",
+    "background_2d_from_cube",
+]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# The bins stored in the cubes with their units
+CUBE_BINS_UNITS = {
+    "energy_bins": u.TeV,
+    "migration_bins": u.one,
+    "fov_offset_bins": u.deg,
+    "theta_bins": u.deg,
+    "bkg_fov_offset_bins": u.deg,
+    "gammaness_bins": u.one,
+    "gammaness_quantiles": u.one,
+}
+
+
+def _calculate_cube_bin_indices(values, bins):
+    """
+    Calculates the bin indices of values with the underflow bin 0 and
+    the overflow bin `len(bins)`, including the last edge in the last
+    bin as `numpy.histogram` does.
+    """
+
+    bin_indices = np.searchsorted(bins, values, side="right")
+    bin_indices[values == bins[-1]] = len(bins) - 1
+
+    return bin_indices
+
+
+def _calculate_cube_edge_flags(values, bins, bin_indices):
+    """
+    Flags the values lying exactly on the lower (1) or upper (2) edge of
+    their cube bins, the latter only for the last edge included in the
+    last bin, and 0 otherwise.
+    """
+
+    bins = np.concatenate([[-np.inf], bins, [np.inf]])
+
+    edge_flags = np.zeros(len(values), dtype=np.int8)
+    edge_flags[values == bins[bin_indices]] = 1
+    edge_flags[values == bins[bin_indices + 1]] = 2
+
+    return edge_flags
+
+
+def _fill_cube_cells(bin_indices, weights):
+    """
+    Fills the occupied bins of a cube with the numbers and summed
+    weights of the events.
+    """
+
+    df_events = pd.DataFrame(bin_indices)
+    df_events["n_events"] = 1
+    df_events["weight"] = weights
+
+    cells = df_events.groupby(list(bin_indices.keys()), sort=True).sum()
+    cells.reset_index(inplace=True)
+
+    return cells
+
+
+def create_irf_cube(
+    event_table_gamma,
+    energy_bins,
+    migration_bins,
+    fov_offset_bins,
+    theta_bins,
+    event_table_bkg=None,
+    bkg_fov_offset_bins=None,
+    n_gammaness_quantiles=100,
+    n_gammaness_edges=101,
+):
+    """
+    Creates a histogram cube of MC DL2 events.
+
+    Parameters
+    ----------
+    event_table_gamma: astropy.table.table.QTable
+        Table of the gamma MC DL2 events, with the columns `true_energy`,
+        `reco_energy`, `true_source_fov_offset`, `theta` and `gammaness`
+    energy_bins: astropy.units.quantity.Quantity
+        Edges of the true and reconstructed energy bins
+    migration_bins: numpy.ndarray
+        Edges of the energy migration bins
+    fov_offset_bins: astropy.units.quantity.Quantity
+        Edges of the true FoV offset bins
+    theta_bins: astropy.units.quantity.Quantity
+        Edges of the theta bins, on which the theta cuts are applied
+    event_table_bkg: astropy.table.table.QTable
+        Table of the background MC DL2 events, with the columns
+        `reco_energy`, `reco_source_fov_offset`, `gammaness` and
+        `weight` (If None, the background cube is not created)
+    bkg_fov_offset_bins: astropy.units.quantity.Quantity
+        Edges of the reconstructed FoV offset bins of the background
+    n_gammaness_quantiles: int
+        Number of the gammaness quantiles of the gamma events computed
+        per reconstructed energy bin
+    n_gammaness_edges: int
+        Number of the linear gammaness bin edges between 0 and 1, which
+        are merged with the quantiles. The edges are the values
+        `i / (n_gammaness_edges - 1)`, so that the global gammaness cuts
+        given with the same precision are at the edges
+
+    Returns
+    -------
+    irf_cube: dict
+        Cells of the gamma and background cubes and their bins
+    """
+
+    energy_bins = energy_bins.to("TeV")
+    fov_offset_bins = fov_offset_bins.to("deg")
+    theta_bins = theta_bins.to("deg")
+
+    # Drop the events whose binned parameters are not valid, which
+    # cannot pass the cuts applied to the events
+    gamma_columns = [
+        "true_energy",
+        "reco_energy",
+        "true_source_fov_offset",
+        "theta",
+        "gammaness",
+    ]
+
+    mask_valid = np.all(
+        [np.isfinite(np.asarray(event_table_gamma[col])) for col in gamma_columns],
+        axis=0,
+    )
+
+    if not mask_valid.all():
+        logger.warning(
+            f"WARNING: Dropping {np.count_nonzero(~mask_valid)} gamma events "
+            "with invalid parameters from the cube."
+        )
+        event_table_gamma = event_table_gamma[mask_valid]
+
+    true_energy = event_table_gamma["true_energy"].to_value("TeV")
+    reco_energy = event_table_gamma["reco_energy"].to_value("TeV")
+    gammaness = np.asarray(event_table_gamma["gammaness"])
+
+    # Compute the gammaness quantiles per reconstructed energy bin. The
+    # events are grouped by the same bin indices as the dynamic cuts of
+    # `pyirf.cuts.calculate_percentile_cut`, and the quantiles of the
+    # underflow and overflow bins are used only to make the bin edges
+    n_reco_bins = len(energy_bins) + 1
+
+    reco_energy_bin_cut = np.digitize(reco_energy, energy_bins.value)
+    quantile_levels = np.linspace(0, 1, n_gammaness_quantiles + 1)
+
+    gammaness_quantiles = np.tile(quantile_levels, (n_reco_bins, 1))
+    linear_edges = np.arange(n_gammaness_edges) / (n_gammaness_edges - 1)
+
+    for i_bin in range(n_reco_bins):
+        gammaness_bin = gammaness[reco_energy_bin_cut == i_bin]
+
+        if len(gammaness_bin) > 0:
+            gammaness_quantiles[i_bin] = np.percentile(
+                gammaness_bin, 100 * quantile_levels
+            )
+
+    gammaness_bins = np.sort(
+        np.concatenate(
+            [gammaness_quantiles, np.tile(linear_edges, (n_reco_bins, 1))], axis=1
+        ),
+        axis=1,
+    )
+
+    # Fill the gamma cube
+    bin_indices = {
+        "true_energy_bin": _calculate_cube_bin_indices(true_energy, energy_bins.value),
+        "reco_energy_bin": reco_energy_bin_cut,
+        "migration_bin": _calculate_cube_bin_indices(
+            reco_energy / true_energy, migration_bins
+        ),
+        "fov_offset_bin": _calculate_cube_bin_indices(
+            event_table_gamma["true_source_fov_offset"].to_value("deg"),
+            fov_offset_bins.value,
+        ),
+        "theta_bin": _calculate_cube_bin_indices(
+            event_table_gamma["theta"].to_value("deg"), theta_bins.value
+        ),
+        "gammaness_bin": np.zeros(len(gammaness), dtype=np.int64),
+        "gammaness_edge": np.zeros(len(gammaness), dtype=np.int8),
+    }
+
+    bin_indices["theta_edge"] = _calculate_cube_edge_flags(
+        event_table_gamma["theta"].to_value("deg"),
+        theta_bins.value,
+        bin_indices["theta_bin"],
+    )
+
+    for i_bin in range(n_reco_bins):
+        mask = reco_energy_bin_cut == i_bin
+
+        bin_indices["gammaness_bin"][mask] = _calculate_cube_bin_indices(
+            gammaness[mask], gammaness_bins[i_bin]
+        )
+
+        bin_indices["gammaness_edge"][mask] = _calculate_cube_edge_flags(
+            gammaness[mask], gammaness_bins[i_bin], bin_indices["gammaness_bin"][mask]
+        )
+
+    if "weight" in event_table_gamma.colnames:
+        weights = np.asarray(event_table_gamma["weight"])
+    else:
+        weights = np.ones(len(event_table_gamma))
+
+    irf_cube = {
+        "gamma": _fill_cube_cells(bin_indices, weights),
+        "background": None,
+        "energy_bins": energy_bins,
+        "migration_bins": np.asarray(migration_bins),
+        "fov_offset_bins": fov_offset_bins,
+        "theta_bins": theta_bins,
+        "bkg_fov_offset_bins": None,
+        "gammaness_bins": gammaness_bins,
+        "gammaness_quantiles": gammaness_quantiles,
+    }
+
+    if event_table_bkg is None:
+        return irf_cube
+
+    # Fill the background cube with the gammaness bins of the gammas
+    bkg_columns = ["reco_energy", "reco_source_fov_offset", "gammaness", "weight"]
+
+    mask_valid = np.all(
+        [np.isfinite(np.asarray(event_table_bkg[col])) for col in bkg_columns], axis=0
+    )
+
+    if not mask_valid.all():
+        logger.warning(
+            f"WARNING: Dropping {np.count_nonzero(~mask_valid)} background events "
+            "with invalid parameters from the cube."
+        )
+        event_table_bkg = event_table_bkg[mask_valid]
+
+    bkg_fov_offset_bins = bkg_fov_offset_bins.to("deg")
+
+    reco_energy_bin_cut = np.digitize(
+        event_table_bkg["reco_energy"].to_value("TeV"), energy_bins.value
+    )
+
+    gammaness = np.asarray(event_table_bkg["gammaness"])
+
+    bin_indices = {
+        "reco_energy_bin": reco_energy_bin_cut,
+        "bkg_fov_offset_bin": _calculate_cube_bin_indices(
+            event_table_bkg["reco_source_fov_offset"].to_value("deg"),
+            bkg_fov_offset_bins.value,
+        ),
+        "gammaness_bin": np.zeros(len(gammaness), dtype=np.int64),
+        "gammaness_edge": np.zeros(len(gammaness), dtype=np.int8),
+    }
+
+    for i_bin in range(n_reco_bins):
+        mask = reco_energy_bin_cut == i_bin
+
+        bin_indices["gammaness_bin"][mask] = _calculate_cube_bin_indices(
+            gammaness[mask], gammaness_bins[i_bin]
+        )
+
+        bin_indices["gammaness_edge"][mask] = _calculate_cube_edge_flags(
+            gammaness[mask], gammaness_bins[i_bin], bin_indices["gammaness_bin"][mask]
+        )
+
+    irf_cube["background"] = _fill_cube_cells(
+        bin_indices, np.asarray(event_table_bkg["weight"])
+    )
+
+    irf_cube["bkg_fov_offset_bins"] = bkg_fov_offset_bins
+
+    return irf_cube
+
+
+def save_irf_cube(irf_cube, output_file, sim_info=None, metadata=None):
+    """
+    Saves a histogram cube in an HDF file.
+
+    Parameters
+    ----------
+    irf_cube: dict
+        Histogram cube created by `create_irf_cube`
+    output_file: str
+        Path to an output HDF file
+    sim_info: pyirf.simulations.SimulatedEventsInfo
+        Simulation information of the gamma MC, used to compute the
+        effective area
+    metadata: dict
+        Any other information saved with the cube, which must be
+        serializable to JSON
+    """
+
+    with tables.open_file(output_file, mode="w") as f_out:
+        group = f_out.create_group("/", "cube")
+
+        for key in ["gamma", "background"]:
+            if irf_cube[key] is not None:
+                cells = irf_cube[key].to_records(index=False)
+                f_out.create_table(group, key, obj=cells)
+
+        for key, unit in CUBE_BINS_UNITS.items():
+            if irf_cube[key] is not None:
+                bins = u.Quantity(irf_cube[key]).to_value(unit)
+                f_out.create_array(group, key, obj=bins)
+
+        if sim_info is not None:
+            group._v_attrs["sim_info"] = json.dumps(
+                {
+                    "n_showers": int(sim_info.n_showers),
+                    "energy_min": sim_info.energy_min.to_value("TeV"),
+                    "energy_max": sim_info.energy_max.to_value("TeV"),
+                    "max_impact": sim_info.max_impact.to_value("m"),
+                    "spectral_index": float(sim_info.spectral_index),
+                    "viewcone": sim_info.viewcone.to_value("deg"),
+                }
+            )
+
+        if metadata is not None:
+            group._v_attrs["metadata"] = json.dumps(metadata)
+
+
+def load_irf_cube(input_file):
+    """
+    Loads a histogram cube saved in an HDF file.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an input HDF file
+
+    Returns
+    -------
+    irf_cube: dict
+        Cells of the gamma and background cubes and their bins
+    sim_info: pyirf.simulations.SimulatedEventsInfo
+        Simulation information of the gamma MC, or `None` if not saved
+    metadata: dict
+        Information saved with the cube, or `None` if not saved
+    """
+
+    irf_cube = {}
+
+    with tables.open_file(input_file, mode="r") as f_in:
+        group = f_in.root.cube
+
+        for key in ["gamma", "background"]:
+            if key in group:
+                irf_cube[key] = pd.DataFrame(f_in.get_node(group, key).read())
+            else:
+                irf_cube[key] = None
+
+        for key, unit in CUBE_BINS_UNITS.items():
+            if key in group:
+                bins = f_in.get_node(group, key).read()
+                irf_cube[key] = bins if unit is u.one else u.Quantity(bins, unit)
+            else:
+                irf_cube[key] = None
+
+        attrs = group._v_attrs
+        sim_info = None
+        metadata = None
+
+        if "sim_info" in attrs:
+            sim_info = json.loads(attrs["sim_info"])
+
+            sim_info = SimulatedEventsInfo(
+                n_showers=sim_info["n_showers"],
+                energy_min=u.Quantity(sim_info["energy_min"], u.TeV),
+                energy_max=u.Quantity(sim_info["energy_max"], u.TeV),
+                max_impact=u.Quantity(sim_info["max_impact"], u.m),
+                spectral_index=sim_info["spectral_index"],
+                viewcone=u.Quantity(sim_info["viewcone"], u.deg),
+            )
+
+        if "metadata" in attrs:
+            metadata = json.loads(attrs["metadata"])
+
+    return irf_cube, sim_info, metadata
+
+
+def _get_cut_bins(irf_cube, param):
+    """
+    Gets the bin edges of a cut parameter per reconstructed energy bin,
+    including the underflow and overflow bins.
+    """
+
+    if param == "gammaness":
+        bins = irf_cube["gammaness_bins"]
+    elif param == "theta":
+        n_reco_bins = len(irf_cube["energy_bins"]) + 1
+        bins = np.tile(irf_cube["theta_bins"].to_value("deg"), (n_reco_bins, 1))
+    else:
+        raise ValueError(f"Unknown cut parameter '{param}'.")
+
+    return bins
+
+
+def _snap_to_bins(cut_values, bins):
+    """
+    Moves cut values to the nearest bin edges, given per row of bins.
+    """
+
+    i_nearest = np.argmin(np.abs(bins - cut_values[:, np.newaxis]), axis=1)
+
+    return bins[np.arange(len(bins)), i_nearest]
+
+
+def calculate_percentile_cut_from_cube(
+    cells,
+    irf_cube,
+    param,
+    percentile,
+    fill_value,
+    min_value=None,
+    max_value=None,
+    min_events=10,
+):
+    """
+    Calculates the cuts in reconstructed energy bins as the percentiles
+    of the gammaness or theta of gamma events, as done with the events
+    by `pyirf.cuts.calculate_percentile_cut`.
+
+    The gammaness percentiles are computed from the quantiles of all the
+    gamma events of the cube, so they are valid only when the gammaness
+    cuts are applied first. The theta percentiles are interpolated
+    within the bins of the given cells. The cuts are moved to the
+    nearest bin edges, at which they are applied, so the theta cuts
+    differ from those computed with the events by up to the width of a
+    theta bin.
+
+    Parameters
+    ----------
+    cells: pandas.core.frame.DataFrame
+        Cells of the gamma cube
+    irf_cube: dict
+        Histogram cube with the bins of the cells
+    param: str
+        Parameter of the cuts, "gammaness" or "theta"
+    percentile: float
+        Percentile of the parameter computed in every bin
+    fill_value: float or astropy.units.quantity.Quantity
+        Value for the bins with less than `min_events` events
+    min_value: float or astropy.units.quantity.Quantity
+        If given, cuts smaller than this value are replaced with it
+    max_value: float or astropy.units.quantity.Quantity
+        If given, cuts larger than this value are replaced with it
+    min_events: int
+        Bins with less events than this number get the `fill_value`
+
+    Returns
+    -------
+    cut_table: astropy.table.table.QTable
+        Table of the cuts in the reconstructed energy bins
+
+    Raises
+    ------
+    ValueError
+        If the cut parameter is not known
+    """
+
+    energy_bins = irf_cube["energy_bins"]
+    n_energy_bins = len(energy_bins) - 1
+
+    bins = _get_cut_bins(irf_cube, param)[1:-1]
+    unit = u.deg if param == "theta" else None
+
+    def to_value(value):
+        return value if unit is None else u.Quantity(value).to_value(unit)
+
+    reco_energy_bin = cells["reco_energy_bin"].to_numpy()
+    n_events = cells["n_events"].to_numpy()
+
+    n_events_per_bin = np.bincount(
+        reco_energy_bin, weights=n_events, minlength=n_energy_bins + 2
+    )[1:-1]
+
+    cuts = np.full(n_energy_bins, to_value(fill_value), dtype=float)
+    mask_valid = n_events_per_bin >= min_events
+
+    if param == "gammaness":
+        quantile_levels = np.linspace(0, 1, irf_cube["gammaness_quantiles"].shape[1])
+
+        for i_bin in np.flatnonzero(mask_valid):
+            cuts[i_bin] = np.interp(
+                percentile / 100,
+                quantile_levels,
+                irf_cube["gammaness_quantiles"][i_bin + 1],
+            )
+
+    elif param == "theta":
+        theta_bins = irf_cube["theta_bins"].to_value("deg")
+        n_theta_bins = len(theta_bins) + 1
+
+        hist = np.zeros((n_energy_bins + 2, n_theta_bins))
+        np.add.at(hist, (reco_energy_bin, cells["theta_bin"].to_numpy()), n_events)
+
+        # Interpolate the percentiles within the bins, as the linear
+        # interpolation of `numpy.percentile` between the sorted values
+        bins_lower = np.concatenate([[theta_bins[0]], theta_bins])
+        bins_upper = np.concatenate([theta_bins, [theta_bins[-1]]])
+
+        for i_bin in np.flatnonzero(mask_valid):
+            hist_bin = hist[i_bin + 1]
+            cumsum = np.cumsum(hist_bin)
+
+            position = percentile / 100 * (cumsum[-1] - 1)
+            i_theta = np.searchsorted(cumsum, position, side="right")
+
+            fraction = (position - (cumsum[i_theta] - hist_bin[i_theta])) / hist_bin[
+                i_theta
+            ]
+
+            cuts[i_bin] = bins_lower[i_theta] + fraction * (
+                bins_upper[i_theta] - bins_lower[i_theta]
+            )
+
+    if min_value is not None:
+        cuts = np.maximum(cuts, to_value(min_value))
+
+    if max_value is not None:
+        cuts = np.minimum(cuts, to_value(max_value))
+
+    cut_table = QTable()
+    cut_table["low"] = energy_bins[:-1]
+    cut_table["high"] = energy_bins[1:]
+    cut_table["center"] = bin_center(energy_bins)
+    cut_table["cut"] = _snap_to_bins(cuts, bins)
+
+    if unit is not None:
+        cut_table["cut"] *= unit
+
+    return cut_table
+
+
+def evaluate_cut_from_cube(cells, irf_cube, param, cut, op):
+    """
+    Evaluates a global cut or binned cuts on the cells of a cube, as done
+    with the events by `pyirf.cuts.evaluate_binned_cut`.
+
+    The values lying exactly on the bin edges are compared with the
+    cuts by the given operator. For the other values, the cuts are moved
+    to the nearest bin edges, and the lower edges of the bins are
+    compared with them for the operators `>=` and `>`, and the upper
+    edges for `<=` and `<`. The cuts at the bin edges are then evaluated
+    exactly as with the events.
+
+    Parameters
+    ----------
+    cells: pandas.core.frame.DataFrame
+        Cells of a gamma or background cube
+    irf_cube: dict
+        Histogram cube with the bins of the cells
+    param: str
+        Parameter of the cuts, "gammaness" or "theta"
+    cut: float or astropy.units.quantity.Quantity or astropy.table.table.QTable
+        Global cut value or table of the cuts in the reconstructed
+        energy bins
+    op: callable
+        One of `operator.ge`, `operator.gt`, `operator.le` and
+        `operator.lt`
+
+    Returns
+    -------
+    mask: numpy.ndarray
+        Mask of the cells surviving the cuts
+
+    Raises
+    ------
+    ValueError
+        If the cut parameter or operator is not known
+    """
+
+    bins = _get_cut_bins(irf_cube, param)
+
+    # Get the cuts per reconstructed energy bin. The underflow events
+    # are compared with the cut of the last bin by the negative index in
+    # `pyirf.cuts.evaluate_binned_cut`, which is reproduced here
+    if isinstance(cut, QTable):
+        cuts = cut["cut"]
+        cuts = np.concatenate([cuts[-1:], cuts, cuts[-1:]])
+    else:
+        cuts = np.repeat(cut, len(bins))
+
+    if param == "theta":
+        cuts = u.Quantity(cuts, u.deg).to_value("deg")
+
+    cuts = np.asarray(cuts, dtype=float)
+    cuts_snapped = _snap_to_bins(cuts, bins)
+
+    # Get the edges of the bins of the cells, which are infinite for the
+    # underflow and overflow bins
+    bins = np.pad(bins, ((0, 0), (1, 1)), constant_values=(-np.inf, np.inf))
+
+    reco_energy_bin = cells["reco_energy_bin"].to_numpy()
+    bin_indices = cells[f"{param}_bin"].to_numpy()
+    edge_flags = cells[f"{param}_edge"].to_numpy()
+
+    bins_lower = bins[reco_energy_bin, bin_indices]
+    bins_upper = bins[reco_energy_bin, bin_indices + 1]
+
+    if op in (operator.ge, operator.gt):
+        mask = bins_lower >= cuts_snapped[reco_energy_bin]
+    elif op in (operator.le, operator.lt):
+        mask = bins_upper <= cuts_snapped[reco_energy_bin]
+    else:
+        raise ValueError(f"Unknown cut operator '{op}'.")
+
+    # Compare the values on the bin edges with the cuts, which makes the
+    # difference between the strict and non-strict operators
+    on_edge = edge_flags > 0
+    values = np.where(edge_flags == 1, bins_lower, bins_upper)
+
+    mask[on_edge] = op(values[on_edge], cuts[reco_energy_bin][on_edge])
+
+    return mask
+
+
+def _histogram_cells(cells, axes, n_bins, weights="n_events"):
+    """
+    Histograms the cells of a cube in the bins of the given axes,
+    excluding the underflow and overflow bins.
+    """
+
+    bin_indices = [cells[axis].to_numpy() - 1 for axis in axes]
+
+    mask = np.all(
+        [(indices >= 0) & (indices < n) for indices, n in zip(bin_indices, n_bins)],
+        axis=0,
+    )
+
+    hist = np.zeros(n_bins)
+    indices = tuple(indices[mask] for indices in bin_indices)
+
+    np.add.at(hist, indices, cells[weights].to_numpy()[mask])
+
+    return hist
+
+
+def effective_area_from_cube(cells, irf_cube, sim_info, per_fov=True):
+    """
+    Calculates the effective area from the cells of a gamma cube, as
+    done with the events by `pyirf.irf.effective_area_per_energy` and
+    `pyirf.irf.effective_area_per_energy_and_fov`.
+
+    Parameters
+    ----------
+    cells: pandas.core.frame.DataFrame
+        Cells of the gamma cube surviving the cuts
+    irf_cube: dict
+        Histogram cube with the bins of the cells
+    sim_info: pyirf.simulations.SimulatedEventsInfo
+        Simulation information of the gamma MC
+    per_fov: bool
+        If `True`, the effective area is calculated per FoV offset bin,
+        otherwise with all the FoV offsets
+
+    Returns
+    -------
+    aeff: astropy.units.quantity.Quantity
+        Effective area in the true energy (and FoV offset) bins
+    """
+
+    energy_bins = irf_cube["energy_bins"]
+    fov_offset_bins = irf_cube["fov_offset_bins"]
+
+    area = np.pi * sim_info.max_impact**2
+
+    if per_fov:
+        n_selected = _histogram_cells(
+            cells,
+            ["true_energy_bin", "fov_offset_bin"],
+            (len(energy_bins) - 1, len(fov_offset_bins) - 1),
+        )
+
+        n_simulated = sim_info.calculate_n_showers_per_energy_and_fov(
+            energy_bins, fov_offset_bins
+        )
+
+    else:
+        n_selected = _histogram_cells(
+            cells, ["true_energy_bin"], (len(energy_bins) - 1,)
+        )
+
+        n_simulated = sim_info.calculate_n_showers_per_energy(energy_bins)
+
+    aeff = (n_selected / n_simulated) * area
+
+    return aeff
+
+
+def energy_dispersion_from_cube(cells, irf_cube):
+    """
+    Calculates the energy dispersion from the cells of a gamma cube, as
+    done with the events by `pyirf.irf.energy_dispersion`.
+
+    Parameters
+    ----------
+    cells: pandas.core.frame.DataFrame
+        Cells of the gamma cube surviving the cuts
+    irf_cube: dict
+        Histogram cube with the bins of the cells
+
+    Returns
+    -------
+    edisp: numpy.ndarray
+        Energy dispersion in the true energy, migration and FoV offset
+        bins
+    """
+
+    hist = _histogram_cells(
+        cells,
+        ["true_energy_bin", "migration_bin", "fov_offset_bin"],
+        (
+            len(irf_cube["energy_bins"]) - 1,
+            len(irf_cube["migration_bins"]) - 1,
+            len(irf_cube["fov_offset_bins"]) - 1,
+        ),
+    )
+
+    with np.errstate(invalid="ignore"):
+        edisp = hist / hist.sum(axis=1)[:, np.newaxis, :]
+
+    edisp = np.nan_to_num(edisp)
+
+    return edisp
+
+
+def psf_table_from_cube(cells, irf_cube, source_offset_bins):
+    """
+    Calculates the PSF table from the cells of a gamma cube, as done
+    with the events by `pyirf.irf.psf_table`.
+
+    Parameters
+    ----------
+    cells: pandas.core.frame.DataFrame
+        Cells of the gamma cube surviving the cuts
+    irf_cube: dict
+        Histogram cube with the bins of the cells
+    source_offset_bins: astropy.units.quantity.Quantity
+        Edges of the source offset bins, which must be a subset of the
+        theta bin edges of the cube
+
+    Returns
+    -------
+    psf: astropy.units.quantity.Quantity
+        PSF in the true energy, FoV offset and source offset bins
+
+    Raises
+    ------
+    ValueError
+        If the source offset bin edges are not a subset of the theta
+        bin edges
+    """
+
+    theta_bins = irf_cube["theta_bins"].to_value("deg")
+    source_bins = source_offset_bins.to_value("deg")
+
+    # Get the nearest theta bin edges, which may differ from the source
+    # offset ones by the rounding errors
+    i_edges = np.argmin(np.abs(theta_bins[:, np.newaxis] - source_bins), axis=0)
+
+    if not np.allclose(theta_bins[i_edges], source_bins, rtol=0, atol=1e-9):
+        raise ValueError(
+            "The source offset bin edges are not a subset of the theta bin edges "
+            "of the cube."
+        )
+
+    # Rebin the theta bins of the cells to the source offset bins, by
+    # the indices of the theta bin edges matching the source offset ones.
+    # The values on the theta bin edges are binned as they are
+    theta_bin = cells["theta_bin"].to_numpy()
+    edge_flags = cells["theta_edge"].to_numpy()
+
+    source_offset_bin = np.searchsorted(i_edges, theta_bin - 1, side="right")
+
+    on_edge = edge_flags > 0
+    theta_bins = np.concatenate([[-np.inf], theta_bins, [np.inf]])
+
+    theta_on_edge = np.where(
+        edge_flags == 1, theta_bins[theta_bin], theta_bins[theta_bin + 1]
+    )[on_edge]
+
+    source_offset_bin[on_edge] = _calculate_cube_bin_indices(
+        theta_on_edge, source_bins
+    )
+
+    cells = cells.assign(source_offset_bin=source_offset_bin)
+
+    hist = _histogram_cells(
+        cells,
+        ["true_energy_bin", "fov_offset_bin", "source_offset_bin"],
+        (
+            len(irf_cube["energy_bins"]) - 1,
+            len(irf_cube["fov_offset_bins"]) - 1,
+            len(source_bins) - 1,
+        ),
+    )
+
+    solid_angle = np.diff(cone_solid_angle(source_offset_bins))
+
+    with np.errstate(invalid="ignore"):
+        psf = np.nan_to_num(hist / hist.sum(axis=2)[:, :, np.newaxis])
+
+    psf = psf / solid_angle
+
+    return psf
+
+
+def background_2d_from_cube(cells, irf_cube, t_obs):
+    """
+    Calculates the background rates from the cells of a background cube,
+    as done with the events by `pyirf.irf.background_2d`.
+
+    Parameters
+    ----------
+    cells: pandas.core.frame.DataFrame
+        Cells of the background cube surviving the cuts
+    irf_cube: dict
+        Histogram cube with the bins of the cells
+    t_obs: astropy.units.quantity.Quantity
+        Observation time with which the event weights are calculated
+
+    Returns
+    -------
+    bkg_rate: astropy.units.quantity.Quantity
+        Background rates in the reconstructed energy and FoV offset bins
+    """
+
+    energy_bins = irf_cube["energy_bins"]
+    bkg_fov_offset_bins = irf_cube["bkg_fov_offset_bins"]
+
+    hist = _histogram_cells(
+        cells,
+        ["reco_energy_bin", "bkg_fov_offset_bin"],
+        (len(energy_bins) - 1, len(bkg_fov_offset_bins) - 1),
+        weights="weight",
+    )
+
+    per_energy = (hist.T / np.diff(energy_bins)).T
+    bin_solid_angle = np.diff(cone_solid_angle(bkg_fov_offset_bins))
+
+    bkg_rate = per_energy / t_obs / bin_solid_angle
+
+    return bkg_rate.to(BACKGROUND_UNIT)
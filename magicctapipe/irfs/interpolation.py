@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Interpolation of the IRFs of a pointing grid to target pointing
+directions.
+
+Interpolating the IRF components one by one with `griddata` builds the
+triangulation of the grid points and computes the interpolation weights
+of the target point again for every component. `IRFInterpolator` builds
+the triangulation (or the k-d tree for the "nearest" method) once per
+grid, computes the weights once per target point and applies them to all
+the components as weighted sums of the grid values. The results are the
+same as those of `griddata` with the same method.
+"""
+
+import logging
+
+import numpy as np
+from astropy import units as u
+from pyirf.utils import cone_solid_angle
+from scipy.interpolate import CloughTocher2DInterpolator
+from scipy.spatial import Delaunay, cKDTree
+
+__all__ = ["IRFInterpolator"]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# The minimum effective area considered for the interpolation, as done
+# by `pyirf.interpolation.interpolate_effective_area_per_energy_and_fov`
+MIN_EFFECTIVE_AREA = u.Quantity(1, unit="m2")
+
+# The interpolation methods which are supported
+INTERPOLATION_METHODS = ["nearest", "linear", "cubic"]
+
+
+class IRFInterpolator:
+    """
+    Interpolator of the IRFs of a pointing grid, which keeps the
+    triangulation of the grid points and the interpolation weights of
+    the target points already used.
+
+    Attributes
+    ----------
+    irf_data: dict
+        IRF data returned by `magicctapipe.io.load_irf_files`
+    method: str
+        Interpolation method - "nearest", "linear" or "cubic"
+    grid_points: numpy.ndarray
+        Grid points in (cos(Zd), Az)
+    """
+
+    def __init__(self, irf_data, method="linear"):
+        """
+        Constructor of the class.
+
+        Parameters
+        ----------
+        irf_data: dict
+            IRF data returned by `magicctapipe.io.load_irf_files`
+        method: str
+            Interpolation method - "nearest", "linear" or "cubic"
+
+        Raises
+        ------
+        ValueError
+            If the interpolation method is not known
+        """
+
+        if method not in INTERPOLATION_METHODS:
+            raise ValueError(f"Unknown interpolation method '{method}'.")
+
+        self.irf_data = irf_data
+        self.method = method
+        self.grid_points = np.asarray(irf_data["grid_points"], dtype=np.float64)
+
+        if method == "nearest":
+            self._tree = cKDTree(self.grid_points)
+        else:
+            self._triangulation = Delaunay(self.grid_points)
+
+        self._weights = {}
+
+    def get_weights(self, target_points):
+        """
+        Gets the indices of the grid points and their weights with which
+        the values at target points are interpolated.
+
+        Parameters
+        ----------
+        target_points: numpy.ndarray
+            Target points in (cos(Zd), Az), of shape (n_targets, 2)
+
+        Returns
+        -------
+        indices: numpy.ndarray
+            Indices of the grid points used for the interpolation, of
+            shape (n_targets, n_vertices)
+        weights: numpy.ndarray
+            Weights of the grid points, of shape (n_targets, n_vertices),
+            which are NaN for the target points outside of the grid
+        """
+
+        target_points = np.atleast_2d(np.asarray(target_points, dtype=np.float64))
+        cache_key = target_points.tobytes()
+
+        if cache_key in self._weights:
+            return self._weights[cache_key]
+
+        if self.method == "nearest":
+            _, indices = self._tree.query(target_points)
+
+            indices = indices[:, np.newaxis]
+            weights = np.ones(indices.shape)
+
+        else:
+            n_dims = self.grid_points.shape[1]
+
+            simplices = self._triangulation.find_simplex(target_points)
+            transforms = self._triangulation.transform[simplices]
+
+            # Compute the barycentric coordinates of the target points
+            coords = np.einsum(
+                "ijk,ik->ij",
+                transforms[:, :n_dims],
+                target_points - transforms[:, n_dims],
+            )
+
+            indices = self._triangulation.simplices[simplices]
+            weights = np.column_stack([coords, 1 - coords.sum(axis=1)])
+
+            # The target points outside of the grid get NaN as griddata
+            outside = simplices == -1
+            indices[outside] = 0
+            weights[outside] = np.nan
+
+        self._weights[cache_key] = (indices, weights)
+
+        return indices, weights
+
+    def interpolate(self, values, target_points):
+        """
+        Interpolates values given at the grid points to target points.
+
+        Parameters
+        ----------
+        values: numpy.ndarray
+            Values at the grid points, of shape (n_grid_points, ...)
+        target_points: numpy.ndarray
+            Target points in (cos(Zd), Az), of shape (n_targets, 2)
+
+        Returns
+        -------
+        values_interp: numpy.ndarray
+            Interpolated values, of shape (n_targets, ...)
+        """
+
+        values = np.asarray(values)
+        target_points = np.atleast_2d(target_points)
+
+        if self.method == "cubic":
+            # The cubic interpolation is not a weighted sum of the grid
+            # values, so here only the triangulation is reused
+            interpolator = CloughTocher2DInterpolator(
+                self._triangulation, values.reshape(len(values), -1)
+            )
+            values_interp = interpolator(target_points)
+
+            return values_interp.reshape(len(target_points), *values.shape[1:])
+
+        indices, weights = self.get_weights(target_points)
+
+        values_interp = np.einsum("ij,ij...->i...", weights, values[indices])
+
+        return values_interp
+
+    def interpolate_irfs(self, target_points):
+        """
+        Interpolates all the IRF components to target points, applying
+        the same renormalizations as `pyirf.interpolation` does.
+
+        Parameters
+        ----------
+        target_points: numpy.ndarray
+            Target points in (cos(Zd), Az), of shape (n_targets, 2)
+
+        Returns
+        -------
+        irfs_interp: dict
+            Interpolated IRF components of the IRF data, of which the
+            first axis is the target points
+        """
+
+        irf_data = self.irf_data
+        irfs_interp = {}
+
+        # Interpolate the effective area in the logarithmic space
+        min_aeff = MIN_EFFECTIVE_AREA.to_value("m2")
+
+        aeff_log = np.log(np.maximum(irf_data["effective_area"].to_value("m2"), min_aeff))
+        aeff_interp = np.exp(self.interpolate(aeff_log, target_points))
+
+        # Set the too low values to zero, where the factor 1.1 corrects
+        # for the numerical uncertainty of the interpolation
+        aeff_interp[aeff_interp < min_aeff * 1.1] = 0
+
+        # Swap the axes to (n_targets, n_energy_bins, n_fov_offset_bins)
+        aeff_interp = np.swapaxes(aeff_interp, 1, 2)
+        irfs_interp["effective_area"] = u.Quantity(aeff_interp, unit="m2")
+
+        # Re-normalize the energy dispersion along the migration axis
+        edisp_interp = self.interpolate(irf_data["energy_dispersion"], target_points)
+
+        norm = np.sum(edisp_interp, axis=2, keepdims=True)
+        mask_zeros = norm != 0
+
+        irfs_interp["energy_dispersion"] = np.divide(
+            edisp_interp, norm, out=np.zeros_like(edisp_interp), where=mask_zeros
+        )
+
+        if "psf_table" in irf_data:
+            # Re-normalize the PSF table along the source offset axis
+            psf_interp = self.interpolate(
+                irf_data["psf_table"].to_value("sr-1"), target_points
+            )
+            psf_interp = psf_interp * u.Unit("sr-1")
+
+            omegas = np.diff(cone_solid_angle(irf_data["source_offset_bins"]))
+
+            norm = np.sum(psf_interp * omegas, axis=3, keepdims=True)
+            mask_zeros = norm != 0
+
+            irfs_interp["psf_table"] = np.divide(
+                psf_interp, norm, out=np.zeros_like(psf_interp), where=mask_zeros
+            )
+
+        if "background" in irf_data:
+            bkg_interp = self.interpolate(
+                irf_data["background"].to_value("MeV-1 s-1 sr-1"), target_points
+            )
+            irfs_interp["background"] = bkg_interp * u.Unit("MeV-1 s-1 sr-1")
+
+        if "gh_cuts" in irf_data:
+            irfs_interp["gh_cuts"] = self.interpolate(irf_data["gh_cuts"], target_points)
+
+        if "rad_max" in irf_data:
+            rad_max_interp = self.interpolate(
+                irf_data["rad_max"].to_value("deg"), target_points
+            )
+            irfs_interp["rad_max"] = rad_max_interp * u.deg
+
+        return irfs_interp
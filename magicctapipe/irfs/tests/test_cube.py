@@ -0,0 +1,299 @@
+import operator
+
+import numpy as np
+import pytest
+from astropy import units as u
+from astropy.table import QTable
+from magicctapipe.irfs import (
+    background_2d_from_cube,
+    calculate_percentile_cut_from_cube,
+    create_irf_cube,
+    effective_area_from_cube,
+    energy_dispersion_from_cube,
+    evaluate_cut_from_cube,
+    psf_table_from_cube,
+)
+from pyirf.cuts import calculate_percentile_cut, evaluate_binned_cut
+from pyirf.irf import (
+    background_2d,
+    effective_area_per_energy_and_fov,
+    energy_dispersion,
+    psf_table,
+)
+from pyirf.simulations import SimulatedEventsInfo
+
+ENERGY_BINS = np.geomspace(1e-3, 1e3, 25) * u.TeV
+MIGRATION_BINS = np.geomspace(0.2, 5, 31)
+FOV_OFFSET_BINS = [0, 0.5, 1, 1.5] * u.deg
+SOURCE_OFFSET_BINS = np.linspace(0, 1, 21) * u.deg
+BKG_FOV_OFFSET_BINS = [0, 1, 2, 3] * u.deg
+THETA_BINS = np.linspace(0, 1, 201) * u.deg
+
+OBS_TIME = 50 * u.hour
+
+SIM_INFO = SimulatedEventsInfo(
+    n_showers=int(1e6),
+    energy_min=0.005 * u.TeV,
+    energy_max=200 * u.TeV,
+    max_impact=500 * u.m,
+    spectral_index=-2,
+    viewcone=2 * u.deg,
+)
+
+
+@pytest.fixture(scope="module")
+def event_tables():
+    """
+    Gamma and background events with the gammaness discretized as
+    `k / 150`, and the theta partly on the theta bin edges of the cube.
+    """
+
+    rng = np.random.default_rng(0)
+
+    n_gamma = 20000
+    n_bkg = 20000
+
+    true_energy = 10 ** rng.uniform(-2, 2, n_gamma) * u.TeV
+    theta = rng.rayleigh(0.1, n_gamma)
+
+    mask_edge = rng.random(n_gamma) < 0.3
+    theta[mask_edge] = THETA_BINS.value[rng.integers(0, 60, mask_edge.sum())]
+
+    event_table_gamma = QTable(
+        {
+            "true_energy": true_energy,
+            "reco_energy": true_energy * rng.lognormal(0, 0.3, n_gamma),
+            "true_source_fov_offset": rng.uniform(0, 1.5, n_gamma) * u.deg,
+            "theta": theta * u.deg,
+            "gammaness": rng.integers(0, 151, n_gamma) / 150,
+        }
+    )
+
+    event_table_bkg = QTable(
+        {
+            "reco_energy": 10 ** rng.uniform(-2, 2, n_bkg) * u.TeV,
+            "reco_source_fov_offset": rng.uniform(0, 3, n_bkg) * u.deg,
+            "gammaness": rng.binomial(150, 0.3, n_bkg) / 150,
+            "weight": rng.uniform(0.5, 2, n_bkg),
+        }
+    )
+
+    return event_table_gamma, event_table_bkg
+
+
+@pytest.fixture(scope="module")
+def irf_cube(event_tables):
+    """
+    Histogram cube of the gamma and background events.
+    """
+
+    event_table_gamma, event_table_bkg = event_tables
+
+    irf_cube = create_irf_cube(
+        event_table_gamma=event_table_gamma,
+        energy_bins=ENERGY_BINS,
+        migration_bins=MIGRATION_BINS,
+        fov_offset_bins=FOV_OFFSET_BINS,
+        theta_bins=THETA_BINS,
+        event_table_bkg=event_table_bkg,
+        bkg_fov_offset_bins=BKG_FOV_OFFSET_BINS,
+    )
+
+    return irf_cube
+
+
+def evaluate_cut(event_table, param, cut, op):
+    """
+    Evaluates a global cut or binned cuts on events.
+    """
+
+    if isinstance(cut, QTable):
+        return evaluate_binned_cut(event_table[param], event_table["reco_energy"], cut, op)
+
+    return op(event_table[param], cut)
+
+
+def assert_irfs_equal(event_tables, irf_cube, cells_gamma, cells_bkg):
+    """
+    Checks that the IRFs derived from the selected events and cells of
+    the cube are the same.
+    """
+
+    event_table_gamma, event_table_bkg = event_tables
+
+    assert cells_gamma["n_events"].sum() == len(event_table_gamma)
+    assert cells_bkg["n_events"].sum() == len(event_table_bkg)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        aeff = effective_area_per_energy_and_fov(
+            event_table_gamma, SIM_INFO, ENERGY_BINS, FOV_OFFSET_BINS
+        )
+        aeff_cube = effective_area_from_cube(cells_gamma, irf_cube, SIM_INFO)
+
+    edisp = energy_dispersion(
+        event_table_gamma, ENERGY_BINS, FOV_OFFSET_BINS, MIGRATION_BINS
+    )
+    edisp_cube = energy_dispersion_from_cube(cells_gamma, irf_cube)
+
+    psf = psf_table(event_table_gamma, ENERGY_BINS, SOURCE_OFFSET_BINS, FOV_OFFSET_BINS)
+    psf_cube = psf_table_from_cube(cells_gamma, irf_cube, SOURCE_OFFSET_BINS)
+
+    bkg = background_2d(event_table_bkg, ENERGY_BINS, BKG_FOV_OFFSET_BINS, OBS_TIME)
+    bkg_cube = background_2d_from_cube(cells_bkg, irf_cube, OBS_TIME)
+
+    np.testing.assert_allclose(aeff_cube.to_value("m2"), aeff.to_value("m2"))
+    np.testing.assert_allclose(edisp_cube, edisp, atol=1e-12)
+    np.testing.assert_allclose(psf_cube.to_value("sr-1"), psf.to_value("sr-1"))
+    np.testing.assert_allclose(bkg_cube.value, bkg.to_value(bkg_cube.unit))
+
+
+@pytest.mark.parametrize("gh_cut", [0.5, 0.6, 0.8])
+@pytest.mark.parametrize("theta_cut", [0.1, 0.2])
+def test_global_cuts(event_tables, irf_cube, gh_cut, theta_cut):
+    """
+    Check that the global cuts with the strict operators select the same
+    events from the cube as from the events, including those with the
+    gammaness or theta exactly on the cuts.
+    """
+
+    event_table_gamma, event_table_bkg = event_tables
+    cells_gamma = irf_cube["gamma"]
+    cells_bkg = irf_cube["background"]
+
+    assert np.any(event_table_gamma["gammaness"] == gh_cut)
+    assert np.any(event_table_gamma["theta"].to_value("deg") == theta_cut)
+
+    mask = evaluate_cut(event_table_gamma, "gammaness", gh_cut, operator.gt)
+    event_table_gamma = event_table_gamma[mask]
+
+    mask = evaluate_cut(event_table_bkg, "gammaness", gh_cut, operator.gt)
+    event_table_bkg = event_table_bkg[mask]
+
+    mask = evaluate_cut_from_cube(cells_gamma, irf_cube, "gammaness", gh_cut, operator.gt)
+    cells_gamma = cells_gamma[mask]
+
+    mask = evaluate_cut_from_cube(cells_bkg, irf_cube, "gammaness", gh_cut, operator.gt)
+    cells_bkg = cells_bkg[mask]
+
+    mask = evaluate_cut(event_table_gamma, "theta", theta_cut * u.deg, operator.lt)
+    event_table_gamma = event_table_gamma[mask]
+
+    mask = evaluate_cut_from_cube(
+        cells_gamma, irf_cube, "theta", theta_cut * u.deg, operator.lt
+    )
+    cells_gamma = cells_gamma[mask]
+
+    assert_irfs_equal(
+        (event_table_gamma, event_table_bkg), irf_cube, cells_gamma, cells_bkg
+    )
+
+
+@pytest.mark.parametrize("param, cut", [("gammaness", 0.6), ("theta", 0.1 * u.deg)])
+@pytest.mark.parametrize("op", [operator.ge, operator.gt, operator.le, operator.lt])
+def test_evaluate_cut_operators(event_tables, irf_cube, param, cut, op):
+    """
+    Check that every operator selects the same number of gamma events
+    from the cube as from the events.
+    """
+
+    event_table_gamma, _ = event_tables
+    cells_gamma = irf_cube["gamma"]
+
+    n_events = np.count_nonzero(evaluate_cut(event_table_gamma, param, cut, op))
+    mask = evaluate_cut_from_cube(cells_gamma, irf_cube, param, cut, op)
+
+    assert cells_gamma["n_events"][mask].sum() == n_events
+
+
+def test_dynamic_cuts(event_tables, irf_cube):
+    """
+    Check the dynamic gammaness and theta cuts computed from the cube
+    against those computed from the events, and that the IRFs derived
+    with the cuts of the cube are the same.
+    """
+
+    event_table_gamma, event_table_bkg = event_tables
+    cells_gamma = irf_cube["gamma"]
+    cells_bkg = irf_cube["background"]
+
+    # The gammaness cuts at the quantiles of the cube are exact
+    cut_table_gh = calculate_percentile_cut(
+        values=event_table_gamma["gammaness"],
+        bin_values=event_table_gamma["reco_energy"],
+        bins=ENERGY_BINS,
+        fill_value=0.1,
+        percentile=10,
+        min_value=0.1,
+        max_value=0.95,
+    )
+
+    cut_table_gh_cube = calculate_percentile_cut_from_cube(
+        cells=cells_gamma,
+        irf_cube=irf_cube,
+        param="gammaness",
+        percentile=10,
+        fill_value=0.1,
+        min_value=0.1,
+        max_value=0.95,
+    )
+
+    np.testing.assert_allclose(cut_table_gh_cube["cut"], cut_table_gh["cut"])
+
+    cut_table_gh = cut_table_gh_cube
+
+    mask = evaluate_cut(event_table_gamma, "gammaness", cut_table_gh, operator.ge)
+    event_table_gamma = event_table_gamma[mask]
+
+    mask = evaluate_cut(event_table_bkg, "gammaness", cut_table_gh, operator.ge)
+    event_table_bkg = event_table_bkg[mask]
+
+    mask = evaluate_cut_from_cube(
+        cells_gamma, irf_cube, "gammaness", cut_table_gh, operator.ge
+    )
+    cells_gamma = cells_gamma[mask]
+
+    mask = evaluate_cut_from_cube(
+        cells_bkg, irf_cube, "gammaness", cut_table_gh, operator.ge
+    )
+    cells_bkg = cells_bkg[mask]
+
+    # The theta cuts of the cube are rounded to the theta bin edges
+    cut_table_theta = calculate_percentile_cut(
+        values=event_table_gamma["theta"],
+        bin_values=event_table_gamma["reco_energy"],
+        bins=ENERGY_BINS,
+        fill_value=0.3 * u.deg,
+        percentile=70,
+        min_value=0.05 * u.deg,
+        max_value=0.3 * u.deg,
+    )
+
+    cut_table_theta_cube = calculate_percentile_cut_from_cube(
+        cells=cells_gamma,
+        irf_cube=irf_cube,
+        param="theta",
+        percentile=70,
+        fill_value=0.3 * u.deg,
+        min_value=0.05 * u.deg,
+        max_value=0.3 * u.deg,
+    )
+
+    theta_bin_width = np.diff(THETA_BINS)[0]
+
+    assert np.all(
+        np.abs(cut_table_theta_cube["cut"] - cut_table_theta["cut"]) <= theta_bin_width
+    )
+
+    cut_table_theta = cut_table_theta_cube
+
+    mask = evaluate_cut(event_table_gamma, "theta", cut_table_theta, operator.le)
+    event_table_gamma = event_table_gamma[mask]
+
+    mask = evaluate_cut_from_cube(
+        cells_gamma, irf_cube, "theta", cut_table_theta, operator.le
+    )
+    cells_gamma = cells_gamma[mask]
+
+    assert_irfs_equal(
+        (event_table_gamma, event_table_bkg), irf_cube, cells_gamma, cells_bkg
+    )
@@ -41,6 +41,7 @@ from .estimators import (
     DispRegressor,
     EnergyRegressor,
     EventClassifier,
+    HistGradientBoostingVarianceRegressor,
 )
 
 from .stereo import (
@@ -78,6 +79,7 @@ __all__ = [
     "DispRegressor",
     "EnergyRegressor",
     "EventClassifier",
+    "HistGradientBoostingVarianceRegressor",
     "write_hillas",
     "check_write_stereo",
     "check_stereo",
@@ -7,13 +7,323 @@ import joblib
 import numpy as np
 import pandas as pd
 import sklearn.ensemble
+from sklearn.model_selection import train_test_split
 
-__all__ = ["EnergyRegressor", "DispRegressor", "EventClassifier"]
+__all__ = [
+    "EnergyRegressor",
+    "DispRegressor",
+    "EventClassifier",
+    "HistGradientBoostingVarianceRegressor",
+]
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# The lower limit of the variance estimated by the gradient boosting
+# regressors, to avoid that its inverse value becomes infinite
+VARIANCE_LOWLIM = 1e-6
+
+# The estimator backends. The settings of the RFs are given directly in
+# the estimator settings, and those of the other backends in the
+# sections of the settings named after them
+ESTIMATOR_BACKENDS = ["random_forest", "hist_gradient_boosting"]
+
+
+class HistGradientBoostingVarianceRegressor:
+    """
+    Histogram-based gradient boosting regressor which also estimates the
+    variance of the predictions.
+
+    Since gradient boosting does not build independent trees whose
+    responses could be compared as done for RFs, a second regressor is
+    trained with the squared residuals of the first one and its
+    predictions are used as the variance. The residuals are computed
+    with a fraction of the training events held out from the training
+    of the first regressor, since the residuals of the events used for
+    the training are much smaller than those of the other events, so
+    that the variance costs the training of only one more regressor.
+
+    Attributes
+    ----------
+    settings: dict
+        Settings of the gradient boosting regressors
+    variance_fraction: float
+        Fraction of the training events held out to train the regressor
+        of the squared residuals
+    regressor: sklearn.ensemble.HistGradientBoostingRegressor
+        Regressor of the target values
+    variance_regressor: sklearn.ensemble.HistGradientBoostingRegressor
+        Regressor of the squared residuals
+    """
+
+    def __init__(self, variance_fraction=0.2, **settings):
+        """
+        Constructor of the class.
+
+        Parameters
+        ----------
+        variance_fraction: float
+            Fraction of the training events held out to train the
+            regressor of the squared residuals
+        **settings: dict
+            Settings of the gradient boosting regressors
+
+        Raises
+        ------
+        ValueError
+            If the input fraction is not between 0 and 1
+        """
+
+        if not 0 < variance_fraction < 1:
+            raise ValueError(
+                f"The variance fraction {variance_fraction} is not between 0 and 1."
+            )
+
+        self.settings = settings
+        self.variance_fraction = variance_fraction
+        self.regressor = None
+        self.variance_regressor = None
+
+    def fit(self, x_train, y_train):
+        """
+        Trains the regressors of the target values and their variance.
+
+        Parameters
+        ----------
+        x_train: numpy.ndarray
+            Training features
+        y_train: numpy.ndarray
+            Training target values
+
+        Returns
+        -------
+        self: HistGradientBoostingVarianceRegressor
+            Trained regressor
+        """
+
+        # Hold out a fraction of the events. They are shuffled since the
+        # events are ordered by the input files
+        x_fit, x_held_out, y_fit, y_held_out = train_test_split(
+            x_train,
+            y_train,
+            test_size=self.variance_fraction,
+            shuffle=True,
+            random_state=self.settings.get("random_state"),
+        )
+
+        self.regressor = sklearn.ensemble.HistGradientBoostingRegressor(
+            **self.settings
+        )
+        self.regressor.fit(x_fit, y_fit)
+
+        residuals = (y_held_out - self.regressor.predict(x_held_out)) ** 2
+
+        self.variance_regressor = sklearn.ensemble.HistGradientBoostingRegressor(
+            **self.settings
+        )
+        self.variance_regressor.fit(x_held_out, residuals)
+
+        return self
+
+    def predict(self, x_predict):
+        """
+        Predicts the target values.
+
+        Parameters
+        ----------
+        x_predict: numpy.ndarray
+            Features of the events
+
+        Returns
+        -------
+        y_predict: numpy.ndarray
+            Predicted target values
+        """
+
+        y_predict = self.regressor.predict(x_predict)
+
+        return y_predict
+
+    def predict_var(self, x_predict):
+        """
+        Predicts the variance of the target values.
+
+        Parameters
+        ----------
+        x_predict: numpy.ndarray
+            Features of the events
+
+        Returns
+        -------
+        y_predict_var: numpy.ndarray
+            Predicted variance of the target values
+        """
+
+        y_predict_var = self.variance_regressor.predict(x_predict)
+        y_predict_var = np.clip(y_predict_var, VARIANCE_LOWLIM, None)
+
+        return y_predict_var
+
+
+def get_backend_settings(settings):
+    """
+    Gets the estimator backend and its settings from the settings of an
+    estimator.
+
+    The backend is selected by the `backend` key ("random_forest" by
+    default). The settings of the RFs are the other keys, except for the
+    sections of the other backends, and those of the other backends are
+    given in the sections named after them, e.g., `hist_gradient_boosting`.
+
+    Parameters
+    ----------
+    settings: dict
+        Settings of the estimator
+
+    Returns
+    -------
+    backend: str
+        Estimator backend
+    backend_settings: dict
+        Settings passed to the estimator of the backend
+
+    Raises
+    ------
+    ValueError
+        If the input backend is not known or its settings are not given
+    """
+
+    settings = settings.copy()
+    backend = settings.pop("backend", "random_forest")
+
+    if backend not in ESTIMATOR_BACKENDS:
+        raise ValueError(f"Unknown estimator backend '{backend}'.")
+
+    sections = {
+        name: settings.pop(name, None)
+        for name in ESTIMATOR_BACKENDS
+        if name != "random_forest"
+    }
+
+    if backend == "random_forest":
+        return backend, settings
+
+    if sections[backend] is None:
+        raise ValueError(
+            f"The settings of the estimator backend '{backend}' are not given. "
+            f"Please add them to the '{backend}' section of the settings."
+        )
+
+    return backend, dict(sections[backend])
+
+
+def configure_regressor(settings):
+    """
+    Configures a regressor with the backend specified in the settings.
+
+    Parameters
+    ----------
+    settings: dict
+        Settings of the regressor, whose `backend` key selects the
+        estimator - "random_forest" (default) uses the RF regressor and
+        "hist_gradient_boosting" uses the histogram-based gradient
+        boosting regressor (see `get_backend_settings`)
+
+    Returns
+    -------
+    regressor: sklearn.ensemble.RandomForestRegressor or HistGradientBoostingVarianceRegressor
+        Regressor configured with the settings
+
+    Raises
+    ------
+    ValueError
+        If the input backend is not known or its settings are not given
+    """
+
+    backend, backend_settings = get_backend_settings(settings)
+
+    if backend == "random_forest":
+        regressor = sklearn.ensemble.RandomForestRegressor(**backend_settings)
+    else:
+        regressor = HistGradientBoostingVarianceRegressor(**backend_settings)
+
+    return regressor
+
+
+def configure_classifier(settings):
+    """
+    Configures a classifier with the backend specified in the settings.
+
+    Parameters
+    ----------
+    settings: dict
+        Settings of the classifier, whose `backend` key selects the
+        estimator - "random_forest" (default) uses the RF classifier and
+        "hist_gradient_boosting" uses the histogram-based gradient
+        boosting classifier (see `get_backend_settings`)
+
+    Returns
+    -------
+    classifier: sklearn.ensemble.RandomForestClassifier or sklearn.ensemble.HistGradientBoostingClassifier
+        Classifier configured with the settings
+
+    Raises
+    ------
+    ValueError
+        If the input backend is not known or its settings are not given
+    """
+
+    backend, backend_settings = get_backend_settings(settings)
+
+    if backend == "random_forest":
+        classifier = sklearn.ensemble.RandomForestClassifier(**backend_settings)
+    else:
+        classifier = sklearn.ensemble.HistGradientBoostingClassifier(
+            **backend_settings
+        )
+
+    return classifier
+
+
+def predict_with_variance(regressor, x_predict):
+    """
+    Applies a trained regressor and estimates the variance of the
+    predictions.
+
+    For RFs the variance of the responses of the individual trees is
+    used, and for the gradient boosting regressors the prediction of
+    their variance regressor.
+
+    Parameters
+    ----------
+    regressor: sklearn.ensemble.RandomForestRegressor or HistGradientBoostingVarianceRegressor
+        Trained regressor
+    x_predict: numpy.ndarray
+        Features of the events
+
+    Returns
+    -------
+    y_predict: numpy.ndarray
+        Predicted values
+    y_predict_var: numpy.ndarray
+        Variance of the predicted values
+    """
+
+    y_predict = regressor.predict(x_predict)
+
+    if hasattr(regressor, "predict_var"):
+        y_predict_var = regressor.predict_var(x_predict)
+
+    else:
+        responses_per_estimator = []
+        for estimator in regressor.estimators_:
+            responses_per_estimator.append(estimator.predict(x_predict))
+
+        y_predict_var = np.var(responses_per_estimator, axis=0)
+
+    return y_predict, y_predict_var
+
 
 class EnergyRegressor:
     """
@@ -80,7 +390,7 @@ class EnergyRegressor:
             y_train = np.log10(df_events["true_energy"].to_numpy())
 
             # Configure the RF regressor
-            regressor = sklearn.ensemble.RandomForestRegressor(**self.settings)
+            regressor = configure_regressor(self.settings)
 
             # Train a telescope RF
             logger.info(f"Training a {self.TEL_NAMES[tel_id]} RF...")
@@ -124,13 +434,11 @@ class EnergyRegressor:
             # Apply the trained RF. Since the predicted values are in
             # logarithmic scale, here we convert them to the normal one.
 
-            reco_energy = 10 ** telescope_rf.predict(x_predict)
-
-            responses_per_estimator = []
-            for estimator in telescope_rf.estimators_:
-                responses_per_estimator.append(estimator.predict(x_predict))
+            reco_log_energy, reco_energy_var = predict_with_variance(
+                telescope_rf, x_predict
+            )
 
-            reco_energy_var = np.var(responses_per_estimator, axis=0)
+            reco_energy = 10**reco_log_energy
 
             df_reco_energy = pd.DataFrame(
                 data={"reco_energy": reco_energy, "reco_energy_var": reco_energy_var},
@@ -245,7 +553,7 @@ class DispRegressor:
             y_train = df_events["true_disp"].to_numpy()
 
             # Configure the RF regressor
-            regressor = sklearn.ensemble.RandomForestRegressor(**self.settings)
+            regressor = configure_regressor(self.settings)
 
             # Train a telescope RF
             logger.info(f"Training a {self.TEL_NAMES[tel_id]} RF...")
@@ -287,13 +595,7 @@ class DispRegressor:
                 x_predict = np.abs(x_predict)
 
             # Apply the trained RF
-            reco_disp = telescope_rf.predict(x_predict)
-
-            responses_per_estimator = []
-            for estimator in telescope_rf.estimators_:
-                responses_per_estimator.append(estimator.predict(x_predict))
-
-            reco_disp_var = np.var(responses_per_estimator, axis=0)
+            reco_disp, reco_disp_var = predict_with_variance(telescope_rf, x_predict)
 
             df_reco_disp = pd.DataFrame(
                 data={"reco_disp": reco_disp, "reco_disp_var": reco_disp_var},
@@ -408,7 +710,7 @@ class EventClassifier:
             y_train = df_events["true_event_class"].to_numpy()
 
             # Configure the RF classifier
-            classifier = sklearn.ensemble.RandomForestClassifier(**self.settings)
+            classifier = configure_classifier(self.settings)
 
             # Train a telescope RF
             logger.info(f"Training a {self.TEL_NAMES[tel_id]} RF...")
@@ -8,20 +8,36 @@ and in the subdirectories therein.
 Usage:
 $ python DL1_to_DL2.py
 
+To run the jobs with local processes instead of SLURM, or to
+only show the plan of the jobs without running them:
+$ python DL1_to_DL2.py --backend local --n-local-workers 4
+$ python DL1_to_DL2.py --dry-run
+
+The data files whose recorded provenance (inputs, configuration and
+version) is up to date are skipped by the jobs. To process all of
+them again:
+$ python DL1_to_DL2.py --force
+
 """
 
 import os
+import argparse
 import numpy as np
 import glob
 import yaml
 import logging
 from pathlib import Path
+from magicctapipe.utils.pipeline import Pipeline, add_pipeline_arguments, get_pipeline_backend
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
-def DL1_to_DL2(target_dir):
+# Number of worker processes of each job. The RFs are loaded only once
+# per job and shared by the workers.
+N_WORKERS = 8
+
+def DL1_to_DL2(target_dir, force=False):
     
     """
     This function creates the bash scripts to run lst1_magic_dl1_stereo_to_dl2.py.
@@ -30,8 +46,12 @@ def DL1_to_DL2(target_dir):
     ----------
     target_dir: str
         Path to the working directory
+    force: bool
+        If True, the data files are processed again even if they are up to date
     """
     
+    force_arg = " --force" if force else ""
+    
     if not os.path.exists(target_dir+"/DL2"):
         os.mkdir(target_dir+"/DL2")
     
@@ -51,26 +71,23 @@ def DL1_to_DL2(target_dir):
         
         listOfDL1Files = np.sort(glob.glob(night+"/*.h5"))
         np.savetxt(night+"/list_of_DL1_stereo_files.txt",listOfDL1Files, fmt='%s')
-        process_size = len(listOfDL1Files) - 1
         
         f = open(f'DL1_to_DL2_{night.split("/")[-1]}.sh','w')
         f.write('#!/bin/sh\n\n')
         f.write('#SBATCH -p long\n')
         f.write('#SBATCH -J '+process_name+'\n')
-        f.write(f"#SBATCH --array=0-{process_size}%100\n")
-        f.write('#SBATCH --mem=30g\n')
+        f.write(f'#SBATCH --cpus-per-task={N_WORKERS}\n')
+        f.write('#SBATCH --mem=60g\n')
         f.write('#SBATCH -N 1\n\n')
         f.write('ulimit -l unlimited\n')
         f.write('ulimit -s unlimited\n')
         f.write('ulimit -a\n\n')
             
-        f.write(f"SAMPLE_LIST=($(<{night}/list_of_DL1_stereo_files.txt))\n")
-        f.write("SAMPLE=${SAMPLE_LIST[${SLURM_ARRAY_TASK_ID}]}\n")
-        f.write(f'export LOG={output}'+'/DL1_to_DL2_${SLURM_ARRAY_TASK_ID}.log\n')
-        f.write(f'conda run -n magic-lst python lst1_magic_dl1_stereo_to_dl2.py --input-file-dl1 $SAMPLE --input-dir-rfs {RFs_dir} --output-dir {output} --config-file {target_dir}/../config_general.yaml >$LOG 2>&1\n\n')
+        f.write(f'export LOG={output}'+'/DL1_to_DL2.log\n')
+        f.write(f'conda run -n magic-lst python lst1_magic_dl1_stereo_to_dl2.py --input-list {night}/list_of_DL1_stereo_files.txt --input-dir-rfs {RFs_dir} --output-dir {output} --config-file {target_dir}/../config_general.yaml --n-workers {N_WORKERS}{force_arg} >$LOG 2>&1\n\n')
         f.close()
 
-def DL1_to_DL2_MC(target_dir, identification): 
+def DL1_to_DL2_MC(target_dir, identification, force=False): 
     """
     This function creates the bash scripts to run lst1_magic_dl1_stereo_to_dl2.py on the MC files.
     
@@ -78,8 +95,12 @@ def DL1_to_DL2_MC(target_dir, identification):
     ----------
     target_dir: str
         Path to the working directory
+    force: bool
+        If True, the data files are processed again even if they are up to date
     """
     
+    force_arg = " --force" if force else ""
+    
     process_name = "DL2_"+target_dir.split("/")[-2:][1]
     RFs_dir = target_dir+"/DL1/MC/RFs"
     
@@ -97,23 +118,20 @@ def DL1_to_DL2_MC(target_dir, identification):
     listOfMC = np.sort(glob.glob(target_dir+f"/DL1/MC/{identification}/Merged/StereoMerged/*.h5"))
     
     np.savetxt(target_dir+f"/DL1/MC/{identification}/Merged/StereoMerged/list_of_DL1_stereo_files.txt",listOfMC, fmt='%s')
-    process_size = len(listOfMC) - 1
 
     f = open(f'DL1_to_DL2_MC_{identification}.sh','w')
     f.write('#!/bin/sh\n\n')
     f.write('#SBATCH -p long\n')
     f.write('#SBATCH -J '+process_name+'\n')
-    f.write(f"#SBATCH --array=0-{process_size}%50\n")
-    f.write('#SBATCH --mem=40g\n')
+    f.write(f'#SBATCH --cpus-per-task={N_WORKERS}\n')
+    f.write('#SBATCH --mem=80g\n')
     f.write('#SBATCH -N 1\n\n')
     f.write('ulimit -l unlimited\n')
     f.write('ulimit -s unlimited\n')
     f.write('ulimit -a\n\n')
     
-    f.write(f"SAMPLE_LIST=($(<{target_dir}/DL1/MC/{identification}/Merged/StereoMerged/list_of_DL1_stereo_files.txt))\n")
-    f.write("SAMPLE=${SAMPLE_LIST[${SLURM_ARRAY_TASK_ID}]}\n")
-    f.write(f'export LOG={outputMC}'+'/DL1_to_DL2_${SLURM_ARRAY_TASK_ID}.log\n')
-    f.write(f'conda run -n magic-lst python lst1_magic_dl1_stereo_to_dl2.py --input-file-dl1 $SAMPLE --input-dir-rfs {RFs_dir} --output-dir {outputMC} --config-file {target_dir}/../config_general.yaml >$LOG 2>&1\n\n')
+    f.write(f'export LOG={outputMC}'+'/DL1_to_DL2.log\n')
+    f.write(f'conda run -n magic-lst python lst1_magic_dl1_stereo_to_dl2.py --input-list {target_dir}/DL1/MC/{identification}/Merged/StereoMerged/list_of_DL1_stereo_files.txt --input-dir-rfs {RFs_dir} --output-dir {outputMC} --config-file {target_dir}/../config_general.yaml --n-workers {N_WORKERS}{force_arg} >$LOG 2>&1\n\n')
     f.close()
 
 def main():
@@ -122,6 +140,15 @@ def main():
     Here we read the config_general.yaml file and call the functions defined above.
     """
     
+    parser = argparse.ArgumentParser()
+    add_pipeline_arguments(parser)
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Process the data files again even if they are up to date",
+    )
+    args = parser.parse_args()
     
     with open("config_general.yaml", "rb") as f:   # "rb" mode opens the file in binary format for reading
         config = yaml.safe_load(f)
@@ -130,27 +157,24 @@ def main():
     target_dir = str(Path(config["directories"]["workspace_dir"]))+"/"+config["directories"]["target_name"]
     
     print("***** Generating bashscripts for DL2...")
-    DL1_to_DL2(target_dir)
-    DL1_to_DL2_MC(target_dir, "gammas")
-    DL1_to_DL2_MC(target_dir, "protons")
-    DL1_to_DL2_MC(target_dir, "protons_test")
+    DL1_to_DL2(target_dir, args.force)
+    DL1_to_DL2_MC(target_dir, "gammas", args.force)
+    DL1_to_DL2_MC(target_dir, "protons", args.force)
+    DL1_to_DL2_MC(target_dir, "protons_test", args.force)
     
     
     print("***** Running lst1_magic_dl1_stereo_to_dl2.py in the DL1 data files...")
     print("Process name: DL2_"+target_dir.split("/")[-2:][1])
     print("To check the jobs submitted to the cluster, type: squeue -n DL2_"+target_dir.split("/")[-2:][1])
     
-    #Below we run the bash scripts to perform the DL1 to DL2 cnoversion:
+    #Below we run the bash scripts to perform the DL1 to DL2 cnoversion. The nights and MC samples are independent, so they run in parallel
     list_of_DL1_to_DL2_scripts = np.sort(glob.glob("DL1_to_DL2_*.sh"))
     
-    for n,run in enumerate(list_of_DL1_to_DL2_scripts):
-        if n == 0:
-            launch_jobs =  f"dl2{n}=$(sbatch --parsable {run})"
-        else:
-            launch_jobs = launch_jobs + f" && dl2{n}=$(sbatch --parsable --dependency=afterany:$dl2{n-1} {run})"
+    pipeline = Pipeline("DL2_"+target_dir.split("/")[-2:][1])
+    for run in list_of_DL1_to_DL2_scripts:
+        pipeline.add_task(run[0:-3], run)
     
-    #print(launch_jobs)
-    os.system(launch_jobs)
+    pipeline.run(get_pipeline_backend(args), dry_run=args.dry_run)
 
 if __name__ == "__main__":
     main()
@@ -12,19 +12,42 @@ data files.
 Usage:
 $ python DL2_to_DL3.py
 
+The nights are converted in parallel, and the index files of
+the DL3 data files are updated once all the nights are done.
+To run the jobs with local processes instead of SLURM, or to
+only show the plan of the jobs without running them:
+$ python DL2_to_DL3.py --backend local --n-local-workers 4
+$ python DL2_to_DL3.py --dry-run
+
+The data files whose recorded provenance (inputs, configuration and
+version) is up to date are skipped by the jobs. To process all of
+them again:
+$ python DL2_to_DL3.py --force
+
 """
 
 import os
+import argparse
 import numpy as np
 import glob
 import yaml
 import logging
 from pathlib import Path
+from magicctapipe.utils.pipeline import Pipeline, add_pipeline_arguments, get_pipeline_backend
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# Number of worker processes of each job. The IRFs are loaded only once
+# per job and shared by the workers.
+N_WORKERS = 8
+
+# Memory in GB requested for each job, for the IRFs loaded by the job
+# and the DL2 data file processed by every worker
+MEMORY_PER_JOB = 4
+MEMORY_PER_WORKER = 2
+
 def configuration_DL3(ids, target_dir,target_coords):
     
     """
@@ -47,7 +70,7 @@ def configuration_DL3(ids, target_dir,target_coords):
     f.close()
             
 
-def DL2_to_DL3(target_dir):
+def DL2_to_DL3(target_dir, force=False):
     
     """
     This function creates the bash scripts to run lst1_magic_dl2_to_dl3.py on the real data.
@@ -56,8 +79,12 @@ def DL2_to_DL3(target_dir):
     ----------
     target_dir: str
         Path to the working directory
+    force: bool
+        If True, the data files are processed again even if they are up to date
     """
     
+    force_arg = " --force" if force else ""
+    
     if not os.path.exists(target_dir+"/DL3"):
         os.mkdir(target_dir+"/DL3")
         
@@ -68,24 +95,40 @@ def DL2_to_DL3(target_dir):
     
     for night in nights:
         listOfDL2files = np.sort(glob.glob(night+"/Merged/*.h5"))
+        np.savetxt(night+"/Merged/list_of_DL2_files.txt",listOfDL2files, fmt='%s')
         
         f = open(f'DL3_{night.split("/")[-1]}.sh','w')
         f.write('#!/bin/sh\n\n')
         f.write('#SBATCH -p short\n')
         f.write('#SBATCH -J '+process_name+'\n')
-        f.write('#SBATCH --mem=10g\n')
+        f.write(f'#SBATCH --cpus-per-task={N_WORKERS}\n')
+        f.write(f'#SBATCH --mem={MEMORY_PER_JOB + MEMORY_PER_WORKER * N_WORKERS}g\n')
         f.write('#SBATCH -N 1\n\n')
         f.write('ulimit -l unlimited\n')
         f.write('ulimit -s unlimited\n')
         f.write('ulimit -a\n\n')
         
-        
-        for DL2_file in listOfDL2files:
-            f.write(f'export LOG={output}/DL3_{DL2_file.split("/")[-1]}.log\n')
-            f.write(f'conda run -n magic-lst python lst1_magic_dl2_to_dl3.py --input-file-dl2 {DL2_file} --input-dir-irf {IRF_dir} --output-dir {output} --config-file {target_dir}/config_DL3.yaml >$LOG 2>&1\n\n')
+        f.write(f'export LOG={output}/DL3_{night.split("/")[-1]}.log\n')
+        f.write(f'conda run -n magic-lst python lst1_magic_dl2_to_dl3.py --input-list {night}/Merged/list_of_DL2_files.txt --input-dir-irf {IRF_dir} --output-dir {output} --config-file {target_dir}/config_DL3.yaml --n-workers {N_WORKERS}{force_arg} >$LOG 2>&1\n\n')
 
         f.close()
     
+    #The index files are updated with all the nights at the end, since the jobs of the nights may update them at the same time
+    f = open('DL3_index.sh','w')
+    f.write('#!/bin/sh\n\n')
+    f.write('#SBATCH -p short\n')
+    f.write('#SBATCH -J '+process_name+'\n')
+    f.write(f'#SBATCH --cpus-per-task={N_WORKERS}\n')
+    f.write('#SBATCH -N 1\n\n')
+    f.write('ulimit -l unlimited\n')
+    f.write('ulimit -s unlimited\n')
+    f.write('ulimit -a\n\n')
+    
+    f.write(f'export LOG={output}/DL3_index.log\n')
+    f.write(f'conda run -n magic-lst python create_dl3_index_files.py --input-dir {output} --update --n-workers {N_WORKERS} >$LOG 2>&1\n\n')
+    
+    f.close()
+    
     
 def main():
 
@@ -93,6 +136,16 @@ def main():
     Here we read the config_general.yaml file and call the functions defined above.
     """
     
+    parser = argparse.ArgumentParser()
+    add_pipeline_arguments(parser)
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Process the data files again even if they are up to date",
+    )
+    args = parser.parse_args()
+    
     with open("config_general.yaml", "rb") as f:   # "rb" mode opens the file in binary format for reading
         config = yaml.safe_load(f)
     
@@ -108,22 +161,23 @@ def main():
     
         
     print("***** Generating bashscripts for DL2-DL3 conversion...")
-    DL2_to_DL3(target_dir)
+    DL2_to_DL3(target_dir, args.force)
     
     print("***** Running lst1_magic_dl2_to_dl3.py in the DL2 real data files...")
     print("Process name: DL3_"+target_dir.split("/")[-2:][1])
     print("To check the jobs submitted to the cluster, type: squeue -n DL3_"+target_dir.split("/")[-2:][1])
     
-    #Below we run the bash scripts to perform the DL1 to DL2 cnoversion:
+    #Below we run the bash scripts to perform the DL2 to DL3 conversion. The nights are independent, so they run in parallel, and the index files are updated after all of them
     list_of_DL2_to_DL3_scripts = np.sort(glob.glob("DL3_2*.sh"))
+    DL3_dir = target_dir+"/DL3"
+    
+    pipeline = Pipeline("DL3_"+target_dir.split("/")[-2:][1])
+    for run in list_of_DL2_to_DL3_scripts:
+        pipeline.add_task(run[0:-3], run, outputs=[DL3_dir])
     
-    for n,run in enumerate(list_of_DL2_to_DL3_scripts):
-        if n == 0:
-            launch_jobs =  f"dl3{n}=$(sbatch --parsable {run})"
-        else:
-            launch_jobs = launch_jobs + f" && dl3{n}=$(sbatch --parsable --dependency=afterany:$dl3{n-1} {run})"
+    pipeline.add_task("DL3_index", "DL3_index.sh", inputs=[DL3_dir])
     
-    os.system(launch_jobs)
+    pipeline.run(get_pipeline_backend(args), dry_run=args.dry_run)
 
 if __name__ == "__main__":
     main()
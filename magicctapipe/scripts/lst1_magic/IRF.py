@@ -6,19 +6,31 @@ WorkingDirectory/IRF
 Usage:
 $ python IRF.py
 
+To run the jobs with local processes instead of SLURM, or to
+only show the plan of the jobs without running them:
+$ python IRF.py --backend local --n-local-workers 4
+$ python IRF.py --dry-run
+
 """
 
 import os
+import argparse
 import numpy as np
 import glob
 import yaml
 import logging
 from pathlib import Path
+from magicctapipe.utils.pipeline import Pipeline, add_pipeline_arguments, get_pipeline_backend
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# Memory in GB requested for the IRF job, for the parent process and the
+# MC DL2 event tables of the pointing direction processed by every worker
+MEMORY_PER_JOB = 4
+MEMORY_PER_WORKER = 8
+
 def configuration_IRF(ids, target_dir):
     
     """
@@ -53,15 +65,19 @@ def configuration_IRF(ids, target_dir):
 
         
 
-def IRF(target_dir):
+def IRF(target_dir, n_workers=8):
     
     """
-    This function creates the bash scripts to run lst1_magic_create_irf.py on the MC gammas.
+    This function creates the bash script to run lst1_magic_create_irf.py on the MC gammas.
+    The IRFs of all the pointing directions are created in a single job with a pool of
+    processes, which also writes the manifest of the IRF files used by the DL3 step.
     
     Parameters
     ----------
     target_dir: str
         Path to the working directory
+    n_workers: int
+        Number of worker processes of the job
     """
     
     if not os.path.exists(target_dir+"/IRF"):
@@ -70,26 +86,22 @@ def IRF(target_dir):
         
     process_name = "IRF_"+target_dir.split("/")[-2:][1]
     data_files_dir = target_dir+"/DL2/MC/gammas"
-    listOfDL2MCgammas = np.sort(glob.glob(data_files_dir+"/*gamma*.h5"))
-    np.savetxt(data_files_dir+"/DL2_MC_files.txt",listOfDL2MCgammas, fmt='%s')
     
     output = target_dir+"/IRF"
-    process_size = len(listOfDL2MCgammas) - 1
     
     f = open('IRF.sh','w')
     f.write('#!/bin/sh\n\n')
     f.write('#SBATCH -p short\n')
     f.write('#SBATCH -J '+process_name+'\n')
-    f.write(f"#SBATCH --array=0-{process_size}%50\n")
+    f.write(f"#SBATCH -c {n_workers}\n")
+    f.write(f"#SBATCH --mem={MEMORY_PER_JOB + MEMORY_PER_WORKER * n_workers}g\n")
     f.write('#SBATCH -N 1\n\n')
     f.write('ulimit -l unlimited\n')
     f.write('ulimit -s unlimited\n')
     f.write('ulimit -a\n\n')
 
-    f.write(f"SAMPLE_LIST=($(<{data_files_dir}/DL2_MC_files.txt))\n")
-    f.write("SAMPLE=${SAMPLE_LIST[${SLURM_ARRAY_TASK_ID}]}\n")
-    f.write(f'export LOG={output}'+'/IRF_${SLURM_ARRAY_TASK_ID}.log\n')
-    f.write(f'conda run -n magic-lst python lst1_magic_create_irf.py --input-file-gamma $SAMPLE --output-dir {output} --config-file {target_dir}/config_IRF.yaml >$LOG 2>&1\n\n')
+    f.write(f'export LOG={output}/IRF.log\n')
+    f.write(f'conda run -n magic-lst python lst1_magic_create_irf.py --input-dir {data_files_dir} --output-dir {output} --config-file {target_dir}/config_IRF.yaml --n-workers {n_workers} >$LOG 2>&1\n\n')
 
     f.close()
     
@@ -133,6 +145,9 @@ def main():
     Here we read the config_general.yaml file and call the functions defined above.
     """
     
+    parser = argparse.ArgumentParser()
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
     
     with open("config_general.yaml", "rb") as f:   # "rb" mode opens the file in binary format for reading
         config = yaml.safe_load(f)
@@ -155,17 +170,14 @@ def main():
     print("Process name: IRF_"+target_dir.split("/")[-2:][1])
     print("To check the jobs submitted to the cluster, type: squeue -n IRF_"+target_dir.split("/")[-2:][1])
     
-    #Below we run the bash scripts to perform the DL1 to DL2 cnoversion:
+    #Below we run the bash scripts to create the IRFs and to merge the DL2 files, which are independent of each other
     list_of_DL1_to_2_scripts = np.asarray(["IRF.sh","DL3_0_merging.sh"])
     
-    for n,run in enumerate(list_of_DL1_to_2_scripts):
-        if n == 0:
-            launch_jobs =  f"conversion{n}=$(sbatch --parsable {run})"
-        else:
-            launch_jobs = launch_jobs + f" && conversion{n}=$(sbatch --parsable --dependency=afterany:$conversion{n-1} {run})"
+    pipeline = Pipeline("IRF_"+target_dir.split("/")[-2:][1])
+    for run in list_of_DL1_to_2_scripts:
+        pipeline.add_task(run[0:-3], run)
     
-    #print(launch_jobs)
-    os.system(launch_jobs)
+    pipeline.run(get_pipeline_backend(args), dry_run=args.dry_run)
 
 if __name__ == "__main__":
     main()
@@ -44,6 +44,7 @@ def configuration_RFs(ids, target_dir):
     "\n    MAGIC-II: "+str(ids[5])+"\n\n",
     "energy_regressor:",
     "\n    settings:",
+    '\n        backend: "random_forest"',
     "\n        n_estimators: 150",
     '\n        criterion: "squared_error"',
     "\n        max_depth: 50",
@@ -60,13 +61,23 @@ def configuration_RFs(ids, target_dir):
     "\n        verbose: 0",
     "\n        warm_start: false",
     "\n        ccp_alpha: 0.0",
-    "\n        max_samples: null\n\n",
+    "\n        max_samples: null",
+    "\n        hist_gradient_boosting:",
+    "\n            max_iter: 300",
+    "\n            learning_rate: 0.1",
+    "\n            max_leaf_nodes: 63",
+    "\n            min_samples_leaf: 20",
+    "\n            l2_regularization: 0.0",
+    "\n            early_stopping: false",
+    "\n            random_state: 42",
+    "\n            variance_fraction: 0.2\n\n",
     '    features: ["intensity", "length", "width", "skewness", "kurtosis", "slope", "intensity_width_2", "h_max", "impact", "pointing_alt", "pointing_az"]\n\n',
     "    gamma_offaxis:",
     "\n        min: 0.2 deg",
     "\n        max: 0.5 deg\n\n",
     "disp_regressor:",
     "\n    settings:",
+    '\n        backend: "random_forest"',
     "\n        n_estimators: 150",
     '\n        criterion: "squared_error"',
     "\n        max_depth: 50",
@@ -83,13 +94,23 @@ def configuration_RFs(ids, target_dir):
     "\n        verbose: 0",
     "\n        warm_start: false",
     "\n        ccp_alpha: 0.0",
-    "\n        max_samples: null\n\n",
+    "\n        max_samples: null",
+    "\n        hist_gradient_boosting:",
+    "\n            max_iter: 300",
+    "\n            learning_rate: 0.1",
+    "\n            max_leaf_nodes: 63",
+    "\n            min_samples_leaf: 20",
+    "\n            l2_regularization: 0.0",
+    "\n            early_stopping: false",
+    "\n            random_state: 42",
+    "\n            variance_fraction: 0.2\n\n",
     '    features: ["intensity", "length", "width", "skewness", "kurtosis", "slope", "intensity_width_2", "h_max", "impact", "pointing_alt", "pointing_az"]\n\n',
     "    gamma_offaxis:",
     "\n        min: 0.2 deg",
     "\n        max: 0.5 deg\n\n",
     "event_classifier:",
     "\n    settings:",
+    '\n        backend: "random_forest"',
     "\n        n_estimators: 100",
     '\n        criterion: "gini"',
     "\n        max_depth: 100",
@@ -107,7 +128,15 @@ def configuration_RFs(ids, target_dir):
     "\n        warm_start: false",
     "\n        class_weight: null",
     "\n        ccp_alpha: 0.0",
-    "\n        max_samples: null\n\n",
+    "\n        max_samples: null",
+    "\n        hist_gradient_boosting:",
+    "\n            max_iter: 300",
+    "\n            learning_rate: 0.1",
+    "\n            max_leaf_nodes: 63",
+    "\n            min_samples_leaf: 20",
+    "\n            l2_regularization: 0.0",
+    "\n            early_stopping: false",
+    "\n            random_state: 42\n\n",
     '    features: ["intensity", "length", "width", "skewness", "kurtosis", "slope", "intensity_width_2", "h_max", "impact", "pointing_alt", "pointing_az"]\n\n',
     "    gamma_offaxis:",
     "\n        min: 0.2 deg",
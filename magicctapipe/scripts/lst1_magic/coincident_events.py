@@ -13,14 +13,26 @@ event files.
 Usage:
 $ python coincident_events.py
 
+To run the jobs with local processes instead of SLURM, or to
+only show the plan of the jobs without running them:
+$ python coincident_events.py --backend local --n-local-workers 4
+$ python coincident_events.py --dry-run
+
+The data files whose recorded provenance (inputs, configuration and
+version) is up to date are skipped by the jobs. To process all of
+them again:
+$ python coincident_events.py --force
+
 """
 
 import os
+import argparse
 import numpy as np
 import glob
 import yaml
 import logging
 from pathlib import Path
+from magicctapipe.utils.pipeline import Pipeline, add_pipeline_arguments, get_pipeline_backend
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
@@ -81,7 +93,7 @@ def linking_lst(target_dir, LST_runs):
             f.close()
         
      
-def bash_coincident(target_dir):
+def bash_coincident(target_dir, force=False):
 
     """
     This function generates the bashscript for running the coincidence analysis.
@@ -90,7 +102,11 @@ def bash_coincident(target_dir):
     ----------
     target_dir: str
         Path to the working directory
+    force: bool
+        If True, the data files are processed again even if they are up to date
     """
+    
+    force_arg = " --force" if force else ""
 
     process_name = target_dir.split("/")[-2:][1]
     
@@ -115,7 +131,7 @@ def bash_coincident(target_dir):
         f.write("SAMPLE_LIST=($(<$OUTPUTDIR/list_LST.txt))\n")
         f.write("SAMPLE=${SAMPLE_LIST[${SLURM_ARRAY_TASK_ID}]}\n")
         f.write("export LOG=$OUTPUTDIR/coincidence_${SLURM_ARRAY_TASK_ID}.log\n")
-        f.write(f"conda run -n magic-lst python lst1_magic_event_coincidence.py --input-file-lst $SAMPLE --input-dir-magic $INM --output-dir $OUTPUTDIR --config-file {target_dir}/config_coincidence.yaml >$LOG 2>&1")
+        f.write(f"conda run -n magic-lst python lst1_magic_event_coincidence.py --input-file-lst $SAMPLE --input-dir-magic $INM --output-dir $OUTPUTDIR --config-file {target_dir}/config_coincidence.yaml{force_arg} >$LOG 2>&1")
         f.close()
         
 
@@ -126,6 +142,15 @@ def main():
     Here we read the config_general.yaml file and call the functions defined above.
     """
     
+    parser = argparse.ArgumentParser()
+    add_pipeline_arguments(parser)
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Process the data files again even if they are up to date",
+    )
+    args = parser.parse_args()
     
     with open("config_general.yaml", "rb") as f:   # "rb" mode opens the file in binary format for reading
         config = yaml.safe_load(f)
@@ -146,24 +171,21 @@ def main():
     
     
     print("***** Generating the bashscript...")
-    bash_coincident(target_dir)
+    bash_coincident(target_dir, args.force)
     
     
     print("***** Submitting processess to the cluster...")
     print("Process name: "+target_dir.split("/")[-2:][1]+"_coincidence")
     print("To check the jobs submitted to the cluster, type: squeue -n "+target_dir.split("/")[-2:][1]+"_coincidence")
     
-    #Below we run the bash scripts to find the coincident events
+    #Below we run the bash scripts to find the coincident events. The nights are independent, so they run in parallel
     list_of_coincidence_scripts = np.sort(glob.glob("LST_coincident*.sh"))
     
-    for n,run in enumerate(list_of_coincidence_scripts):
-        if n == 0:
-            launch_jobs =  f"coincidence{n}=$(sbatch --parsable {run})"
-        else:
-            launch_jobs = launch_jobs + f" && coincidence{n}=$(sbatch --parsable --dependency=afterany:$coincidence{n-1} {run})"
+    pipeline = Pipeline(target_dir.split("/")[-2:][1]+"_coincidence")
+    for run in list_of_coincidence_scripts:
+        pipeline.add_task(run[0:-3], run)
     
-    #print(launch_jobs)
-    os.system(launch_jobs)
+    pipeline.run(get_pipeline_backend(args), dry_run=args.dry_run)
 
 if __name__ == "__main__":
     main()
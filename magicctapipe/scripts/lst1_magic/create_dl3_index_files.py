@@ -5,26 +5,286 @@
 This script creates DL3 index files, i.e., the HDU and observation index
 files. They will be saved in the same directory as the input DL3 files.
 
+Only the headers of the HDUs listed in the index files are read from the
+input files, streaming the gzip-compressed files without decompressing
+the data into memory, and the files are read with a pool of threads.
+
+With `--update`, the existing index files are updated incrementally, i.e.,
+the headers are read only from the files which are new or changed since
+the index files were created, based on the sizes and modification times
+recorded in the HDU index file. The entries of the removed files are
+dropped from the index files.
+
 Usage:
 $ conda run -n magic-lst python create_dl3_index_files.py --input-dir ./CrabTeste/DL3
+(--update)
+(--n-workers 8)
 """
 
 import argparse
+import concurrent.futures
+import functools
 import glob
+import gzip
 import logging
+import os
 import time
 from pathlib import Path
 
-from lstchain.high_level import create_hdu_index_hdu, create_obs_index_hdu
+import numpy as np
+from astropy import units as u
+from astropy.io import fits
+from astropy.table import QTable, Table
+from astropy.time import Time
+from magicctapipe import __version__
 
-__all__ = ["create_dl3_index_files"]
+__all__ = ["read_fits_headers", "create_dl3_index_files"]
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# The size of the FITS blocks and header cards in bytes
+FITS_BLOCK_SIZE = 2880
+FITS_CARD_SIZE = 80
+
+# The HDUs which every DL3 data file has
+DL3_HDU_NAMES = ["EVENTS", "GTI", "POINTING"]
+
+# The IRF HDUs which are listed in the HDU index file if they exist
+IRF_HDU_NAMES = ["EFFECTIVE AREA", "ENERGY DISPERSION", "BACKGROUND", "PSF", "RAD_MAX"]
+
+# The columns of the observation index file with their units
+OBS_INDEX_UNITS = {
+    "RA_PNT": u.deg,
+    "DEC_PNT": u.deg,
+    "ZEN_PNT": u.deg,
+    "ALT_PNT": u.deg,
+    "AZ_PNT": u.deg,
+    "RA_OBJ": u.deg,
+    "DEC_OBJ": u.deg,
+    "TSTART": u.s,
+    "TSTOP": u.s,
+    "ONTIME": u.s,
+    "TELAPSE": u.s,
+    "LIVETIME": u.s,
+}
+
+# The cards of the events header copied to the observation index file
+OBS_INDEX_KEYS = [
+    "OBS_ID",
+    "DATE-OBS",
+    "TIME-OBS",
+    "DATE-END",
+    "TIME-END",
+    "RA_PNT",
+    "DEC_PNT",
+    "ZEN_PNT",
+    "ALT_PNT",
+    "AZ_PNT",
+    "RA_OBJ",
+    "DEC_OBJ",
+    "TSTART",
+    "TSTOP",
+    "ONTIME",
+    "TELAPSE",
+    "LIVETIME",
+    "DEADC",
+    "OBJECT",
+    "OBS_MODE",
+    "N_TELS",
+    "TELLIST",
+    "INSTRUME",
+]
+
+
+def read_fits_headers(input_file, hdu_names):
+    """
+    Reads the headers of given HDUs from a FITS file, which can be
+    gzip-compressed. The file is read as a stream, skipping the data of
+    the HDUs, until all the given HDUs are found.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an input FITS file
+    hdu_names: list
+        Names of the HDUs whose headers are read
+
+    Returns
+    -------
+    headers: dict
+        Headers of the HDUs found in the input file
+    """
+
+    headers = {}
+
+    opener = gzip.open if str(input_file).endswith(".gz") else open
+
+    with opener(input_file, "rb") as f_in:
+        while len(headers) < len(hdu_names):
+            # Read the header blocks until the END card is found
+            header_blocks = []
+            is_end = False
+
+            while not is_end:
+                block = f_in.read(FITS_BLOCK_SIZE)
+
+                if len(block) < FITS_BLOCK_SIZE:
+                    # Reached the end of the file
+                    return headers
+
+                header_blocks.append(block)
+
+                is_end = any(
+                    block[i_card : i_card + 8] == b"END     "
+                    for i_card in range(0, FITS_BLOCK_SIZE, FITS_CARD_SIZE)
+                )
+
+            header = fits.Header.fromstring(b"".join(header_blocks).decode("ascii"))
+            hdu_name = header.get("EXTNAME", "PRIMARY")
+
+            if hdu_name in hdu_names:
+                headers[hdu_name] = header
+
+            # Skip the data of the HDU, including the padding
+            n_axes = header.get("NAXIS", 0)
+            n_elements = np.prod([header[f"NAXIS{i}"] for i in range(1, n_axes + 1)])
+
+            data_size = (
+                abs(header["BITPIX"]) // 8
+                * header.get("GCOUNT", 1)
+                * (header.get("PCOUNT", 0) + (n_elements if n_axes > 0 else 0))
+            )
+
+            n_blocks = int(np.ceil(data_size / FITS_BLOCK_SIZE))
+            f_in.seek(n_blocks * FITS_BLOCK_SIZE, os.SEEK_CUR)
+
+    return headers
+
+
+def _read_index_entries(input_dir, file_name):
+    """
+    Reads the headers of a DL3 data file and gets its entries of the
+    HDU and observation index files, or `None` if the file is corrupted.
+    """
+
+    input_file = Path(input_dir) / file_name
+
+    try:
+        headers = read_fits_headers(input_file, DL3_HDU_NAMES + IRF_HDU_NAMES)
+        evt_hdr = headers["EVENTS"]
+
+        for hdu_name in DL3_HDU_NAMES:
+            # Just test they are here
+            headers[hdu_name]
+
+        obs_entry = {key: evt_hdr[key] for key in OBS_INDEX_KEYS if key != "ZEN_PNT"}
+        obs_entry["ZEN_PNT"] = 90 - float(evt_hdr["ALT_PNT"])
+
+    except Exception:
+        logger.exception(f"FITS corrupted for file {file_name}:")
+        return None
+
+    file_stat = input_file.stat()
+
+    hdu_entries = []
+
+    for hdu_name in DL3_HDU_NAMES + IRF_HDU_NAMES:
+        if hdu_name not in headers:
+            logger.warning(f"Run {evt_hdr['OBS_ID']} does not contain HDU {hdu_name}")
+            continue
+
+        if hdu_name in DL3_HDU_NAMES:
+            hdu_class = hdu_name.lower()
+            hdu_type = hdu_class
+        else:
+            hdu_class = headers[hdu_name]["HDUCLAS4"].lower()
+            hdu_type = hdu_class.rsplit("_", 1)[0]
+
+        hdu_entries.append(
+            {
+                "OBS_ID": evt_hdr["OBS_ID"],
+                "HDU_TYPE": hdu_type,
+                "HDU_CLASS": hdu_class,
+                "FILE_DIR": ".",
+                "FILE_NAME": file_name,
+                "HDU_NAME": hdu_name,
+                "SIZE": file_stat.st_size,
+                "MTIME": file_stat.st_mtime_ns,
+            }
+        )
+
+    index_header = {
+        "INSTRUME": evt_hdr["INSTRUME"],
+        "MJDREFI": evt_hdr["MJDREFI"],
+        "MJDREFF": evt_hdr["MJDREFF"],
+    }
+
+    return obs_entry, hdu_entries, index_header
+
+
+def _load_index_entries(hdu_index_file, obs_index_file):
+    """
+    Loads the entries of existing HDU and observation index files, with
+    the keys of the file names, and the header of the index files.
+    """
+
+    hdu_index = Table.read(hdu_index_file, hdu="HDU INDEX")
+    obs_index = Table.read(obs_index_file, hdu="OBS INDEX")
+
+    if "MTIME" not in hdu_index.colnames:
+        logger.info("\nThe existing index files do not record the modification times")
+        return {}, None
+
+    obs_entries = {
+        row["OBS_ID"]: dict(zip(obs_index.colnames, row)) for row in obs_index
+    }
+
+    index_entries = {}
+
+    for row in hdu_index:
+        hdu_entry = dict(zip(hdu_index.colnames, row))
+        file_name = hdu_entry["FILE_NAME"]
+
+        if file_name not in index_entries:
+            index_entries[file_name] = (obs_entries[hdu_entry["OBS_ID"]], [])
+
+        index_entries[file_name][1].append(hdu_entry)
+
+    obs_header = fits.getheader(obs_index_file, "OBS INDEX")
+
+    index_header = {
+        "INSTRUME": obs_header["INSTRUME"],
+        "MJDREFI": obs_header["MJDREFI"],
+        "MJDREFF": obs_header["MJDREFF"],
+    }
+
+    return index_entries, index_header
+
+
+def _get_index_header(index_header, hdu_class):
+    """
+    Gets the header of an index file.
+    """
+
+    header = fits.Header()
+
+    header["CREATOR"] = f"magicctapipe v{__version__}"
+    header["HDUDOC"] = "https://github.com/open-gamma-ray-astro/gamma-astro-data-formats"
+    header["HDUVERS"] = "0.2"
+    header["HDUCLASS"] = "GADF"
+    header["ORIGIN"] = "CTA"
+    header["TELESCOP"] = "CTA-N"
+    header["CREATED"] = Time.now().utc.iso
+    header["HDUCLAS1"] = "INDEX"
+    header["HDUCLAS2"] = hdu_class
+    header["INSTRUME"] = index_header["INSTRUME"]
+
+    return header
+
 
-def create_dl3_index_files(input_dir):
+def create_dl3_index_files(input_dir, update=False, n_workers=1):
     """
     Creates DL3 index files.
 
@@ -32,11 +292,18 @@ def create_dl3_index_files(input_dir):
     ----------
     input_dir: str
         Path to a directory where input DL3 data files are stored
+    update: bool
+        If `True`, the existing index files are updated incrementally,
+        reading only the files which are new or changed
+    n_workers: int
+        Number of the threads reading the input files
 
     Raises
     ------
     FileNotFoundError
         If any DL3 data files are not found in the input directory
+    RuntimeError
+        If none of the DL3 data files could be read
     """
 
     # Find the input files
@@ -62,25 +329,112 @@ def create_dl3_index_files(input_dir):
         input_file_name = Path(input_file).name
         file_names.append(input_file_name)
 
+    hdu_index_file = f"{input_dir}/hdu-index.fits.gz"
+    obs_index_file = f"{input_dir}/obs-index.fits.gz"
+
+    # Find the entries which are already in the index files and whose
+    # files are not changed since then
+    index_entries = {}
+    index_header = None
+
+    if update and Path(hdu_index_file).exists() and Path(obs_index_file).exists():
+        existing_entries, index_header = _load_index_entries(
+            hdu_index_file, obs_index_file
+        )
+
+        for file_name, (obs_entry, hdu_entries) in existing_entries.items():
+            if file_name not in file_names:
+                continue
+
+            file_stat = (Path(input_dir) / file_name).stat()
+
+            is_unchanged = all(
+                (entry["SIZE"] == file_stat.st_size)
+                and (entry["MTIME"] == file_stat.st_mtime_ns)
+                for entry in hdu_entries
+            )
+
+            if is_unchanged:
+                index_entries[file_name] = (obs_entry, hdu_entries)
+
+    new_file_names = [name for name in file_names if name not in index_entries]
+
+    logger.info(
+        f"\nReading {len(new_file_names)} files "
+        f"({len(index_entries)} files are already indexed)..."
+    )
+
+    # Read the headers of the new files
+    read_entries = functools.partial(_read_index_entries, input_dir)
+
+    with concurrent.futures.ThreadPoolExecutor(n_workers) as executor:
+        new_entries = list(executor.map(read_entries, new_file_names))
+
+    for file_name, entries in zip(new_file_names, new_entries):
+        if entries is None:
+            continue
+
+        obs_entry, hdu_entries, index_header = entries
+        index_entries[file_name] = (obs_entry, hdu_entries)
+
+    if len(index_entries) == 0:
+        raise RuntimeError("Could not read any DL3 data files.")
+
     # Create the DL3 index files
     logger.info("\nCreating DL3 index files...")
 
-    hdu_index_file = f"{input_dir}/hdu-index.fits.gz"
-    obs_index_file = f"{input_dir}/obs-index.fits.gz"
+    obs_rows = []
+    hdu_rows = []
+
+    for file_name in file_names:
+        if file_name in index_entries:
+            obs_entry, hdu_entries = index_entries[file_name]
+
+            obs_rows.append(obs_entry)
+            hdu_rows.extend(hdu_entries)
 
-    create_hdu_index_hdu(
-        filename_list=file_names,
-        fits_dir=Path(input_dir),
-        hdu_index_file=Path(hdu_index_file),
-        overwrite=True,
+    obs_index_table = QTable(
+        rows=[[row[key] for key in OBS_INDEX_KEYS] for row in obs_rows],
+        names=OBS_INDEX_KEYS,
     )
 
-    create_obs_index_hdu(
-        filename_list=file_names,
-        fits_dir=Path(input_dir),
-        obs_index_file=Path(obs_index_file),
-        overwrite=True,
+    for key, unit in OBS_INDEX_UNITS.items():
+        obs_index_table[key] = u.Quantity(obs_index_table[key], unit=unit)
+
+    hdu_index_keys = list(hdu_rows[0].keys())
+    hdu_index_table = Table(
+        rows=[[row[key] for key in hdu_index_keys] for row in hdu_rows],
+        names=hdu_index_keys,
+    )
+
+    obs_index_header = _get_index_header(index_header, "OBS")
+    obs_index_header["MJDREFI"] = index_header["MJDREFI"]
+    obs_index_header["MJDREFF"] = index_header["MJDREFF"]
+
+    hdu_index_header = _get_index_header(index_header, "HDU")
+    hdu_index_header["BASE_DIR"] = str(Path(input_dir).absolute().resolve())
+
+    hdu_index = fits.BinTableHDU(
+        hdu_index_table, header=hdu_index_header, name="HDU INDEX"
     )
+    obs_index = fits.BinTableHDU(
+        obs_index_table, header=obs_index_header, name="OBS INDEX"
+    )
+
+    # Write the files under temporary names and rename them, so that the
+    # index files are never read while being written, also when several
+    # jobs update them at the same time
+    for index_hdu, index_file in zip(
+        [hdu_index, obs_index], [hdu_index_file, obs_index_file]
+    ):
+        index_file_tmp = f"{input_dir}/tmp{os.getpid()}_{Path(index_file).name}"
+
+        index_list = fits.HDUList([fits.PrimaryHDU(), index_hdu])
+        index_list.writeto(index_file_tmp, overwrite=True)
+
+        os.replace(index_file_tmp, index_file)
+
+    logger.info(f"\nOutput files:\n{hdu_index_file}\n{obs_index_file}")
 
 
 def main():
@@ -97,10 +451,27 @@ def main():
         help="Path to a directory where input DL3 files are stored",
     )
 
+    parser.add_argument(
+        "--update",
+        "-u",
+        dest="update",
+        action="store_true",
+        help="Update the existing index files with the new or changed DL3 files",
+    )
+
+    parser.add_argument(
+        "--n-workers",
+        "-n",
+        dest="n_workers",
+        type=int,
+        default=1,
+        help="Number of threads reading the DL3 files",
+    )
+
     args = parser.parse_args()
 
     # Create the index files
-    create_dl3_index_files(args.input_dir)
+    create_dl3_index_files(args.input_dir, args.update, args.n_workers)
 
     logger.info("\nDone.")
 
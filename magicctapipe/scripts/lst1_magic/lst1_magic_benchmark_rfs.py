@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This script compares the estimator backends of the energy regressors,
+DISP regressors and event classifiers, i.e., the RFs and the
+histogram-based gradient boosting estimators. The input DL1-stereo
+events are split into training and test samples at random, and the
+training time, inference time and performance on the test samples are
+shown telescope-wise for every backend.
+
+The settings of both backends are taken from the estimator settings in
+the configuration file, i.e., those of the RFs and of the
+`hist_gradient_boosting` section. If the section does not exist, the
+default settings of the gradient boosting backend defined in this
+script are used.
+
+If the `--use-unsigned` argument is given, the estimators are trained
+with unsigned features, as done by `lst1_magic_train_rfs.py`.
+
+The IRF-level performance can be compared by processing the same MC
+test samples to DL2 with both backends and creating the IRFs with the
+script `lst1_magic_create_irf.py`.
+
+Usage:
+$ python lst1_magic_benchmark_rfs.py
+--input-dir-gamma dl1_stereo/gamma
+(--input-dir-proton dl1_stereo/proton)
+(--config-file config.yaml)
+(--test-fraction 0.5)
+(--use-unsigned)
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import yaml
+from magicctapipe.io import format_object, load_train_data_files_tel, telescope_combinations
+from magicctapipe.reco import DispRegressor, EnergyRegressor, EventClassifier
+from sklearn.metrics import roc_auc_score
+
+__all__ = ["split_train_test_events", "benchmark_estimator"]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# True event class of gamma and proton MCs
+EVENT_CLASS_GAMMA = 0
+EVENT_CLASS_PROTON = 1
+
+# The random seed used when splitting the input events
+RANDOM_SEED = 1000
+
+# The default settings of the gradient boosting backend
+SETTINGS_HIST_GRADIENT_BOOSTING = {
+    "max_iter": 300,
+    "learning_rate": 0.1,
+    "max_leaf_nodes": 63,
+    "min_samples_leaf": 20,
+    "early_stopping": False,
+    "random_state": 42,
+}
+
+
+def split_train_test_events(event_data, test_fraction, random_state=None):
+    """
+    Splits shower events into training and test samples at random.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame
+        Data frame of shower events
+    test_fraction: float
+        Fraction of the events used for the test sample
+    random_state: int
+        Seed of the random number generator
+
+    Returns
+    -------
+    df_train: pandas.core.frame.DataFrame
+        Data frame of the training events
+    df_test: pandas.core.frame.DataFrame
+        Data frame of the test events
+    """
+
+    rng = np.random.default_rng(random_state)
+
+    # Split per shower event, so that all its telescope rows are kept
+    event_codes, event_keys = pd.factorize(event_data.index)
+    is_test = rng.random(len(event_keys))[event_codes] < test_fraction
+
+    df_train = event_data[~is_test]
+    df_test = event_data[is_test]
+
+    return df_train, df_test
+
+
+def benchmark_estimator(estimator, df_train, df_test, target):
+    """
+    Trains and applies an estimator and evaluates its performance.
+
+    Parameters
+    ----------
+    estimator: magicctapipe.reco.estimator
+        Regressor or classifier to be benchmarked
+    df_train: pandas.core.frame.DataFrame
+        Data frame of the training events
+    df_test: pandas.core.frame.DataFrame
+        Data frame of the test events
+    target: str
+        Type of the target - "energy", "disp" or "gammaness"
+
+    Returns
+    -------
+    results: dict
+        Training time, inference time and performance of the estimator
+    """
+
+    start_time = time.time()
+    estimator.fit(df_train)
+    train_time = time.time() - start_time
+
+    start_time = time.time()
+    reco_params = estimator.predict(df_test)
+    inference_time = time.time() - start_time
+
+    df_test = df_test.loc[reco_params.index]
+
+    results = {
+        "training time": f"{train_time:.1f} [sec]",
+        "inference time": f"{inference_time:.1f} [sec]",
+    }
+
+    if target == "energy":
+        log_ratio = np.log10(reco_params["reco_energy"] / df_test["true_energy"])
+
+        results["bias (log10)"] = f"{np.median(log_ratio):.4f}"
+        results["resolution (log10)"] = f"{np.percentile(np.abs(log_ratio), 68):.4f}"
+        results["mean variance"] = f"{reco_params['reco_energy_var'].mean():.3g}"
+
+    elif target == "disp":
+        disp_diff = reco_params["reco_disp"] - df_test["true_disp"]
+
+        results["bias [deg]"] = f"{np.median(disp_diff):.4f}"
+        results["resolution [deg]"] = f"{np.percentile(np.abs(disp_diff), 68):.4f}"
+        results["mean variance"] = f"{reco_params['reco_disp_var'].mean():.3g}"
+
+    elif target == "gammaness":
+        is_gamma = df_test["true_event_class"] == EVENT_CLASS_GAMMA
+        roc_auc = roc_auc_score(is_gamma, reco_params["gammaness"])
+
+        results["ROC AUC"] = f"{roc_auc:.4f}"
+
+    return results
+
+
+def main():
+
+    start_time = time.time()
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--input-dir-gamma",
+        "-g",
+        dest="input_dir_gamma",
+        type=str,
+        required=True,
+        help="Path to a directory where input gamma MC data files are stored",
+    )
+
+    parser.add_argument(
+        "--input-dir-proton",
+        "-p",
+        dest="input_dir_proton",
+        type=str,
+        help="Path to a directory where input proton MC data files are stored",
+    )
+
+    parser.add_argument(
+        "--config-file",
+        "-c",
+        dest="config_file",
+        type=str,
+        default="./config.yaml",
+        help="Path to a configuration file",
+    )
+
+    parser.add_argument(
+        "--test-fraction",
+        "-t",
+        dest="test_fraction",
+        type=float,
+        default=0.5,
+        help="Fraction of the input events used for the test samples",
+    )
+
+    parser.add_argument(
+        "--use-unsigned",
+        dest="use_unsigned",
+        action="store_true",
+        help="Use unsigned features for training the estimators",
+    )
+
+    args = parser.parse_args()
+
+    with open(args.config_file, "rb") as f:
+        config = yaml.safe_load(f)
+
+    TEL_NAMES, _ = telescope_combinations(config)
+
+    # Load the input files
+    logger.info(f"\nInput gamma MC directory: {args.input_dir_gamma}")
+
+    compact = config.get("compact_dtypes", False)
+
+    event_data_gamma = load_train_data_files_tel(
+        args.input_dir_gamma,
+        config,
+        true_event_class=EVENT_CLASS_GAMMA,
+        compact=compact,
+    )
+
+    event_data_proton = {}
+
+    if args.input_dir_proton is not None:
+        logger.info(f"\nInput proton MC directory: {args.input_dir_proton}")
+
+        event_data_proton = load_train_data_files_tel(
+            args.input_dir_proton,
+            config,
+            true_event_class=EVENT_CLASS_PROTON,
+            compact=compact,
+        )
+
+    estimator_types = [
+        ("energy_regressor", EnergyRegressor, "energy"),
+        ("disp_regressor", DispRegressor, "disp"),
+        ("event_classifier", EventClassifier, "gammaness"),
+    ]
+
+    for config_key, estimator_class, target in estimator_types:
+        config_rf = config[config_key]
+
+        settings = config_rf["settings"]
+
+        settings_gb = settings.get(
+            "hist_gradient_boosting", SETTINGS_HIST_GRADIENT_BOOSTING
+        )
+
+        backends = {
+            "random_forest": dict(settings, backend="random_forest"),
+            "hist_gradient_boosting": dict(
+                settings,
+                backend="hist_gradient_boosting",
+                hist_gradient_boosting=settings_gb,
+            ),
+        }
+
+        for tel_id, df_gamma in event_data_gamma.items():
+            df_events = df_gamma
+
+            if target == "gammaness":
+                if tel_id not in event_data_proton:
+                    continue
+
+                df_events = pd.concat([df_gamma, event_data_proton[tel_id]])
+
+            df_train, df_test = split_train_test_events(
+                df_events, args.test_fraction, RANDOM_SEED
+            )
+
+            for backend, backend_settings in backends.items():
+                estimator = estimator_class(
+                    TEL_NAMES,
+                    backend_settings,
+                    config_rf["features"],
+                    use_unsigned_features=args.use_unsigned,
+                )
+
+                results = benchmark_estimator(estimator, df_train, df_test, target)
+
+                logger.info(f"\n{config_key}, {TEL_NAMES[tel_id]}, {backend}:")
+                logger.info(format_object(results))
+
+    logger.info("\nDone.")
+
+    process_time = time.time() - start_time
+    logger.info(f"\nProcess time: {process_time:.0f} [sec]\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,29 @@ There are two types of gammaness and theta cuts, "global" and "dynamic".
 In case of the dynamic cuts, the optimal cut satisfying a given
 efficiency will be calculated for every energy bin.
 
+With `--cut-scan`, the IRFs are created for all the combinations of the
+gammaness and theta cuts listed in the `cut_scan` section of the
+configuration file. The input events are loaded and binned only once,
+and the cut configurations are processed with a pool of `--n-workers`
+processes, creating one output file per configuration.
+
+With `--input-dir`, the gamma, proton and electron MC DL2 data files of
+many pointing directions stored in a directory are paired by their
+pointings, and the IRFs of all the pointing nodes are created with a
+pool of `--n-workers` processes. A manifest listing the output files is
+saved in the output directory, which is then used by the DL2-to-DL3
+conversion to find the IRFs. The proton and electron files are then
+found in the directory, so `--input-file-proton` and
+`--input-file-electron` are allowed only with `--input-file-gamma`.
+
+With `--output-file-cube`, a histogram cube of the input events is saved
+instead of the IRFs, and with `--input-file-cube` the IRFs are derived
+from the cube without the events (also with `--cut-scan`). The IRFs
+derived from the cube are the same as those derived from the events
+with the global cuts at the bin edges of the cube (e.g. the gammaness
+cuts given with two decimals) and with the dynamic gammaness cuts. The
+dynamic theta cuts are rounded to the theta bin edges of the cube.
+
 Usage:
 $ python lst1_magic_create_irf.py
 --input-file-gamma dl2/dl2_gamma_40deg_90deg.h5
@@ -39,6 +62,28 @@ $ python lst1_magic_create_irf.py
 (--input-file-electron dl2/dl2_electron_40deg_90deg.h5)
 (--output-dir irf)
 (--config-file config.yaml)
+(--cut-scan --n-workers 8)
+
+Or, for a grid of pointing directions:
+$ python lst1_magic_create_irf.py
+--input-dir dl2
+(--output-dir irf)
+(--config-file config.yaml)
+(--n-workers 8)
+
+Or, with a histogram cube:
+$ python lst1_magic_create_irf.py
+--input-file-gamma dl2/dl2_gamma_40deg_90deg.h5
+(--input-file-proton dl2/dl2_proton_40deg_90deg.h5)
+(--input-file-electron dl2/dl2_electron_40deg_90deg.h5)
+--output-file-cube irf/cube_40deg_90deg.h5
+(--config-file config.yaml)
+
+$ python lst1_magic_create_irf.py
+--input-file-cube irf/cube_40deg_90deg.h5
+(--output-dir irf)
+(--config-file config.yaml)
+(--cut-scan --n-workers 8)
 
 Broader usage:
 This script is called automatically from the script "IRF.py".
@@ -46,7 +91,11 @@ If you want to analyse a target, this is the way to go. See this other script fo
 """
 
 import argparse
+import functools
+import glob
+import itertools
 import logging
+import multiprocessing
 import operator
 import time
 from pathlib import Path
@@ -54,10 +103,29 @@ from pathlib import Path
 import numpy as np
 import yaml
 from astropy import units as u
+from astropy.coordinates import Angle
 from astropy.io import fits
 from astropy.table import QTable, vstack
-from magicctapipe.io import create_gh_cuts_hdu, format_object, load_mc_dl2_data_file
-from pyirf.cuts import calculate_percentile_cut, evaluate_binned_cut
+from magicctapipe.irfs import (
+    background_2d_from_cube,
+    calculate_percentile_cut_from_cube,
+    create_irf_cube,
+    effective_area_from_cube,
+    energy_dispersion_from_cube,
+    evaluate_cut_from_cube,
+    load_irf_cube,
+    psf_table_from_cube,
+    save_irf_cube,
+)
+from magicctapipe.io import (
+    create_gh_cuts_hdu,
+    format_object,
+    load_mc_dl2_data_file,
+    read_event_data,
+    save_irf_manifest,
+)
+from pyirf.binning import calculate_bin_indices
+from pyirf.cuts import calculate_percentile_cut
 from pyirf.io.gadf import (
     create_aeff2d_hdu,
     create_background_2d_hdu,
@@ -79,18 +147,36 @@ from pyirf.spectral import (
     calculate_event_weights,
 )
 
-__all__ = ["create_irf"]
+__all__ = [
+    "load_irf_inputs",
+    "create_irf_hdus",
+    "create_irf",
+    "get_cut_configurations",
+    "create_irf_scan",
+    "scan_irf_cuts",
+    "create_irf_cube_file",
+    "load_irf_cube_inputs",
+    "create_irf_from_cube",
+    "find_irf_grid_nodes",
+    "create_irf_grid",
+]
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# The particle types of the MC DL2 data files, identified by the file names
+MC_PARTICLE_TYPES = ["gamma", "proton", "electron"]
 
-def create_irf(
-    input_file_gamma, input_file_proton, input_file_electron, output_dir, config
-):
+
+def load_irf_inputs(input_file_gamma, input_file_proton, input_file_electron, config):
     """
-    Processes MC DL2 events and creates the IRFs.
+    Loads MC DL2 events and prepares the bins and header keywords for
+    creating the IRFs, which are shared by any cut configurations.
+
+    The reconstructed energy bin of every event is computed here once,
+    so that the gammaness and theta cuts of any configurations are
+    evaluated without binning the events again.
 
     Parameters
     ----------
@@ -100,17 +186,19 @@ def create_irf(
         Path to an input proton MC DL2 data file
     input_file_electron: str
         Path to an input electron MC DL2 data file
-    output_dir: str
-        Path to a directory where to save an output IRF file
     config: dict
         Configuration for the LST-1 + MAGIC analysis
 
+    Returns
+    -------
+    irf_inputs: dict
+        Event tables, simulation information, bins and header keywords
+        used to create the IRFs
+
     Raises
     ------
     RuntimeError
         If the pointing direction does not match between the input MCs
-    ValueError
-        If the input type of gammaness or theta cut is not known
     """
 
     config_irf = config["create_irf"]
@@ -118,16 +206,33 @@ def create_irf(
     quality_cuts = config_irf["quality_cuts"]
     event_type = config_irf["event_type"]
     weight_type_dl2 = config_irf["weight_type_dl2"]
+    compact = config.get("compact_dtypes", False)
+
+    cache_dir = config_irf.get("cache_dir")
+    cache_max_size = config_irf.get("cache_max_size")
+
+    if cache_max_size is not None:
+        cache_max_size = int(u.Quantity(cache_max_size).to_value("byte"))
 
     logger.info(f"\nQuality cuts: {quality_cuts}")
     logger.info(f"Event type: {event_type}")
     logger.info(f"DL2 weight type: {weight_type_dl2}")
 
+    if cache_dir is not None:
+        logger.info(f"Cache directory: {cache_dir}")
+
     # Load the input gamma MC DL2 data file
     logger.info(f"\nInput gamma MC DL2 data file: {input_file_gamma}")
 
     event_table_gamma, pnt_gamma, sim_info_gamma = load_mc_dl2_data_file(
-        config, input_file_gamma, quality_cuts, event_type, weight_type_dl2
+        config,
+        input_file_gamma,
+        quality_cuts,
+        event_type,
+        weight_type_dl2,
+        compact=compact,
+        cache_dir=cache_dir,
+        cache_max_size=cache_max_size,
     )
 
     is_diffuse_mc = sim_info_gamma.viewcone.to_value("deg") > 0
@@ -194,13 +299,21 @@ def create_irf(
         )
 
     event_table_bkg = QTable()
+    obs_time = None
 
     if not is_point_like and is_bkg_mc:
         # Load the input proton MC DL2 data file
         logger.info(f"\nInput proton MC DL2 data file: {input_file_proton}")
 
         event_table_proton, pnt_proton, sim_info_proton = load_mc_dl2_data_file(
-            config, input_file_proton, quality_cuts, event_type, weight_type_dl2
+            config,
+            input_file_proton,
+            quality_cuts,
+            event_type,
+            weight_type_dl2,
+            compact=compact,
+            cache_dir=cache_dir,
+            cache_max_size=cache_max_size,
         )
 
         if any(pnt_proton != pnt_gamma):
@@ -213,7 +326,14 @@ def create_irf(
         logger.info(f"\nInput electron MC DL2 data file: {input_file_electron}")
 
         event_table_electron, pnt_electron, sim_info_electron = load_mc_dl2_data_file(
-            config, input_file_electron, quality_cuts, event_type, weight_type_dl2
+            config,
+            input_file_electron,
+            quality_cuts,
+            event_type,
+            weight_type_dl2,
+            compact=compact,
+            cache_dir=cache_dir,
+            cache_max_size=cache_max_size,
         )
 
         if any(pnt_electron != pnt_gamma):
@@ -269,6 +389,9 @@ def create_irf(
         config_mig_bins["start"], config_mig_bins["stop"], config_mig_bins["n_edges"]
     )
 
+    source_offset_bins = None
+    bkg_fov_offset_bins = None
+
     if not is_point_like:
         config_src_bins = config_irf["source_offset_bins"]
 
@@ -299,6 +422,17 @@ def create_irf(
                 num=config_bkg_bins["n_edges"],
             )
 
+    # Compute the reconstructed energy bins of the events, with the same
+    # convention as `pyirf.binning.calculate_bin_indices`
+    event_table_gamma["reco_energy_bin"] = calculate_bin_indices(
+        event_table_gamma["reco_energy"], energy_bins
+    )
+
+    if is_bkg_mc and (len(event_table_bkg) > 0):
+        event_table_bkg["reco_energy_bin"] = calculate_bin_indices(
+            event_table_bkg["reco_energy"], energy_bins
+        )
+
     extra_header = {
         "TELESCOP": "CTA-N",
         "INSTRUME": "LST-1_MAGIC",
@@ -315,10 +449,223 @@ def create_irf(
     if is_bkg_mc:
         extra_header["IRF_OBST"] = (obs_time.to_value("h"), "h")
 
+    irf_inputs = {
+        "event_table_gamma": event_table_gamma,
+        "event_table_bkg": event_table_bkg,
+        "sim_info_gamma": sim_info_gamma,
+        "pointing": pnt_gamma,
+        "event_type": event_type,
+        "is_diffuse_mc": is_diffuse_mc,
+        "is_point_like": is_point_like,
+        "is_bkg_mc": is_bkg_mc,
+        "obs_time": obs_time,
+        "energy_bins": energy_bins,
+        "migration_bins": migration_bins,
+        "fov_offset_bins": fov_offset_bins,
+        "source_offset_bins": source_offset_bins,
+        "bkg_fov_offset_bins": bkg_fov_offset_bins,
+        "extra_header": extra_header,
+    }
+
+    return irf_inputs
+
+
+def evaluate_binned_cut_indices(values, bin_indices, cut_table, op):
+    """
+    Evaluates binned cuts on events whose bin indices are already
+    computed, as done by `pyirf.cuts.evaluate_binned_cut`.
+
+    Parameters
+    ----------
+    values: numpy.ndarray or astropy.units.quantity.Quantity
+        Values on which the cuts are evaluated
+    bin_indices: numpy.ndarray
+        Bin indices of the events
+    cut_table: astropy.table.table.QTable
+        Table of the binned cuts, with the column `cut`
+    op: callable
+        Function comparing the values and cuts element-wise
+
+    Returns
+    -------
+    mask: numpy.ndarray
+        Mask of the events surviving the cuts
+    """
+
+    mask = op(values, cut_table["cut"][np.asarray(bin_indices)])
+
+    return mask
+
+
+def calculate_cut_table(
+    event_table,
+    param,
+    energy_bins,
+    fill_value,
+    percentile,
+    min_value,
+    max_value,
+    irf_cube=None,
+):
+    """
+    Calculates the dynamic cuts in reconstructed energy bins, either
+    with the events or with the cells of a histogram cube.
+
+    Parameters
+    ----------
+    event_table: astropy.table.table.QTable or pandas.core.frame.DataFrame
+        Table of the gamma events, or the cells of the gamma cube
+    param: str
+        Parameter of the cuts, "gammaness" or "theta"
+    energy_bins: astropy.units.quantity.Quantity
+        Edges of the reconstructed energy bins
+    fill_value: float or astropy.units.quantity.Quantity
+        Value for the bins with too few events
+    percentile: float
+        Percentile of the parameter computed in every bin
+    min_value: float or astropy.units.quantity.Quantity
+        Minimum cut value
+    max_value: float or astropy.units.quantity.Quantity
+        Maximum cut value
+    irf_cube: dict
+        Histogram cube of the cells (If None, the events are given)
+
+    Returns
+    -------
+    cut_table: astropy.table.table.QTable
+        Table of the cuts in the reconstructed energy bins
+    """
+
+    if irf_cube is not None:
+        cut_table = calculate_percentile_cut_from_cube(
+            cells=event_table,
+            irf_cube=irf_cube,
+            param=param,
+            percentile=percentile,
+            fill_value=fill_value,
+            min_value=min_value,
+            max_value=max_value,
+        )
+
+    else:
+        cut_table = calculate_percentile_cut(
+            values=event_table[param],
+            bin_values=event_table["reco_energy"],
+            bins=energy_bins,
+            fill_value=fill_value,
+            percentile=percentile,
+            min_value=min_value,
+            max_value=max_value,
+        )
+
+    return cut_table
+
+
+def evaluate_cut(event_table, param, cut, op, irf_cube=None):
+    """
+    Evaluates a global cut or binned cuts, either on the events or on
+    the cells of a histogram cube.
+
+    Parameters
+    ----------
+    event_table: astropy.table.table.QTable or pandas.core.frame.DataFrame
+        Table of the events, or the cells of a cube
+    param: str
+        Parameter of the cuts, "gammaness" or "theta"
+    cut: float or astropy.table.table.QTable
+        Global cut value, in the unit of degree for theta, or table of
+        the cuts in the reconstructed energy bins
+    op: callable
+        Function comparing the values and cuts element-wise
+    irf_cube: dict
+        Histogram cube of the cells (If None, the events are given)
+
+    Returns
+    -------
+    mask: numpy.ndarray
+        Mask of the events or cells surviving the cuts
+    """
+
+    if irf_cube is not None:
+        mask = evaluate_cut_from_cube(event_table, irf_cube, param, cut, op)
+
+    elif isinstance(cut, QTable):
+        mask = evaluate_binned_cut_indices(
+            values=event_table[param],
+            bin_indices=event_table["reco_energy_bin"],
+            cut_table=cut,
+            op=op,
+        )
+
+    elif param == "theta":
+        mask = op(event_table["theta"].to_value("deg"), cut)
+
+    else:
+        mask = op(event_table[param], cut)
+
+    return mask
+
+
+def create_irf_hdus(irf_inputs, config_gh_cuts, config_theta_cuts):
+    """
+    Applies a gammaness and theta cut configuration to MC DL2 events
+    and creates the IRF HDUs.
+
+    If the inputs are loaded from a histogram cube, the cuts are applied
+    to the cells of the cube and the IRFs are derived from them. The
+    cuts are applied at the bin edges of the cube, and the dynamic theta
+    cuts are rounded to the nearest theta bin edges.
+
+    Parameters
+    ----------
+    irf_inputs: dict
+        Inputs of the IRFs returned by `load_irf_inputs` or
+        `load_irf_cube_inputs`
+    config_gh_cuts: dict
+        Configuration of the gammaness cut
+    config_theta_cuts: dict
+        Configuration of the theta cut, used for the "POINT-LIKE" IRFs
+
+    Returns
+    -------
+    irf_hdus: astropy.io.fits.hdu.hdulist.HDUList
+        HDUs of the IRFs
+    output_suffix: str
+        Suffix of the output file name describing the cuts
+
+    Raises
+    ------
+    ValueError
+        If the input type of gammaness or theta cut is not known
+    """
+
+    irf_cube = irf_inputs.get("irf_cube")
+
+    if irf_cube is None:
+        event_table_gamma = irf_inputs["event_table_gamma"]
+        event_table_bkg = irf_inputs["event_table_bkg"]
+    else:
+        # The cells of the cube are selected in the same way as the events
+        event_table_gamma = irf_cube["gamma"]
+        event_table_bkg = irf_cube["background"]
+
+    sim_info_gamma = irf_inputs["sim_info_gamma"]
+    is_diffuse_mc = irf_inputs["is_diffuse_mc"]
+    is_point_like = irf_inputs["is_point_like"]
+    is_bkg_mc = irf_inputs["is_bkg_mc"]
+    obs_time = irf_inputs["obs_time"]
+    energy_bins = irf_inputs["energy_bins"]
+    migration_bins = irf_inputs["migration_bins"]
+    fov_offset_bins = irf_inputs["fov_offset_bins"]
+    source_offset_bins = irf_inputs["source_offset_bins"]
+    bkg_fov_offset_bins = irf_inputs["bkg_fov_offset_bins"]
+
+    extra_header = irf_inputs["extra_header"].copy()
+
     irf_hdus = fits.HDUList([fits.PrimaryHDU()])
 
     # Apply the gammaness cut
-    config_gh_cuts = config_irf["gammaness"]
+    config_gh_cuts = config_gh_cuts.copy()
     cut_type_gh = config_gh_cuts.pop("cut_type")
 
     if cut_type_gh == "global":
@@ -329,11 +676,15 @@ def create_irf(
         output_suffix = f"gh_glob{cut_value_gh}"
 
         # Apply the global gammaness cut
-        mask_gh = event_table_gamma["gammaness"] > cut_value_gh
+        mask_gh = evaluate_cut(
+            event_table_gamma, "gammaness", cut_value_gh, operator.gt, irf_cube
+        )
         event_table_gamma = event_table_gamma[mask_gh]
 
         if is_bkg_mc:
-            mask_gh = event_table_bkg["gammaness"] > cut_value_gh
+            mask_gh = evaluate_cut(
+                event_table_bkg, "gammaness", cut_value_gh, operator.gt, irf_cube
+            )
             event_table_bkg = event_table_bkg[mask_gh]
 
     elif cut_type_gh == "dynamic":
@@ -355,34 +706,29 @@ def create_irf(
         # Calculate dynamic gammaness cuts
         gh_percentile = 100 * (1 - gh_efficiency)
 
-        cut_table_gh = calculate_percentile_cut(
-            values=event_table_gamma["gammaness"],
-            bin_values=event_table_gamma["reco_energy"],
-            bins=energy_bins,
+        cut_table_gh = calculate_cut_table(
+            event_table=event_table_gamma,
+            param="gammaness",
+            energy_bins=energy_bins,
             fill_value=gh_cut_min,
             percentile=gh_percentile,
             min_value=gh_cut_min,
             max_value=gh_cut_max,
+            irf_cube=irf_cube,
         )
 
         logger.info(f"\nGammaness-cut table:\n\n{cut_table_gh}")
 
         # Apply the dynamic gammaness cuts
-        mask_gh = evaluate_binned_cut(
-            values=event_table_gamma["gammaness"],
-            bin_values=event_table_gamma["reco_energy"],
-            cut_table=cut_table_gh,
-            op=operator.ge,
+        mask_gh = evaluate_cut(
+            event_table_gamma, "gammaness", cut_table_gh, operator.ge, irf_cube
         )
 
         event_table_gamma = event_table_gamma[mask_gh]
 
         if is_bkg_mc:
-            mask_gh = evaluate_binned_cut(
-                values=event_table_bkg["gammaness"],
-                bin_values=event_table_bkg["reco_energy"],
-                cut_table=cut_table_gh,
-                op=operator.ge,
+            mask_gh = evaluate_cut(
+                event_table_bkg, "gammaness", cut_table_gh, operator.ge, irf_cube
             )
 
             event_table_bkg = event_table_bkg[mask_gh]
@@ -407,7 +753,7 @@ def create_irf(
 
     if is_point_like:
         # Apply the theta cut
-        config_theta_cuts = config_irf["theta"]
+        config_theta_cuts = config_theta_cuts.copy()
         cut_type_theta = config_theta_cuts.pop("cut_type")
 
         if cut_type_theta == "global":
@@ -420,7 +766,9 @@ def create_irf(
             output_suffix += f"_theta_glob{cut_value_theta}deg"
 
             # Apply the global theta cut
-            mask_theta = event_table_gamma["theta"].to_value("deg") < cut_value_theta
+            mask_theta = evaluate_cut(
+                event_table_gamma, "theta", cut_value_theta, operator.lt, irf_cube
+            )
             event_table_gamma = event_table_gamma[mask_theta]
 
         elif cut_type_theta == "dynamic":
@@ -442,24 +790,22 @@ def create_irf(
             # Calculate dynamic theta cuts
             theta_percentile = 100 * theta_efficiency
 
-            cut_table_theta = calculate_percentile_cut(
-                values=event_table_gamma["theta"],
-                bin_values=event_table_gamma["reco_energy"],
-                bins=energy_bins,
+            cut_table_theta = calculate_cut_table(
+                event_table=event_table_gamma,
+                param="theta",
+                energy_bins=energy_bins,
                 fill_value=theta_cut_max,
                 percentile=theta_percentile,
                 min_value=theta_cut_min,
                 max_value=theta_cut_max,
+                irf_cube=irf_cube,
             )
 
             logger.info(f"\nTheta-cut table:\n\n{cut_table_theta}")
 
             # Apply the dynamic theta cuts
-            mask_theta = evaluate_binned_cut(
-                values=event_table_gamma["theta"],
-                bin_values=event_table_gamma["reco_energy"],
-                cut_table=cut_table_theta,
-                op=operator.le,
+            mask_theta = evaluate_cut(
+                event_table_gamma, "theta", cut_table_theta, operator.le, irf_cube
             )
 
             event_table_gamma = event_table_gamma[mask_theta]
@@ -487,7 +833,19 @@ def create_irf(
     logger.info("\nCreating an effective-area HDU...")
 
     with np.errstate(invalid="ignore", divide="ignore"):
-        if is_diffuse_mc:
+        if irf_cube is not None:
+            aeff = effective_area_from_cube(
+                cells=event_table_gamma,
+                irf_cube=irf_cube,
+                sim_info=sim_info_gamma,
+                per_fov=is_diffuse_mc,
+            )
+
+            if not is_diffuse_mc:
+                # Add one dimension for the FoV offset bin
+                aeff = aeff[:, np.newaxis]
+
+        elif is_diffuse_mc:
             aeff = effective_area_per_energy_and_fov(
                 selected_events=event_table_gamma,
                 simulation_info=sim_info_gamma,
@@ -519,12 +877,16 @@ def create_irf(
     # Create an energy-dispersion HDU
     logger.info("Creating an energy-dispersion HDU...")
 
-    edisp = energy_dispersion(
-        selected_events=event_table_gamma,
-        true_energy_bins=energy_bins,
-        fov_offset_bins=fov_offset_bins,
-        migration_bins=migration_bins,
-    )
+    if irf_cube is not None:
+        edisp = energy_dispersion_from_cube(event_table_gamma, irf_cube)
+
+    else:
+        edisp = energy_dispersion(
+            selected_events=event_table_gamma,
+            true_energy_bins=energy_bins,
+            fov_offset_bins=fov_offset_bins,
+            migration_bins=migration_bins,
+        )
 
     edisp_hdu = create_energy_dispersion_hdu(
         energy_dispersion=edisp,
@@ -542,12 +904,16 @@ def create_irf(
         # Create a PSF table HDU
         logger.info("Creating a PSF table HDU...")
 
-        psf = psf_table(
-            events=event_table_gamma,
-            true_energy_bins=energy_bins,
-            source_offset_bins=source_offset_bins,
-            fov_offset_bins=fov_offset_bins,
-        )
+        if irf_cube is not None:
+            psf = psf_table_from_cube(event_table_gamma, irf_cube, source_offset_bins)
+
+        else:
+            psf = psf_table(
+                events=event_table_gamma,
+                true_energy_bins=energy_bins,
+                source_offset_bins=source_offset_bins,
+                fov_offset_bins=fov_offset_bins,
+            )
 
         psf_hdu = create_psf_table_hdu(
             psf=psf,
@@ -564,12 +930,16 @@ def create_irf(
             # Create a background HDU
             logger.info("Creating a background HDU...")
 
-            bkg = background_2d(
-                events=event_table_bkg,
-                reco_energy_bins=energy_bins,
-                fov_offset_bins=bkg_fov_offset_bins,
-                t_obs=obs_time,
-            )
+            if irf_cube is not None:
+                bkg = background_2d_from_cube(event_table_bkg, irf_cube, obs_time)
+
+            else:
+                bkg = background_2d(
+                    events=event_table_bkg,
+                    reco_energy_bins=energy_bins,
+                    fov_offset_bins=bkg_fov_offset_bins,
+                    t_obs=obs_time,
+                )
 
             bkg_hdu = create_background_2d_hdu(
                 background_2d=bkg,
@@ -581,7 +951,34 @@ def create_irf(
 
             irf_hdus.append(bkg_hdu)
 
-    # Save the data in an output file
+    return irf_hdus, output_suffix
+
+
+def save_irf_hdus(irf_hdus, irf_inputs, output_suffix, output_dir):
+    """
+    Saves IRF HDUs in an output file named after the pointing direction,
+    event type and cuts.
+
+    Parameters
+    ----------
+    irf_hdus: astropy.io.fits.hdu.hdulist.HDUList
+        HDUs of the IRFs
+    irf_inputs: dict
+        Inputs of the IRFs returned by `load_irf_inputs`
+    output_suffix: str
+        Suffix of the output file name describing the cuts
+    output_dir: str
+        Path to a directory where to save the output IRF file
+
+    Returns
+    -------
+    output_file: str
+        Path to the output IRF file
+    """
+
+    pnt_gamma = irf_inputs["pointing"]
+    event_type = irf_inputs["event_type"]
+
     Path(output_dir).mkdir(exist_ok=True, parents=True)
 
     output_file = (
@@ -593,21 +990,671 @@ def create_irf(
 
     logger.info(f"\nOutput file: {output_file}")
 
+    return output_file
+
+
+def create_irf(
+    input_file_gamma, input_file_proton, input_file_electron, output_dir, config
+):
+    """
+    Processes MC DL2 events and creates the IRFs.
+
+    Parameters
+    ----------
+    input_file_gamma: str
+        Path to an input gamma MC DL2 data file
+    input_file_proton: str
+        Path to an input proton MC DL2 data file
+    input_file_electron: str
+        Path to an input electron MC DL2 data file
+    output_dir: str
+        Path to a directory where to save an output IRF file
+    config: dict
+        Configuration for the LST-1 + MAGIC analysis
+
+    Returns
+    -------
+    output_file: str
+        Path to the output IRF file
+
+    Raises
+    ------
+    RuntimeError
+        If the pointing direction does not match between the input MCs
+    ValueError
+        If the input type of gammaness or theta cut is not known
+    """
+
+    config_irf = config["create_irf"]
+
+    irf_inputs = load_irf_inputs(
+        input_file_gamma, input_file_proton, input_file_electron, config
+    )
+
+    irf_hdus, output_suffix = create_irf_hdus(
+        irf_inputs, config_irf["gammaness"], config_irf["theta"]
+    )
+
+    # Save the data in an output file
+    output_file = save_irf_hdus(irf_hdus, irf_inputs, output_suffix, output_dir)
+
+    return output_file
+
+
+def get_cut_configurations(config_irf):
+    """
+    Gets the gammaness and theta cut configurations scanned with the
+    settings of the `cut_scan` section of the IRF configuration.
+
+    The global cut values and the efficiencies of the dynamic cuts are
+    given as lists, and the minimum and maximum dynamic cuts are taken
+    from the `gammaness` and `theta` sections. If no values are given
+    for a cut, the configuration of its section is used as it is.
+
+    Parameters
+    ----------
+    config_irf: dict
+        Configuration for creating the IRFs
+
+    Returns
+    -------
+    cut_configs: list
+        Pairs of the gammaness and theta cut configurations
+    """
+
+    config_scan = config_irf.get("cut_scan", {})
+
+    cut_configs_per_param = []
+
+    for param in ["gammaness", "theta"]:
+        config_cuts = config_irf[param]
+        config_scan_param = config_scan.get(param) or {}
+
+        param_configs = [
+            {"cut_type": "global", "global_cut_value": cut_value}
+            for cut_value in config_scan_param.get("global_cut_values") or []
+        ]
+
+        param_configs += [
+            {
+                "cut_type": "dynamic",
+                "efficiency": efficiency,
+                "min_cut": config_cuts["min_cut"],
+                "max_cut": config_cuts["max_cut"],
+            }
+            for efficiency in config_scan_param.get("efficiencies") or []
+        ]
+
+        if len(param_configs) == 0:
+            param_configs = [config_cuts]
+
+        cut_configs_per_param.append(param_configs)
+
+    cut_configs = list(itertools.product(*cut_configs_per_param))
+
+    return cut_configs
+
+
+# The IRF inputs shared by the worker processes of `create_irf_scan`
+_LOADED_IRF_INPUTS = None
+
+
+def _create_irf_file_with_loaded_inputs(cut_config, output_dir):
+    """
+    Creates an IRF file with a cut configuration and the IRF inputs
+    loaded by `create_irf_scan`, returning the configuration if it fails.
+    """
+
+    config_gh_cuts, config_theta_cuts = cut_config
+
+    try:
+        irf_hdus, output_suffix = create_irf_hdus(
+            _LOADED_IRF_INPUTS, config_gh_cuts, config_theta_cuts
+        )
+
+        save_irf_hdus(irf_hdus, _LOADED_IRF_INPUTS, output_suffix, output_dir)
+
+    except Exception:
+        logger.exception(f"\nFailed to create the IRFs with the cuts {cut_config}:")
+        return cut_config
+
+    return None
+
+
+def create_irf_scan(
+    input_file_gamma,
+    input_file_proton,
+    input_file_electron,
+    output_dir,
+    config,
+    n_workers=1,
+):
+    """
+    Processes MC DL2 events and creates the IRFs for many gammaness and
+    theta cut configurations, e.g., for the cut optimization.
+
+    The input events are loaded and binned only once, and the cut
+    configurations given by `get_cut_configurations` are processed with
+    a pool of worker processes which inherit the loaded events via fork.
+    One output IRF file is created per configuration as done by
+    `create_irf`.
+
+    Parameters
+    ----------
+    input_file_gamma: str
+        Path to an input gamma MC DL2 data file
+    input_file_proton: str
+        Path to an input proton MC DL2 data file
+    input_file_electron: str
+        Path to an input electron MC DL2 data file
+    output_dir: str
+        Path to a directory where to save output IRF files
+    config: dict
+        Configuration for the LST-1 + MAGIC analysis
+    n_workers: int
+        Number of the worker processes
+
+    Raises
+    ------
+    RuntimeError
+        If the pointing direction does not match between the input MCs,
+        or if the IRFs could not be created with any of the cut
+        configurations
+    """
+
+    irf_inputs = load_irf_inputs(
+        input_file_gamma, input_file_proton, input_file_electron, config
+    )
+
+    scan_irf_cuts(irf_inputs, output_dir, config, n_workers)
+
+
+def scan_irf_cuts(irf_inputs, output_dir, config, n_workers=1):
+    """
+    Creates the IRFs for the cut configurations given by
+    `get_cut_configurations` with loaded IRF inputs, processing the
+    configurations with a pool of worker processes which inherit the
+    inputs via fork.
+
+    Parameters
+    ----------
+    irf_inputs: dict
+        Inputs of the IRFs returned by `load_irf_inputs` or
+        `load_irf_cube_inputs`
+    output_dir: str
+        Path to a directory where to save output IRF files
+    config: dict
+        Configuration for the LST-1 + MAGIC analysis
+    n_workers: int
+        Number of the worker processes
+
+    Raises
+    ------
+    RuntimeError
+        If the IRFs could not be created with any of the cut
+        configurations
+    """
+
+    global _LOADED_IRF_INPUTS
+
+    cut_configs = get_cut_configurations(config["create_irf"])
+    logger.info(f"\nIn total {len(cut_configs)} cut configurations are scanned")
+
+    _LOADED_IRF_INPUTS = irf_inputs
+
+    create_irf_file = functools.partial(
+        _create_irf_file_with_loaded_inputs, output_dir=output_dir
+    )
+
+    try:
+        if n_workers > 1:
+            context = multiprocessing.get_context("fork")
+
+            with context.Pool(n_workers) as pool:
+                failed_configs = pool.map(create_irf_file, cut_configs, chunksize=1)
+
+        else:
+            failed_configs = [create_irf_file(cut_config) for cut_config in cut_configs]
+
+    finally:
+        _LOADED_IRF_INPUTS = None
+
+    failed_configs = [cut_config for cut_config in failed_configs if cut_config is not None]
+
+    if len(failed_configs) > 0:
+        raise RuntimeError(
+            f"Could not create the IRFs with {len(failed_configs)} cut configurations:\n"
+            + "\n".join(str(cut_config) for cut_config in failed_configs)
+        )
+
+
+def create_irf_cube_file(
+    input_file_gamma, input_file_proton, input_file_electron, output_file, config
+):
+    """
+    Processes MC DL2 events and saves their histogram cube, from which
+    the IRFs are derived for any gammaness and theta cuts.
+
+    The theta bins and the gammaness binning of the cube are given in
+    the `irf_cube` section of the IRF configuration, and the other bins
+    are the same as those of the IRFs.
+
+    Parameters
+    ----------
+    input_file_gamma: str
+        Path to an input gamma MC DL2 data file
+    input_file_proton: str
+        Path to an input proton MC DL2 data file
+    input_file_electron: str
+        Path to an input electron MC DL2 data file
+    output_file: str
+        Path to an output HDF file of the cube
+    config: dict
+        Configuration for the LST-1 + MAGIC analysis
+
+    Raises
+    ------
+    RuntimeError
+        If the pointing direction does not match between the input MCs
+    """
+
+    config_cube = config["create_irf"]["irf_cube"]
+
+    logger.info("\nHistogram cube:")
+    logger.info(format_object(config_cube))
+
+    irf_inputs = load_irf_inputs(
+        input_file_gamma, input_file_proton, input_file_electron, config
+    )
+
+    config_theta_bins = config_cube["theta_bins"]
+
+    theta_bins_start = u.Quantity(config_theta_bins["start"])
+    theta_bins_stop = u.Quantity(config_theta_bins["stop"])
+
+    theta_bins = u.deg * np.linspace(
+        start=theta_bins_start.to_value("deg").round(3),
+        stop=theta_bins_stop.to_value("deg").round(3),
+        num=config_theta_bins["n_edges"],
+    )
+
+    is_bkg_mc = irf_inputs["is_bkg_mc"] and (len(irf_inputs["event_table_bkg"]) > 0)
+
+    logger.info("\nCreating the histogram cube...")
+
+    irf_cube = create_irf_cube(
+        event_table_gamma=irf_inputs["event_table_gamma"],
+        energy_bins=irf_inputs["energy_bins"],
+        migration_bins=irf_inputs["migration_bins"],
+        fov_offset_bins=irf_inputs["fov_offset_bins"],
+        theta_bins=theta_bins,
+        event_table_bkg=irf_inputs["event_table_bkg"] if is_bkg_mc else None,
+        bkg_fov_offset_bins=irf_inputs["bkg_fov_offset_bins"] if is_bkg_mc else None,
+        n_gammaness_quantiles=config_cube["n_gammaness_quantiles"],
+        n_gammaness_edges=config_cube["n_gammaness_edges"],
+    )
+
+    logger.info(f"Number of the gamma cells: {len(irf_cube['gamma'])}")
+
+    if is_bkg_mc:
+        logger.info(f"Number of the background cells: {len(irf_cube['background'])}")
+
+    # The header values given as (value, unit) are saved as lists
+    source_offset_bins = irf_inputs["source_offset_bins"]
+    obs_time = irf_inputs["obs_time"]
+
+    metadata = {
+        "pointing": irf_inputs["pointing"].tolist(),
+        "event_type": irf_inputs["event_type"],
+        "is_diffuse_mc": bool(irf_inputs["is_diffuse_mc"]),
+        "is_point_like": bool(irf_inputs["is_point_like"]),
+        "is_bkg_mc": bool(irf_inputs["is_bkg_mc"]),
+        "obs_time": None if obs_time is None else obs_time.to_value("h"),
+        "source_offset_bins": (
+            None
+            if source_offset_bins is None
+            else source_offset_bins.to_value("deg").tolist()
+        ),
+        "extra_header": irf_inputs["extra_header"],
+    }
+
+    Path(output_file).parent.mkdir(exist_ok=True, parents=True)
+
+    save_irf_cube(irf_cube, output_file, irf_inputs["sim_info_gamma"], metadata)
+
+    logger.info(f"\nOutput file: {output_file}")
+
+
+def load_irf_cube_inputs(input_file_cube):
+    """
+    Loads a histogram cube of MC DL2 events saved by
+    `create_irf_cube_file` as the inputs of the IRFs.
+
+    Parameters
+    ----------
+    input_file_cube: str
+        Path to an input HDF file of the cube
+
+    Returns
+    -------
+    irf_inputs: dict
+        Histogram cube, simulation information, bins and header
+        keywords used to create the IRFs
+    """
+
+    irf_cube, sim_info_gamma, metadata = load_irf_cube(input_file_cube)
+
+    obs_time = metadata["obs_time"]
+    source_offset_bins = metadata["source_offset_bins"]
+
+    extra_header = {
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in metadata["extra_header"].items()
+    }
+
+    irf_inputs = {
+        "irf_cube": irf_cube,
+        "sim_info_gamma": sim_info_gamma,
+        "pointing": np.array(metadata["pointing"]),
+        "event_type": metadata["event_type"],
+        "is_diffuse_mc": metadata["is_diffuse_mc"],
+        "is_point_like": metadata["is_point_like"],
+        "is_bkg_mc": metadata["is_bkg_mc"] and (irf_cube["background"] is not None),
+        "obs_time": None if obs_time is None else u.Quantity(obs_time, u.h),
+        "energy_bins": irf_cube["energy_bins"],
+        "migration_bins": irf_cube["migration_bins"],
+        "fov_offset_bins": irf_cube["fov_offset_bins"],
+        "source_offset_bins": (
+            None if source_offset_bins is None else u.Quantity(source_offset_bins, u.deg)
+        ),
+        "bkg_fov_offset_bins": irf_cube["bkg_fov_offset_bins"],
+        "extra_header": extra_header,
+    }
+
+    return irf_inputs
+
+
+def create_irf_from_cube(
+    input_file_cube, output_dir, config, cut_scan=False, n_workers=1
+):
+    """
+    Creates the IRFs from a histogram cube of MC DL2 events, either with
+    the cut configuration of the `gammaness` and `theta` sections or with
+    those scanned with the `cut_scan` section.
+
+    Parameters
+    ----------
+    input_file_cube: str
+        Path to an input HDF file of the cube
+    output_dir: str
+        Path to a directory where to save output IRF files
+    config: dict
+        Configuration for the LST-1 + MAGIC analysis
+    cut_scan: bool
+        If `True`, the cut configurations of the `cut_scan` section are
+        scanned
+    n_workers: int
+        Number of the worker processes used with `cut_scan`
+
+    Raises
+    ------
+    RuntimeError
+        If the IRFs could not be created with any of the scanned cut
+        configurations
+    ValueError
+        If the input type of gammaness or theta cut is not known
+    """
+
+    config_irf = config["create_irf"]
+
+    logger.info(f"\nInput histogram cube: {input_file_cube}")
+
+    irf_inputs = load_irf_cube_inputs(input_file_cube)
+
+    if cut_scan:
+        scan_irf_cuts(irf_inputs, output_dir, config, n_workers)
+
+    else:
+        irf_hdus, output_suffix = create_irf_hdus(
+            irf_inputs, config_irf["gammaness"], config_irf["theta"]
+        )
+
+        save_irf_hdus(irf_hdus, irf_inputs, output_suffix, output_dir)
+
+
+def find_irf_grid_nodes(input_dir):
+    """
+    Finds the gamma, proton and electron MC DL2 data files stored in a
+    directory and pairs them by their pointing directions.
+
+    The particle types are identified by the file names, and the
+    pointing directions are computed from the pointing columns of the
+    events. The mean azimuth is computed in the range where the angles
+    do not wrap, as done for the target point of the IRF interpolation
+    in the DL2-to-DL3 conversion, so that the files whose azimuths are
+    around 0 deg are paired correctly.
+
+    Parameters
+    ----------
+    input_dir: str
+        Path to a directory where input MC DL2 data files are stored
+
+    Returns
+    -------
+    grid_nodes: list
+        Nodes of the pointing grid, given as dictionaries with the
+        pointing direction (zd, az) in the unit of degree `pointing` and
+        the paths to the input files `input_file_gamma`,
+        `input_file_proton` and `input_file_electron` (`None` if missing)
+
+    Raises
+    ------
+    RuntimeError
+        If more than one file of the same particle type are found for
+        the same pointing direction
+    """
+
+    input_files = glob.glob(f"{input_dir}/*.h5")
+    input_files.sort()
+
+    grid_nodes = {}
+
+    for input_file in input_files:
+        file_name = Path(input_file).name
+        particle = next((p for p in MC_PARTICLE_TYPES if p in file_name), None)
+
+        if particle is None:
+            continue
+
+        df_pointing = read_event_data(input_file, columns=["pointing_alt", "pointing_az"])
+
+        pointing_zd = 90 - np.rad2deg(df_pointing["pointing_alt"].mean())
+
+        pnt_az = Angle(df_pointing["pointing_az"].to_numpy(), u.rad)
+        pnt_az_wrap_360deg = pnt_az.wrap_at("360 deg")
+        pnt_az_wrap_180deg = pnt_az.wrap_at("180 deg")
+
+        if pnt_az_wrap_360deg.std() <= pnt_az_wrap_180deg.std():
+            pointing_az = pnt_az_wrap_360deg.mean().to_value("deg")
+        else:
+            pointing_az = pnt_az_wrap_180deg.mean().wrap_at("360 deg").to_value("deg")
+
+        # Map the azimuths rounded to 360 deg to 0 deg
+        pointing = np.array([pointing_zd, pointing_az]).round(3)
+        pointing[1] %= 360
+
+        pointing = tuple(pointing.tolist())
+
+        grid_node = grid_nodes.setdefault(
+            pointing,
+            {
+                "pointing": list(pointing),
+                **{f"input_file_{p}": None for p in MC_PARTICLE_TYPES},
+            },
+        )
+
+        if grid_node[f"input_file_{particle}"] is not None:
+            raise RuntimeError(
+                f"Found more than one {particle} MC DL2 data files with the pointing "
+                f"direction {list(pointing)} deg:\n"
+                f"{grid_node[f'input_file_{particle}']}\n{input_file}"
+            )
+
+        grid_node[f"input_file_{particle}"] = input_file
+
+    grid_nodes = [grid_nodes[pointing] for pointing in sorted(grid_nodes)]
+
+    for grid_node in grid_nodes:
+        if grid_node["input_file_gamma"] is None:
+            logger.warning(
+                f"\nWARNING: Will skip the pointing direction {grid_node['pointing']} "
+                "deg, since the gamma MC DL2 data file is missing."
+            )
+
+    grid_nodes = [node for node in grid_nodes if node["input_file_gamma"] is not None]
+
+    return grid_nodes
+
+
+def _create_irf_grid_node(grid_node, output_dir, config):
+    """
+    Creates the IRFs of a node of the pointing grid, returning the path
+    to the output file, or `None` if it fails.
+    """
+
+    try:
+        output_file = create_irf(
+            input_file_gamma=grid_node["input_file_gamma"],
+            input_file_proton=grid_node["input_file_proton"],
+            input_file_electron=grid_node["input_file_electron"],
+            output_dir=output_dir,
+            config=config,
+        )
+
+    except Exception:
+        logger.exception(
+            f"\nFailed to create the IRFs of the pointing {grid_node['pointing']} deg:"
+        )
+        return None
+
+    return output_file
+
+
+def create_irf_grid(input_dir, output_dir, config, n_workers=1):
+    """
+    Processes the MC DL2 events of many pointing directions and creates
+    the IRFs of all the nodes of the pointing grid.
+
+    The input files are paired by their pointing directions with
+    `find_irf_grid_nodes`, and the nodes are processed with a pool of
+    worker processes, creating one output IRF file per node as done by
+    `create_irf`. A manifest listing the output files is saved in the
+    output directory, which is used by `load_irf_files` to find them.
+
+    Parameters
+    ----------
+    input_dir: str
+        Path to a directory where input MC DL2 data files are stored
+    output_dir: str
+        Path to a directory where to save output IRF files
+    config: dict
+        Configuration for the LST-1 + MAGIC analysis
+    n_workers: int
+        Number of the worker processes
+
+    Returns
+    -------
+    manifest_file: str
+        Path to the output manifest file
+
+    Raises
+    ------
+    FileNotFoundError
+        If no gamma MC DL2 data files are found in the input directory
+    RuntimeError
+        If the IRFs of any of the nodes could not be created
+    """
+
+    grid_nodes = find_irf_grid_nodes(input_dir)
+
+    if len(grid_nodes) == 0:
+        raise FileNotFoundError(
+            "Could not find any gamma MC DL2 data files in the input directory."
+        )
+
+    logger.info(f"\nIn total {len(grid_nodes)} pointing directions are found:")
+    logger.info(format_object({i: node for i, node in enumerate(grid_nodes)}))
+
+    create_node_irf = functools.partial(
+        _create_irf_grid_node, output_dir=output_dir, config=config
+    )
+
+    if n_workers > 1:
+        context = multiprocessing.get_context("fork")
+
+        with context.Pool(n_workers) as pool:
+            output_files = pool.map(create_node_irf, grid_nodes, chunksize=1)
+
+    else:
+        output_files = [create_node_irf(grid_node) for grid_node in grid_nodes]
+
+    # Save the manifest of the created IRF files
+    irf_entries = [
+        {"file": output_file, **grid_node}
+        for grid_node, output_file in zip(grid_nodes, output_files)
+        if output_file is not None
+    ]
+
+    Path(output_dir).mkdir(exist_ok=True, parents=True)
+
+    manifest_file = save_irf_manifest(irf_entries, output_dir)
+    logger.info(f"\nOutput manifest file: {manifest_file}")
+
+    failed_nodes = [
+        grid_node
+        for grid_node, output_file in zip(grid_nodes, output_files)
+        if output_file is None
+    ]
+
+    if len(failed_nodes) > 0:
+        raise RuntimeError(
+            f"Could not create the IRFs of {len(failed_nodes)} pointing directions:\n"
+            + "\n".join(str(grid_node["pointing"]) for grid_node in failed_nodes)
+        )
+
+    return manifest_file
+
 
 def main():
     start_time = time.time()
 
     parser = argparse.ArgumentParser()
 
-    parser.add_argument(
+    input_group = parser.add_mutually_exclusive_group(required=True)
+
+    input_group.add_argument(
         "--input-file-gamma",
         "-g",
         dest="input_file_gamma",
         type=str,
-        required=True,
         help="Path to an input gamma MC DL2 data file",
     )
 
+    input_group.add_argument(
+        "--input-file-cube",
+        dest="input_file_cube",
+        type=str,
+        help="Path to an input histogram cube of MC DL2 events",
+    )
+
+    input_group.add_argument(
+        "--input-dir",
+        "-i",
+        dest="input_dir",
+        type=str,
+        help="Path to a directory where input MC DL2 data files of many pointings are stored",
+    )
+
     parser.add_argument(
         "--input-file-proton",
         "-p",
@@ -642,19 +1689,93 @@ def main():
         help="Path to a configuration file",
     )
 
+    parser.add_argument(
+        "--output-file-cube",
+        dest="output_file_cube",
+        type=str,
+        help="Path to an output histogram cube, saved instead of the IRFs",
+    )
+
+    parser.add_argument(
+        "--cut-scan",
+        dest="cut_scan",
+        action="store_true",
+        help="Create the IRFs with the cut configurations of the `cut_scan` section",
+    )
+
+    parser.add_argument(
+        "--n-workers",
+        "-n",
+        dest="n_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes used with `--input-dir` or `--cut-scan`",
+    )
+
     args = parser.parse_args()
 
+    if (args.input_dir is not None) and args.cut_scan:
+        parser.error("argument --cut-scan: not allowed with argument --input-dir")
+
+    if (args.output_file_cube is not None) and (args.input_file_gamma is None):
+        parser.error("argument --output-file-cube: requires --input-file-gamma")
+
+    # The proton and electron files are paired by the pointings with
+    # `--input-dir`, and they are already binned in the input cube
+    for arg_name in ["input_file_proton", "input_file_electron"]:
+        if (getattr(args, arg_name) is not None) and (args.input_file_gamma is None):
+            parser.error(
+                f"argument --{arg_name.replace('_', '-')}: requires --input-file-gamma"
+            )
+
     with open(args.config_file, "rb") as f:
         config = yaml.safe_load(f)
 
     # Create the IRFs
-    create_irf(
-        input_file_gamma=args.input_file_gamma,
-        input_file_proton=args.input_file_proton,
-        input_file_electron=args.input_file_electron,
-        output_dir=args.output_dir,
-        config=config,
-    )
+    if args.output_file_cube is not None:
+        create_irf_cube_file(
+            input_file_gamma=args.input_file_gamma,
+            input_file_proton=args.input_file_proton,
+            input_file_electron=args.input_file_electron,
+            output_file=args.output_file_cube,
+            config=config,
+        )
+
+    elif args.input_file_cube is not None:
+        create_irf_from_cube(
+            input_file_cube=args.input_file_cube,
+            output_dir=args.output_dir,
+            config=config,
+            cut_scan=args.cut_scan,
+            n_workers=args.n_workers,
+        )
+
+    elif args.input_dir is not None:
+        create_irf_grid(
+            input_dir=args.input_dir,
+            output_dir=args.output_dir,
+            config=config,
+            n_workers=args.n_workers,
+        )
+
+    elif args.cut_scan:
+        create_irf_scan(
+            input_file_gamma=args.input_file_gamma,
+            input_file_proton=args.input_file_proton,
+            input_file_electron=args.input_file_electron,
+            output_dir=args.output_dir,
+            config=config,
+            n_workers=args.n_workers,
+        )
+
+    else:
+        create_irf(
+            input_file_gamma=args.input_file_gamma,
+            input_file_proton=args.input_file_proton,
+            input_file_electron=args.input_file_electron,
+            output_dir=args.output_dir,
+            config=config,
+        )
 
     logger.info("\nDone.")
 
@@ -9,11 +9,29 @@ For reconstructing the arrival directions, it uses the MARS-like DISP
 method, i.e., select the closest combination with which the sum of the
 angular distances of all the head and tail candidates becomes minimum.
 
+When many input files are given with `--input-dir` or `--input-list`,
+the RFs are loaded only once and the files are processed with a pool of
+`--n-workers` processes, creating one output file per input file.
+
+Instead of a directory, the `--input-dir` argument accepts a manifest
+listing the input files, e.g., the test subset of the MC files saved by
+`magicctapipe.io.create_split_manifests`. If the events of the files
+are split, only those of the subset are processed.
+
+The output files record the provenance of the input files, RFs and
+configuration, and the input files whose outputs are up to date are
+skipped unless the `--force` argument is given.
+
 Usage:
 $ python lst1_magic_dl1_stereo_to_dl2.py
 --input-file-dl1 dl1_stereo/dl1_stereo_LST-1_MAGIC.Run03265.0040.h5
+(or --input-dir dl1_stereo, or --input-dir manifest.json,
+or --input-list list_of_DL1_stereo_files.txt)
 --input-dir-rfs rfs
 (--output-dir dl2)
+(--config-file config_general.yaml)
+(--n-workers 8)
+(--force)
 
 Broader usage:
 This script is called automatically from the script "DL1_to_DL2.py".
@@ -23,27 +41,56 @@ If you want to analyse a target, this is the way to go. See this other script fo
 
 import yaml
 import argparse
+import functools
 import glob
 import itertools
 import logging
+import multiprocessing
 import time
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 from astropy import units as u
-from astropy.coordinates import AltAz, SkyCoord, angular_separation
-from ctapipe.coordinates import TelescopeFrame
 from ctapipe.instrument import SubarrayDescription
-from magicctapipe.io import get_stereo_events, save_pandas_data_in_table, telescope_combinations
+from magicctapipe.io import (
+    apply_dtype_profile,
+    find_input_files,
+    get_provenance,
+    get_stereo_events,
+    is_sorted_event_file,
+    is_up_to_date,
+    read_event_data,
+    save_event_data,
+    save_pandas_data_in_table,
+    select_split_events,
+    telescope_combinations,
+    write_provenance,
+)
 from magicctapipe.reco import DispRegressor, EnergyRegressor, EventClassifier
-
-__all__ = ["apply_rfs", "reconstruct_arrival_direction", "dl1_stereo_to_dl2"]
+from magicctapipe.utils import (
+    camera_to_telescope,
+    directional_offset_by,
+    get_event_sort_keys,
+    telescope_to_altaz,
+)
+
+__all__ = [
+    "apply_rfs",
+    "reconstruct_arrival_direction",
+    "load_rfs",
+    "dl1_stereo_to_dl2",
+    "dl1_stereo_to_dl2_batch",
+]
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# The RFs loaded once by `dl1_stereo_to_dl2_batch`, which are inherited
+# by the worker processes via fork
+_LOADED_ESTIMATORS = None
+
 
 def apply_rfs(event_data, estimator, config):
     """
@@ -95,71 +142,101 @@ def reconstruct_arrival_direction(event_data, tel_descriptions, config):
         Data frame of the shower events with reconstructed directions
     """
 
-    params_with_flips = pd.DataFrame()
-    
     _, TEL_COMBINATIONS = telescope_combinations(config)
-    
+
     # First of all, we reconstruct the directions of all the head and
     # tail candidates for every telescope image, i.e., the directions
     # separated by the DISP parameter from the image CoG along the
-    # shower main axis. The `flip` parameter distinguishes them.
+    # shower main axis. The last axis of the candidate arrays
+    # distinguishes them, i.e., the `flip` parameter.
 
-    tel_ids = np.unique(event_data.index.get_level_values("tel_id"))
+    n_rows = len(event_data)
 
-    for tel_id in tel_ids:
-        df_events = event_data.query(f"tel_id == {tel_id}")
+    candidates_alt = np.full((n_rows, 2), np.nan)
+    candidates_az = np.full((n_rows, 2), np.nan)
 
-        tel_pointing = AltAz(
-            alt=u.Quantity(df_events["pointing_alt"], unit="rad"),
-            az=u.Quantity(df_events["pointing_az"], unit="rad"),
-        )
+    tel_ids = event_data.index.get_level_values("tel_id").to_numpy()
+    event_keys = get_event_sort_keys(event_data)
 
-        tel_frame = TelescopeFrame(telescope_pointing=tel_pointing)
+    for tel_id in np.unique(tel_ids):
+        is_tel_event = tel_ids == tel_id
+        df_events = event_data[is_tel_event]
 
-        cog_coord = SkyCoord(
-            u.Quantity(df_events["x"], unit="m"),
-            u.Quantity(df_events["y"], unit="m"),
-            frame=tel_descriptions[tel_id].camera.geometry.frame,
-        )
+        camera_frame = tel_descriptions[tel_id].camera.geometry.frame
 
-        cog_coord = cog_coord.transform_to(tel_frame)
+        cog_lon, cog_lat = camera_to_telescope(
+            x=df_events["x"].to_numpy(),
+            y=df_events["y"].to_numpy(),
+            focal_length=camera_frame.focal_length.to_value("m"),
+            rotation=camera_frame.rotation.to_value("rad"),
+        )
 
         for flip in [0, 1]:
-            psi_flipped = df_events["psi"] + 180 * flip
+            psi_flipped = df_events["psi"].to_numpy() + 180 * flip
 
-            event_coord = cog_coord.directional_offset_by(
-                position_angle=u.Quantity(psi_flipped, unit="deg"),
-                separation=u.Quantity(df_events["reco_disp"], unit="deg"),
+            event_lon, event_lat = directional_offset_by(
+                lon=cog_lon,
+                lat=cog_lat,
+                position_angle=np.deg2rad(psi_flipped),
+                separation=np.deg2rad(df_events["reco_disp"].to_numpy()),
             )
 
-            event_coord = event_coord.altaz
-
-            df_altaz = pd.DataFrame(
-                data={
-                    "flip": flip,
-                    "reco_alt": event_coord.alt.to_value("deg"),
-                    "reco_az": event_coord.az.to_value("deg"),
-                    "combo_type": df_events["combo_type"],
-                },
-                index=df_events.index,
+            event_alt, event_az = telescope_to_altaz(
+                fov_lon=event_lon,
+                fov_lat=event_lat,
+                pointing_alt=df_events["pointing_alt"].to_numpy(),
+                pointing_az=df_events["pointing_az"].to_numpy(),
             )
 
-            params_with_flips = pd.concat([params_with_flips, df_altaz])
-
-    params_with_flips.set_index("flip", append=True, inplace=True)
-    params_with_flips.sort_index(inplace=True)
+            candidates_alt[is_tel_event, flip] = np.rad2deg(event_alt)
+            candidates_az[is_tel_event, flip] = np.rad2deg(event_az)
+
+    # Convert the candidates to unit vectors, with which the angular
+    # distances are calculated with plain array operations
+    candidates_alt_rad = np.deg2rad(candidates_alt)
+    candidates_az_rad = np.deg2rad(candidates_az)
+
+    candidate_vectors = np.stack(
+        [
+            np.cos(candidates_alt_rad) * np.cos(candidates_az_rad),
+            np.cos(candidates_alt_rad) * np.sin(candidates_az_rad),
+            np.sin(candidates_alt_rad),
+        ],
+        axis=-1,
+    )
 
     # Then, we get the flip combination minimizing the angular distances
-    # of the head and tail candidates for every shower event. In order
-    # to speed up the calculations, here we process the events for every
-    # telescope combination types.
+    # of the head and tail candidates for every shower event. Here we
+    # process the events for every telescope combination type, so that
+    # the candidates can be packed in a dense array with the shape of
+    # (n_events, n_tels, 2, 3).
+
+    reco_alt = np.full(n_rows, np.nan)
+    reco_az = np.full(n_rows, np.nan)
+    disp_diff_sum = np.full(n_rows, np.nan)
+    disp_diff_mean = np.full(n_rows, np.nan)
 
-    reco_params = pd.DataFrame()
+    is_processed = np.zeros(n_rows, dtype=bool)
+    combo_types = event_data["combo_type"].to_numpy()
 
-    for combo_type, tel_ids in enumerate(TEL_COMBINATIONS.values()):
-        df_events = params_with_flips.query(f"combo_type == {combo_type}")
+    for combo_type, combo_tel_ids in enumerate(TEL_COMBINATIONS.values()):
+        (rows,) = np.nonzero(combo_types == combo_type)
 
-        n_events = len(df_events.groupby(["obs_id", "event_id"]).size())
+        if len(rows) == 0:
+            continue
+
+        n_tels = len(combo_tel_ids)
+
+        # Sort the rows by the event and telescope IDs, so that every
+        # event has `n_tels` consecutive rows, and then reorder the
+        # telescope axis in the same order as the combination
+        rows = rows[np.argsort(event_keys[rows], kind="stable")]
+        rows = rows.reshape(-1, n_tels)
+
+        tel_order = np.argsort(combo_tel_ids)
+        rows = rows[:, np.argsort(tel_order)]
+
+        vectors = candidate_vectors[rows]
 
         # Here we first define all the possible flip combinations. For
         # example, in case that we have two telescope images, in total
@@ -168,85 +245,158 @@ def reconstruct_arrival_direction(event_data, tel_descriptions, config):
         # where the i-th element of each tuple means the i-th telescope
         # image. In case of 3 images we have in total 8 combinations.
 
-        flip_combinations = np.array(
-            list(itertools.product([0, 1], repeat=len(tel_ids)))
-        )
+        flip_combinations = np.array(list(itertools.product([0, 1], repeat=n_tels)))
 
         # Next, we define all the possible 2 telescopes combinations.
         # For example, in case of 3 telescopes, in total 3 combinations
         # are defined as follows:
         #                 [(1, 2), (1, 3), (2, 3)]
-        # where the elements of the tuples mean the telescope IDs. In
-        # case of 2 telescopes there is only one combination.
+        # where the elements of the tuples mean the telescope indices.
+        # In case of 2 telescopes there is only one combination.
 
-        tel_any2_combinations = list(itertools.combinations(tel_ids, 2))
+        tel_any2_combinations = list(itertools.combinations(range(n_tels), 2))
 
-        distances = np.zeros((len(flip_combinations), n_events))
+        distances = np.zeros((len(rows), len(flip_combinations)))
 
-        # Loop over every flip combination
-        for i_flip, flip_combo in enumerate(flip_combinations):
-            container = {}
+        for i_tel_1, i_tel_2 in tel_any2_combinations:
+            # Calculate the distances of all the head and tail pairs,
+            # whose shape is (n_events, 2, 2)
+            vectors_1 = vectors[:, i_tel_1, :, np.newaxis, :]
+            vectors_2 = vectors[:, i_tel_2, np.newaxis, :, :]
 
-            # Set the directions of a given flip combination
-            for tel_id, flip in zip(tel_ids, flip_combo):
-                container[tel_id] = df_events.query(
-                    f"(tel_id == {tel_id}) & (flip == {flip})"
-                )
+            cos_theta = np.einsum("eik,ejk->eij", vectors[:, i_tel_1], vectors[:, i_tel_2])
+            sin_theta = np.linalg.norm(np.cross(vectors_1, vectors_2), axis=-1)
 
-            for tel_id_1, tel_id_2 in tel_any2_combinations:
-                # Calculate the distance of the 2-tel combination
-                theta = angular_separation(
-                    lon1=u.Quantity(container[tel_id_1]["reco_az"], unit="deg"),
-                    lat1=u.Quantity(container[tel_id_1]["reco_alt"], unit="deg"),
-                    lon2=u.Quantity(container[tel_id_2]["reco_az"], unit="deg"),
-                    lat2=u.Quantity(container[tel_id_2]["reco_alt"], unit="deg"),
-                )
+            theta = np.arctan2(sin_theta, cos_theta)
+
+            # Sum up the distances of every flip combination
+            distances += theta[
+                :, flip_combinations[:, i_tel_1], flip_combinations[:, i_tel_2]
+            ]
 
-                # Sum up the distance
-                distances[i_flip] += theta.to_value("deg")
+        distances = np.rad2deg(distances)
 
         # Extracts the minimum distances and their flip combinations
-        distances_min = distances.min(axis=0)
-        indices_at_min = distances.argmin(axis=0)
+        indices_at_min = distances.argmin(axis=1)
+        distances_min = distances[np.arange(len(rows)), indices_at_min]
+
+        flips = flip_combinations[indices_at_min]
+
+        # Keep only the information of the closest combinations. The
+        # minimum angular distances are also added to the output, since
+        # they are useful to separate gamma and hadron events (hadron
+        # events tend to have larger distances than gammas).
+        reco_alt[rows] = candidates_alt[rows, flips]
+        reco_az[rows] = candidates_az[rows, flips]
+
+        disp_diff_sum[rows] = distances_min[:, np.newaxis]
+        disp_diff_mean[rows] = distances_min[:, np.newaxis] / len(tel_any2_combinations)
+
+        is_processed[rows] = True
+
+    # Sort the output by the event keys, i.e., in the same order as the
+    # sorted multi index
+    (rows,) = np.nonzero(is_processed)
+    rows = rows[np.argsort(event_keys[rows], kind="stable")]
+
+    reco_params = pd.DataFrame(
+        data={
+            "reco_alt": reco_alt[rows],
+            "reco_az": reco_az[rows],
+            "disp_diff_sum": disp_diff_sum[rows],
+            "disp_diff_mean": disp_diff_mean[rows],
+        },
+        index=event_data.index[rows],
+    )
 
-        flips = flip_combinations[indices_at_min].ravel()
+    return reco_params
 
-        group_size = df_events.groupby(["obs_id", "event_id", "tel_id"]).size()
 
-        obs_ids = group_size.index.get_level_values("obs_id")
-        event_ids = group_size.index.get_level_values("event_id")
-        tel_ids = group_size.index.get_level_values("tel_id")
+def load_rfs(input_dir_rfs, config):
+    """
+    Loads trained RFs from the joblib files stored in a directory.
 
-        multi_indices = pd.MultiIndex.from_arrays(
-            arrays=[obs_ids, event_ids, tel_ids, flips], names=df_events.index.names
-        )
+    Parameters
+    ----------
+    input_dir_rfs: str
+        Path to a directory where trained RFs are stored
+    config: dict
+        dictionary with telescope IDs information
 
-        # Keep only the information of the closest combinations
-        df_events = df_events.loc[multi_indices]
-
-        # Add the minimum angular distances to the output data frame,
-        # since they are useful to separate gamma and hadron events
-        # (hadron events tend to have larger distances than gammas)
-        df_disp_diffs = pd.DataFrame(
-            data={
-                "disp_diff_sum": distances_min,
-                "disp_diff_mean": distances_min / len(tel_any2_combinations),
-            },
-            index=df_events.groupby(["obs_id", "event_id"]).size().index,
-        )
+    Returns
+    -------
+    estimators: dict
+        Loaded energy regressors, DISP regressors and event classifiers
+    """
 
-        df_events = df_events.join(df_disp_diffs)
+    TEL_NAMES, _ = telescope_combinations(config)
 
-        reco_params = pd.concat([reco_params, df_events])
+    logger.info(f"\nInput RF directory: {input_dir_rfs}")
 
-    reco_params.reset_index(level="flip", inplace=True)
-    reco_params.drop(["flip", "combo_type"], axis=1, inplace=True)
-    reco_params.sort_index(inplace=True)
+    estimator_types = {
+        "energy_regressors": EnergyRegressor,
+        "disp_regressors": DispRegressor,
+        "event_classifiers": EventClassifier,
+    }
 
-    return reco_params
+    estimators = {}
 
+    for rf_type, estimator_class in estimator_types.items():
+        input_files = glob.glob(f"{input_dir_rfs}/{rf_type}_*.joblib")
+        input_files.sort()
 
-def dl1_stereo_to_dl2(input_file_dl1, input_dir_rfs, output_dir, config):
+        estimators[rf_type] = []
+
+        if len(input_files) > 0:
+            rf_name = rf_type.replace("_", " ")[:-1]
+            logger.info(f"\nIn total {len(input_files)} {rf_name} files are found:")
+
+        for input_file in input_files:
+            logger.info(f"Loading {input_file}...")
+
+            estimator = estimator_class(TEL_NAMES)
+            estimator.load(input_file)
+
+            estimators[rf_type].append(estimator)
+
+    return estimators
+
+
+def _get_output_provenance(
+    input_file_dl1, input_dir_rfs, output_dir, config, split=None
+):
+    """
+    Gets the path to the output DL2 data file of an input DL1-stereo
+    data file and the provenance of the output file.
+    """
+
+    input_file_name = Path(input_file_dl1).name
+
+    output_file_name = input_file_name.replace("dl1_stereo", "dl2")
+    output_file = f"{output_dir}/{output_file_name}"
+
+    input_files_rfs = sorted(glob.glob(f"{input_dir_rfs}/*.joblib"))
+
+    config_provenance = {
+        key: config.get(key)
+        for key in ["mc_tel_ids", "storage_backend", "sort_events", "compact_dtypes"]
+    }
+    config_provenance["split"] = split
+
+    provenance = get_provenance([input_file_dl1] + input_files_rfs, config_provenance)
+
+    return output_file, provenance
+
+
+def dl1_stereo_to_dl2(
+    input_file_dl1,
+    input_dir_rfs,
+    output_dir,
+    config,
+    estimators=None,
+    force=False,
+    split=None,
+):
     """
     Processes DL1-stereo events and reconstructs the DL2 parameters with
     trained RFs.
@@ -261,16 +411,36 @@ def dl1_stereo_to_dl2(input_file_dl1, input_dir_rfs, output_dir, config):
         Path to a directory where to save an output DL2 data file
     config: dict
         dictionary with telescope IDs information
+    estimators: dict
+        RFs already loaded with `load_rfs` - if given, the RFs are not
+        loaded again from the input RF directory
+    force: bool
+        If `True`, the output file is created even if it is up to date
+    split: dict
+        Split of the events returned by `find_input_files` - if given,
+        only the events of its subset are processed
     """
-    
-    TEL_NAMES, _ = telescope_combinations(config)
-    
+
+    output_file, provenance = _get_output_provenance(
+        input_file_dl1, input_dir_rfs, output_dir, config, split
+    )
+
+    if not force and is_up_to_date(output_file, provenance):
+        logger.info(f"\nOutput file is up to date, skipping: {output_file}")
+        return
+
     # Load the input DL1-stereo data file
     logger.info(f"\nInput DL1-stereo data file: {input_file_dl1}")
 
-    event_data = pd.read_hdf(input_file_dl1, key="events/parameters")
+    event_data = read_event_data(input_file_dl1)
+    event_data = event_data[select_split_events(event_data, split)]
+    event_data = apply_dtype_profile(event_data, config.get("compact_dtypes", False))
+
+    if not is_sorted_event_file(input_file_dl1):
+        order = np.argsort(get_event_sort_keys(event_data), kind="stable")
+        event_data = event_data.iloc[order]
+
     event_data.set_index(["obs_id", "event_id", "tel_id"], inplace=True)
-    event_data.sort_index(inplace=True)
 
     is_simulation = "true_energy" in event_data.columns
     logger.info(f"\nIs simulation: {is_simulation}")
@@ -280,80 +450,30 @@ def dl1_stereo_to_dl2(input_file_dl1, input_dir_rfs, output_dir, config):
     subarray = SubarrayDescription.from_hdf(input_file_dl1)
     tel_descriptions = subarray.tel
 
-    logger.info(f"\nInput RF directory: {input_dir_rfs}")
-
-    mask_energy_regressor = f"{input_dir_rfs}/energy_regressors_*.joblib"
-    mask_disp_regressor = f"{input_dir_rfs}/disp_regressors_*.joblib"
-    mask_event_classifier = f"{input_dir_rfs}/event_classifiers_*.joblib"
-
-    # Find the energy regressors
-    input_files_energy = glob.glob(mask_energy_regressor)
-    input_files_energy.sort()
-
-    n_files_energy = len(input_files_energy)
-
-    if n_files_energy > 0:
-        logger.info(f"\nIn total {n_files_energy} energy regressor files are found:")
-
-        for input_file_energy in input_files_energy:
-            logger.info(f"Applying {input_file_energy}...")
-
-            energy_regressor = EnergyRegressor(TEL_NAMES)
-            energy_regressor.load(input_file_energy)
-
-            # Apply the RFs
-            reco_params = apply_rfs(event_data, energy_regressor, config)
-            event_data.loc[reco_params.index, reco_params.columns] = reco_params
-
-    del energy_regressor
-
-    # Find the DISP regressors
-    input_files_dips = glob.glob(mask_disp_regressor)
-    input_files_dips.sort()
+    if estimators is None:
+        estimators = load_rfs(input_dir_rfs, config)
 
-    n_files_disp = len(input_files_dips)
-
-    if n_files_disp > 0:
-        logger.info(f"\nIn total {n_files_disp} DISP regressor files are found:")
-
-        for input_file_disp in input_files_dips:
-            logger.info(f"Applying {input_file_disp}...")
-
-            disp_regressor = DispRegressor(TEL_NAMES)
-            disp_regressor.load(input_file_disp)
+    # Apply the energy regressors
+    for energy_regressor in estimators["energy_regressors"]:
+        reco_params = apply_rfs(event_data, energy_regressor, config)
+        event_data.loc[reco_params.index, reco_params.columns] = reco_params
 
-            # Apply the RFs
-            reco_params = apply_rfs(event_data, disp_regressor, config)
-            event_data.loc[reco_params.index, reco_params.columns] = reco_params
+    # Apply the DISP regressors
+    for disp_regressor in estimators["disp_regressors"]:
+        reco_params = apply_rfs(event_data, disp_regressor, config)
+        event_data.loc[reco_params.index, reco_params.columns] = reco_params
 
+    if len(estimators["disp_regressors"]) > 0:
         # Reconstruct the arrival directions with the DISP method
         logger.info("\nReconstructing the arrival directions...")
 
         reco_params = reconstruct_arrival_direction(event_data, tel_descriptions, config)
         event_data.loc[reco_params.index, reco_params.columns] = reco_params
 
-    del disp_regressor
-
-    # Find the event classifiers
-    input_files_class = glob.glob(mask_event_classifier)
-    input_files_class.sort()
-
-    n_files_class = len(input_files_class)
-
-    if n_files_class > 0:
-        logger.info(f"\nIn total {n_files_class} event classifier files are found:")
-
-        for input_file_class in input_files_class:
-            logger.info(f"Applying {input_file_class}...")
-
-            event_classifier = EventClassifier(TEL_NAMES)
-            event_classifier.load(input_file_class)
-
-            # Apply the RFs
-            reco_params = apply_rfs(event_data, event_classifier, config)
-            event_data.loc[reco_params.index, reco_params.columns] = reco_params
-
-    del event_classifier
+    # Apply the event classifiers
+    for event_classifier in estimators["event_classifiers"]:
+        reco_params = apply_rfs(event_data, event_classifier, config)
+        event_data.loc[reco_params.index, reco_params.columns] = reco_params
 
     # In case of MAGIC-only analyses, here we drop `time_sec` and
     # `time_nanosec` but instead set `timestamp`, since the precise
@@ -371,13 +491,12 @@ def dl1_stereo_to_dl2(input_file_dl1, input_dir_rfs, output_dir, config):
     # Save the data in an output file
     Path(output_dir).mkdir(exist_ok=True, parents=True)
 
-    input_file_name = Path(input_file_dl1).name
-
-    output_file_name = input_file_name.replace("dl1_stereo", "dl2")
-    output_file = f"{output_dir}/{output_file_name}"
-
-    save_pandas_data_in_table(
-        event_data, output_file, group_name="/events", table_name="parameters"
+    save_event_data(
+        event_data,
+        output_file,
+        backend=config.get("storage_backend", "hdf5"),
+        sort_events=config.get("sort_events", False),
+        compact=config.get("compact_dtypes", False),
     )
 
     # Save the subarray description
@@ -395,23 +514,165 @@ def dl1_stereo_to_dl2(input_file_dl1, input_dir_rfs, output_dir, config):
             mode="a",
         )
 
+    # Record the provenance last, so that incomplete files are never
+    # considered up to date
+    write_provenance(output_file, provenance)
+
     logger.info(f"\nOutput file: {output_file}")
 
 
+def _process_file_with_loaded_rfs(
+    input_file_dl1, input_dir_rfs, output_dir, config, split=None
+):
+    """
+    Processes a DL1-stereo data file with the RFs loaded by the parent
+    process of the worker pool, which are inherited via fork.
+
+    Returns the path to the input file if the processing failed,
+    otherwise None.
+    """
+
+    try:
+        dl1_stereo_to_dl2(
+            input_file_dl1,
+            input_dir_rfs,
+            output_dir,
+            config,
+            estimators=_LOADED_ESTIMATORS,
+            force=True,
+            split=split,
+        )
+
+    except Exception:
+        logger.exception(f"\nFailed to process {input_file_dl1}:")
+        return input_file_dl1
+
+    return None
+
+
+def dl1_stereo_to_dl2_batch(
+    input_files_dl1,
+    input_dir_rfs,
+    output_dir,
+    config,
+    n_workers=1,
+    force=False,
+    split=None,
+):
+    """
+    Processes many DL1-stereo data files loading the trained RFs only
+    once. The files are processed with a pool of worker processes which
+    inherit the loaded RFs via fork, and one output DL2 data file is
+    created per input file as done by `dl1_stereo_to_dl2`.
+
+    Parameters
+    ----------
+    input_files_dl1: list
+        Paths to input DL1-stereo data files
+    input_dir_rfs: str
+        Path to a directory where trained RFs are stored
+    output_dir: str
+        Path to a directory where to save output DL2 data files
+    config: dict
+        dictionary with telescope IDs information
+    n_workers: int
+        Number of the worker processes
+    force: bool
+        If `True`, the output files are created even if they are up to
+        date
+    split: dict
+        Split of the events returned by `find_input_files` - if given,
+        only the events of its subset are processed
+
+    Raises
+    ------
+    RuntimeError
+        If any of the input files could not be processed
+    """
+
+    global _LOADED_ESTIMATORS
+
+    logger.info(f"\nIn total {len(input_files_dl1)} DL1-stereo data files are given")
+
+    if not force:
+        # Skip the files whose outputs are up to date, before loading
+        # the RFs which may not be needed at all
+        input_files_dl1 = [
+            input_file
+            for input_file in input_files_dl1
+            if not is_up_to_date(
+                *_get_output_provenance(
+                    input_file, input_dir_rfs, output_dir, config, split
+                )
+            )
+        ]
+
+        logger.info(f"{len(input_files_dl1)} files are not up to date")
+
+        if len(input_files_dl1) == 0:
+            return
+
+    _LOADED_ESTIMATORS = load_rfs(input_dir_rfs, config)
+
+    process_file = functools.partial(
+        _process_file_with_loaded_rfs,
+        input_dir_rfs=input_dir_rfs,
+        output_dir=output_dir,
+        config=config,
+        split=split,
+    )
+
+    try:
+        if n_workers > 1:
+            context = multiprocessing.get_context("fork")
+
+            with context.Pool(n_workers) as pool:
+                failed_files = pool.map(process_file, input_files_dl1, chunksize=1)
+
+        else:
+            failed_files = [process_file(input_file) for input_file in input_files_dl1]
+
+    finally:
+        _LOADED_ESTIMATORS = None
+
+    failed_files = [input_file for input_file in failed_files if input_file is not None]
+
+    if len(failed_files) > 0:
+        raise RuntimeError(
+            f"Could not process {len(failed_files)} input files:\n"
+            + "\n".join(failed_files)
+        )
+
+
 def main():
     start_time = time.time()
 
     parser = argparse.ArgumentParser()
 
-    parser.add_argument(
+    input_group = parser.add_mutually_exclusive_group(required=True)
+
+    input_group.add_argument(
         "--input-file-dl1",
         "-d",
         dest="input_file_dl1",
         type=str,
-        required=True,
         help="Path to an input DL1-stereo data file",
     )
 
+    input_group.add_argument(
+        "--input-dir",
+        dest="input_dir",
+        type=str,
+        help="Path to a directory where input DL1-stereo data files are stored, or to a manifest",
+    )
+
+    input_group.add_argument(
+        "--input-list",
+        dest="input_list",
+        type=str,
+        help="Path to a text file listing input DL1-stereo data files",
+    )
+
     parser.add_argument(
         "--input-dir-rfs",
         "-r",
@@ -439,13 +700,60 @@ def main():
         help="Path to a configuration file",
     )
 
+    parser.add_argument(
+        "--n-workers",
+        "-n",
+        dest="n_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes used with `--input-dir` or `--input-list`",
+    )
+
+    parser.add_argument(
+        "--force",
+        "-f",
+        dest="force",
+        action="store_true",
+        help="Process the input data even if the outputs are up to date",
+    )
+
     args = parser.parse_args()
     
     with open(args.config_file, "rb") as f:
         config = yaml.safe_load(f)
         
     # Process the input data
-    dl1_stereo_to_dl2(args.input_file_dl1, args.input_dir_rfs, args.output_dir, config)
+    if args.input_file_dl1 is not None:
+        dl1_stereo_to_dl2(
+            args.input_file_dl1,
+            args.input_dir_rfs,
+            args.output_dir,
+            config,
+            force=args.force,
+        )
+
+    else:
+        split = None
+
+        if args.input_dir is not None:
+            input_files_dl1, split = find_input_files(args.input_dir, "dl1_stereo_*.h5")
+        else:
+            input_files_dl1 = np.loadtxt(args.input_list, dtype=str, ndmin=1).tolist()
+
+        input_files_dl1.sort()
+
+        if len(input_files_dl1) == 0:
+            raise FileNotFoundError("Could not find any input DL1-stereo data files.")
+
+        dl1_stereo_to_dl2_batch(
+            input_files_dl1,
+            args.input_dir_rfs,
+            args.output_dir,
+            config,
+            args.n_workers,
+            args.force,
+            split,
+        )
 
     logger.info("\nDone.")
 
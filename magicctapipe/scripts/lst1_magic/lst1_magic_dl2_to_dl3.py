@@ -10,14 +10,30 @@ There are three methods for the interpolation of the IRFs, "nearest",
 "linear" and "cubic", which can be specified in the configuration file.
 The "nearest" method just selects the IRFs of the closest pointing
 direction in (cos(Zd), Az), and the other methods work only when there
-are multiple IRFs available from different pointing directions.
+are multiple IRFs available from different pointing directions. The
+triangulation of the pointing grid is built only once, also when many
+input files are processed.
+
+When many input files are given with `--input-dir` or `--input-list`,
+the IRFs are loaded only once and the files are processed with a pool of
+`--n-workers` processes, creating one output file per input file. The
+DL3 index files are not updated by this script, since several jobs may
+write in the same output directory at the same time, so run the script
+"create_dl3_index_files.py" once all the files are processed.
+
+The output files record the provenance of the input files, IRFs and
+configuration, and the input files whose outputs are up to date are
+skipped unless the `--force` argument is given.
 
 Usage:
 $ python lst1_magic_dl2_to_dl3.py
 --input-file-dl2 dl2_LST-1_MAGIC.Run03265.h5
+(or --input-dir dl2, or --input-list list_of_DL2_files.txt)
 --input-dir-irf irf
 (--output-dir dl3)
 (--config-file config.yaml)
+(--n-workers 8)
+(--force)
 
 Broader usage:
 This script is called automatically from the script "DL2_to_DL3.py".
@@ -25,8 +41,12 @@ If you want to analyse a target, this is the way to go. See this other script fo
 """
 
 import argparse
+import functools
+import glob
 import logging
+import multiprocessing
 import operator
+import os
 import time
 from pathlib import Path
 
@@ -36,17 +56,22 @@ from astropy import units as u
 from astropy.coordinates import Angle
 from astropy.io import fits
 from astropy.table import QTable
+from magicctapipe.irfs import IRFInterpolator
 from magicctapipe.io import (
     create_event_hdu,
     create_gh_cuts_hdu,
     create_gti_hdu,
     create_pointing_hdu,
+    find_irf_files,
     format_object,
+    get_input_identity,
+    get_provenance,
+    is_up_to_date,
     load_dl2_data_file,
     load_irf_files,
+    set_provenance_keywords,
 )
 from pyirf.cuts import evaluate_binned_cut
-from pyirf.interpolation import interpolate_effective_area_per_energy_and_fov
 from pyirf.io import (
     create_aeff2d_hdu,
     create_background_2d_hdu,
@@ -54,17 +79,114 @@ from pyirf.io import (
     create_psf_table_hdu,
     create_rad_max_hdu,
 )
-from pyirf.utils import cone_solid_angle
-from scipy.interpolate import griddata
 
-__all__ = ["dl2_to_dl3"]
+__all__ = ["load_irfs", "dl2_to_dl3", "dl2_to_dl3_batch"]
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# The settings of the observed source, which are passed to
+# `create_event_hdu`
+SOURCE_SETTINGS = [
+    "source_name",
+    "source_ra",
+    "source_dec",
+    "source_catalog",
+    "source_cache_file",
+    "resolve_source_online",
+]
+
+# The IRFs loaded once by `dl2_to_dl3_batch`, which are inherited by the
+# worker processes via fork
+_LOADED_IRFS = None
+
+
+def load_irfs(input_dir_irf, interpolation_method):
+    """
+    Loads the input IRF data files used for creating DL3 data files and
+    builds their interpolator.
+
+    Parameters
+    ----------
+    input_dir_irf: str
+        Path to a directory where input IRF files are stored
+    interpolation_method: str
+        Interpolation method of the IRFs - "nearest", "linear" or
+        "cubic"
+
+    Returns
+    -------
+    irfs: tuple
+        IRF data and extra header returned by `load_irf_files`, and the
+        interpolator of the IRFs
+    """
+
+    logger.info(f"\nInput IRF directory: {input_dir_irf}")
+
+    irf_data, extra_header = load_irf_files(input_dir_irf)
+
+    logger.info("\nGrid points in (cos(Zd), Az):")
+    logger.info(format_object(irf_data["grid_points"]))
+
+    logger.info("\nExtra header:")
+    logger.info(format_object(extra_header))
+
+    interpolator = IRFInterpolator(irf_data, interpolation_method)
+
+    return irf_data, extra_header, interpolator
+
+
+def _get_irf_identity(input_dir_irf, config):
+    """
+    Gets the identity of the inputs shared by all the DL3 data files,
+    i.e., the same IRF data files as `load_irf_files` and the source
+    catalog from which the source coordinate may be taken.
+    """
+
+    input_paths = find_irf_files(input_dir_irf)
+
+    source_catalog = config["dl2_to_dl3"].get("source_catalog")
+
+    if source_catalog is not None and Path(source_catalog).exists():
+        input_paths.append(source_catalog)
+
+    irf_identity = get_input_identity(input_paths)
+
+    return irf_identity
+
+
+def _get_output_provenance(input_file_dl2, output_dir, config, irf_identity):
+    """
+    Gets the path to the output DL3 data file of an input DL2 data file
+    and the provenance of the output file.
+    """
+
+    input_file_name = Path(input_file_dl2).name
+
+    output_file_name = input_file_name.replace("dl2", "dl3").replace(".h5", ".fits.gz")
+    output_file = f"{output_dir}/{output_file_name}"
+
+    config_provenance = {
+        key: config.get(key) for key in ["mc_tel_ids", "dl2_to_dl3", "compact_dtypes"]
+    }
+
+    provenance = get_provenance(
+        [input_file_dl2], config_provenance, input_identity=irf_identity
+    )
+
+    return output_file, provenance
+
 
-def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
+def dl2_to_dl3(
+    input_file_dl2,
+    input_dir_irf,
+    output_dir,
+    config,
+    irfs=None,
+    force=False,
+    irf_identity=None,
+):
     """
     Processes DL2 events and creates a DL3 data file with the IRFs.
 
@@ -78,20 +200,42 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
         Path to a directory where to save an output DL3 data file
     config: dict
         Configuration for the LST-1 + MAGIC analysis
+    irfs: tuple
+        IRFs already loaded with `load_irfs` - if given, the IRFs are
+        not loaded again from the input IRF directory
+    force: bool
+        If `True`, the output file is created even if it is up to date
+    irf_identity: list
+        Identity of the IRF data files already computed for many input
+        files - if given, the IRF data files are not read again
+
+    Returns
+    -------
+    output_file: str
+        Path to the output DL3 data file
     """
 
-    config_dl3 = config["dl2_to_dl3"]
+    if irf_identity is None:
+        irf_identity = _get_irf_identity(input_dir_irf, config)
 
-    # Load the input IRF data files
-    logger.info(f"\nInput IRF directory: {input_dir_irf}")
+    output_file, provenance = _get_output_provenance(
+        input_file_dl2, output_dir, config, irf_identity
+    )
 
-    irf_data, extra_header = load_irf_files(input_dir_irf)
+    if not force and is_up_to_date(output_file, provenance):
+        logger.info(f"\nOutput file is up to date, skipping: {output_file}")
+        return output_file
 
-    logger.info("\nGrid points in (cos(Zd), Az):")
-    logger.info(format_object(irf_data["grid_points"]))
+    config_dl3 = config["dl2_to_dl3"]
 
-    logger.info("\nExtra header:")
-    logger.info(format_object(extra_header))
+    interpolation_method = config_dl3["interpolation_method"]
+
+    # Load the input IRF data files
+    if irfs is None:
+        irfs = load_irfs(input_dir_irf, interpolation_method)
+
+    irf_data, extra_header, interpolator = irfs
+    extra_header = extra_header.copy()  # Modified below as well
 
     # Load the input DL2 data file
     logger.info(f"\nInput DL2 data file: {input_file_dl2}")
@@ -100,8 +244,25 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
     event_type = extra_header["EVT_TYPE"]
     dl2_weight_type = extra_header["DL2_WEIG"]
 
+    # Get the settings of the Alt/Az to RA/Dec transformation
+    time_resolution_radec = config_dl3.get("radec_time_resolution", "1 s")
+    accuracy_radec = config_dl3.get("radec_accuracy", "1 arcsec")
+
+    if time_resolution_radec is not None:
+        time_resolution_radec = u.Quantity(time_resolution_radec)
+
+    if accuracy_radec is not None:
+        accuracy_radec = u.Quantity(accuracy_radec)
+
     event_table, on_time, deadc = load_dl2_data_file(
-        config, input_file_dl2, quality_cuts, event_type, dl2_weight_type
+        config,
+        input_file_dl2,
+        quality_cuts,
+        event_type,
+        dl2_weight_type,
+        time_resolution_radec=time_resolution_radec,
+        accuracy_radec=accuracy_radec,
+        compact=config.get("compact_dtypes", False),
     )
 
     # Calculate the mean pointing direction for the target point of the
@@ -124,28 +285,24 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
     target_point = np.array([pnt_coszd_mean, pnt_az_mean])
     logger.info(f"\nTarget point in (cos(Zd), Az): {target_point.round(5).tolist()}")
 
-    # Prepare for the IRF interpolations
-    interpolation_method = config_dl3.pop("interpolation_method")
-    logger.info(f"\nInterpolation method: {interpolation_method}")
-
-    extra_header["IRF_INTP"] = interpolation_method
+    # Interpolate the IRFs to the target point. The interpolation
+    # weights are computed only once and applied to all the IRFs.
+    logger.info(f"\nInterpolation method: {interpolator.method}")
 
-    hdus = fits.HDUList([fits.PrimaryHDU()])
+    extra_header["IRF_INTP"] = interpolator.method
 
-    # Interpolate the effective area
-    logger.info("\nInterpolating the effective area...")
+    logger.info("\nInterpolating the IRFs...")
 
-    aeff_interp = interpolate_effective_area_per_energy_and_fov(
-        effective_area=irf_data["effective_area"],
-        grid_points=irf_data["grid_points"],
-        target_point=target_point,
-        method=interpolation_method,
-    )
+    # Remove the dimension of the target points
+    irfs_interp = {
+        key: values[0]
+        for key, values in interpolator.interpolate_irfs(target_point).items()
+    }
 
-    aeff_interp = aeff_interp[:, :, 0]  # Remove the dimension of the grid points
+    hdus = fits.HDUList([fits.PrimaryHDU()])
 
     aeff_hdu = create_aeff2d_hdu(
-        effective_area=aeff_interp,
+        effective_area=irfs_interp["effective_area"],
         true_energy_bins=irf_data["energy_bins"],
         fov_offset_bins=irf_data["fov_offset_bins"],
         point_like=True,
@@ -155,28 +312,8 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
 
     hdus.append(aeff_hdu)
 
-    # Interpolate the energy dispersion with a custom way, since there
-    # is a bug in the function of pyirf v0.6.0 about the renormalization
-    logger.info("Interpolating the energy dispersion...")
-
-    edisp_interp = griddata(
-        points=irf_data["grid_points"],
-        values=irf_data["energy_dispersion"],
-        xi=target_point,
-        method=interpolation_method,
-    )
-
-    edisp_interp = edisp_interp[0]  # Remove the dimension of the grid points
-
-    norm = np.sum(edisp_interp, axis=1, keepdims=True)  # Along the migration axis
-    mask_zeros = norm != 0
-
-    edisp_interp = np.divide(
-        edisp_interp, norm, out=np.zeros_like(edisp_interp), where=mask_zeros
-    )
-
     edisp_hdu = create_energy_dispersion_hdu(
-        energy_dispersion=edisp_interp,
+        energy_dispersion=irfs_interp["energy_dispersion"],
         true_energy_bins=irf_data["energy_bins"],
         migration_bins=irf_data["migration_bins"],
         fov_offset_bins=irf_data["fov_offset_bins"],
@@ -186,34 +323,9 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
 
     hdus.append(edisp_hdu)
 
-    if "psf_table" in irf_data:
-        # Interpolate the PSF table with a custom way, since there is a
-        # bug in the function of pyirf v0.6.0 about the renormalization
-        logger.info("Interpolating the PSF table...")
-
-        psf_interp = griddata(
-            points=irf_data["grid_points"],
-            values=irf_data["psf_table"].to_value("sr-1"),
-            xi=target_point,
-            method=interpolation_method,
-        )
-
-        # Remove the dimension of the grid points and add the unit
-        psf_interp = psf_interp[0] * u.Unit("sr-1")
-
-        # Re-normalize along the source offset axis
-        omegas = np.diff(cone_solid_angle(irf_data["source_offset_bins"]))
-
-        norm = np.sum(psf_interp * omegas, axis=2, keepdims=True)
-        mask_zeros = norm != 0
-
-        psf_interp = np.divide(
-            psf_interp, norm, out=np.zeros_like(psf_interp), where=mask_zeros
-        )
-
-        # Create a PSF table HDU
+    if "psf_table" in irfs_interp:
         psf_hdu = create_psf_table_hdu(
-            psf=psf_interp,
+            psf=irfs_interp["psf_table"],
             true_energy_bins=irf_data["energy_bins"],
             source_offset_bins=irf_data["source_offset_bins"],
             fov_offset_bins=irf_data["fov_offset_bins"],
@@ -223,22 +335,9 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
 
         hdus.append(psf_hdu)
 
-    if "background" in irf_data:
-        # Interpolate the background model
-        logger.info("Interpolating the background model...")
-
-        bkg = griddata(
-            points=irf_data["grid_points"],
-            values=irf_data["background"].to_value("MeV-1 s-1 sr-1"),
-            xi=target_point,
-            method=interpolation_method,
-        )
-
-        # Remove the dimension of the grid points and add the unit
-        bkg = bkg[0] * u.Unit("MeV-1 s-1 sr-1")
-
+    if "background" in irfs_interp:
         bkg_hdu = create_background_2d_hdu(
-            background_2d=bkg,
+            background_2d=irfs_interp["background"],
             reco_energy_bins=irf_data["energy_bins"],
             fov_offset_bins=irf_data["fov_offset_bins"],
             extname="BACKGROUND",
@@ -246,19 +345,8 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
 
         hdus.append(bkg_hdu)
 
-    if "gh_cuts" in irf_data:
-        # Interpolate the dynamic gammaness cuts
-        logger.info("Interpolating the dynamic gammaness cuts...")
-
-        gh_cuts_interp = griddata(
-            points=irf_data["grid_points"],
-            values=irf_data["gh_cuts"],
-            xi=target_point,
-            method=interpolation_method,
-        )
-
-        # Remove the dimension of the grid points
-        gh_cuts_interp = gh_cuts_interp[0]
+    if "gh_cuts" in irfs_interp:
+        gh_cuts_interp = irfs_interp["gh_cuts"]
 
         gh_cuts_hdu = create_gh_cuts_hdu(
             gh_cuts=gh_cuts_interp,
@@ -269,22 +357,9 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
 
         hdus.append(gh_cuts_hdu)
 
-    if "rad_max" in irf_data:
-        # Interpolate the dynamic theta cuts
-        logger.info("Interpolating the dynamic theta cuts...")
-
-        rad_max_interp = griddata(
-            points=irf_data["grid_points"],
-            values=irf_data["rad_max"].to_value("deg"),
-            xi=target_point,
-            method=interpolation_method,
-        )
-
-        # Remove the dimension of the grid points and add the unit
-        rad_max_interp = rad_max_interp[0] * u.deg
-
+    if "rad_max" in irfs_interp:
         rad_max_hdu = create_rad_max_hdu(
-            rad_max=rad_max_interp,
+            rad_max=irfs_interp["rad_max"],
             reco_energy_bins=irf_data["energy_bins"],
             fov_offset_bins=irf_data["fov_offset_bins"],
             point_like=True,
@@ -323,7 +398,11 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
     # Create an event HDU
     logger.info("\nCreating an event HDU...")
 
-    event_hdu = create_event_hdu(event_table, config, on_time, deadc, **config_dl3)
+    source_settings = {
+        key: value for key, value in config_dl3.items() if key in SOURCE_SETTINGS
+    }
+
+    event_hdu = create_event_hdu(event_table, config, on_time, deadc, **source_settings)
 
     hdus.append(event_hdu)
 
@@ -344,30 +423,176 @@ def dl2_to_dl3(input_file_dl2, input_dir_irf, output_dir, config):
     # Save the data in an output file
     Path(output_dir).mkdir(exist_ok=True, parents=True)
 
-    input_file_name = Path(input_file_dl2).name
+    # Record the provenance in the primary header, and write the file
+    # under a temporary name and rename it, so that incomplete files are
+    # never considered up to date
+    set_provenance_keywords(hdus[0].header, provenance)
 
-    output_file_name = input_file_name.replace("dl2", "dl3").replace(".h5", ".fits.gz")
-    output_file = f"{output_dir}/{output_file_name}"
+    output_file_tmp = f"{output_dir}/tmp{os.getpid()}_{Path(output_file).name}"
 
-    hdus.writeto(output_file, overwrite=True)
+    hdus.writeto(output_file_tmp, overwrite=True)
+    os.replace(output_file_tmp, output_file)
 
     logger.info(f"\nOutput file: {output_file}")
 
+    return output_file
+
+
+def _process_file_with_loaded_irfs(
+    input_file_dl2, input_dir_irf, output_dir, config, irf_identity
+):
+    """
+    Processes a DL2 data file with the IRFs loaded by the parent process
+    of the worker pool, which are inherited via fork.
+
+    Returns the path to the input file if the processing failed,
+    otherwise None.
+    """
+
+    try:
+        dl2_to_dl3(
+            input_file_dl2,
+            input_dir_irf,
+            output_dir,
+            config,
+            irfs=_LOADED_IRFS,
+            force=True,
+            irf_identity=irf_identity,
+        )
+
+    except Exception:
+        logger.exception(f"\nFailed to process {input_file_dl2}:")
+        return input_file_dl2
+
+    return None
+
+
+def dl2_to_dl3_batch(
+    input_files_dl2, input_dir_irf, output_dir, config, n_workers=1, force=False
+):
+    """
+    Processes many DL2 data files loading the IRFs only once. The files
+    are processed with a pool of worker processes which inherit the
+    loaded IRFs via fork, and one output DL3 data file is created per
+    input file as done by `dl2_to_dl3`. The DL3 index files of the
+    output directory are not updated, which is left to a single call of
+    `create_dl3_index_files` after all the jobs writing in the directory.
+
+    Parameters
+    ----------
+    input_files_dl2: list
+        Paths to input DL2 data files
+    input_dir_irf: str
+        Path to a directory where input IRF files are stored
+    output_dir: str
+        Path to a directory where to save output DL3 data files
+    config: dict
+        Configuration for the LST-1 + MAGIC analysis
+    n_workers: int
+        Number of the worker processes
+    force: bool
+        If `True`, the output files are created even if they are up to
+        date
+
+    Raises
+    ------
+    RuntimeError
+        If any of the input files could not be processed
+    """
+
+    global _LOADED_IRFS
+
+    logger.info(f"\nIn total {len(input_files_dl2)} DL2 data files are given")
+
+    input_files_to_process = input_files_dl2
+
+    # The IRF data files are shared by all the input files, so their
+    # identity is computed only once
+    irf_identity = _get_irf_identity(input_dir_irf, config)
+
+    if not force:
+        # Skip the files whose outputs are up to date, before loading
+        # the IRFs which may not be needed at all
+        input_files_to_process = [
+            input_file
+            for input_file in input_files_dl2
+            if not is_up_to_date(
+                *_get_output_provenance(input_file, output_dir, config, irf_identity)
+            )
+        ]
+
+        logger.info(f"{len(input_files_to_process)} files are not up to date")
+
+    failed_files = []
+
+    if len(input_files_to_process) > 0:
+        _LOADED_IRFS = load_irfs(
+            input_dir_irf, config["dl2_to_dl3"]["interpolation_method"]
+        )
+
+        process_file = functools.partial(
+            _process_file_with_loaded_irfs,
+            input_dir_irf=input_dir_irf,
+            output_dir=output_dir,
+            config=config,
+            irf_identity=irf_identity,
+        )
+
+        try:
+            if n_workers > 1:
+                context = multiprocessing.get_context("fork")
+
+                with context.Pool(n_workers) as pool:
+                    failed_files = pool.map(
+                        process_file, input_files_to_process, chunksize=1
+                    )
+
+            else:
+                failed_files = [
+                    process_file(input_file) for input_file in input_files_to_process
+                ]
+
+        finally:
+            _LOADED_IRFS = None
+
+    failed_files = [input_file for input_file in failed_files if input_file is not None]
+
+    if len(failed_files) > 0:
+        raise RuntimeError(
+            f"Could not process {len(failed_files)} input files:\n"
+            + "\n".join(failed_files)
+        )
+
 
 def main():
     start_time = time.time()
 
     parser = argparse.ArgumentParser()
 
-    parser.add_argument(
+    input_group = parser.add_mutually_exclusive_group(required=True)
+
+    input_group.add_argument(
         "--input-file-dl2",
         "-d",
         dest="input_file_dl2",
         type=str,
-        required=True,
         help="Path to an input DL2 data file",
     )
 
+    input_group.add_argument(
+        "--input-dir",
+        dest="input_dir",
+        type=str,
+        help="Path to a directory where input DL2 data files are stored",
+    )
+
+    input_group.add_argument(
+        "--input-list",
+        dest="input_list",
+        type=str,
+        help="Path to a text file listing input DL2 data files",
+    )
+
     parser.add_argument(
         "--input-dir-irf",
         "-i",
@@ -395,13 +620,57 @@ def main():
         help="Path to a configuration file",
     )
 
+    parser.add_argument(
+        "--n-workers",
+        "-n",
+        dest="n_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes used with `--input-dir` or `--input-list`",
+    )
+
+    parser.add_argument(
+        "--force",
+        "-f",
+        dest="force",
+        action="store_true",
+        help="Process the input data even if the outputs are up to date",
+    )
+
     args = parser.parse_args()
 
     with open(args.config_file, "rb") as f:
         config = yaml.safe_load(f)
 
     # Process the input data
-    dl2_to_dl3(args.input_file_dl2, args.input_dir_irf, args.output_dir, config)
+    if args.input_file_dl2 is not None:
+        dl2_to_dl3(
+            args.input_file_dl2,
+            args.input_dir_irf,
+            args.output_dir,
+            config,
+            force=args.force,
+        )
+
+    else:
+        if args.input_dir is not None:
+            input_files_dl2 = glob.glob(f"{args.input_dir}/dl2_*.h5")
+        else:
+            input_files_dl2 = np.loadtxt(args.input_list, dtype=str, ndmin=1).tolist()
+
+        input_files_dl2.sort()
+
+        if len(input_files_dl2) == 0:
+            raise FileNotFoundError("Could not find any input DL2 data files.")
+
+        dl2_to_dl3_batch(
+            input_files_dl2,
+            args.input_dir_irf,
+            args.output_dir,
+            config,
+            args.n_workers,
+            args.force,
+        )
 
     logger.info("\nDone.")
 
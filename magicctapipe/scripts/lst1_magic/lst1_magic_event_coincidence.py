@@ -41,6 +41,11 @@ $ python lst1_magic_event_coincidence.py
 --input-dir-magic dl1/MAGIC
 (--output-dir dl1_coincidence)
 (--config-file config.yaml)
+(--force)
+
+The output file records the provenance of the input files and
+configuration, and it is not created again if it is up to date unless
+the `--force` argument is given.
 
 Broader usage:
 This script is called automatically from the script "coincident_events.py".
@@ -48,6 +53,7 @@ If you want to analyse a target, this is the way to go. See this other script fo
 """
 
 import argparse
+import glob
 import logging
 import sys
 import time
@@ -61,12 +67,17 @@ from astropy import units as u
 from ctapipe.instrument import SubarrayDescription
 from magicctapipe.io import (
     format_object,
+    get_provenance,
     get_stereo_events,
+    is_up_to_date,
     load_lst_dl1_data_file,
     load_magic_dl1_data_files,
+    save_event_data,
     save_pandas_data_in_table,
     telescope_combinations,
+    write_provenance,
 )
+from magicctapipe.utils import get_event_sort_keys, group_sum, pack_sort_key
 
 __all__ = ["telescope_positions","event_coincidence"]
 
@@ -129,7 +140,7 @@ def telescope_positions(config):
 
 
 
-def event_coincidence(input_file_lst, input_dir_magic, output_dir, config):
+def event_coincidence(input_file_lst, input_dir_magic, output_dir, config, force=False):
     """
     Searches for coincident events from LST and MAGIC joint
     observation data offline using their timestamps.
@@ -144,8 +155,36 @@ def event_coincidence(input_file_lst, input_dir_magic, output_dir, config):
         Path to a directory where to save an output DL1 data file
     config: dict
         Configuration for the LST + MAGIC combined analysis
+    force: bool
+        If `True`, the output file is created even if it is up to date
     """
 
+    input_file_name = Path(input_file_lst).name
+
+    output_file_name = input_file_name.replace("LST", "MAGIC_LST")
+    output_file = f"{output_dir}/{output_file_name}"
+
+    # Check whether the output file was already created from the same
+    # input files and configuration
+    input_files_magic = sorted(glob.glob(f"{input_dir_magic}/dl1_*.h5"))
+
+    config_provenance = {
+        key: config.get(key)
+        for key in [
+            "mc_tel_ids",
+            "event_coincidence",
+            "storage_backend",
+            "sort_events",
+            "compact_dtypes",
+        ]
+    }
+
+    provenance = get_provenance([input_file_lst] + input_files_magic, config_provenance)
+
+    if not force and is_up_to_date(output_file, provenance):
+        logger.info(f"\nOutput file is up to date, skipping: {output_file}")
+        return
+
     config_coinc = config["event_coincidence"]
 
     TEL_NAMES, _ = telescope_combinations(config)
@@ -155,12 +194,16 @@ def event_coincidence(input_file_lst, input_dir_magic, output_dir, config):
     # Load the input LST DL1 data file
     logger.info(f"\nInput LST DL1 data file: {input_file_lst}")
 
-    event_data_lst, subarray_lst = load_lst_dl1_data_file(input_file_lst)
+    compact = config.get("compact_dtypes", False)
+
+    event_data_lst, subarray_lst = load_lst_dl1_data_file(input_file_lst, compact)
 
     # Load the input MAGIC DL1 data files
     logger.info(f"\nInput MAGIC directory: {input_dir_magic}")
 
-    event_data_magic, subarray_magic = load_magic_dl1_data_files(input_dir_magic, config)
+    event_data_magic, subarray_magic = load_magic_dl1_data_files(
+        input_dir_magic, config, compact
+    )
 
     # Exclude the parameters non-common to LST and MAGIC data
     timestamp_type_lst = config_coinc["timestamp_type_lst"]
@@ -341,12 +384,16 @@ def event_coincidence(input_file_lst, input_dir_magic, output_dir, config):
         df_lst.set_index(["obs_id_magic", "event_id_magic", "tel_id"], inplace=True)
 
         # Assign also the LST observation and event IDs to the MAGIC
-        # events coincident with the LST events
-        obs_ids_lst = df_lst["obs_id_lst"].to_numpy()
-        event_ids_lst = df_lst["event_id_lst"].to_numpy()
+        # events coincident with the LST events. They are assigned by the
+        # positions of the MAGIC events instead of the multi index.
+        obs_ids_lst = np.full(len(df_magic), np.nan)
+        event_ids_lst = np.full(len(df_magic), np.nan)
+
+        obs_ids_lst[indices_magic] = df_lst["obs_id_lst"].to_numpy()
+        event_ids_lst[indices_magic] = df_lst["event_id_lst"].to_numpy()
 
-        df_magic.loc[multi_indices_magic, "obs_id_lst"] = obs_ids_lst
-        df_magic.loc[multi_indices_magic, "event_id_lst"] = event_ids_lst
+        df_magic["obs_id_lst"] = obs_ids_lst
+        df_magic["event_id_lst"] = event_ids_lst
 
         # Arrange the data frames
         coincidence_id = "1" + str(tel_id)  # Combination of the telescope IDs
@@ -381,7 +428,18 @@ def event_coincidence(input_file_lst, input_dir_magic, output_dir, config):
         logger.info("\nNo coincident events are found. Exiting...")
         sys.exit()
 
-    event_data.sort_index(inplace=True)
+    # Sort the events with the packed keys of the MAGIC observation and
+    # event IDs and the telescope IDs, which is much faster than sorting
+    # the multi index
+    obs_ids_magic = event_data.index.get_level_values("obs_id_magic").to_numpy()
+    event_ids_magic = event_data.index.get_level_values("event_id_magic").to_numpy()
+    tel_ids = event_data.index.get_level_values("tel_id").to_numpy()
+
+    order = np.argsort(
+        pack_sort_key(obs_ids_magic, event_ids_magic, tel_ids), kind="stable"
+    )
+
+    event_data = event_data.iloc[order]
     event_data.drop_duplicates(inplace=True)
 
     # It sometimes happen that even if it is a MAGIC-stereo event, only
@@ -393,35 +451,56 @@ def event_coincidence(input_file_lst, input_dir_magic, output_dir, config):
     # events, since the stereo reconstruction is still feasible, but not
     # yet used for the high level analysis.
 
-    group_mean = event_data.groupby(["obs_id_magic", "event_id_magic"]).mean()
+    event_data.reset_index(inplace=True)
 
-    event_data["obs_id"] = group_mean["obs_id_lst"]
-    event_data["event_id"] = group_mean["event_id_lst"]
+    # Assign the mean LST observation and event IDs per MAGIC shower
+    # event, skipping the MAGIC events not coincident with LST events
+    shower_keys_magic = pack_sort_key(
+        event_data["obs_id_magic"].to_numpy(), event_data["event_id_magic"].to_numpy()
+    )
 
-    indices = event_data[event_data["obs_id"].isna()].index
+    _, event_codes = np.unique(shower_keys_magic, return_inverse=True)
+    n_events = event_codes.max() + 1
 
-    event_data.loc[indices, "obs_id"] = indices.get_level_values("obs_id_magic")
-    event_data.loc[indices, "event_id"] = indices.get_level_values("event_id_magic")
+    for id_type in ["obs_id", "event_id"]:
+        ids_lst = event_data[f"{id_type}_lst"].to_numpy(dtype=np.float64)
+        ids_magic = event_data[f"{id_type}_magic"].to_numpy()
 
-    event_data.reset_index(inplace=True)
-    event_data.set_index(["obs_id", "event_id", "tel_id"], inplace=True)
-    event_data.sort_index(inplace=True)
+        is_lst_id = ~np.isnan(ids_lst)
 
-    event_data = get_stereo_events(event_data, config)
-    event_data.reset_index(inplace=True)
+        id_sums = group_sum(ids_lst[is_lst_id], event_codes[is_lst_id], n_events)
+        n_ids = np.bincount(event_codes[is_lst_id], minlength=n_events)
 
-    event_data = event_data.astype({"obs_id": int, "event_id": int})
+        ids_mean = np.full(n_events, np.nan)
+        np.divide(id_sums, n_ids, out=ids_mean, where=n_ids > 0)
 
-    # Save the data in an output file
-    Path(output_dir).mkdir(exist_ok=True, parents=True)
+        ids = ids_mean[event_codes]
+        ids = np.where(np.isnan(ids), ids_magic, ids)
 
-    input_file_name = Path(input_file_lst).name
+        event_data[id_type] = ids.astype(np.int64)
 
-    output_file_name = input_file_name.replace("LST", "MAGIC_LST")
-    output_file = f"{output_dir}/{output_file_name}"
+    # Sort the events by the new observation and event IDs
+    order = np.argsort(get_event_sort_keys(event_data), kind="stable")
+    event_data = event_data.iloc[order]
 
-    save_pandas_data_in_table(
-        event_data, output_file, group_name="/events", table_name="parameters", mode="w"
+    columns = ["obs_id", "event_id", "tel_id"]
+    columns += [column for column in event_data.columns if column not in columns]
+
+    event_data = event_data[columns]
+    event_data.reset_index(drop=True, inplace=True)
+
+    event_data = get_stereo_events(event_data, config)
+    event_data.reset_index(drop=True, inplace=True)
+
+    # Save the data in an output file
+    Path(output_dir).mkdir(exist_ok=True, parents=True)
+
+    save_event_data(
+        event_data,
+        output_file,
+        backend=config.get("storage_backend", "hdf5"),
+        sort_events=config.get("sort_events", False),
+        compact=compact,
     )
 
     save_pandas_data_in_table(
@@ -449,6 +528,10 @@ def event_coincidence(input_file_lst, input_dir_magic, output_dir, config):
     # Save the subarray description
     subarray_lst_magic.to_hdf(output_file)
 
+    # Record the provenance last, so that incomplete files are never
+    # considered up to date
+    write_provenance(output_file, provenance)
+
     logger.info(f"\nOutput file: {output_file}")
 
 
@@ -494,6 +577,14 @@ def main():
         help="Path to a configuration file",
     )
 
+    parser.add_argument(
+        "--force",
+        "-f",
+        dest="force",
+        action="store_true",
+        help="Process the input data even if the output is up to date",
+    )
+
     args = parser.parse_args()
 
     with open(args.config_file, "rb") as f:
@@ -501,7 +592,7 @@ def main():
 
     # Check the event coincidence
     event_coincidence(
-        args.input_file_lst, args.input_dir_magic, args.output_dir, config
+        args.input_file_lst, args.input_dir_magic, args.output_dir, config, args.force
     )
 
     logger.info("\nDone.")
@@ -24,6 +24,11 @@ $ python lst1_magic_stereo_reco.py
 (--output-dir dl1_stereo)
 (--config-file config.yaml)
 (--magic-only)
+(--force)
+
+The output file records the provenance of the input file and
+configuration, and it is not created again if it is up to date unless
+the `--force` argument is given.
 
 Broader usage:
 This script is called automatically from the script "stereo_events.py".
@@ -48,8 +53,23 @@ from ctapipe.containers import (
 )
 from ctapipe.instrument import SubarrayDescription
 from ctapipe.reco import HillasReconstructor
-from magicctapipe.io import format_object, get_stereo_events, save_pandas_data_in_table
-from magicctapipe.utils import calculate_impact, calculate_mean_direction
+from magicctapipe.io import (
+    apply_dtype_profile,
+    format_object,
+    get_provenance,
+    get_stereo_events,
+    is_up_to_date,
+    read_event_data,
+    save_event_data,
+    save_pandas_data_in_table,
+    write_provenance,
+)
+from magicctapipe.utils import (
+    calculate_impact,
+    calculate_mean_direction,
+    get_event_sort_keys,
+    get_shower_key,
+)
 
 __all__ = ["calculate_pointing_separation", "stereo_reconstruction"]
 
@@ -106,7 +126,9 @@ def calculate_pointing_separation(event_data, config):
     return theta
 
 
-def stereo_reconstruction(input_file, output_dir, config, magic_only_analysis=False):
+def stereo_reconstruction(
+    input_file, output_dir, config, magic_only_analysis=False, force=False
+):
     """
     Processes DL1 events and reconstructs the geometrical stereo
     parameters with more than one telescope information.
@@ -122,15 +144,47 @@ def stereo_reconstruction(input_file, output_dir, config, magic_only_analysis=Fa
     magic_only_analysis: bool
         If `True`, it reconstructs the stereo parameters using only
         MAGIC events
+    force: bool
+        If `True`, the output file is created even if it is up to date
     """
 
+    input_file_name = Path(input_file).name
+
+    if magic_only_analysis:
+        output_file_name = input_file_name.replace("dl1", "dl1_stereo_magic_only")
+    else:
+        output_file_name = input_file_name.replace("dl1", "dl1_stereo")
+
+    output_file = f"{output_dir}/{output_file_name}"
+
+    # Check whether the output file was already created from the same
+    # input file and configuration
+    config_provenance = {
+        key: config.get(key)
+        for key in [
+            "mc_tel_ids",
+            "stereo_reco",
+            "storage_backend",
+            "sort_events",
+            "compact_dtypes",
+        ]
+    }
+    config_provenance["magic_only_analysis"] = magic_only_analysis
+
+    provenance = get_provenance([input_file], config_provenance)
+
+    if not force and is_up_to_date(output_file, provenance):
+        logger.info(f"\nOutput file is up to date, skipping: {output_file}")
+        return
+
     config_stereo = config["stereo_reco"]
     assigned_tel_ids = config["mc_tel_ids"] #This variable becomes a dictionary, e.g.: {'LST-1': 1, 'LST-2': 0, 'LST-3': 0, 'LST-4': 0, 'MAGIC-I': 2, 'MAGIC-II': 3}
     
     # Load the input file
     logger.info(f"\nInput file: {input_file}")
 
-    event_data = pd.read_hdf(input_file, key="events/parameters")
+    event_data = read_event_data(input_file)
+    event_data = apply_dtype_profile(event_data, config.get("compact_dtypes", False))
 
     # It sometimes happens that there are MAGIC events whose event and
     # telescope IDs are duplicated, so here we exclude those events
@@ -138,8 +192,11 @@ def stereo_reconstruction(input_file, output_dir, config, magic_only_analysis=Fa
         subset=["obs_id", "event_id", "tel_id"], keep=False, inplace=True
     )
 
+    # Sort the events with the packed event keys, which is much faster
+    # than sorting the multi index
+    order = np.argsort(get_event_sort_keys(event_data), kind="stable")
+    event_data = event_data.iloc[order]
     event_data.set_index(["obs_id", "event_id", "tel_id"], inplace=True)
-    event_data.sort_index(inplace=True)
 
     is_simulation = "true_energy" in event_data.columns
     logger.info(f"\nIs simulation: {is_simulation}")
@@ -217,48 +274,90 @@ def stereo_reconstruction(input_file, output_dir, config, magic_only_analysis=Fa
         lon=event_data["pointing_az"], lat=event_data["pointing_alt"], unit="rad"
     )
 
+    # Get the rows of every shower event with the packed event keys, so
+    # that the events are accessed by the positions instead of the multi
+    # index. The shower events are in the same order as the mean
+    # pointing directions, i.e., sorted by the observation and event IDs.
+    event_keys = get_event_sort_keys(event_data)
+    rows_sorted = np.argsort(event_keys, kind="stable")
+
+    shower_keys = get_shower_key(event_keys[rows_sorted])
+    group_starts = np.flatnonzero(np.diff(shower_keys) != 0) + 1
+
+    event_ids = event_data.index.get_level_values("event_id").to_numpy()
+    tel_ids = event_data.index.get_level_values("tel_id").to_numpy()
+
+    pnt_alt_mean = pnt_alt_mean.to_numpy()
+    pnt_az_mean = pnt_az_mean.to_numpy()
+
+    columns = [
+        "pointing_alt",
+        "pointing_az",
+        "intensity",
+        "x",
+        "y",
+        "r",
+        "phi",
+        "length",
+        "width",
+        "psi",
+        "skewness",
+        "kurtosis",
+    ]
+
+    dl1_params = {column: event_data[column].to_numpy() for column in columns}
+
+    stereo_columns = [
+        "alt",
+        "alt_uncert",
+        "az",
+        "az_uncert",
+        "core_x",
+        "core_y",
+        "impact",
+        "h_max",
+    ]
+
+    stereo_params = {column: np.full(len(event_data), np.nan) for column in stereo_columns}
+
     # Loop over every shower event
     logger.info("\nReconstructing the stereo parameters...")
 
-    multi_indices = event_data.groupby(["obs_id", "event_id"]).size().index
-
-    for i_evt, (obs_id, event_id) in enumerate(multi_indices):
+    for i_evt, rows in enumerate(np.split(rows_sorted, group_starts)):
 
         if i_evt % 100 == 0:
             logger.info(f"{i_evt} events")
 
+        event_id = event_ids[rows[0]]
+
         # Create an array event container
         event = ArrayEventContainer()
 
         # Assign the mean pointing direction
-        event.pointing.array_altitude = pnt_alt_mean.loc[(obs_id, event_id)] * u.rad
-        event.pointing.array_azimuth = pnt_az_mean.loc[(obs_id, event_id)] * u.rad
-
-        # Extract the data frame of the shower event
-        df_evt = event_data.loc[(obs_id, event_id, slice(None))]
+        event.pointing.array_altitude = pnt_alt_mean[i_evt] * u.rad
+        event.pointing.array_azimuth = pnt_az_mean[i_evt] * u.rad
 
         # Loop over every telescope
-        tel_ids = df_evt.index.get_level_values("tel_id")
+        for row in rows:
 
-        for tel_id in tel_ids:
-
-            df_tel = df_evt.loc[tel_id]
+            tel_id = tel_ids[row]
+            params = {column: values[row] for column, values in dl1_params.items()}
 
             # Assign the telescope information
-            event.pointing.tel[tel_id].altitude = df_tel["pointing_alt"] * u.rad
-            event.pointing.tel[tel_id].azimuth = df_tel["pointing_az"] * u.rad
+            event.pointing.tel[tel_id].altitude = params["pointing_alt"] * u.rad
+            event.pointing.tel[tel_id].azimuth = params["pointing_az"] * u.rad
 
             hillas_params = CameraHillasParametersContainer(
-                intensity=float(df_tel["intensity"]),
-                x=u.Quantity(df_tel["x"], unit="m"),
-                y=u.Quantity(df_tel["y"], unit="m"),
-                r=u.Quantity(df_tel["r"], unit="m"),
-                phi=Angle(df_tel["phi"], unit="deg"),
-                length=u.Quantity(df_tel["length"], unit="m"),
-                width=u.Quantity(df_tel["width"], unit="m"),
-                psi=Angle(df_tel["psi"], unit="deg"),
-                skewness=float(df_tel["skewness"]),
-                kurtosis=float(df_tel["kurtosis"]),
+                intensity=float(params["intensity"]),
+                x=u.Quantity(params["x"], unit="m"),
+                y=u.Quantity(params["y"], unit="m"),
+                r=u.Quantity(params["r"], unit="m"),
+                phi=Angle(params["phi"], unit="deg"),
+                length=u.Quantity(params["length"], unit="m"),
+                width=u.Quantity(params["width"], unit="m"),
+                psi=Angle(params["psi"], unit="deg"),
+                skewness=float(params["skewness"]),
+                kurtosis=float(params["kurtosis"]),
             )
 
             event.dl1.tel[tel_id].parameters = ImageParametersContainer(
@@ -268,42 +367,43 @@ def stereo_reconstruction(input_file, output_dir, config, magic_only_analysis=Fa
         # Reconstruct the stereo parameters
         hillas_reconstructor(event)
 
-        stereo_params = event.dl2.stereo.geometry["HillasReconstructor"]
+        stereo_container = event.dl2.stereo.geometry["HillasReconstructor"]
 
-        if not stereo_params.is_valid:
+        if not stereo_container.is_valid:
             logger.info(
                 f"--> event {i_evt} (event ID {event_id}) failed to reconstruct valid "
                 "stereo parameters, maybe due to the images of zero width. Skipping..."
             )
             continue
 
-        stereo_params.az.wrap_at("360 deg", inplace=True)
+        stereo_container.az.wrap_at("360 deg", inplace=True)
+
+        for row in rows:
+            tel_id = tel_ids[row]
 
-        for tel_id in tel_ids:
             # Calculate the impact parameter
             impact = calculate_impact(
-                shower_alt=stereo_params.alt,
-                shower_az=stereo_params.az,
-                core_x=stereo_params.core_x,
-                core_y=stereo_params.core_y,
+                shower_alt=stereo_container.alt,
+                shower_az=stereo_container.az,
+                core_x=stereo_container.core_x,
+                core_y=stereo_container.core_y,
                 tel_pos_x=tel_positions[tel_id][0],
                 tel_pos_y=tel_positions[tel_id][1],
                 tel_pos_z=tel_positions[tel_id][2],
             )
 
-            # Set the stereo parameters to the data frame
-            params = {
-                "alt": stereo_params.alt.to_value("deg"),
-                "alt_uncert": stereo_params.alt_uncert.to_value("deg"),
-                "az": stereo_params.az.to_value("deg"),
-                "az_uncert": stereo_params.az_uncert.to_value("deg"),
-                "core_x": stereo_params.core_x.to_value("m"),
-                "core_y": stereo_params.core_y.to_value("m"),
-                "impact": impact.to_value("m"),
-                "h_max": stereo_params.h_max.to_value("m"),
-            }
+            # Set the stereo parameters to the arrays
+            stereo_params["alt"][row] = stereo_container.alt.to_value("deg")
+            stereo_params["alt_uncert"][row] = stereo_container.alt_uncert.to_value("deg")
+            stereo_params["az"][row] = stereo_container.az.to_value("deg")
+            stereo_params["az_uncert"][row] = stereo_container.az_uncert.to_value("deg")
+            stereo_params["core_x"][row] = stereo_container.core_x.to_value("m")
+            stereo_params["core_y"][row] = stereo_container.core_y.to_value("m")
+            stereo_params["impact"][row] = impact.to_value("m")
+            stereo_params["h_max"][row] = stereo_container.h_max.to_value("m")
 
-            event_data.loc[(obs_id, event_id, tel_id), params.keys()] = params.values()
+    for column, values in stereo_params.items():
+        event_data[column] = values
 
     n_events_processed = i_evt + 1
     logger.info(f"{n_events_processed} events")
@@ -313,17 +413,12 @@ def stereo_reconstruction(input_file, output_dir, config, magic_only_analysis=Fa
     # Save the data in an output file
     Path(output_dir).mkdir(exist_ok=True, parents=True)
 
-    input_file_name = Path(input_file).name
-
-    if magic_only_analysis:
-        output_file_name = input_file_name.replace("dl1", "dl1_stereo_magic_only")
-    else:
-        output_file_name = input_file_name.replace("dl1", "dl1_stereo")
-
-    output_file = f"{output_dir}/{output_file_name}"
-
-    save_pandas_data_in_table(
-        event_data, output_file, group_name="/events", table_name="parameters"
+    save_event_data(
+        event_data,
+        output_file,
+        backend=config.get("storage_backend", "hdf5"),
+        sort_events=config.get("sort_events", False),
+        compact=config.get("compact_dtypes", False),
     )
 
     # Save the subarray description
@@ -341,6 +436,10 @@ def stereo_reconstruction(input_file, output_dir, config, magic_only_analysis=Fa
             mode="a",
         )
 
+    # Record the provenance last, so that incomplete files are never
+    # considered up to date
+    write_provenance(output_file, provenance)
+
     logger.info(f"\nOutput file: {output_file}")
 
 
@@ -384,13 +483,23 @@ def main():
         help="Reconstruct the stereo parameters using only MAGIC events",
     )
 
+    parser.add_argument(
+        "--force",
+        "-f",
+        dest="force",
+        action="store_true",
+        help="Process the input data even if the output is up to date",
+    )
+
     args = parser.parse_args()
 
     with open(args.config_file, "rb") as f:
         config = yaml.safe_load(f)
     
     # Process the input data
-    stereo_reconstruction(args.input_file, args.output_dir, config, args.magic_only)
+    stereo_reconstruction(
+        args.input_file, args.output_dir, config, args.magic_only, args.force
+    )
 
     logger.info("\nDone.")
 
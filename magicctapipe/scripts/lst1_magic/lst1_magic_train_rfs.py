@@ -38,19 +38,21 @@ If you want to analyse a target, this is the way to go. See this other script fo
 
 import argparse
 import logging
-import random
 import time
 from pathlib import Path
 
-import numpy as np
 import pandas as pd
 import yaml
-from magicctapipe.io import format_object, load_train_data_files_tel, telescope_combinations
-from magicctapipe.io.io import GROUP_INDEX_TRAIN
+from magicctapipe.io import (
+    count_train_data_files_tel,
+    format_object,
+    load_train_data_files_tel,
+    sample_train_data_files_tel,
+    telescope_combinations,
+)
 from magicctapipe.reco import DispRegressor, EnergyRegressor, EventClassifier
 
 __all__ = [
-    "get_events_at_random",
     "train_energy_regressor",
     "train_disp_regressor",
     "train_event_classifier",
@@ -64,41 +66,8 @@ logger.setLevel(logging.INFO)
 EVENT_CLASS_GAMMA = 0
 EVENT_CLASS_PROTON = 1
 
-# Set the random seed
-random.seed(1000)
-
-
-def get_events_at_random(event_data, n_events_random):
-    """
-    Extracts a given number of shower events randomly.
-
-    Parameters
-    ----------
-    event_data: pandas.core.frame.DataFrame
-        Data frame of shower events
-    n_events_random: int or float
-        Number of events to be extracted randomly
-
-    Returns
-    -------
-    event_data_selected: pandas.core.frame.DataFrame
-        Data frame of the shower events extracted randomly
-    """
-
-    # Get the unique multi indices
-    multi_indices_unique = np.unique(event_data.index).tolist()
-
-    # Extract a given number of indices randomly
-    multi_indices_random = pd.MultiIndex.from_tuples(
-        tuples=random.sample(multi_indices_unique, n_events_random),
-        names=event_data.index.names,
-    )
-
-    # Extract the events of the random indices
-    event_data_selected = event_data.loc[multi_indices_random]
-    event_data_selected.sort_index(inplace=True)
-
-    return event_data_selected
+# The random seed used when extracting the training events
+RANDOM_SEED = 1000
 
 
 def train_energy_regressor(input_dir, output_dir, config, use_unsigned_features=False):
@@ -130,7 +99,11 @@ def train_energy_regressor(input_dir, output_dir, config, use_unsigned_features=
     logger.info(f"\nInput directory: {input_dir}")
 
     event_data_train = load_train_data_files_tel(
-        input_dir, config, gamma_offaxis["min"], gamma_offaxis["max"]
+        input_dir,
+        config,
+        gamma_offaxis["min"],
+        gamma_offaxis["max"],
+        compact=config.get("compact_dtypes", False),
     )
 
     # Configure the energy regressor
@@ -159,14 +132,16 @@ def train_energy_regressor(input_dir, output_dir, config, use_unsigned_features=
         # Train the RFs
         energy_regressor.fit(df_train)
 
-        # Check the feature importance
+        # Check the feature importance, which is not available with the
+        # gradient boosting backend
         telescope_rf = energy_regressor.telescope_rfs[tel_id]
 
-        importances = telescope_rf.feature_importances_.round(5)
-        importances = dict(zip(energy_regressor.features, importances))
+        if hasattr(telescope_rf, "feature_importances_"):
+            importances = telescope_rf.feature_importances_.round(5)
+            importances = dict(zip(energy_regressor.features, importances))
 
-        logger.info(f"\n{TEL_NAMES[tel_id]} feature importance:")
-        logger.info(format_object(importances))
+            logger.info(f"\n{TEL_NAMES[tel_id]} feature importance:")
+            logger.info(format_object(importances))
 
         # Save the trained RFs
         if use_unsigned_features:
@@ -208,7 +183,11 @@ def train_disp_regressor(input_dir, output_dir, config, use_unsigned_features=Fa
     logger.info(f"\nInput directory: {input_dir}")
 
     event_data_train = load_train_data_files_tel(
-        input_dir, config, gamma_offaxis["min"], gamma_offaxis["max"]
+        input_dir,
+        config,
+        gamma_offaxis["min"],
+        gamma_offaxis["max"],
+        compact=config.get("compact_dtypes", False),
     )
 
     # Configure the DISP regressor
@@ -235,14 +214,16 @@ def train_disp_regressor(input_dir, output_dir, config, use_unsigned_features=Fa
         # Train the RFs
         disp_regressor.fit(df_train)
 
-        # Check the feature importance
+        # Check the feature importance, which is not available with the
+        # gradient boosting backend
         telescope_rf = disp_regressor.telescope_rfs[tel_id]
 
-        importances = telescope_rf.feature_importances_.round(5)
-        importances = dict(zip(disp_regressor.features, importances))
+        if hasattr(telescope_rf, "feature_importances_"):
+            importances = telescope_rf.feature_importances_.round(5)
+            importances = dict(zip(disp_regressor.features, importances))
 
-        logger.info(f"\n{TEL_NAMES[tel_id]} feature importance:")
-        logger.info(format_object(importances))
+            logger.info(f"\n{TEL_NAMES[tel_id]} feature importance:")
+            logger.info(format_object(importances))
 
         # Save the trained RFs to an output file
         if use_unsigned_features:
@@ -284,18 +265,48 @@ def train_event_classifier(
     logger.info("\nGamma off-axis angles allowed:")
     logger.info(format_object(gamma_offaxis))
 
-    # Load the input gamma MC data files
+    # Count the input events to adjust the number of training samples
     logger.info(f"\nInput gamma MC directory: {input_dir_gamma}")
 
-    event_data_gamma = load_train_data_files_tel(
-        input_dir_gamma, config, gamma_offaxis["min"], gamma_offaxis["max"], EVENT_CLASS_GAMMA
+    n_events_gamma = count_train_data_files_tel(
+        input_dir_gamma, config, gamma_offaxis["min"], gamma_offaxis["max"]
     )
 
-    # Load the input proton MC data files
     logger.info(f"\nInput proton MC directory: {input_dir_proton}")
 
-    event_data_proton = load_train_data_files_tel(
-        input_dir_proton, config, true_event_class=EVENT_CLASS_PROTON
+    n_events_proton = count_train_data_files_tel(input_dir_proton, config)
+
+    n_events_train = {}
+
+    for tel_id in TEL_NAMES.keys():
+        n_events_train[tel_id] = min(n_events_gamma[tel_id], n_events_proton[tel_id])
+
+        logger.info(
+            f"{TEL_NAMES[tel_id]}: {n_events_gamma[tel_id]} gamma and "
+            f"{n_events_proton[tel_id]} proton MC events -> "
+            f"extracting {n_events_train[tel_id]} events each"
+        )
+
+    # Load the input gamma MC data files
+    event_data_gamma = sample_train_data_files_tel(
+        input_dir=input_dir_gamma,
+        config=config,
+        n_events=n_events_train,
+        offaxis_min=gamma_offaxis["min"],
+        offaxis_max=gamma_offaxis["max"],
+        true_event_class=EVENT_CLASS_GAMMA,
+        random_state=RANDOM_SEED,
+        compact=config.get("compact_dtypes", False),
+    )
+
+    # Load the input proton MC data files
+    event_data_proton = sample_train_data_files_tel(
+        input_dir=input_dir_proton,
+        config=config,
+        n_events=n_events_train,
+        true_event_class=EVENT_CLASS_PROTON,
+        random_state=RANDOM_SEED,
+        compact=config.get("compact_dtypes", False),
     )
 
     # Configure the event classifier
@@ -324,31 +335,21 @@ def train_event_classifier(
         df_gamma = event_data_gamma[tel_id]
         df_proton = event_data_proton[tel_id]
 
-        # Adjust the number of training samples
-        n_events_gamma = len(df_gamma.groupby(GROUP_INDEX_TRAIN).size())
-        n_events_proton = len(df_proton.groupby(GROUP_INDEX_TRAIN).size())
-
-        if n_events_gamma > n_events_proton:
-            logger.info(f"Extracting {n_events_proton} gamma MC events...")
-            df_gamma = get_events_at_random(df_gamma, n_events_proton)
-
-        elif n_events_proton > n_events_gamma:
-            logger.info(f"Extracting {n_events_gamma} proton MC events...")
-            df_proton = get_events_at_random(df_proton, n_events_gamma)
-
         df_train = pd.concat([df_gamma, df_proton])
 
         # Train the RFs
         event_classifier.fit(df_train)
 
-        # Check the feature importance
+        # Check the feature importance, which is not available with the
+        # gradient boosting backend
         telescope_rf = event_classifier.telescope_rfs[tel_id]
 
-        importances = telescope_rf.feature_importances_.round(5)
-        importances = dict(zip(event_classifier.features, importances))
+        if hasattr(telescope_rf, "feature_importances_"):
+            importances = telescope_rf.feature_importances_.round(5)
+            importances = dict(zip(event_classifier.features, importances))
 
-        logger.info(f"\n{TEL_NAMES[tel_id]} feature importance:")
-        logger.info(format_object(importances))
+            logger.info(f"\n{TEL_NAMES[tel_id]} feature importance:")
+            logger.info(format_object(importances))
 
         # Save the trained RFs to an output file
         if use_unsigned_features:
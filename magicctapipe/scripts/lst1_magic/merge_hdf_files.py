@@ -10,17 +10,42 @@ If no output directory is specified with the `--output-dir` argument,
 it saves merged files in the `merged` directory which will be created
 under the input directory.
 
+Instead of a directory, the `--input-dir` argument accepts a manifest
+listing the input files, e.g., the train or test subset of the MC files
+saved by `magicctapipe.io.create_split_manifests`. If the events of the
+files are split, only those of the subset are merged.
+
 If the `--run-wise` argument is given, it merges input files run-wise.
 It is applicable only to real data since MC data are already produced
 run-wise. The `--subrun-wise` argument can be also used to merge MAGIC
 DL1 real data subrun-wise.
 
+The event tables are copied in chunks of rows while the next input file
+is prefetched, and the range of the rows copied from every input file
+is saved in the table `merge/source_files` of the output file. The
+output event tables can be compressed with the `--compression-level`
+and `--compression-lib` arguments, and the `--index-events` argument
+creates the column indexes of the observation and event IDs.
+
+If the events of the input files are saved with the Parquet storage
+backend, they are merged into a Parquet dataset next to the output
+file, to which the compression and index arguments do not apply.
+
+The output files record the provenance of the input files and the
+merging options, so that the downstream files are not processed again
+when the same input files are merged again. The output files that are
+already up to date are skipped unless the `--force` argument is given.
+
 Usage:
 $ python merge_hdf_files.py
---input-dir dl1
+--input-dir dl1 (or --input-dir manifest.json)
 (--output-dir dl1_merged)
 (--run-wise)
 (--subrun-wise)
+(--index-events)
+(--compression-level 5)
+(--compression-lib blosc:zstd)
+(--force)
 
 Broader usage:
 This script is called automatically from the script "merging_runs_and_spliting_training_samples.py".
@@ -28,89 +53,391 @@ If you want to analyse a target, this is the way to go. See this other script fo
 """
 
 import argparse
+import fnmatch
 import glob
 import logging
 import re
+import shutil
+import threading
 import time
 from pathlib import Path
 
 import numpy as np
 import tables
 from ctapipe.instrument import SubarrayDescription
-
-__all__ = ["write_data_to_table", "merge_hdf_files"]
+from magicctapipe.io import (
+    find_input_files,
+    get_parquet_path,
+    get_provenance,
+    index_event_table,
+    is_up_to_date,
+    merge_parquet_data,
+    select_split_events,
+    write_provenance,
+)
+
+__all__ = [
+    "check_table_schemas",
+    "prefetch_file",
+    "write_data_to_table",
+    "merge_hdf_files",
+]
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
+# The event table attributes that are not copied from the input files
+SORTING_ATTRS = ["sorted_by"]
+
+# The number of the rows of the event tables copied at once
+CHUNK_SIZE = 100000
+
+# The size of the blocks read when prefetching the next input file
+PREFETCH_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def check_table_schemas(input_files):
+    """
+    Checks that the event tables of input files have the same schema.
+
+    Parameters
+    ----------
+    input_files: list
+        Paths to input HDF files
+
+    Returns
+    -------
+    n_rows: list
+        Number of the rows of the event table in every input file
+
+    Raises
+    ------
+    RuntimeError
+        If the schema of any event table differs from the first one
+    """
+
+    n_rows = []
+
+    for input_file in input_files:
+        with tables.open_file(input_file) as f_input:
+            event_data = f_input.root.events.parameters
+
+            if len(n_rows) == 0:
+                dtype = event_data.dtype
 
-def write_data_to_table(input_file_mask, output_file):
+            elif event_data.dtype != dtype:
+                raise RuntimeError(
+                    f"The schema of the event table in '{input_file}' differs from "
+                    f"that in '{input_files[0]}'."
+                )
+
+            n_rows.append(event_data.nrows)
+
+    return n_rows
+
+
+def prefetch_file(input_file, stop_event):
+    """
+    Reads a file sequentially and discards the data, so that the file
+    is loaded in the page cache of the operating system before it is
+    opened with PyTables. It stops when the given event is set.
+
+    Parameters
+    ----------
+    input_file: str
+        Path to an input file
+    stop_event: threading.Event
+        Event to stop the prefetching
+    """
+
+    with open(input_file, "rb") as f_input:
+        while not stop_event.is_set():
+            if not f_input.read(PREFETCH_BLOCK_SIZE):
+                break
+
+
+def write_data_to_table(
+    input_file_mask,
+    output_file,
+    chunk_size=CHUNK_SIZE,
+    filters=None,
+    index_events=False,
+    split=None,
+    force=False,
+):
     """
     Writes data to a new table.
 
+    The event tables are copied in chunks of rows, so that the memory
+    usage does not depend on the file sizes, and the next input file is
+    prefetched on a background thread while the current one is written.
+    The range of the rows copied from every input file is saved in the
+    table `merge/source_files` of the output file.
+
+    If the events of the input files are saved with the Parquet storage
+    backend, they are merged into a Parquet dataset next to the output
+    file instead, and the output file keeps the other data.
+
     Parameters
     ----------
-    input_file_mask: str
-        Mask of the paths to input HDF files
+    input_file_mask: str or list
+        Mask of the paths to input HDF files, or list of the paths
     output_file: str
         Path to an output HDF file
+    chunk_size: int
+        Number of the rows copied at once
+    filters: tables.filters.Filters
+        Compression filters of the output event table
+        (If None, the table is not compressed, applicable only to the
+        HDF backend)
+    index_events: bool
+        If `True`, the column indexes of the observation and event IDs
+        are created, and the output event table is flagged as sorted if
+        the merged rows are sorted by the event key (applicable only to
+        the HDF backend)
+    split: dict
+        Split of the events returned by `find_input_files` - if given,
+        only the events of its subset are copied
+    force: bool
+        If `True`, the input files are merged again even if the output
+        file is up to date
+
+    Raises
+    ------
+    RuntimeError
+        If the schemas of the input event tables are not consistent, or
+        if the events of the input files are saved with different
+        storage backends
     """
 
     # Find the input files
-    input_files = glob.glob(input_file_mask)
+    if isinstance(input_file_mask, str):
+        input_files = glob.glob(input_file_mask)
+    else:
+        input_files = list(input_file_mask)
+
     input_files.sort()
 
+    file_names = [Path(input_file).name for input_file in input_files]
+
+    is_parquet = [
+        Path(get_parquet_path(input_file)).exists() for input_file in input_files
+    ]
+
+    if any(is_parquet) and not all(is_parquet):
+        raise RuntimeError(
+            "The events of the input files are saved with different storage backends."
+        )
+
+    parquet_path = Path(get_parquet_path(output_file))
+
+    # Check whether the output file was already merged from the same
+    # input files with the same options
+    input_paths = list(input_files)
+
+    if all(is_parquet):
+        input_paths += [get_parquet_path(input_file) for input_file in input_files]
+
+    config_provenance = {
+        "split": split,
+        "index_events": index_events,
+        "filters": None if filters is None else repr(filters),
+    }
+
+    provenance = get_provenance(input_paths, config_provenance)
+
+    if not force and is_up_to_date(output_file, provenance):
+        logger.info(f"Output file is up to date, skipping: {output_file}")
+        return
+
+    # Remove the output file first, so that it is not considered up to
+    # date if the merging is interrupted
+    if Path(output_file).exists():
+        Path(output_file).unlink()
+
+    if all(is_parquet):
+        for input_file in input_files:
+            logger.info(input_file)
+
+        n_rows_copied = merge_parquet_data(
+            input_files,
+            parquet_path,
+            selection=lambda event_data: select_split_events(event_data, split),
+        )
+
+        with tables.open_file(output_file, mode="w") as f_out:
+            with tables.open_file(input_files[0]) as f_input:
+                _copy_simulation_config(f_input, f_out)
+
+            _save_source_files(f_out, file_names, n_rows_copied)
+
+        _copy_subarray(input_files[0], output_file)
+        write_provenance(output_file, provenance)
+
+        logger.info(f"--> Output file: {output_file}")
+        return
+
+    # Remove the events merged previously with the Parquet backend,
+    # which would otherwise be read instead of the new ones
+    if parquet_path.exists():
+        shutil.rmtree(parquet_path)
+
+    n_rows = check_table_schemas(input_files)
+    row_offsets = np.cumsum([0] + n_rows)
+
     with tables.open_file(output_file, mode="w") as f_out:
-        logger.info(f"\n{input_files[0]}")
 
-        # Create a new table with the first input file
+        # Create a new table with the schema of the first input file
         with tables.open_file(input_files[0]) as f_input:
             event_data = f_input.root.events.parameters
 
-            f_out.create_table(
-                "/events", "parameters", createparents=True, obj=event_data.read()
+            table_out = f_out.create_table(
+                "/events",
+                "parameters",
+                description=event_data.description,
+                createparents=True,
+                filters=filters,
+                expectedrows=max(row_offsets[-1], 1),
             )
 
+            # The sorting flag is set only by `index_event_table` after
+            # checking the order of the merged rows
             for attr in event_data.attrs._f_list():
-                f_out.root.events.parameters.attrs[attr] = event_data.attrs[attr]
-
-            if "simulation" in f_input.root:
-                # Write the simulation configuration of the first input
-                # file, assuming that it is consistent with the others
-                sim_config = f_input.root.simulation.config
+                if attr not in SORTING_ATTRS:
+                    table_out.attrs[attr] = event_data.attrs[attr]
 
-                f_out.create_table(
-                    "/simulation", "config", createparents=True, obj=sim_config.read()
-                )
+            _copy_simulation_config(f_input, f_out)
 
-                for attr in sim_config.attrs._f_list():
-                    f_out.root.simulation.config.attrs[attr] = sim_config.attrs[attr]
+        # Copy the event tables of the input files
+        n_rows_copied = [0] * len(input_files)
 
-        # Write the rest of the input files
-        for input_file in input_files[1:]:
+        for i_file, input_file in enumerate(input_files):
             logger.info(input_file)
 
+            stop_event = threading.Event()
+
+            if i_file + 1 < len(input_files):
+                prefetch_thread = threading.Thread(
+                    target=prefetch_file,
+                    args=(input_files[i_file + 1], stop_event),
+                    daemon=True,
+                )
+                prefetch_thread.start()
+
             with tables.open_file(input_file) as f_input:
                 event_data = f_input.root.events.parameters
-                f_out.root.events.parameters.append(event_data.read())
 
-    # Save the subarray description of the first input file, assuming
-    # that it is consistent with the others
-    subarray = SubarrayDescription.from_hdf(input_files[0])
-    subarray.to_hdf(output_file)
+                for start in range(0, event_data.nrows, chunk_size):
+                    rows = event_data.read(start, start + chunk_size)
+                    rows = rows[select_split_events(rows, split)]
+
+                    table_out.append(rows)
+                    n_rows_copied[i_file] += len(rows)
+
+            stop_event.set()
+
+        table_out.flush()
+
+        if index_events:
+            is_sorted = index_event_table(table_out)
+
+            if not is_sorted:
+                logger.warning(
+                    "WARNING: The merged events are not sorted by the event key, "
+                    "so the output table is not flagged as sorted."
+                )
+
+        _save_source_files(f_out, file_names, n_rows_copied)
+
+    _copy_subarray(input_files[0], output_file)
+
+    # Record the provenance last, so that incomplete files are never
+    # considered up to date
+    write_provenance(output_file, provenance)
 
     logger.info(f"--> Output file: {output_file}")
 
 
-def merge_hdf_files(input_dir, output_dir=None, run_wise=False, subrun_wise=False):
+def _copy_simulation_config(f_input, f_out):
+    """
+    Copies the simulation configuration of an input file, if any,
+    assuming that it is consistent with the other input files.
+    """
+
+    if "simulation" in f_input.root:
+        sim_config = f_input.root.simulation.config
+
+        f_out.create_table(
+            "/simulation", "config", createparents=True, obj=sim_config.read()
+        )
+
+        for attr in sim_config.attrs._f_list():
+            f_out.root.simulation.config.attrs[attr] = sim_config.attrs[attr]
+
+
+def _save_source_files(f_out, file_names, n_rows_copied):
+    """
+    Saves the ranges of the rows copied from the input files.
+    """
+
+    source_files = np.zeros(
+        len(file_names),
+        dtype=[
+            ("file_name", f"S{max(len(name) for name in file_names)}"),
+            ("row_start", np.int64),
+            ("row_stop", np.int64),
+        ],
+    )
+
+    row_offsets = np.cumsum([0] + list(n_rows_copied))
+
+    source_files["file_name"] = file_names
+    source_files["row_start"] = row_offsets[:-1]
+    source_files["row_stop"] = row_offsets[1:]
+
+    f_out.create_table("/merge", "source_files", createparents=True, obj=source_files)
+
+
+def _copy_subarray(input_file, output_file):
+    """
+    Saves the subarray description of an input file, assuming that it
+    is consistent with the other input files.
+    """
+
+    subarray = SubarrayDescription.from_hdf(input_file)
+    subarray.to_hdf(output_file)
+
+
+def _select_input_files(input_files, file_name_mask):
+    """
+    Selects the input files whose names match a mask.
+    """
+
+    return [
+        input_file
+        for input_file in input_files
+        if fnmatch.fnmatchcase(Path(input_file).name, file_name_mask)
+    ]
+
+
+def merge_hdf_files(
+    input_dir,
+    output_dir=None,
+    run_wise=False,
+    subrun_wise=False,
+    filters=None,
+    index_events=False,
+    force=False,
+):
     """
     Merges the HDF files produced by the combined analysis pipeline.
 
     Parameters
     ----------
     input_dir: str
-        Path to a directory where input HDF files are stored
+        Path to a directory where input HDF files are stored, or to a
+        manifest listing them
     output_dir: str
         Path to a directory where to save output HDF files
     run_wise: bool
@@ -119,6 +446,15 @@ def merge_hdf_files(input_dir, output_dir=None, run_wise=False, subrun_wise=Fals
     subrun_wise: bool
         If `True`, it merges the input files subrun-wise
         (applicable only to MAGIC real data)
+    filters: tables.filters.Filters
+        Compression filters of the output event tables
+        (If None, the tables are not compressed)
+    index_events: bool
+        If `True`, the column indexes of the observation and event IDs
+        are created in the output event tables
+    force: bool
+        If `True`, the input files are merged again even if the output
+        files are up to date
 
     Raises
     ------
@@ -128,13 +464,10 @@ def merge_hdf_files(input_dir, output_dir=None, run_wise=False, subrun_wise=Fals
         If multiple types of files are found in the input directory
     """
 
-    # Find the input files
+    # Find the input files, in the directory or in the manifest
     logger.info(f"\nInput directory: {input_dir}")
 
-    input_file_mask = f"{input_dir}/*.h5"
-
-    input_files = glob.glob(input_file_mask)
-    input_files.sort()
+    input_files, split = find_input_files(input_dir, "*.h5")
 
     if len(input_files) == 0:
         raise FileNotFoundError("Could not find any HDF files in the input directory.")
@@ -182,7 +515,9 @@ def merge_hdf_files(input_dir, output_dir=None, run_wise=False, subrun_wise=Fals
 
     # Create an output directory
     if output_dir is None:
-        output_dir = f"{input_dir}/merged"
+        # Create it next to the manifest if the input is a manifest
+        input_path = Path(input_dir)
+        output_dir = f"{input_path.parent if input_path.is_file() else input_path}/merged"
 
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
@@ -203,25 +538,37 @@ def merge_hdf_files(input_dir, output_dir=None, run_wise=False, subrun_wise=Fals
             subrun_ids_unique = subrun_ids_unique[counts > 1]
 
             for subrun_id in subrun_ids_unique:
-                file_mask = f"{input_dir}/*Run{run_id}.{subrun_id}.h5"
+                file_mask = f"*Run{run_id}.{subrun_id}.h5"
                 output_file = f"{output_dir}/{output_file_name}{run_id}.{subrun_id}.h5"
 
-                write_data_to_table(file_mask, output_file)
+                write_data_to_table(
+                    _select_input_files(input_files, file_mask),
+                    output_file,
+                    filters=filters,
+                    index_events=index_events,
+                    split=split,
+                    force=force,
+                )
 
     elif run_wise:
         logger.info("\nMerging the input files run-wise...")
 
         for run_id in run_ids_unique:
-            file_mask = f"{input_dir}/*Run{run_id}.*h5"
+            file_mask = f"*Run{run_id}.*h5"
             output_file = f"{output_dir}/{output_file_name}{run_id}.h5"
 
-            write_data_to_table(file_mask, output_file)
+            write_data_to_table(
+                _select_input_files(input_files, file_mask),
+                output_file,
+                filters=filters,
+                index_events=index_events,
+                split=split,
+                force=force,
+            )
 
     else:
         logger.info("\nMerging the input files...")
 
-        file_mask = f"{input_dir}/*.h5"
-
         if len(run_ids_unique) == 1:
             output_file = f"{output_dir}/{output_file_name}{run_ids_unique[0]}.h5"
 
@@ -243,7 +590,14 @@ def merge_hdf_files(input_dir, output_dir=None, run_wise=False, subrun_wise=Fals
                 f"{output_dir}/{output_file_name}{run_id_min}_to_{run_id_max}.h5"
             )
 
-        write_data_to_table(file_mask, output_file)
+        write_data_to_table(
+            input_files,
+            output_file,
+            filters=filters,
+            index_events=index_events,
+            split=split,
+            force=force,
+        )
 
 
 def main():
@@ -257,7 +611,7 @@ def main():
         dest="input_dir",
         type=str,
         required=True,
-        help="Path to a directory where input HDF files are stored",
+        help="Path to a directory where input HDF files are stored, or to a manifest",
     )
 
     parser.add_argument(
@@ -282,10 +636,55 @@ def main():
         help="Merge input files subrun-wise (applicable only to MAGIC real data)",
     )
 
+    parser.add_argument(
+        "--index-events",
+        dest="index_events",
+        action="store_true",
+        help="Create the column indexes of the observation and event IDs",
+    )
+
+    parser.add_argument(
+        "--compression-level",
+        dest="compression_level",
+        type=int,
+        default=0,
+        help="Compression level of output event tables (0 for no compression)",
+    )
+
+    parser.add_argument(
+        "--compression-lib",
+        dest="compression_lib",
+        type=str,
+        default="blosc:zstd",
+        help="Compression library of output event tables",
+    )
+
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Merge the input files again even if the output files are up to date",
+    )
+
     args = parser.parse_args()
 
+    filters = None
+
+    if args.compression_level > 0:
+        filters = tables.Filters(
+            complevel=args.compression_level, complib=args.compression_lib, shuffle=True
+        )
+
     # Merge the input files
-    merge_hdf_files(args.input_dir, args.output_dir, args.run_wise, args.subrun_wise)
+    merge_hdf_files(
+        args.input_dir,
+        args.output_dir,
+        args.run_wise,
+        args.subrun_wise,
+        filters,
+        args.index_events,
+        args.force,
+    )
 
     logger.info("\nDone.")
 
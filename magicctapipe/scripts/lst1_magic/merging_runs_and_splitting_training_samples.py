@@ -1,6 +1,6 @@
 """
 This script split the proton MC data sample into "train"
-and "test", deletes possible failed runs (only those files
+and "test", skips possible failed runs (only those files
 that end up with a size < 1 kB), and generates the bash 
 scripts to merge the data files calling the script "merge_hdf_files.py"
 in the follwoing order:
@@ -15,84 +15,100 @@ MC:
 1) Merges all MC runs in a node and save them at
 Workingdir/DL1/MC/PARTICLE/Merged 
 
+No MC file is moved or deleted: the runs of each node are listed in
+manifests saved at Workingdir/DL1/MC/PARTICLE/manifests, which are
+given to merge_hdf_files.py instead of the node directories. For the
+protons, the manifests list the "train" and "test" subsamples.
+
 
 Usage:
 $ python merging_runs_and_splitting_training_samples.py
 
+To run the jobs with local processes instead of SLURM, or to
+only show the plan of the jobs without running them:
+$ python merging_runs_and_splitting_training_samples.py --backend local --n-local-workers 4
+$ python merging_runs_and_splitting_training_samples.py --dry-run
+
+The merged files whose recorded provenance (inputs and merging options)
+is up to date are skipped by the jobs. To merge all of them again:
+$ python merging_runs_and_splitting_training_samples.py --force
+
 """
 
 import os
+import argparse
 import numpy as np
 import glob
 import yaml
 import logging
 from tqdm import tqdm
 from pathlib import Path
+from magicctapipe.io import create_split_manifests, save_file_manifest
+from magicctapipe.utils.pipeline import Pipeline, add_pipeline_arguments, get_pipeline_backend
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 logger.setLevel(logging.INFO)
 
-def cleaning(list_of_nodes, target_dir):
+def list_valid_runs(node_dir):
     
     """
-    This function looks for failed runs in each node and remove them.
+    This function lists the MC runs of a node, skipping the failed runs (i.e. the files with a size < 1 kB).
+    The failed runs are only left out of the lists, they are not deleted.
     
     Parameters
     ----------
-    target_dir: str
-        Path to the target directory.
-    list_of_nodes: array of str
-        List of nodes where the function will look for failed runs.
+    node_dir: str
+        Path to the directory of the node
+    
+    Returns
+    -------
+    list_of_runs: list of str
+        Paths to the valid runs of the node
     """
     
-    for i in tqdm(range(len(list_of_nodes)), desc="Cleaning failed runs"):
-        os.chdir(list_of_nodes[i])
-        os.system('find . -type f -name "*.h5" -size -1k -delete')
+    list_of_runs = []
+    for run in sorted(glob.glob(f"{node_dir}/*.h5")):
+        if os.path.getsize(run) < 1024:
+            logger.info(f"Skipping the failed run {run}")
+        else:
+            list_of_runs.append(run)
     
-    os.chdir(target_dir+"/../")
-    print("Cleaning done.")
+    return list_of_runs
 
-def split_train_test(target_dir, train_fraction):
+def split_train_test(target_dir, train_fraction, seed=0, split_by="file"):
     
     """
     This function splits the MC proton sample in 2, i.e. the "test" and the "train" subsamples.
-    It generates 2 subdirectories in the directory .../DL1/MC/protons named "test" and "train" and creates sub-sub-directories with the names of all nodes.
-    For each node sub-sub-directory we move 80% of the .h5 files (if it is in the "test" subdirectory) or 20% of the .h5 files (if it is in the "train" subdirectory).
+    No file is moved: for each node, it saves the manifests .../DL1/MC/protons/manifests/NODE.json and .../DL1/MC/protons_test/manifests/NODE.json,
+    which list the runs of the "train" and the "test" subsamples and are then given to merge_hdf_files.py instead of the node directories.
+    The same seed always gives the same split.
     
     Parameters
     ----------
     target_dir: str
         Path to the working directory
     train_fraction: float
-        Fraction of proton MC files to be used in the training RF dataset
+        Fraction of proton MC files (or events) to be used in the training RF dataset
+    seed: int
+        Seed of the split
+    split_by: str
+        Whether to split the proton MC runs ("file") or the events of all the runs ("event") between "train" and "test"
     """
     
     proton_dir = target_dir+"/DL1/MC/protons"
     
-    if not os.path.exists(proton_dir+"/train"):
-        os.mkdir(proton_dir+"/train")
-    if not os.path.exists(proton_dir+"/../protons_test"):
-        os.mkdir(proton_dir+"/../protons_test")
-    
     list_of_dir = np.sort(glob.glob(proton_dir+'/node*' + os.path.sep))
     
-    for directory in tqdm(range(len(list_of_dir))):   #tqdm allows us to print a progessbar in the terminal
-        if not os.path.exists(proton_dir+"/train/"+list_of_dir[directory].split("/")[-2]):
-            os.mkdir(proton_dir+"/train/"+list_of_dir[directory].split("/")[-2])
-        if not os.path.exists(proton_dir+"/../protons_test/"+list_of_dir[directory].split("/")[-2]):
-            os.mkdir(proton_dir+"/../protons_test/"+list_of_dir[directory].split("/")[-2])
-        list_of_runs = np.sort(glob.glob(proton_dir+"/"+list_of_dir[directory].split("/")[-2]+"/*.h5"))
-        split_percent = int(len(list_of_runs)*train_fraction)
-        for j in list_of_runs[0:split_percent]:
-            os.system(f"mv {j} {proton_dir}/train/"+list_of_dir[directory].split("/")[-2])
-        
-        os.system(f"cp {list_of_dir[directory]}*.txt "+proton_dir+"/train/"+list_of_dir[directory].split("/")[-2])
-        os.system(f"mv {list_of_dir[directory]}*.txt "+proton_dir+"/../protons_test/"+list_of_dir[directory].split("/")[-2])
-        os.system(f"mv {list_of_dir[directory]}*.h5 "+proton_dir+"/../protons_test/"+list_of_dir[directory].split("/")[-2])
-        os.system(f"rm -r {list_of_dir[directory]}")
+    for directory in tqdm(list_of_dir):   #tqdm allows us to print a progessbar in the terminal
+        node = Path(directory).name
+        manifest_files = {
+            "train": f"{proton_dir}/manifests/{node}.json",
+            "test": f"{proton_dir}/../protons_test/manifests/{node}.json",
+        }
+        create_split_manifests(list_valid_runs(directory), manifest_files, train_fraction, seed, split_by)
 
-def merge(target_dir, identification, MAGIC_runs):
+def merge(target_dir, identification, MAGIC_runs, force=False):
     
     """
     This function creates the bash scripts to run merge_hdf_files.py in all MAGIC subruns.
@@ -105,8 +121,12 @@ def merge(target_dir, identification, MAGIC_runs):
         Tells which batch to create. Options: subruns, M1M2, nights
     MAGIC_runs: matrix of strings
         This matrix is imported from config_general.yaml and tells the function where to find the data and where to put the merged files
+    force: bool
+        If True, the data files are merged again even if they are up to date
     """
     
+    force_arg = " --force" if force else ""
+
     process_name = "merging_"+target_dir.split("/")[-2:][1]
     
     MAGIC_DL1_dir = target_dir+"/DL1/Observations"
@@ -130,7 +150,7 @@ def merge(target_dir, identification, MAGIC_runs):
                     os.mkdir(f"{MAGIC_DL1_dir}/Merged/{i[0]}")   #Creating a merged directory for the respective night
                 if not os.path.exists(MAGIC_DL1_dir+f"/Merged/{i[0]}/{i[1]}"):
                     os.mkdir(f"{MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]}") #Creating a merged directory for the respective run
-                f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/M1/{i[0]}/{i[1]} --output-dir {MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]} \n')
+                f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/M1/{i[0]}/{i[1]} --output-dir {MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]}{force_arg} \n')
                     
         if os.path.exists(MAGIC_DL1_dir+"/M2"):
             for i in MAGIC_runs:
@@ -138,25 +158,25 @@ def merge(target_dir, identification, MAGIC_runs):
                     os.mkdir(f"{MAGIC_DL1_dir}/Merged/{i[0]}")   #Creating a merged directory for the respective night
                 if not os.path.exists(MAGIC_DL1_dir+f"/Merged/{i[0]}/{i[1]}"):
                     os.mkdir(f"{MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]}") #Creating a merged directory for the respective run
-                f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/M2/{i[0]}/{i[1]} --output-dir {MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]} \n')
+                f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/M2/{i[0]}/{i[1]} --output-dir {MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]}{force_arg} \n')
     
     elif identification == "1_M1M2":
         if os.path.exists(MAGIC_DL1_dir+"/M1") & os.path.exists(MAGIC_DL1_dir+"/M2"):
             for i in MAGIC_runs:
                 if not os.path.exists(MAGIC_DL1_dir+f"/Merged/{i[0]}/Merged"):
                     os.mkdir(f"{MAGIC_DL1_dir}/Merged/{i[0]}/Merged") 
-                f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]} --output-dir {MAGIC_DL1_dir}/Merged/{i[0]}/Merged --run-wise \n')        
+                f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/Merged/{i[0]}/{i[1]} --output-dir {MAGIC_DL1_dir}/Merged/{i[0]}/Merged --run-wise{force_arg} \n')        
     else:
         for i in MAGIC_runs:
             if not os.path.exists(MAGIC_DL1_dir+f"/Merged/Merged_{i[0]}"):
                 os.mkdir(f"{MAGIC_DL1_dir}/Merged/Merged_{i[0]}")  #Creating a merged directory for each night
-            f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/Merged/{i[0]}/Merged --output-dir {MAGIC_DL1_dir}/Merged/Merged_{i[0]} \n')
+            f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir {MAGIC_DL1_dir}/Merged/{i[0]}/Merged --output-dir {MAGIC_DL1_dir}/Merged/Merged_{i[0]}{force_arg} \n')
     
     
     f.close()
     
 
-def mergeMC(target_dir, identification):
+def mergeMC(target_dir, identification, force=False):
     
     """
     This function creates the bash scripts to run merge_hdf_files.py in all MC runs.
@@ -167,25 +187,30 @@ def mergeMC(target_dir, identification):
         Path to the working directory
     identification: str
         Tells which batch to create. Options: protons, gammadiffuse
+    force: bool
+        If True, the data files are merged again even if they are up to date
     """
     
+    force_arg = " --force" if force else ""
+    
     process_name = "merging_"+target_dir.split("/")[-2:][1]
     
     MC_DL1_dir = target_dir+"/DL1/MC"
+    
+    #The manifests of the protons are saved by split_train_test, those of the other particles list all the valid runs of each node
+    if identification not in ["protons", "protons_test"]:
+        for directory in np.sort(glob.glob(MC_DL1_dir+f"/{identification}/node*" + os.path.sep)):
+            save_file_manifest(f"{MC_DL1_dir}/{identification}/manifests/{Path(directory).name}.json", list_valid_runs(directory))
+    
     if not os.path.exists(MC_DL1_dir+f"/{identification}/Merged"):
         os.mkdir(MC_DL1_dir+f"/{identification}/Merged")
     
-    if identification == "protons":
-        list_of_nodes = np.sort(glob.glob(MC_DL1_dir+f"/{identification}/train/node*"))
-    else: 
-        list_of_nodes = np.sort(glob.glob(MC_DL1_dir+f"/{identification}/node*"))
+    list_of_nodes = np.sort(glob.glob(MC_DL1_dir+f"/{identification}/manifests/*.json"))
     
     np.savetxt(MC_DL1_dir+f"/{identification}/list_of_nodes.txt",list_of_nodes, fmt='%s')
     
         
     process_size = len(list_of_nodes) - 1
-       
-    cleaning(list_of_nodes, target_dir) #This will delete the (possibly) failed runs.
         
     f = open(f"Merge_{identification}.sh","w")
     f.write('#!/bin/sh\n\n')
@@ -201,7 +226,7 @@ def mergeMC(target_dir, identification):
     f.write(f"SAMPLE_LIST=($(<{MC_DL1_dir}/{identification}/list_of_nodes.txt))\n")
     f.write("SAMPLE=${SAMPLE_LIST[${SLURM_ARRAY_TASK_ID}]}\n")
     f.write(f'export LOG={MC_DL1_dir}/{identification}/Merged'+'/merged_${SLURM_ARRAY_TASK_ID}.log\n')
-    f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir $SAMPLE --output-dir {MC_DL1_dir}/{identification}/Merged >$LOG 2>&1\n')        
+    f.write(f'conda run -n magic-lst python merge_hdf_files.py --input-dir $SAMPLE --output-dir {MC_DL1_dir}/{identification}/Merged{force_arg} >$LOG 2>&1\n')        
     
     f.close()
     
@@ -212,6 +237,15 @@ def main():
     Here we read the config_general.yaml file, split the pronton sample into "test" and "train", and merge the MAGIC files.
     """
     
+    parser = argparse.ArgumentParser()
+    add_pipeline_arguments(parser)
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Merge the data files again even if they are up to date",
+    )
+    args = parser.parse_args()
     
     with open("config_general.yaml", "rb") as f:   # "rb" mode opens the file in binary format for reading
         config = yaml.safe_load(f)
@@ -223,39 +257,43 @@ def main():
     MAGIC_runs = np.genfromtxt(MAGIC_runs_and_dates,dtype=str,delimiter=',')
     
     train_fraction = float(config["general"]["proton_train"])
+    train_seed = int(config["general"].get("proton_train_seed", 0))
+    split_by = config["general"].get("proton_split_by", "file")
     
     
     #Here we slice the proton MC data into "train" and "test":
     print("***** Splitting protons into 'train' and 'test' datasets...")
-    split_train_test(target_dir, train_fraction)
+    split_train_test(target_dir, train_fraction, train_seed, split_by)
     
     print("***** Generating merge bashscripts...")
-    merge(target_dir, "0_subruns", MAGIC_runs) #generating the bash script to merge the subruns
-    merge(target_dir, "1_M1M2", MAGIC_runs) #generating the bash script to merge the M1 and M2 runs
-    merge(target_dir, "2_nights", MAGIC_runs) #generating the bash script to merge all runs per night
+    merge(target_dir, "0_subruns", MAGIC_runs, args.force) #generating the bash script to merge the subruns
+    merge(target_dir, "1_M1M2", MAGIC_runs, args.force) #generating the bash script to merge the M1 and M2 runs
+    merge(target_dir, "2_nights", MAGIC_runs, args.force) #generating the bash script to merge all runs per night
     
     print("***** Generating mergeMC bashscripts...")
-    mergeMC(target_dir, "protons") #generating the bash script to merge the files
-    mergeMC(target_dir, "gammadiffuse") #generating the bash script to merge the files
-    mergeMC(target_dir, "gammas") #generating the bash script to merge the files 
-    mergeMC(target_dir, "protons_test")
+    mergeMC(target_dir, "protons", args.force) #generating the bash script to merge the files
+    mergeMC(target_dir, "gammadiffuse", args.force) #generating the bash script to merge the files
+    mergeMC(target_dir, "gammas", args.force) #generating the bash script to merge the files 
+    mergeMC(target_dir, "protons_test", args.force)
     
     
     print("***** Running merge_hdf_files.py in the MAGIC data files...")
     print("Process name: merging_"+target_dir.split("/")[-2:][1])
     print("To check the jobs submitted to the cluster, type: squeue -n merging_"+target_dir.split("/")[-2:][1])
     
-    #Below we run the bash scripts to merge the MAGIC files
+    #Below we run the bash scripts to merge the MAGIC files. The MAGIC merging steps run one after the other, while the MC merging jobs are independent and run in parallel
     list_of_merging_scripts = np.sort(glob.glob("Merge_*.sh"))
+    MAGIC_merging_steps = ["Merge_0_subruns.sh", "Merge_1_M1M2.sh", "Merge_2_nights.sh"]
     
-    for n,run in enumerate(list_of_merging_scripts):
-        if n == 0:
-            launch_jobs =  f"merging{n}=$(sbatch --parsable {run})"
+    pipeline = Pipeline("merging_"+target_dir.split("/")[-2:][1])
+    previous_step = []
+    for run in list_of_merging_scripts:
+        if run in MAGIC_merging_steps:
+            previous_step = [pipeline.add_task(run[0:-3], run, depends_on=previous_step)]
         else:
-            launch_jobs = launch_jobs + f" && merging{n}=$(sbatch --parsable --dependency=afterany:$merging{n-1} {run})"
+            pipeline.add_task(run[0:-3], run)
     
-    #print(launch_jobs)
-    os.system(launch_jobs)
+    pipeline.run(get_pipeline_backend(args), dry_run=args.dry_run)
 
 if __name__ == "__main__":
     main()
@@ -23,15 +23,27 @@ $ python setting_up_config_and_dir.py --partial-analysis onlyMAGIC
 Only MC:
 $ python setting_up_config_and_dir.py --partial-analysis onlyMC
 
+To run the jobs with local processes instead of SLURM, or to
+only show the plan of the jobs without running them:
+$ python setting_up_config_and_dir.py --backend local --n-local-workers 4
+$ python setting_up_config_and_dir.py --dry-run
+
+The existing working directory and its outputs are kept, so that the
+other stages can skip the files that are up to date. To remove it and
+start a new analysis from scratch:
+$ python setting_up_config_and_dir.py --force
+
 """
 
 import os
 import numpy as np
 import argparse
 import glob
+import shutil
 import time
 import yaml
 from pathlib import Path
+from magicctapipe.utils.pipeline import Pipeline, add_pipeline_arguments, get_pipeline_backend
 
 def config_file_gen(ids, target_dir):
     
@@ -289,41 +301,34 @@ def lists_and_bash_gen_MAGIC(target_dir, telescope_ids, MAGIC_runs):
                 f.close()
     
     
-def directories_generator(target_dir, telescope_ids,MAGIC_runs):
+def directories_generator(target_dir, telescope_ids,MAGIC_runs, force=False):
 
     """
     Here we create all subdirectories for a given workspace and target name.
+    
+    Parameters
+    ----------
+    target_dir: str
+        Path to the working directory
+    telescope_ids: list
+        IDs of the telescopes
+    MAGIC_runs: matrix of strings
+        Dates and runs of the MAGIC data
+    force: bool
+        If True, the existing working directory is removed with all its outputs
     """
     
     ###########################################
     ##################### MC
     ###########################################
         
-    if not os.path.exists(target_dir):
-        os.mkdir(target_dir)
-        os.mkdir(target_dir+"/DL1")
-        os.mkdir(target_dir+"/DL1/Observations")
-        os.mkdir(target_dir+"/DL1/MC")
-        os.mkdir(target_dir+"/DL1/MC/gammas")
-        os.mkdir(target_dir+"/DL1/MC/gammadiffuse")
-        os.mkdir(target_dir+"/DL1/MC/electrons")
-        os.mkdir(target_dir+"/DL1/MC/protons")
-        os.mkdir(target_dir+"/DL1/MC/helium")
-    else:
-        overwrite = input("MC directory for "+target_dir.split("/")[-1]+" already exists. Would you like to overwrite it? [only 'y' or 'n']: ")
-        if overwrite == "y":
-            os.system("rm -r "+target_dir)
-            os.mkdir(target_dir)
-            os.mkdir(target_dir+"/DL1")
-            os.mkdir(target_dir+"/DL1/Observations")
-            os.mkdir(target_dir+"/DL1/MC")
-            os.mkdir(target_dir+"/DL1/MC/gammas")
-            os.mkdir(target_dir+"/DL1/MC/gammadiffuse")
-            os.mkdir(target_dir+"/DL1/MC/electrons")
-            os.mkdir(target_dir+"/DL1/MC/protons")
-            os.mkdir(target_dir+"/DL1/MC/helium")
-        else:
-            print("Directory not modified.")
+    #The existing outputs are kept, so that the files up to date are not processed again, unless a new analysis is forced
+    if force and os.path.exists(target_dir):
+        print("Removing the existing directory "+target_dir)
+        shutil.rmtree(target_dir)
+    
+    for directory in ["DL1/Observations", "DL1/MC/gammas", "DL1/MC/gammadiffuse", "DL1/MC/electrons", "DL1/MC/protons", "DL1/MC/helium"]:
+        os.makedirs(target_dir+"/"+directory, exist_ok=True)
     
     
     
@@ -331,25 +336,14 @@ def directories_generator(target_dir, telescope_ids,MAGIC_runs):
     ##################### MAGIC
     ###########################################
     
+    #The directories of the runs added to an existing analysis are created as well
     if telescope_ids[-1] > 0:    
-        if not os.path.exists(target_dir+"/DL1/Observations/M2"):
-            os.mkdir(target_dir+"/DL1/Observations/M2")
-            for i in MAGIC_runs:
-                if not os.path.exists(target_dir+"/DL1/Observations/M2/"+i[0]):
-                    os.mkdir(target_dir+"/DL1/Observations/M2/"+i[0])
-                    os.mkdir(target_dir+"/DL1/Observations/M2/"+i[0]+"/"+i[1])
-                else:
-                    os.mkdir(target_dir+"/DL1/Observations/M2/"+i[0]+"/"+i[1])
+        for i in MAGIC_runs:
+            os.makedirs(target_dir+"/DL1/Observations/M2/"+i[0]+"/"+i[1], exist_ok=True)
     
     if telescope_ids[-2] > 0:
-        if not os.path.exists(target_dir+"/DL1/Observations/M1"):
-            os.mkdir(target_dir+"/DL1/Observations/M1")
-            for i in MAGIC_runs:
-                if not os.path.exists(target_dir+"/DL1/Observations/M1/"+i[0]):
-                    os.mkdir(target_dir+"/DL1/Observations/M1/"+i[0])
-                    os.mkdir(target_dir+"/DL1/Observations/M1/"+i[0]+"/"+i[1])
-                else:
-                    os.mkdir(target_dir+"/DL1/Observations/M1/"+i[0]+"/"+i[1])
+        for i in MAGIC_runs:
+            os.makedirs(target_dir+"/DL1/Observations/M1/"+i[0]+"/"+i[1], exist_ok=True)
     
 
 
@@ -371,6 +365,15 @@ def main():
         help="You can type 'onlyMAGIC' or 'onlyMC' to run this script only on MAGIC or MC data, respectively.",
     )
     
+    add_pipeline_arguments(parser)
+    
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Remove the existing working directory with all its outputs",
+    )
+    
     args = parser.parse_args()
     
     
@@ -400,9 +403,12 @@ def main():
     print("Process name: ",target_dir.split('/')[-2:][1])
     print("To check the jobs submitted to the cluster, type: squeue -n",target_dir.split('/')[-2:][1])
     
-    directories_generator(target_dir, telescope_ids, MAGIC_runs) #Here we create all the necessary directories in the given workspace and collect the main directory of the target   
+    directories_generator(target_dir, telescope_ids, MAGIC_runs, args.force) #Here we create all the necessary directories in the given workspace and collect the main directory of the target   
     config_file_gen(telescope_ids,target_dir)
     
+    #The MC particles and the MAGIC runs are independent, so their jobs run in parallel. Each conversion only waits for its own linking job
+    pipeline = Pipeline(target_dir.split('/')[-2:][1])
+    
     #Below we run the analysis on the MC data
     if not args.partial_analysis=='onlyMAGIC':       
         lists_and_bash_generator("gammas", target_dir, MC_gammas, SimTel_version, telescope_ids, focal_length) #gammas
@@ -412,33 +418,24 @@ def main():
         lists_and_bash_generator("gammadiffuse", target_dir, MC_gammadiff, SimTel_version, telescope_ids, focal_length) #gammadiffuse
         
         #Here we do the MC DL0 to DL1 conversion:
-        list_of_MC = glob.glob("linking_MC_*s.sh")
-        
-        #os.system("RES=$(sbatch --parsable linking_MC_gammas_paths.sh) && sbatch --dependency=afterok:$RES MC_dl0_to_dl1.sh")
+        list_of_MC = np.sort(glob.glob("linking_MC_*s.sh"))
         
-        for n,run in enumerate(list_of_MC):
-            if n == 0:
-                launch_jobs_MC =  f"linking{n}=$(sbatch --parsable {run}) && running{n}=$(sbatch --parsable --dependency=afterany:$linking{n} {run[0:-3]}_r.sh)"
-            else:
-                launch_jobs_MC = launch_jobs_MC + f" && linking{n}=$(sbatch --parsable --dependency=afterany:$running{n-1} {run}) && running{n}=$(sbatch --parsable --dependency=afterany:$linking{n} {run[0:-3]}_r.sh)"
-        
-        
-        os.system(launch_jobs_MC)
+        for run in list_of_MC:
+            linking = pipeline.add_task(run[0:-3], run)
+            pipeline.add_task(run[0:-3]+"_r", run[0:-3]+"_r.sh", depends_on=[linking])
     
     #Below we run the analysis on the MAGIC data
     if not args.partial_analysis=='onlyMC':
         lists_and_bash_gen_MAGIC(target_dir, telescope_ids, MAGIC_runs) #MAGIC real data
         if (telescope_ids[-2] > 0) or (telescope_ids[-1] > 0):
             
-            list_of_MAGIC_runs = glob.glob("MAGIC-*.sh")
+            list_of_MAGIC_runs = np.sort(glob.glob("MAGIC-*.sh"))
             
-            for n,run in enumerate(list_of_MAGIC_runs):
-                if n == 0:
-                    launch_jobs =  f"linking=$(sbatch --parsable linking_MAGIC_data_paths.sh)  &&  RES{n}=$(sbatch --parsable --dependency=afterany:$linking {run})"
-                else:
-                    launch_jobs = launch_jobs + f" && RES{n}=$(sbatch --parsable --dependency=afterany:$RES{n-1} {run})"
-            
-            os.system(launch_jobs)
+            linking = pipeline.add_task("linking_MAGIC_data_paths", "linking_MAGIC_data_paths.sh")
+            for run in list_of_MAGIC_runs:
+                pipeline.add_task(run[0:-3], run, depends_on=[linking])
+    
+    pipeline.run(get_pipeline_backend(args), dry_run=args.dry_run)
         
 if __name__ == "__main__":
     main()
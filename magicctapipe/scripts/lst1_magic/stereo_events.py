@@ -6,14 +6,26 @@ Coincident MAGIC+LST data files.
 Usage:
 $ python stereo_events.py
 
+To run the jobs with local processes instead of SLURM, or to
+only show the plan of the jobs without running them:
+$ python stereo_events.py --backend local --n-local-workers 4
+$ python stereo_events.py --dry-run
+
+The data files whose recorded provenance (inputs, configuration and
+version) is up to date are skipped by the jobs. To process all of
+them again:
+$ python stereo_events.py --force
+
 """
 
 import os
+import argparse
 import numpy as np
 import glob
 import yaml
 import logging
 from pathlib import Path
+from magicctapipe.utils.pipeline import Pipeline, add_pipeline_arguments, get_pipeline_backend
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
@@ -38,7 +50,7 @@ def configfile_stereo(ids, target_dir):
     f.close()
     
      
-def bash_stereo(target_dir):
+def bash_stereo(target_dir, force=False):
 
     """
     This function generates the bashscript for running the stereo analysis.
@@ -47,7 +59,11 @@ def bash_stereo(target_dir):
     ----------
     target_dir: str
         Path to the working directory
+    force: bool
+        If True, the data files are processed again even if they are up to date
     """
+    
+    force_arg = " --force" if force else ""
 
     process_name = target_dir.split("/")[-2:][1]
 
@@ -79,10 +95,10 @@ def bash_stereo(target_dir):
         f.write("SAMPLE_LIST=($(<$INPUTDIR/list_coin.txt))\n")
         f.write("SAMPLE=${SAMPLE_LIST[${SLURM_ARRAY_TASK_ID}]}\n")
         f.write("export LOG=$OUTPUTDIR/stereo_${SLURM_ARRAY_TASK_ID}.log\n")
-        f.write(f"conda run -n magic-lst python lst1_magic_stereo_reco.py --input-file $SAMPLE --output-dir $OUTPUTDIR --config-file {target_dir}/config_stereo.yaml >$LOG 2>&1")
+        f.write(f"conda run -n magic-lst python lst1_magic_stereo_reco.py --input-file $SAMPLE --output-dir $OUTPUTDIR --config-file {target_dir}/config_stereo.yaml{force_arg} >$LOG 2>&1")
         f.close()
 
-def bash_stereoMC(target_dir, identification):
+def bash_stereoMC(target_dir, identification, force=False):
 
     """
     This function generates the bashscript for running the stereo analysis.
@@ -93,7 +109,11 @@ def bash_stereoMC(target_dir, identification):
         Path to the working directory
     identification: str
         Particle name. Options: protons, gammadiffuse
+    force: bool
+        If True, the data files are processed again even if they are up to date
     """
+    
+    force_arg = " --force" if force else ""
 
     process_name = target_dir.split("/")[-2:][1]
 
@@ -121,7 +141,7 @@ def bash_stereoMC(target_dir, identification):
     f.write("SAMPLE_LIST=($(<$INPUTDIR/list_coin.txt))\n")
     f.write("SAMPLE=${SAMPLE_LIST[${SLURM_ARRAY_TASK_ID}]}\n")
     f.write("export LOG=$OUTPUTDIR/stereo_${SLURM_ARRAY_TASK_ID}.log\n")
-    f.write(f"conda run -n magic-lst python lst1_magic_stereo_reco.py --input-file $SAMPLE --output-dir $OUTPUTDIR --config-file {target_dir}/config_stereo.yaml >$LOG 2>&1")
+    f.write(f"conda run -n magic-lst python lst1_magic_stereo_reco.py --input-file $SAMPLE --output-dir $OUTPUTDIR --config-file {target_dir}/config_stereo.yaml{force_arg} >$LOG 2>&1")
     f.close()
 
 
@@ -134,6 +154,15 @@ def main():
     Here we read the config_general.yaml file and call the functions defined above.
     """
     
+    parser = argparse.ArgumentParser()
+    add_pipeline_arguments(parser)
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Process the data files again even if they are up to date",
+    )
+    args = parser.parse_args()
     
     with open("config_general.yaml", "rb") as f:   # "rb" mode opens the file in binary format for reading
         config = yaml.safe_load(f)
@@ -147,29 +176,26 @@ def main():
     configfile_stereo(telescope_ids, target_dir)
     
     print("***** Generating the bashscript...")
-    bash_stereo(target_dir)
+    bash_stereo(target_dir, args.force)
     
     print("***** Generating the bashscript for MCs...")
-    bash_stereoMC(target_dir,"gammadiffuse")
-    bash_stereoMC(target_dir,"gammas")
-    bash_stereoMC(target_dir,"protons")
-    bash_stereoMC(target_dir,"protons_test")
+    bash_stereoMC(target_dir, "gammadiffuse", args.force)
+    bash_stereoMC(target_dir, "gammas", args.force)
+    bash_stereoMC(target_dir, "protons", args.force)
+    bash_stereoMC(target_dir, "protons_test", args.force)
     
     print("***** Submitting processes to the cluster...")
     print("Process name: "+target_dir.split("/")[-2:][1]+"_stereo")
     print("To check the jobs submitted to the cluster, type: squeue -n "+target_dir.split("/")[-2:][1]+"_stereo")
     
-    #Below we run the bash scripts to find the stereo events
+    #Below we run the bash scripts to find the stereo events. The nights and MC samples are independent, so they run in parallel
     list_of_stereo_scripts = np.sort(glob.glob("StereoEvents_*.sh"))
     
-    for n,run in enumerate(list_of_stereo_scripts):
-        if n == 0:
-            launch_jobs =  f"stereo{n}=$(sbatch --parsable {run})"
-        else:
-            launch_jobs = launch_jobs + f" && stereo{n}=$(sbatch --parsable --dependency=afterany:$stereo{n-1} {run})"
+    pipeline = Pipeline(target_dir.split("/")[-2:][1]+"_stereo")
+    for run in list_of_stereo_scripts:
+        pipeline.add_task(run[0:-3], run)
     
-    #print(launch_jobs)
-    os.system(launch_jobs)
+    pipeline.run(get_pipeline_backend(args), dry_run=args.dry_run)
 
 if __name__ == "__main__":
     main()
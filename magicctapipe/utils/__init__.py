@@ -31,12 +31,49 @@ from .gti import (
     GTIGenerator,
 )
 
+from .event_key import (
+    OBS_ID_BITS,
+    EVENT_ID_BITS,
+    TEL_ID_BITS,
+    pack_event_key,
+    pack_sort_key,
+    unpack_event_key,
+    get_shower_key,
+    get_event_keys,
+    get_event_sort_keys,
+)
+
+from .aggregation import (
+    factorize_events,
+    group_sum,
+    group_mean,
+    group_mean_direction,
+)
+
+from .coordinates import (
+    camera_to_telescope,
+    telescope_to_camera,
+    telescope_to_altaz,
+    altaz_to_telescope,
+    camera_to_altaz,
+    directional_offset_by,
+)
+
 from .functions import (
     calculate_disp,
     calculate_impact,
     calculate_mean_direction,
     calculate_off_coordinates,
     transform_altaz_to_radec,
+    transform_radec_to_galactic,
+)
+
+from .pipeline import (
+    Pipeline,
+    LocalBackend,
+    SlurmBackend,
+    add_pipeline_arguments,
+    get_pipeline_backend,
 )
 
 from .plot import (
@@ -87,11 +124,36 @@ __all__ = [
     "identify_time_edges",
     "intersect_time_intervals",
     "GTIGenerator",
+    "OBS_ID_BITS",
+    "EVENT_ID_BITS",
+    "TEL_ID_BITS",
+    "pack_event_key",
+    "pack_sort_key",
+    "unpack_event_key",
+    "get_shower_key",
+    "get_event_keys",
+    "get_event_sort_keys",
+    "factorize_events",
+    "group_sum",
+    "group_mean",
+    "group_mean_direction",
+    "camera_to_telescope",
+    "telescope_to_camera",
+    "telescope_to_altaz",
+    "altaz_to_telescope",
+    "camera_to_altaz",
+    "directional_offset_by",
     "calculate_disp",
     "calculate_impact",
     "calculate_mean_direction",
     "calculate_off_coordinates",
     "transform_altaz_to_radec",
+    "transform_radec_to_galactic",
+    "Pipeline",
+    "LocalBackend",
+    "SlurmBackend",
+    "add_pipeline_arguments",
+    "get_pipeline_backend",
     "save_plt",
     "load_default_plot_settings",
     "load_default_plot_settings_02",
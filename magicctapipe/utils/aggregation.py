@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Group-reduction kernels to aggregate telescope events per shower event.
+
+The shower event key is factorized only once into integer codes, and
+then the (weighted) sums and means of any number of parameters are
+calculated with `numpy.bincount`, which avoids building temporary data
+frames and calling the pandas groupby reductions per parameter. As done
+by the pandas reductions, NaN values are skipped.
+"""
+
+import numpy as np
+import pandas as pd
+from magicctapipe.utils.event_key import get_event_keys, unpack_event_key
+
+__all__ = [
+    "factorize_events",
+    "group_sum",
+    "group_mean",
+    "group_mean_direction",
+]
+
+
+def factorize_events(event_data, group_index=["obs_id", "event_id"]):
+    """
+    Factorizes the shower event key of telescope events.
+
+    If the events are grouped by the integer observation and event IDs,
+    they are factorized with the packed event keys, i.e., by sorting
+    integers, instead of the pandas groupby.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame or pandas.core.series.Series
+        Data frame or series of telescope events
+    group_index: list
+        Index to group telescope events
+
+    Returns
+    -------
+    event_codes: numpy.ndarray
+        Integer code of the shower event of every telescope event,
+        i.e., the position of the event in `event_index`
+    event_index: pandas.core.indexes.multi.MultiIndex
+        Sorted index of the shower events
+    """
+
+    if list(group_index) == ["obs_id", "event_id"]:
+        try:
+            event_keys = get_event_keys(event_data, include_tel_id=False)
+
+        except ValueError:
+            # The IDs are not integers or are out of the packed ranges
+            pass
+
+        else:
+            shower_keys, event_codes = np.unique(event_keys, return_inverse=True)
+
+            obs_ids, event_ids, _ = unpack_event_key(shower_keys)
+            event_index = pd.MultiIndex.from_arrays([obs_ids, event_ids], names=group_index)
+
+            return event_codes.ravel(), event_index
+
+    grouped = event_data.groupby(group_index)
+
+    event_codes = grouped.ngroup().to_numpy()
+    event_index = grouped.size().index
+
+    return event_codes, event_index
+
+
+def group_sum(values, event_codes, n_events, weights=None):
+    """
+    Calculates the (weighted) sum of the values per shower event.
+
+    NaN values, or values with NaN weights, are skipped, so the sum of
+    a shower event with only NaN values is 0 as with `pandas`.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        Values of the telescope events
+    event_codes: numpy.ndarray
+        Shower event codes of the telescope events
+    n_events: int
+        Number of the shower events
+    weights: numpy.ndarray
+        Weights for the input values
+
+    Returns
+    -------
+    sums: numpy.ndarray
+        Sum of the values per shower event
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    if weights is not None:
+        values = values * np.asarray(weights, dtype=np.float64)
+
+    mask_nan = np.isnan(values)
+
+    if mask_nan.any():
+        values = np.where(mask_nan, 0, values)
+
+    sums = np.bincount(event_codes, weights=values, minlength=n_events)
+
+    return sums
+
+
+def group_mean(values, event_codes, n_events, weights=None):
+    """
+    Calculates the (weighted) mean of the values per shower event.
+
+    NaN values, or values with NaN weights, are skipped, so the mean of
+    a shower event with only NaN values is NaN as with `pandas`.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        Values of the telescope events
+    event_codes: numpy.ndarray
+        Shower event codes of the telescope events
+    n_events: int
+        Number of the shower events
+    weights: numpy.ndarray
+        Weights for the input values
+
+    Returns
+    -------
+    means: numpy.ndarray
+        Mean of the values per shower event
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    if weights is None:
+        weights = np.ones(len(values))
+    else:
+        weights = np.asarray(weights, dtype=np.float64)
+
+    # Exclude the weights of the skipped values from the normalization
+    mask_nan = np.isnan(values) | np.isnan(weights)
+
+    if mask_nan.any():
+        weights = np.where(mask_nan, 0, weights)
+        values = np.where(mask_nan, 0, values)
+
+    weight_sums = np.bincount(event_codes, weights=weights, minlength=n_events)
+    value_sums = np.bincount(event_codes, weights=values * weights, minlength=n_events)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = value_sums / weight_sums
+
+    return means
+
+
+def group_mean_direction(lon, lat, event_codes, n_events, weights=None):
+    """
+    Calculates the (weighted) mean direction per shower event.
+
+    The input directions are transformed to the cartesian coordinate,
+    and the mean position of each axis is transformed back to the
+    spherical coordinate.
+
+    Parameters
+    ----------
+    lon: numpy.ndarray
+        Longitude in a spherical coordinate, in the unit of radian
+    lat: numpy.ndarray
+        Latitude in a spherical coordinate, in the unit of radian
+    event_codes: numpy.ndarray
+        Shower event codes of the telescope events
+    n_events: int
+        Number of the shower events
+    weights: numpy.ndarray
+        Weights for the input directions
+
+    Returns
+    -------
+    lon_mean: numpy.ndarray
+        Longitude of the mean direction, between 0 and 2 pi
+    lat_mean: numpy.ndarray
+        Latitude of the mean direction
+    """
+
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+
+    cos_lat = np.cos(lat)
+
+    # The normalization by the sum of the weights is not needed, since
+    # it does not change the direction of the mean vector
+    x_coord_sum = group_sum(cos_lat * np.cos(lon), event_codes, n_events, weights)
+    y_coord_sum = group_sum(cos_lat * np.sin(lon), event_codes, n_events, weights)
+    z_coord_sum = group_sum(np.sin(lat), event_codes, n_events, weights)
+
+    lon_mean = np.mod(np.arctan2(y_coord_sum, x_coord_sum), 2 * np.pi)
+    lat_mean = np.arctan2(z_coord_sum, np.hypot(x_coord_sum, y_coord_sum))
+
+    return lon_mean, lat_mean
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Closed-form transformations between the camera, telescope (nominal)
+and Alt/Az frames implemented with plain NumPy.
+
+They reproduce the transformations of `ctapipe.coordinates.CameraFrame`
+and `ctapipe.coordinates.TelescopeFrame` (equidistant mapping of the
+camera plane and a sky offset frame centered on the telescope pointing)
+without going through the astropy frame-transform graph, which is much
+slower when it is called per telescope event.
+
+All the angles are given and returned in the unit of radian, and the
+camera coordinates in the same unit as the focal length. The functions
+accept both scalars and arrays, following the NumPy broadcasting rules.
+"""
+
+import numpy as np
+
+__all__ = [
+    "camera_to_telescope",
+    "telescope_to_camera",
+    "telescope_to_altaz",
+    "altaz_to_telescope",
+    "camera_to_altaz",
+    "directional_offset_by",
+]
+
+
+def camera_to_telescope(x, y, focal_length, rotation=0):
+    """
+    Transforms camera coordinates to the telescope frame.
+
+    Parameters
+    ----------
+    x: float or numpy.ndarray
+        X coordinate in the camera frame
+    y: float or numpy.ndarray
+        Y coordinate in the camera frame
+    focal_length: float or numpy.ndarray
+        Focal length of the telescope, in the same unit as `x` and `y`
+    rotation: float or numpy.ndarray
+        Rotation angle of the camera
+
+    Returns
+    -------
+    fov_lon: float or numpy.ndarray
+        Longitude in the telescope frame, aligned with the azimuth
+    fov_lat: float or numpy.ndarray
+        Latitude in the telescope frame, aligned with the altitude
+    """
+
+    cos_rot = np.cos(rotation)
+    sin_rot = np.sin(rotation)
+
+    x_rotated = x * cos_rot - y * sin_rot
+    y_rotated = x * sin_rot + y * cos_rot
+
+    # Here we assume the equidistant mapping of the telescope optics,
+    # as done in ctapipe
+    fov_lat = x_rotated / focal_length
+    fov_lon = y_rotated / focal_length
+
+    return fov_lon, fov_lat
+
+
+def telescope_to_camera(fov_lon, fov_lat, focal_length, rotation=0):
+    """
+    Transforms telescope frame coordinates to the camera frame.
+
+    Parameters
+    ----------
+    fov_lon: float or numpy.ndarray
+        Longitude in the telescope frame
+    fov_lat: float or numpy.ndarray
+        Latitude in the telescope frame
+    focal_length: float or numpy.ndarray
+        Focal length of the telescope
+    rotation: float or numpy.ndarray
+        Rotation angle of the camera
+
+    Returns
+    -------
+    x: float or numpy.ndarray
+        X coordinate in the camera frame, in the unit of `focal_length`
+    y: float or numpy.ndarray
+        Y coordinate in the camera frame, in the unit of `focal_length`
+    """
+
+    cos_rot = np.cos(rotation)
+    sin_rot = np.sin(rotation)
+
+    # Reverse the rotation of the camera
+    x_rotated = fov_lat * cos_rot + fov_lon * sin_rot
+    y_rotated = -fov_lat * sin_rot + fov_lon * cos_rot
+
+    x = x_rotated * focal_length
+    y = y_rotated * focal_length
+
+    return x, y
+
+
+def telescope_to_altaz(fov_lon, fov_lat, pointing_alt, pointing_az):
+    """
+    Transforms telescope frame coordinates to the Alt/Az frame.
+
+    Parameters
+    ----------
+    fov_lon: float or numpy.ndarray
+        Longitude in the telescope frame
+    fov_lat: float or numpy.ndarray
+        Latitude in the telescope frame
+    pointing_alt: float or numpy.ndarray
+        Altitude of the telescope pointing direction
+    pointing_az: float or numpy.ndarray
+        Azimuth of the telescope pointing direction
+
+    Returns
+    -------
+    alt: float or numpy.ndarray
+        Altitude of the input direction
+    az: float or numpy.ndarray
+        Azimuth of the input direction, between 0 and 2 pi
+    """
+
+    cos_lat = np.cos(fov_lat)
+
+    vec_x = cos_lat * np.cos(fov_lon)
+    vec_y = cos_lat * np.sin(fov_lon)
+    vec_z = np.sin(fov_lat)
+
+    cos_alt = np.cos(pointing_alt)
+    sin_alt = np.sin(pointing_alt)
+    cos_az = np.cos(pointing_az)
+    sin_az = np.sin(pointing_az)
+
+    # Rotate the pointing direction back from the X axis, i.e., apply the
+    # inverse of the rotations around the Z axis by the azimuth and then
+    # around the Y axis by the altitude
+    rot_x = cos_alt * vec_x - sin_alt * vec_z
+    rot_z = sin_alt * vec_x + cos_alt * vec_z
+
+    altaz_x = cos_az * rot_x - sin_az * vec_y
+    altaz_y = sin_az * rot_x + cos_az * vec_y
+
+    alt = np.arctan2(rot_z, np.hypot(altaz_x, altaz_y))
+    az = np.mod(np.arctan2(altaz_y, altaz_x), 2 * np.pi)
+
+    return alt, az
+
+
+def altaz_to_telescope(alt, az, pointing_alt, pointing_az):
+    """
+    Transforms Alt/Az coordinates to the telescope frame.
+
+    Parameters
+    ----------
+    alt: float or numpy.ndarray
+        Altitude of the input direction
+    az: float or numpy.ndarray
+        Azimuth of the input direction
+    pointing_alt: float or numpy.ndarray
+        Altitude of the telescope pointing direction
+    pointing_az: float or numpy.ndarray
+        Azimuth of the telescope pointing direction
+
+    Returns
+    -------
+    fov_lon: float or numpy.ndarray
+        Longitude in the telescope frame, between -pi and pi
+    fov_lat: float or numpy.ndarray
+        Latitude in the telescope frame
+    """
+
+    cos_lat = np.cos(alt)
+
+    vec_x = cos_lat * np.cos(az)
+    vec_y = cos_lat * np.sin(az)
+    vec_z = np.sin(alt)
+
+    cos_alt = np.cos(pointing_alt)
+    sin_alt = np.sin(pointing_alt)
+    cos_az = np.cos(pointing_az)
+    sin_az = np.sin(pointing_az)
+
+    # Rotate the pointing direction to the X axis
+    rot_x = cos_az * vec_x + sin_az * vec_y
+    rot_y = -sin_az * vec_x + cos_az * vec_y
+
+    tel_x = cos_alt * rot_x + sin_alt * vec_z
+    tel_z = -sin_alt * rot_x + cos_alt * vec_z
+
+    fov_lon = np.arctan2(rot_y, tel_x)
+    fov_lat = np.arctan2(tel_z, np.hypot(tel_x, rot_y))
+
+    return fov_lon, fov_lat
+
+
+def camera_to_altaz(x, y, focal_length, pointing_alt, pointing_az, rotation=0):
+    """
+    Transforms camera coordinates to the Alt/Az frame.
+
+    Parameters
+    ----------
+    x: float or numpy.ndarray
+        X coordinate in the camera frame
+    y: float or numpy.ndarray
+        Y coordinate in the camera frame
+    focal_length: float or numpy.ndarray
+        Focal length of the telescope, in the same unit as `x` and `y`
+    pointing_alt: float or numpy.ndarray
+        Altitude of the telescope pointing direction
+    pointing_az: float or numpy.ndarray
+        Azimuth of the telescope pointing direction
+    rotation: float or numpy.ndarray
+        Rotation angle of the camera
+
+    Returns
+    -------
+    alt: float or numpy.ndarray
+        Altitude of the input position
+    az: float or numpy.ndarray
+        Azimuth of the input position, between 0 and 2 pi
+    """
+
+    fov_lon, fov_lat = camera_to_telescope(x, y, focal_length, rotation)
+    alt, az = telescope_to_altaz(fov_lon, fov_lat, pointing_alt, pointing_az)
+
+    return alt, az
+
+
+def directional_offset_by(lon, lat, position_angle, separation):
+    """
+    Calculates the direction offset by a given separation towards a
+    given position angle, as done by
+    `astropy.coordinates.SkyCoord.directional_offset_by`.
+
+    Parameters
+    ----------
+    lon: float or numpy.ndarray
+        Longitude of the starting direction
+    lat: float or numpy.ndarray
+        Latitude of the starting direction
+    position_angle: float or numpy.ndarray
+        Position angle, measured from the north (latitude axis) towards
+        the east (longitude axis)
+    separation: float or numpy.ndarray
+        Angular separation from the starting direction
+
+    Returns
+    -------
+    lon_offset: float or numpy.ndarray
+        Longitude of the offset direction, between 0 and 2 pi
+    lat_offset: float or numpy.ndarray
+        Latitude of the offset direction
+    """
+
+    cos_a = np.cos(separation)
+    sin_a = np.sin(separation)
+    cos_c = np.sin(lat)
+    sin_c = np.cos(lat)
+    cos_b = np.cos(position_angle)
+    sin_b = np.sin(position_angle)
+
+    # Use the spherical cosine and sine rules of the triangle made by
+    # the north pole, the starting and the offset directions
+    cos_colat = cos_c * cos_a + sin_c * sin_a * cos_b
+
+    xsin_lon_diff = sin_a * sin_b * sin_c
+    xcos_lon_diff = cos_a - cos_colat * cos_c
+
+    lon_diff = np.arctan2(xsin_lon_diff, xcos_lon_diff)
+
+    # Treat the poles as if they are infinitesimally far from the pole
+    # but at the given longitude
+    lon_diff_pole = np.pi / 2 + cos_c * (np.pi / 2 - position_angle)
+    lon_diff = np.where(sin_c < 1e-12, lon_diff_pole, lon_diff)
+
+    lon_offset = np.mod(lon + lon_diff, 2 * np.pi)
+    lat_offset = np.arcsin(cos_colat)
+
+    return lon_offset, lat_offset
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Packed event keys encoding the observation, event and telescope IDs of
+telescope events into single unsigned 64-bit integers.
+
+The bit layout is the following, from the most significant bit:
+
+- 24 bits for the observation ID, i.e., up to 16,777,215, which covers
+  the LST-1 and MAGIC run numbers and the MC run numbers
+- 32 bits for the event ID, i.e., up to 4,294,967,295, which covers the
+  event IDs of a LST-1 run of several hours at 10 kHz and the MC event
+  IDs including the shower reuse
+- 8 bits for the telescope ID, i.e., up to 255
+
+Since the fields are ordered from the most significant bit, the packed
+keys are sorted in the same order as the (`obs_id`, `event_id`,
+`tel_id`) multi index, and grouping and joining telescope events become
+plain operations on sorted integers. The shower events are identified
+by the keys whose telescope field is shifted out.
+
+The IDs which cannot be packed, i.e., the non-integer IDs or those out
+of the ranges of the fields, are replaced with their ranks by
+`pack_sort_key`, whose keys are sorted and grouped in the same way as
+the packed event keys but cannot be unpacked.
+"""
+
+import numpy as np
+import pandas as pd
+
+__all__ = [
+    "OBS_ID_BITS",
+    "EVENT_ID_BITS",
+    "TEL_ID_BITS",
+    "pack_event_key",
+    "pack_sort_key",
+    "unpack_event_key",
+    "get_shower_key",
+    "get_event_keys",
+    "get_event_sort_keys",
+]
+
+# The numbers of bits of the fields of the packed event keys
+OBS_ID_BITS = 24
+EVENT_ID_BITS = 32
+TEL_ID_BITS = 8
+
+
+def pack_event_key(obs_id, event_id, tel_id=0):
+    """
+    Packs observation, event and telescope IDs into event keys.
+
+    Parameters
+    ----------
+    obs_id: int or numpy.ndarray
+        Observation IDs of the events
+    event_id: int or numpy.ndarray
+        Event IDs of the events
+    tel_id: int or numpy.ndarray
+        Telescope IDs of the events
+
+    Returns
+    -------
+    event_keys: numpy.ndarray
+        Packed event keys, as unsigned 64-bit integers
+
+    Raises
+    ------
+    ValueError
+        If the input IDs are not integers or are out of the ranges of
+        the fields of the packed keys
+    """
+
+    fields = [
+        ("obs_id", obs_id, OBS_ID_BITS),
+        ("event_id", event_id, EVENT_ID_BITS),
+        ("tel_id", tel_id, TEL_ID_BITS),
+    ]
+
+    event_keys = np.uint64(0)
+
+    for name, values, n_bits in fields:
+        values = np.asarray(values)
+
+        if values.dtype.kind not in "iu":
+            raise ValueError(f"The {name} values must be integers, not {values.dtype}.")
+
+        if (values.size > 0) and ((values.min() < 0) or (values.max() >= 1 << n_bits)):
+            raise ValueError(
+                f"The {name} values out of the range [0, {(1 << n_bits) - 1}] "
+                "cannot be packed into the event keys."
+            )
+
+        event_keys = (event_keys << np.uint64(n_bits)) | values.astype(np.uint64)
+
+    event_keys = np.asarray(event_keys, dtype=np.uint64)
+
+    return event_keys
+
+
+def pack_sort_key(obs_id, event_id, tel_id=0):
+    """
+    Packs observation, event and telescope IDs into keys which are
+    sorted and grouped in the same order as the (`obs_id`, `event_id`,
+    `tel_id`) multi index.
+
+    The keys are the packed event keys if the IDs can be packed,
+    otherwise the ranks of the IDs are packed instead, as `pandas` sorts
+    them. Only the former can be unpacked with `unpack_event_key`.
+
+    Parameters
+    ----------
+    obs_id: int or numpy.ndarray
+        Observation IDs of the events
+    event_id: int or numpy.ndarray
+        Event IDs of the events
+    tel_id: int or numpy.ndarray
+        Telescope IDs of the events
+
+    Returns
+    -------
+    sort_keys: numpy.ndarray
+        Keys of the events, as unsigned 64-bit integers
+    """
+
+    try:
+        sort_keys = pack_event_key(obs_id, event_id, tel_id)
+
+    except ValueError:
+        # The IDs are not integers or are out of the packed ranges
+        ids = np.broadcast_arrays(obs_id, event_id, tel_id)
+        ranks = [pd.factorize(np.ravel(values), sort=True)[0] for values in ids]
+
+        sort_keys = pack_event_key(*ranks)
+
+    return sort_keys
+
+
+def unpack_event_key(event_keys):
+    """
+    Unpacks event keys into observation, event and telescope IDs.
+
+    Parameters
+    ----------
+    event_keys: numpy.ndarray
+        Packed event keys
+
+    Returns
+    -------
+    obs_id: numpy.ndarray
+        Observation IDs of the events
+    event_id: numpy.ndarray
+        Event IDs of the events
+    tel_id: numpy.ndarray
+        Telescope IDs of the events
+    """
+
+    event_keys = np.asarray(event_keys, dtype=np.uint64)
+
+    tel_id = event_keys & np.uint64((1 << TEL_ID_BITS) - 1)
+    event_id = (event_keys >> np.uint64(TEL_ID_BITS)) & np.uint64((1 << EVENT_ID_BITS) - 1)
+    obs_id = event_keys >> np.uint64(TEL_ID_BITS + EVENT_ID_BITS)
+
+    return obs_id.astype(np.int64), event_id.astype(np.int64), tel_id.astype(np.int64)
+
+
+def get_shower_key(event_keys):
+    """
+    Gets the keys of the shower events of telescope events, which are
+    shared by all the telescope events of the same shower event.
+
+    Parameters
+    ----------
+    event_keys: numpy.ndarray
+        Packed event keys of telescope events
+
+    Returns
+    -------
+    shower_keys: numpy.ndarray
+        Keys of the shower events, sorted in the same order as the
+        (`obs_id`, `event_id`) multi index
+    """
+
+    shower_keys = np.asarray(event_keys, dtype=np.uint64) >> np.uint64(TEL_ID_BITS)
+
+    return shower_keys
+
+
+def get_event_keys(event_data, include_tel_id=True):
+    """
+    Gets the packed event keys of a data frame of events, whose IDs are
+    given either as the columns or as the levels of the index.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame or pandas.core.series.Series
+        Data frame or series of events
+    include_tel_id: bool
+        If `True`, the telescope IDs are packed into the keys,
+        otherwise the telescope fields are set to zero
+
+    Returns
+    -------
+    event_keys: numpy.ndarray
+        Packed event keys of the events
+    """
+
+    event_keys = pack_event_key(*_get_event_ids(event_data, include_tel_id))
+
+    return event_keys
+
+
+def get_event_sort_keys(event_data, include_tel_id=True):
+    """
+    Gets the keys of a data frame of events with `pack_sort_key`, which
+    sort and group the events also when their IDs cannot be packed.
+
+    Parameters
+    ----------
+    event_data: pandas.core.frame.DataFrame or pandas.core.series.Series
+        Data frame or series of events
+    include_tel_id: bool
+        If `True`, the telescope IDs are included in the keys,
+        otherwise the telescope fields are set to zero
+
+    Returns
+    -------
+    sort_keys: numpy.ndarray
+        Keys of the events
+    """
+
+    sort_keys = pack_sort_key(*_get_event_ids(event_data, include_tel_id))
+
+    return sort_keys
+
+
+def _get_event_ids(event_data, include_tel_id):
+    """
+    Gets the IDs of events given either as the columns or as the levels
+    of the index.
+    """
+
+    columns = ["obs_id", "event_id", "tel_id"] if include_tel_id else ["obs_id", "event_id"]
+    ids = []
+
+    for column in columns:
+        if isinstance(event_data, pd.DataFrame) and (column in event_data.columns):
+            ids.append(event_data[column].to_numpy())
+        else:
+            ids.append(event_data.index.get_level_values(column).to_numpy())
+
+    return ids
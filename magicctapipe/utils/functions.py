@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import logging
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 from astropy import units as u
@@ -8,11 +11,15 @@ from astropy.coordinates import (
     AltAz,
     Angle,
     EarthLocation,
+    Latitude,
+    Longitude,
     SkyCoord,
     SkyOffsetFrame,
     angular_separation,
 )
-from ctapipe.coordinates import TelescopeFrame
+from astropy.coordinates.erfa_astrom import ErfaAstromInterpolator, erfa_astrom
+from magicctapipe.utils.aggregation import factorize_events, group_mean_direction
+from magicctapipe.utils.coordinates import camera_to_altaz
 
 __all__ = [
     "calculate_disp",
@@ -20,13 +27,32 @@ __all__ = [
     "calculate_mean_direction",
     "calculate_off_coordinates",
     "transform_altaz_to_radec",
+    "transform_radec_to_galactic",
 ]
 
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
 # The geographic coordinate of ORM
 LON_ORM = -17.89064 * u.deg
 LAT_ORM = 28.76177 * u.deg
 HEIGHT_ORM = 2199.835 * u.m
 
+# The default resolution of the time grid on which the Alt/Az to RA/Dec
+# transformation is computed, and the accuracy required for it
+TIME_RESOLUTION_RADEC = 1 * u.s
+ACCURACY_RADEC = 1 * u.arcsec
+
+# The number of directions with which the accuracy of the transformation
+# computed on the time grid is verified
+N_DIRECTIONS_CHECK = 100
+
+# The factor by which the time grid is refined if the accuracy is not
+# satisfied, and the maximum number of the refinements
+TIME_GRID_REFINEMENT = 10
+MAX_TIME_GRID_REFINEMENTS = 3
+
 
 @u.quantity_input
 def calculate_disp(
@@ -66,16 +92,27 @@ def calculate_disp(
         DISP parameter
     """
 
-    tel_pointing = AltAz(alt=pointing_alt, az=pointing_az)
-    tel_frame = TelescopeFrame(telescope_pointing=tel_pointing)
-
-    # Transform the image CoG position to the Alt/Az direction
-    cog_coord = SkyCoord(cog_x, cog_y, frame=camera_frame)
-    cog_coord = cog_coord.transform_to(tel_frame).altaz
+    focal_length = camera_frame.focal_length.to_value("m")
+    rotation = camera_frame.rotation.to_value("rad")
+
+    # Transform the image CoG position to the Alt/Az direction with the
+    # closed-form transformation, which is much faster than the astropy
+    # frame transformation
+    cog_alt, cog_az = camera_to_altaz(
+        x=cog_x.to_value("m"),
+        y=cog_y.to_value("m"),
+        focal_length=focal_length,
+        pointing_alt=pointing_alt.to_value("rad"),
+        pointing_az=pointing_az.to_value("rad"),
+        rotation=rotation,
+    )
 
     # Calculate the DISP parameter
     disp = angular_separation(
-        lon1=cog_coord.az, lat1=cog_coord.alt, lon2=shower_az, lat2=shower_alt
+        lon1=u.Quantity(cog_az, unit="rad"),
+        lat1=u.Quantity(cog_alt, unit="rad"),
+        lon2=shower_az,
+        lat2=shower_alt,
     )
 
     return disp
@@ -173,42 +210,23 @@ def calculate_mean_direction(lon, lat, unit, weights=None):
         lon = np.deg2rad(lon)
         lat = np.deg2rad(lat)
 
-    # Transform the input directions to the cartesian coordinate and
-    # then calculate the mean position for each axis
-    x_coords = np.cos(lat) * np.cos(lon)
-    y_coords = np.cos(lat) * np.sin(lon)
-    z_coords = np.sin(lat)
+    event_codes, event_index = factorize_events(lon, ["obs_id", "event_id"])
 
-    if weights is None:
-        x_coord_mean = x_coords.groupby(["obs_id", "event_id"]).mean()
-        y_coord_mean = y_coords.groupby(["obs_id", "event_id"]).mean()
-        z_coord_mean = z_coords.groupby(["obs_id", "event_id"]).mean()
+    if weights is not None:
+        weights = np.asarray(weights)
 
-    else:
-        df_cartesian = pd.DataFrame(
-            data={
-                "weight": weights,
-                "weighted_x_coord": x_coords * weights,
-                "weighted_y_coord": y_coords * weights,
-                "weighted_z_coord": z_coords * weights,
-            }
-        )
-
-        group_sum = df_cartesian.groupby(["obs_id", "event_id"]).sum()
-
-        x_coord_mean = group_sum["weighted_x_coord"] / group_sum["weight"]
-        y_coord_mean = group_sum["weighted_y_coord"] / group_sum["weight"]
-        z_coord_mean = group_sum["weighted_z_coord"] / group_sum["weight"]
-
-    coord_mean = SkyCoord(
-        x=x_coord_mean, y=y_coord_mean, z=z_coord_mean, representation_type="cartesian"
+    # Transform the input directions to the cartesian coordinate and
+    # then calculate the mean position for each axis
+    lon_mean, lat_mean = group_mean_direction(
+        lon=lon, lat=lat, event_codes=event_codes, n_events=len(event_index), weights=weights
     )
 
-    # Transform to the spherical coordinate
-    coord_mean = coord_mean.spherical
+    if unit in ["deg", "degree"]:
+        lon_mean = np.rad2deg(lon_mean)
+        lat_mean = np.rad2deg(lat_mean)
 
-    lon_mean = pd.Series(data=coord_mean.lon.to_value(unit), index=x_coord_mean.index)
-    lat_mean = pd.Series(data=coord_mean.lat.to_value(unit), index=x_coord_mean.index)
+    lon_mean = pd.Series(data=lon_mean, index=event_index)
+    lat_mean = pd.Series(data=lat_mean, index=event_index)
 
     return lon_mean, lat_mean
 
@@ -290,11 +308,27 @@ def calculate_off_coordinates(
 
 
 @u.quantity_input
-def transform_altaz_to_radec(alt: u.deg, az: u.deg, obs_time):
+def transform_altaz_to_radec(
+    alt: u.deg, az: u.deg, obs_time, time_resolution=None, accuracy=None
+):
     """
     Transforms the Alt/Az direction measured from ORM to the RA/Dec
     coordinate.
 
+    By default the transformation is computed for every input time,
+    which is slow for millions of events since the precession, nutation
+    and aberration are calculated per event. If the time resolution is
+    given, they are computed only on a time grid over the input time
+    span and interpolated to every input time. With the default time
+    resolution of 1 s, the result agrees with the exact transformation
+    within 1 milliarcsecond, which is verified in the tests.
+
+    If the accuracy is also given, the result is verified against the
+    exact transformation of a hundred directions evenly sampled over
+    the input time span. If the accuracy is not satisfied, the time grid
+    is refined by a factor of 10 up to 3 times, and then the exact
+    transformation is applied instead.
+
     Parameters
     ----------
     alt: astropy.units.quantity.Quantity
@@ -303,6 +337,12 @@ def transform_altaz_to_radec(alt: u.deg, az: u.deg, obs_time):
         Azimuth measured from ORM
     obs_time: astropy.time.core.Time
         Time when the direction was measured
+    time_resolution: astropy.units.quantity.Quantity
+        Resolution of the time grid on which the transformation is
+        computed (If None, it is computed for every input time)
+    accuracy: astropy.units.quantity.Quantity
+        Accuracy required for the transformation computed on the time
+        grid (If None, it is not verified)
 
     Returns
     -------
@@ -315,11 +355,113 @@ def transform_altaz_to_radec(alt: u.deg, az: u.deg, obs_time):
     location = EarthLocation.from_geodetic(lon=LON_ORM, lat=LAT_ORM, height=HEIGHT_ORM)
     horizon_frames = AltAz(location=location, obstime=obs_time)
 
-    # Transform to the RA/Dec coordinate
     event_coord = SkyCoord(alt=alt, az=az, frame=horizon_frames)
-    event_coord = event_coord.transform_to("icrs")
+
+    if (time_resolution is None) or obs_time.isscalar:
+        # Transform to the RA/Dec coordinate
+        event_coord = event_coord.transform_to("icrs")
+
+    elif accuracy is None:
+        # Transform to the RA/Dec coordinate with the time grid
+        with erfa_astrom.set(ErfaAstromInterpolator(time_resolution)):
+            event_coord = event_coord.transform_to("icrs")
+
+    else:
+        # Transform exactly the directions evenly sampled over the input
+        # time span, with which the accuracy is verified
+        indices_check = np.linspace(0, len(obs_time) - 1, N_DIRECTIONS_CHECK)
+        indices_check = np.unique(indices_check.astype(int))
+
+        coord_check = event_coord[indices_check].transform_to("icrs")
+
+        for i_refinement in range(MAX_TIME_GRID_REFINEMENTS + 1):
+            # Transform to the RA/Dec coordinate with the time grid
+            with erfa_astrom.set(ErfaAstromInterpolator(time_resolution)):
+                event_coord_grid = event_coord.transform_to("icrs")
+
+            max_diff = coord_check.separation(event_coord_grid[indices_check]).max()
+
+            if max_diff <= accuracy:
+                event_coord = event_coord_grid
+                break
+
+            if i_refinement < MAX_TIME_GRID_REFINEMENTS:
+                time_resolution = time_resolution / TIME_GRID_REFINEMENT
+
+                logger.info(
+                    f"The Alt/Az to RA/Dec transformation on the time grid differs "
+                    f"by {max_diff.to('arcsec'):.3g} from the exact one, larger than "
+                    f"the required accuracy {accuracy.to('arcsec')}. Refining the "
+                    f"time grid to {time_resolution.to('s'):.3g}..."
+                )
+
+        else:
+            logger.warning(
+                "WARNING: The Alt/Az to RA/Dec transformation on the refined time "
+                f"grid differs by {max_diff.to('arcsec'):.3g} from the exact one. "
+                "Applying the exact transformation..."
+            )
+
+            event_coord = event_coord.transform_to("icrs")
 
     ra = event_coord.ra
     dec = event_coord.dec
 
     return ra, dec
+
+
+@lru_cache()
+def _get_icrs_to_galactic_matrix():
+    """
+    Gets the rotation matrix from the RA/Dec to the galactic coordinate.
+
+    The transformation does not depend on time, so the matrix is
+    computed only once with astropy and cached.
+
+    Returns
+    -------
+    rotation_matrix: numpy.ndarray
+        Rotation matrix applied to the cartesian RA/Dec directions
+    """
+
+    # Transform the unit vectors of the cartesian axes, which become the
+    # columns of the rotation matrix
+    unit_coords = SkyCoord(
+        x=[1, 0, 0], y=[0, 1, 0], z=[0, 0, 1], representation_type="cartesian", frame="icrs"
+    )
+
+    rotation_matrix = unit_coords.galactic.cartesian.xyz.value
+
+    return rotation_matrix
+
+
+@u.quantity_input
+def transform_radec_to_galactic(ra: u.deg, dec: u.deg):
+    """
+    Transforms the RA/Dec direction to the galactic coordinate.
+
+    Parameters
+    ----------
+    ra: astropy.units.quantity.Quantity
+        Right ascension of the input direction
+    dec: astropy.units.quantity.Quantity
+        Declination of the input direction
+
+    Returns
+    -------
+    glon: astropy.coordinates.angles.Longitude
+        Galactic longitude of the input direction
+    glat: astropy.coordinates.angles.Latitude
+        Galactic latitude of the input direction
+    """
+
+    ra = ra.to_value("rad")
+    dec = dec.to_value("rad")
+
+    vectors = np.array([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+    vectors = np.tensordot(_get_icrs_to_galactic_matrix(), vectors, axes=1)
+
+    glon = Longitude(np.arctan2(vectors[1], vectors[0]), unit="rad")
+    glat = Latitude(np.arctan2(vectors[2], np.hypot(vectors[0], vectors[1])), unit="rad")
+
+    return glon.to("deg"), glat.to("deg")
@@ -0,0 +1,591 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Executor of the analysis pipelines given as DAGs of bash scripts.
+
+The scripts generated by the semi-automatic scripts, e.g. one per night
+or per particle type, are added to a `Pipeline` as tasks. A task depends
+on the tasks which produce its inputs, or on the tasks given explicitly,
+so the independent branches are executed in parallel. The pipelines are
+executed with one of the following backends:
+
+- `LocalBackend`: runs the scripts with a pool of local processes, e.g.,
+  for single-node and test runs. The SLURM array jobs are emulated by
+  running the script once per task ID.
+- `SlurmBackend`: submits all the scripts at once with `sbatch`, with
+  `afterok` dependencies on the jobs of the tasks they depend on.
+
+The plan of the execution can be shown without running anything with
+`dry_run=True`.
+"""
+
+import concurrent.futures
+import logging
+import os
+import re
+import subprocess
+
+__all__ = [
+    "Pipeline",
+    "LocalBackend",
+    "SlurmBackend",
+    "add_pipeline_arguments",
+    "get_pipeline_backend",
+]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+
+class Pipeline:
+    """
+    Pipeline of tasks running bash scripts, whose dependencies form a
+    directed acyclic graph.
+
+    Attributes
+    ----------
+    name: str
+        Name of the pipeline
+    tasks: dict
+        Tasks of the pipeline with the keys of their names, each of
+        which has the script, inputs, outputs and explicit dependencies
+    """
+
+    def __init__(self, name):
+        """
+        Constructor of the class.
+
+        Parameters
+        ----------
+        name: str
+            Name of the pipeline
+        """
+
+        self.name = name
+        self.tasks = {}
+
+    def add_task(self, name, script, inputs=None, outputs=None, depends_on=None):
+        """
+        Adds a task to the pipeline.
+
+        Parameters
+        ----------
+        name: str
+            Name of the task
+        script: str
+            Path to the bash script run by the task
+        inputs: list
+            Paths to the inputs of the task, e.g. directories, on whose
+            producing tasks the task depends
+        outputs: list
+            Paths to the outputs produced by the task
+        depends_on: list
+            Names of the tasks on which the task depends explicitly
+
+        Returns
+        -------
+        name: str
+            Name of the task
+
+        Raises
+        ------
+        ValueError
+            If a task of the same name is already added
+        """
+
+        if name in self.tasks:
+            raise ValueError(f"The task '{name}' is already added.")
+
+        self.tasks[name] = {
+            "script": script,
+            "inputs": [os.path.normpath(path) for path in inputs or []],
+            "outputs": [os.path.normpath(path) for path in outputs or []],
+            "depends_on": list(depends_on or []),
+        }
+
+        return name
+
+    def get_dependencies(self):
+        """
+        Gets the dependencies of the tasks, given explicitly or by the
+        inputs produced by the other tasks.
+
+        Returns
+        -------
+        dependencies: dict
+            Names of the tasks on which each task depends
+
+        Raises
+        ------
+        ValueError
+            If a task depends on an unknown task
+        """
+
+        producers = {}
+
+        for name, task in self.tasks.items():
+            for output in task["outputs"]:
+                producers.setdefault(output, []).append(name)
+
+        dependencies = {}
+
+        for name, task in self.tasks.items():
+            task_dependencies = list(task["depends_on"])
+
+            for input_path in task["inputs"]:
+                task_dependencies += producers.get(input_path, [])
+
+            for dependency in task_dependencies:
+                if dependency not in self.tasks:
+                    raise ValueError(
+                        f"The task '{name}' depends on the unknown task '{dependency}'."
+                    )
+
+            # Remove the duplicates and the task itself, keeping the order
+            dependencies[name] = [
+                dependency
+                for i_dep, dependency in enumerate(task_dependencies)
+                if dependency != name and dependency not in task_dependencies[:i_dep]
+            ]
+
+        return dependencies
+
+    def get_stages(self):
+        """
+        Gets the stages of the pipeline, i.e., the groups of the tasks
+        which depend only on the tasks of the previous stages.
+
+        Returns
+        -------
+        stages: list
+            Names of the tasks of each stage
+
+        Raises
+        ------
+        ValueError
+            If the dependencies of the tasks have a cycle
+        """
+
+        dependencies = self.get_dependencies()
+
+        stages = []
+        done_tasks = set()
+
+        while len(done_tasks) < len(self.tasks):
+            stage = [
+                name
+                for name in self.tasks
+                if name not in done_tasks
+                and all(dependency in done_tasks for dependency in dependencies[name])
+            ]
+
+            if len(stage) == 0:
+                remaining_tasks = [name for name in self.tasks if name not in done_tasks]
+                raise ValueError(f"The dependencies of the tasks {remaining_tasks} have a cycle.")
+
+            stages.append(stage)
+            done_tasks.update(stage)
+
+        return stages
+
+    def format_plan(self):
+        """
+        Formats the plan of the execution of the pipeline.
+
+        Returns
+        -------
+        plan: str
+            Stages of the pipeline with the scripts of the tasks and
+            their dependencies
+        """
+
+        dependencies = self.get_dependencies()
+
+        lines = [f"Pipeline '{self.name}' with {len(self.tasks)} tasks:"]
+
+        for i_stage, stage in enumerate(self.get_stages()):
+            lines.append(f"\nStage {i_stage} ({len(stage)} tasks in parallel):")
+
+            for name in stage:
+                line = f"  {name}: {self.tasks[name]['script']}"
+
+                if len(dependencies[name]) > 0:
+                    line += f" (after {', '.join(dependencies[name])})"
+
+                lines.append(line)
+
+        return "\n".join(lines)
+
+    def run(self, backend, dry_run=False):
+        """
+        Executes the pipeline.
+
+        Parameters
+        ----------
+        backend: LocalBackend or SlurmBackend
+            Backend executing the tasks
+        dry_run: bool
+            If `True`, only the plan of the execution is shown
+
+        Returns
+        -------
+        results: dict
+            Results of the tasks returned by the backend, which is empty
+            in the dry run
+        """
+
+        logger.info(f"\n{self.format_plan()}")
+
+        if dry_run:
+            logger.info(f"\n{backend.format_commands(self)}")
+            return {}
+
+        return backend.run(self)
+
+
+def _get_array_task_ids(script):
+    """
+    Gets the task IDs of the SLURM array job defined in a bash script,
+    or `None` if the script does not define an array job.
+    """
+
+    with open(script, "r") as f_in:
+        matches = re.findall(r"^#SBATCH\s+(?:--array=|-a\s*)(\S+)", f_in.read(), re.M)
+
+    if len(matches) == 0:
+        return None
+
+    task_ids = []
+
+    # Remove the limit of the simultaneous tasks, e.g. "%50"
+    for id_range in matches[0].split("%")[0].split(","):
+        id_range, _, step = id_range.partition(":")
+        first, _, last = id_range.partition("-")
+
+        task_ids += list(range(int(first), int(last or first) + 1, int(step or 1)))
+
+    return task_ids
+
+
+class LocalBackend:
+    """
+    Backend running the tasks with a pool of local processes.
+
+    Attributes
+    ----------
+    n_workers: int
+        Number of the scripts run at the same time
+    shell: str
+        Shell running the scripts
+    """
+
+    def __init__(self, n_workers=1, shell="bash"):
+        """
+        Constructor of the class.
+
+        Parameters
+        ----------
+        n_workers: int
+            Number of the scripts run at the same time
+        shell: str
+            Shell running the scripts
+        """
+
+        self.n_workers = n_workers
+        self.shell = shell
+
+    def _run_script(self, script, task_id=None):
+        """
+        Runs a script, returning its exit code.
+        """
+
+        env = os.environ.copy()
+
+        if task_id is not None:
+            env["SLURM_ARRAY_TASK_ID"] = str(task_id)
+
+        return subprocess.run([self.shell, script], env=env).returncode
+
+    def format_commands(self, pipeline):
+        """
+        Formats the commands run for the tasks of a pipeline.
+
+        Parameters
+        ----------
+        pipeline: Pipeline
+            Pipeline to be executed
+
+        Returns
+        -------
+        commands: str
+            Commands run for the tasks
+        """
+
+        lines = [f"Local commands ({self.n_workers} at the same time):"]
+
+        for stage in pipeline.get_stages():
+            for name in stage:
+                script = pipeline.tasks[name]["script"]
+                command = f"{self.shell} {script}"
+
+                if os.path.exists(script) and _get_array_task_ids(script) is not None:
+                    task_ids = _get_array_task_ids(script)
+                    command += f"  # for SLURM_ARRAY_TASK_ID in {task_ids}"
+
+                lines.append(command)
+
+        return "\n".join(lines)
+
+    def run(self, pipeline):
+        """
+        Runs the tasks of a pipeline, starting every task as soon as the
+        tasks on which it depends succeed. The tasks depending on failed
+        tasks are skipped.
+
+        Parameters
+        ----------
+        pipeline: Pipeline
+            Pipeline to be executed
+
+        Returns
+        -------
+        results: dict
+            Status of the tasks - "done", "failed" or "skipped"
+
+        Raises
+        ------
+        RuntimeError
+            If any of the tasks fail
+        """
+
+        dependencies = pipeline.get_dependencies()
+        pipeline.get_stages()  # Check that the dependencies have no cycle
+
+        results = {}
+        running = {}
+
+        with concurrent.futures.ThreadPoolExecutor(self.n_workers) as executor:
+            while len(results) < len(pipeline.tasks):
+                for name in pipeline.tasks:
+                    if (name in results) or (name in running.values()):
+                        continue
+
+                    status_deps = [results.get(dep) for dep in dependencies[name]]
+
+                    if any(status in ["failed", "skipped"] for status in status_deps):
+                        logger.warning(f"Skipping the task '{name}' since its dependencies failed")
+                        results[name] = "skipped"
+
+                    elif all(status == "done" for status in status_deps):
+                        script = pipeline.tasks[name]["script"]
+                        task_ids = _get_array_task_ids(script) or [None]
+
+                        logger.info(f"Starting the task '{name}'...")
+
+                        for task_id in task_ids:
+                            future = executor.submit(self._run_script, script, task_id)
+                            running[future] = name
+
+                if len(running) == 0:
+                    continue
+
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in finished:
+                    name = running.pop(future)
+
+                    if future.result() != 0:
+                        results[name] = "failed"
+
+                    # The task is done when all its array tasks are done
+                    elif (name not in running.values()) and (name not in results):
+                        results[name] = "done"
+
+                    if name in results and name not in running.values():
+                        logger.info(f"Task '{name}': {results[name]}")
+
+        failed_tasks = [name for name, status in results.items() if status != "done"]
+
+        if len(failed_tasks) > 0:
+            raise RuntimeError(
+                f"{len(failed_tasks)} tasks failed or were skipped: {failed_tasks}"
+            )
+
+        return results
+
+
+class SlurmBackend:
+    """
+    Backend submitting the tasks as SLURM jobs, with the `afterok`
+    dependencies on the jobs of the tasks they depend on.
+
+    Attributes
+    ----------
+    sbatch_args: list
+        Additional arguments of `sbatch`
+    """
+
+    def __init__(self, sbatch_args=None):
+        """
+        Constructor of the class.
+
+        Parameters
+        ----------
+        sbatch_args: list
+            Additional arguments of `sbatch`
+        """
+
+        self.sbatch_args = list(sbatch_args or [])
+
+    def _get_sbatch_command(self, script, job_ids):
+        """
+        Gets the `sbatch` command submitting a script after given jobs.
+        """
+
+        command = ["sbatch", "--parsable"] + self.sbatch_args
+
+        if len(job_ids) > 0:
+            # Cancel the job if any of the jobs it depends on fail,
+            # instead of keeping it pending forever
+            command += [
+                f"--dependency=afterok:{':'.join(job_ids)}",
+                "--kill-on-invalid-dep=yes",
+            ]
+
+        return command + [script]
+
+    def format_commands(self, pipeline):
+        """
+        Formats the `sbatch` commands submitting the tasks of a pipeline,
+        where the IDs of the jobs are given as shell variables.
+
+        Parameters
+        ----------
+        pipeline: Pipeline
+            Pipeline to be executed
+
+        Returns
+        -------
+        commands: str
+            Commands submitting the tasks
+        """
+
+        dependencies = pipeline.get_dependencies()
+        job_variables = {}
+
+        lines = ["SLURM commands:"]
+
+        for stage in pipeline.get_stages():
+            for name in stage:
+                job_variables[name] = f"job{len(job_variables)}"
+
+                job_ids = [f"${job_variables[dep]}" for dep in dependencies[name]]
+                command = self._get_sbatch_command(pipeline.tasks[name]["script"], job_ids)
+
+                lines.append(f"{job_variables[name]}=$({' '.join(command)})  # {name}")
+
+        return "\n".join(lines)
+
+    def run(self, pipeline):
+        """
+        Submits the tasks of a pipeline.
+
+        Parameters
+        ----------
+        pipeline: Pipeline
+            Pipeline to be executed
+
+        Returns
+        -------
+        results: dict
+            IDs of the jobs of the tasks
+
+        Raises
+        ------
+        RuntimeError
+            If a job could not be submitted
+        """
+
+        dependencies = pipeline.get_dependencies()
+
+        results = {}
+
+        for stage in pipeline.get_stages():
+            for name in stage:
+                job_ids = [results[dep] for dep in dependencies[name]]
+                command = self._get_sbatch_command(pipeline.tasks[name]["script"], job_ids)
+
+                process = subprocess.run(command, capture_output=True, text=True)
+
+                if process.returncode != 0:
+                    raise RuntimeError(
+                        f"Could not submit the task '{name}':\n{process.stderr}"
+                    )
+
+                # The output of `--parsable` is "<job ID>[;<cluster name>]"
+                results[name] = process.stdout.strip().split(";")[0]
+
+                logger.info(f"Submitted the task '{name}' as the job {results[name]}")
+
+        return results
+
+
+def add_pipeline_arguments(parser):
+    """
+    Adds the arguments selecting the backend of the pipelines to a
+    command-line parser.
+
+    Parameters
+    ----------
+    parser: argparse.ArgumentParser
+        Command-line parser
+    """
+
+    parser.add_argument(
+        "--backend",
+        dest="backend",
+        type=str,
+        default="slurm",
+        choices=["slurm", "local"],
+        help="Backend executing the jobs, 'slurm' or 'local'",
+    )
+
+    parser.add_argument(
+        "--n-local-workers",
+        dest="n_local_workers",
+        type=int,
+        default=1,
+        help="Number of the jobs run at the same time with the local backend",
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        help="Show the plan of the jobs without running them",
+    )
+
+
+def get_pipeline_backend(args):
+    """
+    Gets the backend of the pipelines selected in the command line.
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        Arguments parsed by a parser with `add_pipeline_arguments`
+
+    Returns
+    -------
+    backend: LocalBackend or SlurmBackend
+        Backend executing the pipelines
+    """
+
+    if args.backend == "local":
+        return LocalBackend(args.n_local_workers)
+
+    return SlurmBackend()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from magicctapipe.utils import factorize_events, group_mean, group_sum
+
+
+@pytest.fixture
+def event_data():
+    """
+    Telescope events with NaN values, including a shower event whose
+    values are all NaN.
+    """
+
+    event_data = pd.DataFrame(
+        data={
+            "obs_id": [1, 1, 1, 1, 2, 2, 3, 3],
+            "event_id": [10, 10, 11, 11, 10, 10, 5, 5],
+            "tel_id": [1, 2, 1, 2, 1, 3, 2, 3],
+            "value": [1.0, np.nan, 2.0, 4.0, np.nan, np.nan, 3.0, 5.0],
+            "weight": [2.0, 1.0, 1.0, 3.0, 1.0, 2.0, np.nan, 1.0],
+        }
+    )
+
+    event_data.set_index(["obs_id", "event_id", "tel_id"], inplace=True)
+
+    return event_data
+
+
+def test_group_sum_nan(event_data):
+    """
+    Check that the NaN values are skipped as in the pandas groupby sum.
+    """
+
+    event_codes, event_index = factorize_events(event_data)
+
+    sums = group_sum(event_data["value"], event_codes, len(event_index))
+    expected = event_data["value"].groupby(["obs_id", "event_id"]).sum()
+
+    np.testing.assert_allclose(sums, expected.loc[event_index])
+
+
+def test_group_mean_nan(event_data):
+    """
+    Check that the NaN values are skipped as in the pandas groupby mean,
+    and that the mean is NaN only for the events with all NaN values.
+    """
+
+    event_codes, event_index = factorize_events(event_data)
+
+    means = group_mean(event_data["value"], event_codes, len(event_index))
+    expected = event_data["value"].groupby(["obs_id", "event_id"]).mean()
+
+    np.testing.assert_allclose(means, expected.loc[event_index])
+    assert np.count_nonzero(np.isnan(means)) == 1
+
+
+def test_group_mean_weighted_nan(event_data):
+    """
+    Check that the values with NaN values or weights are excluded from
+    both the weighted sum and the sum of the weights.
+    """
+
+    event_codes, event_index = factorize_events(event_data)
+
+    means = group_mean(
+        event_data["value"], event_codes, len(event_index), event_data["weight"]
+    )
+
+    df_valid = event_data.dropna()
+    df_valid = df_valid.assign(weighted_value=df_valid["value"] * df_valid["weight"])
+
+    group_sums = df_valid.groupby(["obs_id", "event_id"]).sum()
+    expected = group_sums["weighted_value"] / group_sums["weight"]
+    expected = expected.reindex(event_index)
+
+    np.testing.assert_allclose(means, expected)
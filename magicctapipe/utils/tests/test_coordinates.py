@@ -0,0 +1,192 @@
+import numpy as np
+import pytest
+from astropy import units as u
+from astropy.coordinates import AltAz, EarthLocation, SkyCoord, SkyOffsetFrame
+from astropy.time import Time
+from magicctapipe.utils import (
+    altaz_to_telescope,
+    camera_to_altaz,
+    directional_offset_by,
+    telescope_to_altaz,
+)
+
+# The required agreement with astropy
+TOLERANCE = 1e-9 * u.deg
+
+# The location of the telescopes at the ORM
+LOCATION = EarthLocation.from_geodetic(
+    lon=-17.890879 * u.deg, lat=28.761579 * u.deg, height=2199.4 * u.m
+)
+
+# The grid of the telescope pointing directions and observation times.
+# The exact zenith is excluded since the orientation of the sky offset
+# frame is undefined there (older astropy versions drop the azimuth)
+POINTING_ALTS = [10, 30, 50, 70, 89.9] * u.deg
+POINTING_AZS = [0, 45, 135, 180, 270, 359.9] * u.deg
+TIMES = Time(["2022-01-01T00:00:00", "2022-06-21T03:30:00", "2023-11-15T22:10:00"])
+
+
+@pytest.fixture(scope="module")
+def fov_offsets():
+    """
+    Random directions within 5 deg of the telescope pointing.
+    """
+
+    rng = np.random.default_rng(0)
+
+    fov_lon = rng.uniform(-5, 5, 200) * u.deg
+    fov_lat = rng.uniform(-5, 5, 200) * u.deg
+
+    return fov_lon, fov_lat
+
+
+def iterate_pointings():
+    """
+    Iterates over the pointing directions on the grid of alt/az/time.
+    """
+
+    for time in TIMES:
+        altaz_frame = AltAz(obstime=time, location=LOCATION)
+
+        for pnt_alt in POINTING_ALTS:
+            for pnt_az in POINTING_AZS:
+                yield SkyCoord(alt=pnt_alt, az=pnt_az, frame=altaz_frame)
+
+
+def get_offset_frame(pointing):
+    """
+    Gets the sky offset frame centered on the pointing direction.
+
+    The origin is given as the bare Alt/Az frame, since older astropy
+    versions transform a `SkyCoord` origin via ICRS, which shifts it by
+    ~1e-8 deg in azimuth near the zenith.
+    """
+
+    return SkyOffsetFrame(origin=pointing.frame)
+
+
+def test_telescope_to_altaz(fov_offsets):
+    """
+    Check the telescope to Alt/Az transformation against the sky offset
+    frame of astropy.
+    """
+
+    fov_lon, fov_lat = fov_offsets
+
+    for pointing in iterate_pointings():
+        expected = SkyCoord(
+            lon=fov_lon, lat=fov_lat, frame=get_offset_frame(pointing)
+        ).transform_to(pointing.frame)
+
+        alt, az = telescope_to_altaz(
+            fov_lon.to_value("rad"),
+            fov_lat.to_value("rad"),
+            pointing.alt.to_value("rad"),
+            pointing.az.to_value("rad"),
+        )
+
+        coords = SkyCoord(alt=alt * u.rad, az=az * u.rad, frame=pointing.frame)
+
+        assert np.all(coords.separation(expected) < TOLERANCE)
+        assert np.all((az >= 0) & (az < 2 * np.pi))
+
+
+def test_altaz_to_telescope(fov_offsets):
+    """
+    Check the Alt/Az to telescope transformation against the sky offset
+    frame of astropy, and that it is the inverse of
+    `telescope_to_altaz`.
+    """
+
+    fov_lon, fov_lat = fov_offsets
+
+    for pointing in iterate_pointings():
+        offset_frame = get_offset_frame(pointing)
+
+        coords = SkyCoord(lon=fov_lon, lat=fov_lat, frame=offset_frame)
+        coords = coords.transform_to(pointing.frame)
+
+        lon, lat = altaz_to_telescope(
+            coords.alt.to_value("rad"),
+            coords.az.to_value("rad"),
+            pointing.alt.to_value("rad"),
+            pointing.az.to_value("rad"),
+        )
+
+        expected = coords.transform_to(offset_frame)
+        offsets = SkyCoord(lon=lon * u.rad, lat=lat * u.rad, frame=offset_frame)
+
+        assert np.all(offsets.separation(expected) < TOLERANCE)
+
+        np.testing.assert_allclose(lon, fov_lon.to_value("rad"), rtol=0, atol=1e-12)
+        np.testing.assert_allclose(lat, fov_lat.to_value("rad"), rtol=0, atol=1e-12)
+
+
+def test_camera_to_altaz():
+    """
+    Check the camera to Alt/Az transformation against the camera frame
+    of ctapipe.
+    """
+
+    ctapipe_coordinates = pytest.importorskip("ctapipe.coordinates")
+
+    rng = np.random.default_rng(1)
+
+    focal_length = 17 * u.m
+    rotation = 10 * u.deg
+
+    x = rng.uniform(-1, 1, 200) * u.m
+    y = rng.uniform(-1, 1, 200) * u.m
+
+    for pointing in iterate_pointings():
+        camera_frame = ctapipe_coordinates.CameraFrame(
+            focal_length=focal_length,
+            rotation=rotation,
+            telescope_pointing=pointing.frame,
+            obstime=pointing.obstime,
+            location=LOCATION,
+        )
+
+        expected = SkyCoord(x, y, frame=camera_frame).transform_to(pointing.frame)
+
+        alt, az = camera_to_altaz(
+            x.to_value("m"),
+            y.to_value("m"),
+            focal_length.to_value("m"),
+            pointing.alt.to_value("rad"),
+            pointing.az.to_value("rad"),
+            rotation.to_value("rad"),
+        )
+
+        coords = SkyCoord(alt=alt * u.rad, az=az * u.rad, frame=pointing.frame)
+
+        assert np.all(coords.separation(expected) < TOLERANCE)
+
+
+def test_directional_offset_by():
+    """
+    Check the directional offset against
+    `astropy.coordinates.SkyCoord.directional_offset_by`, including the
+    directions at the poles.
+    """
+
+    rng = np.random.default_rng(2)
+
+    lon = rng.uniform(0, 360, 1000) * u.deg
+    lat = np.append(rng.uniform(-90, 90, 998), [90, -90]) * u.deg
+
+    position_angle = rng.uniform(0, 360, 1000) * u.deg
+    separation = rng.uniform(0, 10, 1000) * u.deg
+
+    expected = SkyCoord(lon, lat).directional_offset_by(position_angle, separation)
+
+    lon_offset, lat_offset = directional_offset_by(
+        lon.to_value("rad"),
+        lat.to_value("rad"),
+        position_angle.to_value("rad"),
+        separation.to_value("rad"),
+    )
+
+    coords = SkyCoord(lon_offset * u.rad, lat_offset * u.rad)
+
+    assert np.all(coords.separation(expected) < TOLERANCE)
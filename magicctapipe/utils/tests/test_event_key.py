@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from magicctapipe.utils import (
+    get_event_sort_keys,
+    get_shower_key,
+    pack_event_key,
+    pack_sort_key,
+    unpack_event_key,
+)
+
+
+@pytest.mark.parametrize(
+    "obs_ids",
+    [
+        [5, 5, 3, 3, 3, 7],
+        [2**24 + 5, 2**24 + 5, 3, 3, 3, 2**30],
+        [5.5, 5.5, 3.0, 3.0, 3.0, 7.25],
+    ],
+)
+def test_get_event_sort_keys(obs_ids):
+    """
+    Check that the events are sorted and grouped by the keys in the same
+    way as by the multi index, also when the IDs cannot be packed.
+    """
+
+    event_data = pd.DataFrame(
+        data={
+            "obs_id": obs_ids,
+            "event_id": [10, 10, 12, 11, 11, 1],
+            "tel_id": [2, 1, 1, 3, 1, 2],
+        }
+    )
+
+    sort_keys = get_event_sort_keys(event_data)
+    order = np.argsort(sort_keys, kind="stable")
+
+    expected = event_data.sort_values(["obs_id", "event_id", "tel_id"])
+    pd.testing.assert_frame_equal(event_data.iloc[order], expected)
+
+    shower_keys = get_shower_key(sort_keys)
+    n_showers = event_data.groupby(["obs_id", "event_id"]).ngroups
+
+    assert len(np.unique(shower_keys)) == n_showers
+
+
+def test_pack_sort_key_unpack():
+    """
+    Check that the keys of the IDs which can be packed are the packed
+    event keys.
+    """
+
+    obs_ids = np.array([1, 16777215])
+    event_ids = np.array([4294967295, 0])
+    tel_ids = np.array([255, 1])
+
+    sort_keys = pack_sort_key(obs_ids, event_ids, tel_ids)
+
+    np.testing.assert_array_equal(sort_keys, pack_event_key(obs_ids, event_ids, tel_ids))
+
+    for ids, ids_unpacked in zip([obs_ids, event_ids, tel_ids], unpack_event_key(sort_keys)):
+        np.testing.assert_array_equal(ids_unpacked, ids)
+
+    with pytest.raises(ValueError):
+        pack_event_key(obs_ids + 1, event_ids, tel_ids)
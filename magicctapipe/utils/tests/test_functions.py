@@ -0,0 +1,69 @@
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from astropy.time import Time
+from magicctapipe.utils import transform_altaz_to_radec
+
+
+def test_transform_altaz_to_radec_time_grid():
+    """
+    Check that the Alt/Az to RA/Dec transformation computed on the
+    default time grid agrees with the exact transformation of astropy
+    within 1 milliarcsecond.
+    """
+
+    rng = np.random.default_rng(0)
+    n_events = 2000
+
+    # Events over 20 minutes, sorted by time as in the DL2 data files
+    timestamps = 1.65e9 + np.sort(rng.uniform(0, 1200, n_events))
+    obs_time = Time(timestamps, format="unix", scale="utc")
+
+    alt = rng.uniform(20, 90, n_events) * u.deg
+    az = rng.uniform(0, 360, n_events) * u.deg
+
+    ra_exact, dec_exact = transform_altaz_to_radec(alt, az, obs_time)
+
+    ra_grid, dec_grid = transform_altaz_to_radec(
+        alt, az, obs_time, time_resolution=1 * u.s
+    )
+
+    coords_exact = SkyCoord(ra_exact, dec_exact)
+    coords_grid = SkyCoord(ra_grid, dec_grid)
+
+    assert coords_exact.separation(coords_grid).max() < 1 * u.mas
+
+
+def test_transform_altaz_to_radec_accuracy():
+    """
+    Check that the time grid is refined until the Alt/Az to RA/Dec
+    transformation satisfies the required accuracy.
+    """
+
+    rng = np.random.default_rng(1)
+    n_events = 2000
+
+    # Events over 2 hours, on a time grid much coarser than the default
+    # which does not satisfy the accuracy without the refinement
+    timestamps = 1.65e9 + np.sort(rng.uniform(0, 7200, n_events))
+    obs_time = Time(timestamps, format="unix", scale="utc")
+
+    alt = rng.uniform(20, 90, n_events) * u.deg
+    az = rng.uniform(0, 360, n_events) * u.deg
+
+    ra_exact, dec_exact = transform_altaz_to_radec(alt, az, obs_time)
+
+    ra_coarse, dec_coarse = transform_altaz_to_radec(
+        alt, az, obs_time, time_resolution=1 * u.h
+    )
+
+    ra_refined, dec_refined = transform_altaz_to_radec(
+        alt, az, obs_time, time_resolution=1 * u.h, accuracy=1 * u.uas
+    )
+
+    coords_exact = SkyCoord(ra_exact, dec_exact)
+    coords_coarse = SkyCoord(ra_coarse, dec_coarse)
+    coords_refined = SkyCoord(ra_refined, dec_refined)
+
+    assert coords_exact.separation(coords_coarse).max() > 1 * u.uas
+    assert coords_exact.separation(coords_refined).max() < 1 * u.uas
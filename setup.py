@@ -7,6 +7,7 @@ from setuptools import setup, find_packages
 entry_points = {}
 entry_points["console_scripts"] = [
     "create_dl3_index_files = magicctapipe.scripts.lst1_magic.create_dl3_index_files:main",
+    "lst1_magic_benchmark_rfs = magicctapipe.scripts.lst1_magic.lst1_magic_benchmark_rfs:main",
     "lst1_magic_create_irf = magicctapipe.scripts.lst1_magic.lst1_magic_create_irf:main",
     "lst1_magic_dl1_stereo_to_dl2 = magicctapipe.scripts.lst1_magic.lst1_magic_dl1_stereo_to_dl2:main",
     "lst1_magic_dl2_to_dl3 = magicctapipe.scripts.lst1_magic.lst1_magic_dl2_to_dl3:main",
@@ -32,6 +33,7 @@ docs_require = [
 setup(
     use_scm_version={"write_to": os.path.join("magicctapipe", "_version.py")},
     packages=find_packages(),
+    package_data={"magicctapipe": ["data/source_catalog.yaml"]},
     install_requires=[
         'lstchain~=0.9.6',
         'ctapipe~=0.12.0',
@@ -51,5 +53,6 @@ setup(
         "all": tests_require + docs_require,
         "tests": tests_require,
         "docs": docs_require,
+        "parquet": ["pyarrow>=7"],
     },
 )